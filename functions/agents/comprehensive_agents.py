@@ -15,7 +15,6 @@ This module implements the enhanced agent workflow as specified in the organizer
 
 import logging
 import json
-import re
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 import requests
@@ -28,6 +27,9 @@ from google.analytics.data_v1beta import BetaAnalyticsDataClient
 import firebase_admin
 from firebase_admin import firestore, initialize_app
 
+from utils.json_parsing import loads_tolerant
+from utils.vertex_regions import regional_model
+
 @dataclass
 class AgentConfig:
     """Configuration for all agents"""
@@ -50,7 +52,7 @@ class ValidationAgent:
     def set_up(self):
         """Initialize Google Cloud clients"""
         vertexai.init(project=self.config.project, location=self.config.location)
-        self.gemini_model = GenerativeModel(self.config.model)
+        self.gemini_model = regional_model(self.config.model, call_site="validation")
         
         # Ensure Firebase is initialized before using Firestore
         try:
@@ -129,7 +131,7 @@ class CompetitorBenchmarkingAgent:
     def set_up(self):
         """Initialize Google Cloud clients"""
         vertexai.init(project=self.config.project, location=self.config.location)
-        self.gemini_model = GenerativeModel(self.config.model)
+        self.gemini_model = regional_model(self.config.model, call_site="competitor_benchmarking")
         self.logger.info("✅ CompetitorBenchmarkingAgent setup complete.")
     
     def enrich_competitor_data(self, memo_1_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -183,7 +185,7 @@ class FinancialProjectionAgent:
     def set_up(self):
         """Initialize Google Cloud clients"""
         vertexai.init(project=self.config.project, location=self.config.location)
-        self.gemini_model = GenerativeModel(self.config.model)
+        self.gemini_model = regional_model(self.config.model, call_site="financial_projection")
         self.logger.info("✅ FinancialProjectionAgent setup complete.")
     
     def validate_financial_projections(self, memo_1_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -241,7 +243,7 @@ class RiskScoringAgent:
     def set_up(self):
         """Initialize Google Cloud clients"""
         vertexai.init(project=self.config.project, location=self.config.location)
-        self.gemini_model = GenerativeModel(self.config.model)
+        self.gemini_model = regional_model(self.config.model, call_site="risk_scoring")
         self.logger.info("✅ RiskScoringAgent setup complete.")
     
     def calculate_risk_scores(self, memo_1_data: Dict[str, Any], validation_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -325,7 +327,7 @@ class FinalDiligenceAgent:
     def set_up(self):
         """Initialize Google Cloud clients"""
         vertexai.init(project=self.config.project, location=self.config.location)
-        self.gemini_model = GenerativeModel(self.config.model)
+        self.gemini_model = regional_model(self.config.model, call_site="final_diligence")
         self.logger.info("✅ FinalDiligenceAgent setup complete.")
     
     def generate_memo_3(self, memo_1_data: Dict[str, Any], memo_2_data: Dict[str, Any], 
@@ -372,16 +374,10 @@ class FinalDiligenceAgent:
     
     def _parse_json_from_text(self, text: str) -> Dict[str, Any]:
         """Safely extract JSON from text"""
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            match = re.search(r'```(json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
-            if match:
-                try:
-                    return json.loads(match.group(2))
-                except json.JSONDecodeError:
-                    pass
+        parsed = loads_tolerant(text, expect="object")
+        if parsed is None:
             return {"error": "Failed to parse JSON", "raw_response": text[:1000]}
+        return parsed
 
 class InvestorPreferenceAgent:
     """
@@ -397,7 +393,7 @@ class InvestorPreferenceAgent:
     def set_up(self):
         """Initialize Google Cloud clients"""
         vertexai.init(project=self.config.project, location=self.config.location)
-        self.gemini_model = GenerativeModel(self.config.model)
+        self.gemini_model = regional_model(self.config.model, call_site="investor_preference")
         self.logger.info("✅ InvestorPreferenceAgent setup complete.")
     
     def align_with_investor_thesis(self, memo_data: Dict[str, Any], investor_preferences: Dict[str, Any]) -> Dict[str, Any]:
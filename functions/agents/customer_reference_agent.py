@@ -10,6 +10,9 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import random
 
+from utils.json_parsing import loads_tolerant
+from utils.vertex_regions import regional_model
+
 # Vertex AI imports
 try:
     import vertexai
@@ -32,7 +35,7 @@ class CustomerReferenceAgent:
         if VERTEX_AI_AVAILABLE:
             try:
                 vertexai.init(project=self.project, location=self.location)
-                self.vertex_model = GenerativeModel("gemini-2.5-flash")
+                self.vertex_model = regional_model("gemini-2.5-flash", call_site="customer_reference")
                 self.logger.info("Vertex AI initialized for customer reference generation")
             except Exception as e:
                 self.logger.error(f"Vertex AI initialization failed: {e}")
@@ -160,10 +163,8 @@ class CustomerReferenceAgent:
             reference_text = response.text.strip()
             
             # Extract JSON from response
-            import re
-            json_match = re.search(r'\[.*\]', reference_text, re.DOTALL)
-            if json_match:
-                reference_calls = json.loads(json_match.group())
+            reference_calls = loads_tolerant(reference_text, expect="array")
+            if reference_calls is not None:
                 return reference_calls
             else:
                 self.logger.warning("Could not extract JSON from customer reference response")
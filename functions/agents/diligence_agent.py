@@ -4,7 +4,7 @@ import logging
 import json
 import re
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List
 
 # Google Cloud Imports
 import vertexai
@@ -17,6 +17,14 @@ from firebase_admin import firestore, initialize_app
 # Import PerplexitySearchService for market benchmarking
 from services.perplexity_service import PerplexitySearchService
 from agents.customer_reference_agent import CustomerReferenceAgent
+from utils.deadline import has_budget, rpc_options
+from utils.json_parsing import StreamingObjectParser
+from utils.prompt_budget import PromptSection, build_prompt
+from utils.response_schemas import MEMO_2_SECTIONS, MarketBenchmarking, Memo2Response, memo_2_sections_response
+from utils.structured_output import (
+    OUTCOME_OK, OUTCOME_REPAIRED, generate_json, parse_structured, response_text, validate_structured
+)
+from utils.vertex_regions import regional_model
 
 class DiligenceAgent:
     """
@@ -353,6 +361,30 @@ class DiligenceAgent:
     ---
     """
 
+    MEMO_2_CONTINUATION_TEMPLATE = """
+    **CONTINUATION:** Your previous answer was cut off by the output limit. These sections
+    were already generated and must NOT be repeated: {completed_sections}.
+    Return ONLY a JSON object with the remaining sections, in this order: {remaining_sections}.
+    """
+
+    MEMO_2_GENERATION_CONFIG = {
+        "temperature": 0.1,  # Lower temperature for more factual responses
+        "top_p": 0.8,
+        "top_k": 40,
+        "max_output_tokens": 12000,  # Increased for comprehensive analysis
+    }
+
+    # Continuation requests for sections left unfinished by a cut-off memo
+    MEMO_2_MAX_CONTINUATIONS = 2
+
+    # Estimated input tokens for the Memo 2 prompt, see utils.prompt_budget
+    MEMO_2_PROMPT_TOKEN_BUDGET = 60000
+
+    # Time budget (utils.deadline) kept for Memo 2 synthesis, and needed on top of it
+    # by each optional research stage; stages are skipped when less is left
+    MEMO_2_RESERVE_SECONDS = 180
+    OPTIONAL_STAGE_SECONDS = 45
+
     def __init__(self, project: str, location: str = "asia-south1"):
         self.project = project
         self.location = location
@@ -374,7 +406,7 @@ class DiligenceAgent:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Use Gemini 1.5 Pro for maximum accuracy in diligence analysis
-            self.gemini_model = GenerativeModel("gemini-2.5-flash")
+            self.gemini_model = regional_model("gemini-2.5-flash", call_site="diligence")
             self.logger.info("GenerativeModel ('gemini-2.5-flash') initialized for diligence analysis.")
             
             # Ensure Firebase is initialized before using Firestore
@@ -497,8 +529,14 @@ class DiligenceAgent:
             "note": "This is mock data. Real LinkedIn scraping would require additional implementation."
         }
 
-    def run(self, startup_id: str, ga_property_id: str, linkedin_url: str) -> Dict[str, Any]:
-        """Main entry point. Orchestrates the creation of comprehensive Memo 2 Due Diligence."""
+    def run(self, startup_id: str, ga_property_id: str, linkedin_url: str,
+            on_section: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        Main entry point. Orchestrates the creation of comprehensive Memo 2 Due Diligence.
+
+        Args:
+            on_section: Called with (section, value) as each Memo 2 section is generated
+        """
         start_time = datetime.now()
         self.logger.info(f"Starting comprehensive diligence process for startup_id: {startup_id}")
         
@@ -519,21 +557,27 @@ class DiligenceAgent:
             public_data = self._fetch_public_linkedin_data(linkedin_url, memo_1_data)
             
             # 5. Fetch market benchmarking data using Perplexity API
-            market_benchmarking_data = self._fetch_market_benchmarking(memo_1_data)
+            if self._has_stage_budget("market_benchmarking"):
+                market_benchmarking_data = self._fetch_market_benchmarking(memo_1_data)
+            else:
+                market_benchmarking_data = self._get_default_market_benchmarking()
             
             # 6. Fetch interview data from Firestore
             interview_data = self._fetch_interview_data(startup_id)
             
             # 7. Generate customer references using CustomerReferenceAgent
-            customer_references = self._generate_customer_references(memo_1_data)
+            customer_references = (self._generate_customer_references(memo_1_data)
+                                   if self._has_stage_budget("customer_references") else [])
             
             # 8. Generate LinkedIn verification data using Perplexity
-            linkedin_verification = self._generate_linkedin_verification(memo_1_data)
+            linkedin_verification = (self._generate_linkedin_verification(memo_1_data)
+                                     if self._has_stage_budget("linkedin_verification") else {})
             
             # 9. Synthesize all data into comprehensive Memo 2 using Gemini
             memo_2_json = self._generate_memo_2(
                 memo_1_data, ga_data, public_data, market_benchmarking_data,
-                interview_data, customer_references, linkedin_verification
+                interview_data, customer_references, linkedin_verification,
+                on_section=on_section
             )
 
             processing_time = (datetime.now() - start_time).total_seconds()
@@ -550,12 +594,16 @@ class DiligenceAgent:
                 "error": str(e)
             }
 
+    def _has_stage_budget(self, stage: str) -> bool:
+        """Whether an optional research stage fits before the time kept for Memo 2."""
+        return has_budget(self.MEMO_2_RESERVE_SECONDS + self.OPTIONAL_STAGE_SECONDS, f"diligence.{stage}")
+
     def _fetch_memo_1_data(self, startup_id: str) -> Optional[Dict[str, Any]]:
         """Fetches the result from the IntakeCurationAgent from Firestore."""
         self.logger.info(f"Fetching Memo 1 data for startup: {startup_id}")
         # NOTE: Assumes Memo 1 is stored in a collection named 'ingestionResults'
         doc_ref = self.db.collection('ingestionResults').document(startup_id)
-        doc = doc_ref.get()
+        doc = doc_ref.get(**rpc_options())
         if doc.exists:
             return doc.to_dict().get("memo_1", {})
         return None
@@ -747,10 +795,11 @@ Start with {{ and end with }}.
 
 Extract the data and return ONLY the JSON object."""
             
-            response = self.gemini_model.generate_content(prompt)
-            result = self._parse_json_from_text(response.text)
+            response = generate_json(self.gemini_model, prompt, MarketBenchmarking)
+            result = self._parse_json_from_text(response.text, MarketBenchmarking,
+                                                call_site="diligence.market_benchmarking")
             
-            if result and isinstance(result, dict):
+            if result and isinstance(result, dict) and "error" not in result:
                 return result
             else:
                 return self._get_default_market_benchmarking()
@@ -845,68 +894,102 @@ Extract the data and return ONLY the JSON object."""
 
     def _generate_memo_2(self, memo_1_data: dict, ga_data: dict, public_data: dict, 
                          market_benchmarking_data: dict, interview_data: dict = None, 
-                         customer_references: list = None, linkedin_verification: dict = None) -> Dict[str, Any]:
-        """Uses Gemini to synthesize all data sources into the comprehensive Memo 2 Due Diligence."""
+                         customer_references: list = None, linkedin_verification: dict = None,
+                         on_section: Optional[Callable[[str, Any], None]] = None) -> Dict[str, Any]:
+        """
+        Uses Gemini to synthesize all data sources into the comprehensive Memo 2 Due Diligence.
+
+        The memo is streamed and each top-level section is handed to on_section as soon
+        as it closes. When the output is cut off, only the unfinished sections are
+        requested again, up to MEMO_2_MAX_CONTINUATIONS times.
+        """
         self.logger.info("Synthesizing all data sources to generate comprehensive Memo 2...")
         
-        # Enhanced prompt with all data sources
-        prompt = self.MEMO_2_PROMPT_TEMPLATE.format(
-            memo_1_data=json.dumps(memo_1_data, indent=2),
-            ga_data=json.dumps(ga_data, indent=2),
-            public_data=json.dumps(public_data, indent=2),
-            market_benchmarking_data=json.dumps(market_benchmarking_data, indent=2),
-            interview_data=json.dumps(interview_data or {}, indent=2),
-            customer_references=json.dumps(customer_references or [], indent=2),
-            linkedin_verification=json.dumps(linkedin_verification or {}, indent=2)
-        )
+        # Compact sections fitted to the prompt budget; Memo 1 is never reduced
+        prompt = build_prompt(self.MEMO_2_PROMPT_TEMPLATE, [
+            PromptSection("memo_1_data", memo_1_data, priority=0),
+            PromptSection("ga_data", ga_data, priority=1),
+            PromptSection("market_benchmarking_data", market_benchmarking_data, priority=2, min_tokens=2000),
+            PromptSection("interview_data", interview_data or {}, priority=2, min_tokens=2000,
+                          summarize=self._summarize_prompt_section),
+            PromptSection("linkedin_verification", linkedin_verification or {}, priority=3, min_tokens=500),
+            PromptSection("public_data", public_data, priority=3, min_tokens=1000),
+            PromptSection("customer_references", customer_references or [], priority=4, min_tokens=500),
+        ], budget_tokens=self.MEMO_2_PROMPT_TOKEN_BUDGET, call_site="diligence.memo_2").text
         
-        # Use generate_content with standard configuration
+        memo: Dict[str, Any] = {}
+        parser = self._stream_memo_2_sections(prompt, Memo2Response, memo, on_section)
+        if not memo and not parser.truncated:
+            # No object in the response at all: report it like an unparseable response
+            return self._parse_json_from_text(parser.text, Memo2Response, call_site="diligence.memo_2")
+        
+        continuations = 0
+        while parser.truncated and continuations < self.MEMO_2_MAX_CONTINUATIONS:
+            remaining = [section for section in MEMO_2_SECTIONS if section not in memo]
+            if not remaining:
+                break
+            continuations += 1
+            self.logger.warning(
+                f"Memo 2 was cut off after {len(memo)} sections; requesting {len(remaining)} remaining "
+                f"sections (continuation {continuations}/{self.MEMO_2_MAX_CONTINUATIONS})"
+            )
+            continuation_prompt = prompt + self.MEMO_2_CONTINUATION_TEMPLATE.format(
+                completed_sections=", ".join(memo) or "none",
+                remaining_sections=", ".join(remaining)
+            )
+            parser = self._stream_memo_2_sections(
+                continuation_prompt, memo_2_sections_response(remaining), memo, on_section
+            )
+        
+        incomplete = [section for section in MEMO_2_SECTIONS if section not in memo] if parser.truncated else []
+        outcome = OUTCOME_REPAIRED if continuations or incomplete else OUTCOME_OK
+        memo_2 = validate_structured(memo, Memo2Response, call_site="diligence.memo_2", outcome=outcome)
+        if incomplete:
+            self.logger.error(f"Memo 2 is missing sections after {continuations} continuations: {incomplete}")
+            memo_2["incomplete_sections"] = incomplete
+        self.logger.info(f"Comprehensive Memo 2 generation complete ({len(memo)} sections, {continuations} continuations).")
+        return memo_2
+
+    def _summarize_prompt_section(self, text: str, max_tokens: int) -> str:
+        """Summarizes a prompt section that does not fit the Memo 2 prompt budget."""
         response = self.gemini_model.generate_content(
+            f"Summarize the following diligence data in at most {max_tokens * 3 // 4} words. "
+            f"Keep every number, name, date, claim and concern; drop repetition and filler.\n\n{text}",
+            generation_config={"temperature": 0.0, "max_output_tokens": max_tokens}
+        )
+        return response_text(response)
+
+    def _stream_memo_2_sections(self, prompt: str, response_type, memo: Dict[str, Any],
+                                on_section: Optional[Callable[[str, Any], None]]) -> StreamingObjectParser:
+        """Streams one Memo 2 request, adding each section to memo as it closes."""
+        parser = StreamingObjectParser()
+        chunks = generate_json(
+            self.gemini_model,
             prompt,
-            generation_config={
-                "temperature": 0.1,  # Lower temperature for more factual responses
-                "top_p": 0.8,
-                "top_k": 40,
-                "max_output_tokens": 12000,  # Increased for comprehensive analysis
-            }
+            response_type,
+            generation_config=self.MEMO_2_GENERATION_CONFIG,
+            stream=True
         )
-        self.logger.info("Comprehensive Memo 2 generation complete.")
-        return self._parse_json_from_text(response.text)
+        for chunk in chunks:
+            for section, value in parser.feed(response_text(chunk)):
+                if section in memo:
+                    # Continuations must not repeat completed sections
+                    continue
+                memo[section] = value
+                if on_section is not None:
+                    try:
+                        on_section(section, value)
+                    except Exception as e:
+                        self.logger.warning(f"on_section callback failed for {section}: {e}")
+        return parser
 
-    def _parse_json_from_text(self, text: str) -> Dict[str, Any]:
-        """Safely extracts a JSON object from a string, even with markdown wrappers."""
+    def _parse_json_from_text(self, text: str, response_type=None,
+                              call_site: str = "diligence") -> Dict[str, Any]:
+        """Parses a JSON model response, validating it into response_type."""
         self.logger.debug(f"Attempting to parse JSON from model response: {text[:200]}...")
-        
-        # Remove markdown code blocks
-        text = text.replace('```json', '').replace('```', '')
-        
-        # Try direct parsing first
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-        
-        # Try to find JSON object in the text
-        start = text.find('{')
-        if start != -1:
-            # Find the matching closing brace
-            brace_count = 0
-            end = start
-            for i, char in enumerate(text[start:], start):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        end = i + 1
-                        break
-            
-            if end > start:
-                json_str = text[start:end]
-                try:
-                    return json.loads(json_str)
-                except json.JSONDecodeError:
-                    self.logger.error(f"Failed to decode JSON: {json_str[:200]}...")
+        parsed = parse_structured(text, response_type, call_site=call_site)
+        if isinstance(parsed, dict):
+            return parsed
         
         # Check if JSON is truncated (common issue)
         if text.count('{') > text.count('}'):
@@ -9,13 +9,16 @@ import asyncio
 from typing import Dict, List, Any, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor
 import vertexai
-from vertexai.generative_models import GenerativeModel
 from google.cloud import firestore
 from google.cloud import bigquery
 import logging
 from datetime import datetime
 from .vector_search_client import get_vector_search_client
 from services.perplexity_service import PerplexitySearchService
+from utils.hedging import hedged
+from utils.json_parsing import loads_tolerant
+from utils.prompt_budget import PromptSection, compact_json, fit_sections
+from utils.vertex_regions import regional_model
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,18 +26,10 @@ logger = logging.getLogger(__name__)
 
 def extract_json_from_response(response_text: str) -> dict:
     """Extract JSON from Gemini response that may be wrapped in markdown"""
-    try:
-        # Try direct JSON parse first
-        return json.loads(response_text)
-    except:
-        # Extract from markdown code block
-        if "```json" in response_text:
-            json_str = response_text.split("```json")[1].split("```")[0].strip()
-            return json.loads(json_str)
-        elif "```" in response_text:
-            json_str = response_text.split("```")[1].split("```")[0].strip()
-            return json.loads(json_str)
+    result = loads_tolerant(response_text, expect="object")
+    if result is None:
         raise ValueError("Could not extract JSON from response")
+    return result
 
 def convert_timestamps(data):
     """Convert Firestore timestamps to ISO strings for JSON serialization"""
@@ -51,6 +46,9 @@ def convert_timestamps(data):
 class DiligenceAgentRAG:
     """RAG-based diligence validation agent"""
     
+    # Estimated input tokens per validation prompt, see utils.prompt_budget
+    PROMPT_TOKEN_BUDGET = 16000
+    
     def __init__(self, project_id: str = "veritas-472301", region: str = "asia-south1"):
         """Initialize diligence agent with Firestore and Gemini"""
         self.project_id = project_id
@@ -60,7 +58,7 @@ class DiligenceAgentRAG:
         vertexai.init(project=project_id, location=region)
         
         # Initialize Gemini model
-        self.gemini_model = GenerativeModel("gemini-2.5-flash")
+        self.gemini_model = regional_model("gemini-2.5-flash", call_site="diligence_rag")
         
         # Initialize clients
         self.db = firestore.Client(project=project_id)
@@ -155,6 +153,12 @@ class DiligenceAgentRAG:
                 if enhanced_profile:
                     founder_profile = {**founder_profile, **enhanced_profile}
             
+            sections = fit_sections([
+                PromptSection("founder_profile", convert_timestamps(founder_profile), priority=0),
+                PromptSection("pitch_deck", pitch_deck_text, priority=1, max_tokens=750),
+                PromptSection("memo1", convert_timestamps(memo1), priority=2, max_tokens=500),
+            ], self.PROMPT_TOKEN_BUDGET, call_site="diligence_rag.founder_validation").sections
+            
             # Enhanced detailed prompt with strict JSON formatting
             prompt = f"""You are a senior due diligence analyst specializing in founder background verification.
 
@@ -175,13 +179,13 @@ Do not wrap in ```json``` or any other formatting.
 }}
 
 **Founder Profile Data:**
-{json.dumps(convert_timestamps(founder_profile), indent=2)}
+{sections["founder_profile"]}
 
 **Pitch Deck Claims:**
-{pitch_deck_text[:3000]}
+{sections["pitch_deck"]}
 
 **Memo1 Data (for additional context):**
-{json.dumps(convert_timestamps(memo1), indent=2)[:2000]}
+{sections["memo1"]}
 
 **IMPORTANT INSTRUCTIONS:**
 - If founder profile data is limited, extract what you can from the pitch deck and memo1 data
@@ -192,7 +196,7 @@ Do not wrap in ```json``` or any other formatting.
 
 Analyze the available founder information and return ONLY the JSON object."""
             
-            response = self.gemini_model.generate_content(prompt)
+            response = await asyncio.to_thread(self.gemini_model.generate_content, prompt)
             raw = extract_json_from_response(response.text)
 
             # Normalize numeric fields and required keys
@@ -275,6 +279,11 @@ Analyze the available founder information and return ONLY the JSON object."""
             pitch_deck_text = company_data.get("pitch_deck_text", "")
             memo1 = company_data.get("memo1", {})
             
+            sections = fit_sections([
+                PromptSection("pitch_deck", pitch_deck_text, priority=1, max_tokens=1250),
+                PromptSection("memo1", convert_timestamps(memo1), priority=0),
+            ], self.PROMPT_TOKEN_BUDGET, call_site="diligence_rag.pitch_consistency").sections
+            
             prompt = f"""You are an expert investment analyst checking for internal contradictions in a pitch deck.
 
 **CRITICAL - RESPONSE FORMAT:**
@@ -292,14 +301,14 @@ Start with {{ and end with }}.
 }}
 
 **Pitch Deck Content:**
-{pitch_deck_text[:5000]}
+{sections["pitch_deck"]}
 
 **Memo1 Summary:**
-{json.dumps(convert_timestamps(memo1), indent=2)}
+{sections["memo1"]}
 
 Analyze for internal contradictions and return ONLY the JSON object."""
             
-            response = self.gemini_model.generate_content(prompt)
+            response = await asyncio.to_thread(self.gemini_model.generate_content, prompt)
             raw = extract_json_from_response(response.text)
 
             def to_number(value, default=0, min_val=0, max_val=100):
@@ -340,7 +349,12 @@ Analyze for internal contradictions and return ONLY the JSON object."""
             # If pitch deck text is empty but memo1 has content, use memo1 as source
             if not pitch_deck_text and memo1:
                 logger.warning("No pitch deck text available, using memo1 content as source")
-                pitch_deck_text = json.dumps(memo1, indent=2)
+                pitch_deck_text = compact_json(convert_timestamps(memo1))
+            
+            sections = fit_sections([
+                PromptSection("memo1", convert_timestamps(memo1), priority=0),
+                PromptSection("pitch_deck", pitch_deck_text, priority=1, max_tokens=1250),
+            ], self.PROMPT_TOKEN_BUDGET, call_site="diligence_rag.memo1_accuracy").sections
             
             prompt = f"""You are an expert investment analyst validating memo accuracy against source documents.
 
@@ -360,10 +374,10 @@ Start with {{ and end with }}.
 }}
 
 **Memo1 Summary:**
-{json.dumps(convert_timestamps(memo1), indent=2)}
+{sections["memo1"]}
 
 **Source Pitch Deck:**
-{pitch_deck_text[:5000]}
+{sections["pitch_deck"]}
 
 **IMPORTANT INSTRUCTIONS:**
 - If the source pitch deck is the same as memo1 content, focus on internal consistency and completeness
@@ -373,7 +387,7 @@ Start with {{ and end with }}.
 
 Compare memo against source and return ONLY the JSON object."""
             
-            response = self.gemini_model.generate_content(prompt)
+            response = await asyncio.to_thread(self.gemini_model.generate_content, prompt)
             raw = extract_json_from_response(response.text)
 
             def to_number(value, default=0, min_val=0, max_val=100):
@@ -424,15 +438,19 @@ Compare memo against source and return ONLY the JSON object."""
         try:
             # Prepare synthesis context
             synthesis_context = self._prepare_synthesis_context(validation_results, company_data)
+            sections = fit_sections([
+                PromptSection("validation_results", convert_timestamps(validation_results), priority=0),
+                PromptSection("synthesis_context", synthesis_context, priority=1),
+            ], self.PROMPT_TOKEN_BUDGET, call_site="diligence_rag.synthesis").sections
             
             prompt = f"""
             As a senior diligence expert, synthesize the validation results into a comprehensive diligence report.
             
             Validation Results:
-            {json.dumps(convert_timestamps(validation_results), indent=2)}
+            {sections["validation_results"]}
             
             Company Data Context:
-            {synthesis_context}
+            {sections["synthesis_context"]}
             
             Please create a comprehensive diligence report with:
             1. Executive summary
@@ -460,7 +478,7 @@ Compare memo against source and return ONLY the JSON object."""
             }}
             """
             
-            response = self.gemini_model.generate_content(prompt)
+            response = await asyncio.to_thread(self.gemini_model.generate_content, prompt)
             result = extract_json_from_response(response.text)
 
             # Ensure numeric fields exist and compute overall score
@@ -620,6 +638,12 @@ Compare memo against source and return ONLY the JSON object."""
             pitch_deck_text = company_data.get("pitch_deck_text", "")
             founder_profile = company_data.get("founder_profile", {})
             
+            sections = fit_sections([
+                PromptSection("pitch_deck", pitch_deck_text, priority=1, max_tokens=750),
+                PromptSection("memo1", convert_timestamps(memo1), priority=1, max_tokens=500),
+                PromptSection("founder_profile", convert_timestamps(founder_profile), priority=2, max_tokens=250),
+            ], self.PROMPT_TOKEN_BUDGET, call_site="diligence_rag.query").sections
+            
             # Enhanced detailed prompt with strict JSON formatting
             prompt = f"""You are an expert investment analyst answering questions about company diligence data.
 
@@ -638,15 +662,16 @@ Start with {{ and end with }}.
 }}
 
 **Available Data:**
-- Pitch Deck: {pitch_deck_text[:3000]}
-- Memo1: {json.dumps(convert_timestamps(memo1), indent=2)[:2000]}
-- Founder Profile: {json.dumps(convert_timestamps(founder_profile), indent=2)[:1000]}
+- Pitch Deck: {sections["pitch_deck"]}
+- Memo1: {sections["memo1"]}
+- Founder Profile: {sections["founder_profile"]}
 
 **Question:** {question}
 
 Analyze and return ONLY the JSON object."""
 
-            response = self.gemini_model.generate_content(prompt)
+            # Interactive: hedge slow calls (see utils.hedging)
+            response = await asyncio.to_thread(hedged(self.gemini_model, "diligence_rag.query").generate_content, prompt)
             result = extract_json_from_response(response.text)
             
             return {
@@ -690,7 +715,7 @@ Extract and return ONLY a JSON object with these fields:
 Note: If specific data is not available, use reasonable defaults or leave empty.
 Focus on extracting verifiable professional information that would be useful for due diligence."""
 
-            response = self.gemini_model.generate_content(prompt)
+            response = await asyncio.to_thread(self.gemini_model.generate_content, prompt)
             scraped_data = extract_json_from_response(response.text)
             
             # Merge with existing profile, preferring scraped data
@@ -997,34 +1022,9 @@ Extract the data and return ONLY the JSON object."""
 
     def _parse_json_from_text(self, text: str) -> Dict[str, Any]:
         """Safely extracts a JSON object from a string, even with markdown wrappers."""
-        try:
-            # Try direct JSON parsing first
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-        
-        # Try to extract JSON from markdown code blocks
-        import re
-        
-        # Pattern to match ```json ... ``` blocks
-        json_pattern = r'```(?:json)?\s*(\{.*?\})\s*```'
-        match = re.search(json_pattern, text, re.DOTALL)
-        
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                pass
-        
-        # Try to find JSON object boundaries
-        json_pattern = r'\{.*\}'
-        match = re.search(json_pattern, text, re.DOTALL)
-        
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
+        parsed = loads_tolerant(text, expect="object")
+        if parsed is not None:
+            return parsed
         
         # Log the actual response for debugging
         logger.error(f"Failed to extract JSON from Gemini response. Response: {text[:500]}...")
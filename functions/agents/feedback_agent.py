@@ -5,6 +5,9 @@ import json
 import logging
 from datetime import datetime
 
+from utils.json_parsing import loads_tolerant
+from utils.vertex_regions import regional_model
+
 # Google Cloud imports
 try:
     import vertexai
@@ -69,7 +72,7 @@ class FeedbackAgent:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Initialize Gemini Model
-            self.gemini_model = GenerativeModel(self.model_name)
+            self.gemini_model = regional_model(self.model_name, call_site="feedback")
             self.logger.info(f"GenerativeModel ('{self.model_name}') initialized successfully.")
             
             # Initialize BigQuery Client
@@ -315,19 +318,14 @@ class FeedbackAgent:
                 if isinstance(response.text, dict):
                     result = response.text
                 else:
-                    # Strip markdown code blocks if present
-                    text = response.text.strip()
-                    if text.startswith("```"):
-                        # Remove ```json or ``` at start and ``` at end
-                        text = text.split("```")[1]
-                        if text.startswith("json"):
-                            text = text[4:].strip()
-                    
-                    result = json.loads(text)
+                    # Strip markdown code blocks and surrounding text if present
+                    result = loads_tolerant(response.text, expect="object")
+                    if result is None:
+                        raise ValueError("No JSON object in response")
                 
                 self.logger.info(f"Successfully parsed recommendations: {len(result.get('recommendations', []))} items")
                 return result.get("recommendations", [])
-            except (json.JSONDecodeError, TypeError) as e:
+            except (ValueError, TypeError) as e:
                 # Log the error and the raw response for debugging
                 self.logger.error(f"JSON parsing failed: {e}")
                 self.logger.error(f"Raw response (first 500 chars): {response.text[:500]}")
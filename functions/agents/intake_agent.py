@@ -3,7 +3,7 @@
 from typing import Dict, List, Any, Optional
 import json
 import logging
-import re
+import os
 from datetime import datetime
 
 # Google Cloud imports
@@ -16,6 +16,12 @@ try:
 except ImportError:
     GOOGLE_AVAILABLE = False
 
+from utils.deadline import in_current_context, timeout_for
+from utils.llm_gateway import GatewayModel
+from utils.response_schemas import Memo1Response
+from utils.structured_output import generate_json, parse_structured
+from utils.vertex_regions import RegionalModel, regional_model
+
 # Import vector search client
 try:
     from .vector_search_client import get_vector_search_client
@@ -35,6 +41,27 @@ class IntakeCurationAgent:
     This is the first gatekeeper in the analysis pipeline.
     """
 
+    # Bump whenever the Memo 1 extraction prompt changes; invalidates ingestion checkpoints
+    PROMPT_VERSION = "memo1-2025.3"
+
+    # Above this share of image-only pages, compact PDF input falls back to the full PDF
+    MAX_IMAGE_PAGE_RATIO = 0.5
+
+    # Decks longer than this are extracted in overlapping page windows (map-reduce)
+    SHARD_PAGE_THRESHOLD = 25
+    SHARD_WINDOW_PAGES = 12
+    SHARD_OVERLAP_PAGES = 2
+    SHARD_CONCURRENCY = 4
+
+    # Section-parallel extraction (INTAKE_EXTRACTION_MODE=sections) and its context cache
+    SECTION_CONCURRENCY = 5
+    CONTEXT_CACHE_TTL_SECONDS = 600
+
+    # Speculative enrichment identifies the company from the first pages and waits at
+    # most this long after extraction for the company-level research to finish
+    SPECULATIVE_IDENTITY_PAGES = 3
+    SPECULATIVE_WAIT_SECONDS = 120
+
     def __init__(
         self,
         model: str = "gemini-2.5-flash",
@@ -81,7 +108,7 @@ class IntakeCurationAgent:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Initialize Gemini Model
-            self.gemini_model = GenerativeModel(self.model_name)
+            self.gemini_model = regional_model(self.model_name, call_site="intake")
             self.logger.info(f"GenerativeModel ('{self.model_name}') initialized successfully.")
             
             # Initialize Speech-to-Text Client
@@ -133,43 +160,120 @@ class IntakeCurationAgent:
             else:
                 raise
 
-    def run(self, file_data: bytes, filename: str, file_type: str) -> Dict[str, Any]:
+    @staticmethod
+    def can_read_from_uri(gcs_uri: Optional[str]) -> bool:
+        """
+        Returns True when Gemini and Speech-to-Text can read the file directly from GCS.
+
+        Local and test storage (the Storage emulator, non-gs:// paths) cannot be read by
+        the managed services, and INTAKE_INLINE_FILE_DATA=1 forces inline bytes.
+        """
+        if not gcs_uri or not gcs_uri.startswith("gs://"):
+            return False
+        if os.environ.get("STORAGE_EMULATOR_HOST"):
+            return False
+        return os.environ.get("INTAKE_INLINE_FILE_DATA", "").lower() not in ("1", "true", "yes")
+
+    def needs_file_bytes(self, file_type: str, gcs_uri: Optional[str]) -> bool:
+        """Returns True when run() needs the file bytes rather than just the gs:// URI."""
+        # Forced compact PDF input is extracted locally and always needs the bytes
+        return not self.can_read_from_uri(gcs_uri) or (file_type == 'pdf' and self._pdf_input_mode() == "compact")
+
+    def _read_file_bytes(self, gcs_uri: str) -> bytes:
+        """Downloads a gs:// object when the bytes fallback is needed."""
+        from google.cloud import storage as gcs
+
+        bucket_name, _, blob_name = gcs_uri[len("gs://"):].partition("/")
+        self.logger.info(f"Downloading {gcs_uri} for inline processing...")
+        return gcs.Client(project=self.project).bucket(bucket_name).blob(blob_name).download_as_bytes()
+
+    def _object_size(self, gcs_uri: str) -> Optional[int]:
+        """Size of a gs:// object in bytes, or None when it cannot be looked up."""
+        from google.cloud import storage as gcs
+
+        bucket_name, _, blob_name = gcs_uri[len("gs://"):].partition("/")
+        try:
+            blob = gcs.Client(project=self.project).bucket(bucket_name).get_blob(blob_name)
+            return blob.size if blob is not None else None
+        except Exception as e:
+            self.logger.warning(f"Could not look up the size of {gcs_uri}: {e}")
+            return None
+
+    def run(self, file_data: Optional[bytes], filename: str, file_type: str,
+            gcs_uri: Optional[str] = None,
+            pending_transcription: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Main entry point for the agent. Processes a single file and generates Memo 1.
 
         Args:
-            file_data (bytes): The raw byte content of the file.
+            file_data (Optional[bytes]): The raw byte content of the file. May be None when gcs_uri is given.
             filename (str): The original name of the file.
             file_type (str): The type of file ('pdf', 'video', 'audio').
+            gcs_uri (Optional[str]): gs:// URI of the file. When readable by the managed
+                services the file is passed by reference instead of inline bytes.
+            pending_transcription (Optional[Dict[str, Any]]): pending_transcription of an
+                earlier PENDING result, to resume waiting on its batch transcription.
 
         Returns:
             Dict[str, Any]: A structured dictionary containing the processing status and results.
+                The status is PENDING, with pending_transcription, when a batch transcription
+                is still running at the deadline.
         """
+        from services.transcription_service import BatchTranscriptionPending
+        from utils.memory_usage import MemoryTracker
+
         start_time = datetime.now()
         self.logger.info(f"Starting intake process for '{filename}' (type: {file_type})...")
+        memory_tracker = MemoryTracker(label=f"intake run '{filename}'")
         
         try:
-            extracted_text = ""
-            if file_type == 'pdf':
-                # For PDFs, we generate the memo directly to avoid a two-step process
-                memo_1_json = self._process_pdf_and_generate_memo(file_data)
-            elif file_type in ['video', 'audio']:
-                # For media, we first transcribe, then generate the memo
-                extracted_text = self._process_media(file_data, file_type)
-                memo_1_json = self._generate_memo_from_text(extracted_text, "pitch transcript")
-            else:
-                raise ValueError(f"Unsupported file type: {file_type}")
+            with memory_tracker:
+                use_uri = self.can_read_from_uri(gcs_uri)
+                if self.needs_file_bytes(file_type, gcs_uri) and file_data is None:
+                    if not gcs_uri:
+                        raise ValueError("Either file_data or gcs_uri must be provided")
+                    file_data = self._read_file_bytes(gcs_uri)
+                source_uri = gcs_uri if use_uri else None
+
+                transcription = None
+                if file_type == 'pdf':
+                    # For PDFs, we generate the memo directly to avoid a two-step process
+                    memo_1_json = self._process_pdf_and_generate_memo(file_data, gcs_uri=source_uri)
+                elif file_type in ['video', 'audio']:
+                    # For media, we first transcribe, then generate the memo
+                    transcription = self._process_media(file_data, file_type, gcs_uri=source_uri,
+                                                        pending_batch=pending_transcription)
+                    memo_1_json = self._generate_memo_from_text(transcription.transcript, "pitch transcript")
+                else:
+                    raise ValueError(f"Unsupported file type: {file_type}")
 
             processing_time = (datetime.now() - start_time).total_seconds()
             self.logger.info(f"Successfully processed '{filename}' in {processing_time:.2f} seconds.")
 
-            return {
+            result = {
                 "timestamp": datetime.now().isoformat(),
                 "processing_time_seconds": processing_time,
                 "memo_1": memo_1_json,
                 "original_filename": filename,
+                "input_mode": "uri" if source_uri else "inline",
+                "memory_usage": memory_tracker.usage,
                 "status": "SUCCESS"
             }
+            if transcription is not None:
+                result["transcription_mode"] = transcription.mode
+                result["transcript_segments"] = transcription.segment_dicts()
+            return result
+
+        except BatchTranscriptionPending as e:
+            self.logger.info(f"Handing on the batch transcription of '{filename}': {e}")
+            return {
+                "timestamp": datetime.now().isoformat(),
+                "processing_time_seconds": (datetime.now() - start_time).total_seconds(),
+                "memo_1": {},
+                "memory_usage": memory_tracker.usage,
+                "status": "PENDING",
+                "pending_transcription": e.to_dict()
+            }
             
         except Exception as e:
             self.logger.error(f"Error during intake process for '{filename}': {e}", exc_info=True)
@@ -179,14 +283,249 @@ class IntakeCurationAgent:
                 "timestamp": datetime.now().isoformat(),
                 "processing_time_seconds": processing_time,
                 "memo_1": {},
+                "memory_usage": memory_tracker.usage,
                 "status": "FAILED",
                 "error": str(e)
             }
 
-    def _process_pdf_and_generate_memo(self, file_data: bytes) -> Dict[str, Any]:
-        """Processes a PDF file using Gemini and generates Memo 1 in a single call."""
+    @staticmethod
+    def _pdf_input_mode() -> str:
+        """
+        PDF input mode (INTAKE_PDF_INPUT):
+        - 'auto' (default): compact when the bytes are at hand anyway, otherwise the
+          gs:// URI is passed to Gemini without downloading the deck.
+        - 'compact': always extract text locally, downloading the deck if needed.
+        - 'native': always send the whole PDF.
+        """
+        return os.environ.get("INTAKE_PDF_INPUT", "auto").lower()
+
+    def _preprocess_pdf(self, file_data: Optional[bytes]):
+        """
+        Preprocesses a PDF locally unless native input mode is set.
+
+        Returns the PreprocessedDeck, or None when the whole PDF should be sent instead
+        (native mode, no bytes, most pages image-only, or preprocessing failure).
+        """
+        if self._pdf_input_mode() == "native" or not file_data:
+            return None
+        try:
+            from utils.pdf_preprocessor import preprocess_pdf
+
+            deck = preprocess_pdf(file_data)
+            self.logger.info(f"PDF preprocessing stats: {deck.stats()}")
+            if deck.page_count and len(deck.image_page_numbers) <= deck.page_count * self.MAX_IMAGE_PAGE_RATIO:
+                return deck
+            self.logger.info("Most pages are image-only, sending the full PDF instead")
+        except Exception as e:
+            self.logger.warning(f"PDF preprocessing failed, sending the full PDF: {e}")
+        return None
+
+    def _build_pdf_contents(self, prompt: str, file_data: Optional[bytes], gcs_uri: Optional[str],
+                            deck=None, page_numbers: Optional[List[int]] = None) -> List[Any]:
+        """
+        Builds the Gemini contents for a PDF, or for a subset of its pages.
+
+        With a preprocessed deck the prompt carries per-page text and only pages without
+        extractable text are attached (as a PDF of those pages). Without one, the whole
+        PDF (or the requested pages) is attached.
+        """
+        from utils.pdf_preprocessor import compact_text_for_pages, extract_pages_pdf
+
+        if deck is not None:
+            if page_numbers:
+                deck_text = compact_text_for_pages(deck, page_numbers)
+                image_pages = [n for n in deck.image_page_numbers if n in page_numbers]
+                image_pdf = extract_pages_pdf(file_data, image_pages) if image_pages else None
+            else:
+                deck_text = deck.compact_text
+                image_pdf = deck.image_pages_pdf
+            contents = [
+                prompt,
+                "The pitch deck has been converted to text page by page below. "
+                "Pages marked as visual content are attached as a PDF.\n\n"
+                f"PITCH DECK TEXT:\n{deck_text}"
+            ]
+            if image_pdf:
+                contents.append(Part.from_data(data=image_pdf, mime_type="application/pdf"))
+            return contents
+
+        if page_numbers:
+            return [prompt, Part.from_data(data=extract_pages_pdf(file_data, page_numbers), mime_type="application/pdf")]
+        if gcs_uri:
+            return [prompt, Part.from_uri(uri=gcs_uri, mime_type="application/pdf")]
+        return [prompt, Part.from_data(data=file_data, mime_type="application/pdf")]
+
+    def _shard_windows(self, file_data: Optional[bytes], deck) -> Optional[List[List[int]]]:
+        """Returns overlapping page windows for decks above the sharding threshold, else None."""
+        from utils.pdf_preprocessor import count_pdf_pages, page_windows
+
+        threshold = int(os.environ.get("INTAKE_SHARD_PAGE_THRESHOLD", self.SHARD_PAGE_THRESHOLD))
+        if threshold <= 0 or not file_data:
+            return None
+        try:
+            page_count = deck.page_count if deck is not None else count_pdf_pages(file_data)
+        except Exception as e:
+            self.logger.warning(f"Could not count PDF pages, using single-shot extraction: {e}")
+            return None
+        if page_count <= threshold:
+            return None
+
+        window_pages = int(os.environ.get("INTAKE_SHARD_WINDOW_PAGES", self.SHARD_WINDOW_PAGES))
+        overlap_pages = int(os.environ.get("INTAKE_SHARD_OVERLAP_PAGES", self.SHARD_OVERLAP_PAGES))
+        return page_windows(page_count, window_pages, overlap_pages)
+
+    def _extract_memo_sharded(self, prompt: str, file_data: bytes, deck, windows: List[List[int]]) -> Dict[str, Any]:
+        """
+        Map-reduce extraction: extracts each page window concurrently, then merges the
+        partial memos deterministically (see utils.memo_merge).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from utils.memo_merge import merge_memo_shards
+
+        page_count = windows[-1][-1]
+        self.logger.info(f"Sharded extraction: {page_count} pages in {len(windows)} windows")
+
+        def extract_window(window: List[int]) -> Optional[Dict[str, Any]]:
+            window_prompt = (
+                f"{prompt}\n\nSCOPE: You are given pages {window[0]}-{window[-1]} of a {page_count}-page deck. "
+                "Extract only what these pages state and use \"Not specified\" for anything they do not cover."
+            )
+            try:
+                response = generate_json(
+                    self.gemini_model,
+                    self._build_pdf_contents(window_prompt, file_data, None, deck=deck, page_numbers=window)
+                )
+                return self._parse_json_from_text(self._extract_gemini_response_text(response),
+                                                  call_site="intake.memo_1_shard")
+            except Exception as e:
+                self.logger.warning(f"Extraction failed for pages {window[0]}-{window[-1]}: {e}")
+                return None
+
+        max_workers = min(len(windows), int(os.environ.get("INTAKE_SHARD_CONCURRENCY", self.SHARD_CONCURRENCY)))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            shards = list(pool.map(in_current_context(extract_window), windows))
+
+        shards = [shard for shard in shards if isinstance(shard, dict) and shard]
+        if not shards:
+            raise ValueError("All page windows failed to extract")
+        return merge_memo_shards(shards)
+
+    @staticmethod
+    def _extraction_mode() -> str:
+        """Memo 1 extraction mode: 'single' (one prompt for every field) or 'sections'."""
+        return os.environ.get("INTAKE_EXTRACTION_MODE", "single").lower()
+
+    def _cached_context_model(self, document_contents: List[Any]):
+        """
+        Creates a Vertex AI context cache holding the document and a model bound to it.
+
+        Returns (model, cache), or (None, None) when caching is disabled or not supported
+        (e.g. the document is below the model's minimum cacheable size).
+        """
+        if os.environ.get("INTAKE_CONTEXT_CACHE", "1") == "0":
+            return None, None
+        if not GOOGLE_AVAILABLE or not isinstance(self.gemini_model, (GatewayModel, RegionalModel)):
+            return None, None
+        try:
+            from datetime import timedelta
+            from vertexai.generative_models import Content
+            from vertexai.preview import caching
+
+            parts = [Part.from_text(c) if isinstance(c, str) else c for c in document_contents]
+            cache = caching.CachedContent.create(
+                model_name=self.model_name,
+                contents=[Content(role="user", parts=parts)],
+                ttl=timedelta(seconds=self.CONTEXT_CACHE_TTL_SECONDS),
+            )
+            self.logger.info(f"Created context cache {cache.name} for section extraction")
+            return GatewayModel(GenerativeModel.from_cached_content(cached_content=cache)), cache
+        except Exception as e:
+            self.logger.info(f"Context caching unavailable, sending the document with each section: {e}")
+            return None, None
+
+    def _extract_sections(self, prompt: str, document_contents: List[Any],
+                          sections: Optional[List[str]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Extracts memo sections concurrently against one shared document context.
+
+        With a context cache the document tokens are sent once and each request only
+        carries its section prompt. Without one, the document parts come first in every
+        request so all sections share an identical prefix.
+
+        Returns section -> parsed fields, or None for sections that failed.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from utils.memo_sections import MEMO_1_SECTIONS, build_section_prompt, parse_field_descriptions
+
+        sections = sections or list(MEMO_1_SECTIONS)
+        descriptions = parse_field_descriptions(prompt)
+        cached_model, cache = self._cached_context_model(document_contents)
+
+        def extract_section(section: str) -> Optional[Dict[str, Any]]:
+            section_prompt = build_section_prompt(section, descriptions)
+            try:
+                if cached_model is not None:
+                    response = generate_json(cached_model, section_prompt)
+                else:
+                    response = generate_json(self.gemini_model, [*document_contents, section_prompt])
+                parsed = self._parse_json_from_text(self._extract_gemini_response_text(response),
+                                                    call_site="intake.memo_1_section")
+                if not isinstance(parsed, dict) or "raw_response" in parsed:
+                    raise ValueError("Section response was not valid JSON")
+                return parsed
+            except Exception as e:
+                self.logger.warning(f"Extraction failed for section '{section}': {e}")
+                return None
+
+        max_workers = min(len(sections), int(os.environ.get("INTAKE_SECTION_CONCURRENCY", self.SECTION_CONCURRENCY)))
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+                return dict(zip(sections, pool.map(in_current_context(extract_section), sections)))
+        finally:
+            if cache is not None:
+                try:
+                    cache.delete()
+                except Exception as e:
+                    self.logger.debug(f"Could not delete context cache: {e}")
+
+    def _extract_memo_by_sections(self, prompt: str, document_contents: List[Any]) -> Dict[str, Any]:
+        """Section-parallel extraction assembled into the memo_1 schema."""
+        from utils.memo_sections import assemble_sections
+
+        results = self._extract_sections(prompt, document_contents)
+        failed = [section for section, result in results.items() if not result]
+        if len(failed) == len(results):
+            raise ValueError("All memo sections failed to extract")
+        if failed:
+            self.logger.warning(f"Memo sections failed and will be re-queried: {failed}")
+        return assemble_sections(results)
+
+    def _requery_empty_sections(self, result: Dict[str, Any], prompt: str,
+                                document_contents: List[Any]) -> Dict[str, Any]:
+        """Re-extracts only the sections that came back empty and fills their empty fields."""
+        from utils.memo_sections import MEMO_1_SECTIONS, empty_sections, field_is_empty
+
+        sections = empty_sections(result)
+        if not sections:
+            return result
+
+        self.logger.info(f"Re-querying empty memo sections: {sections}")
+        for section, section_result in self._extract_sections(prompt, document_contents, sections).items():
+            if not section_result:
+                continue
+            for field in MEMO_1_SECTIONS[section]["fields"]:
+                if field_is_empty(result, field) and not field_is_empty(section_result, field):
+                    result[field] = section_result[field]
+        return result
+
+    def _process_pdf_and_generate_memo(self, file_data: Optional[bytes], gcs_uri: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Processes a PDF file using Gemini and generates Memo 1.
+
+        Large decks are extracted in page windows; otherwise the memo is extracted in a
+        single call, or per section when INTAKE_EXTRACTION_MODE=sections.
+        """
         self.logger.info("Processing PDF with Gemini to generate Memo 1...")
-        pdf_part = Part.from_data(data=file_data, mime_type="application/pdf")
         
         prompt = """
         You are an elite AI Venture Capital Analyst with 15+ years of experience in startup evaluation, due diligence, and investment decision-making. You have analyzed thousands of pitch decks across all industries and stages, from pre-seed to Series C+.
@@ -356,7 +695,23 @@ class IntakeCurationAgent:
         FINAL REMINDER: If you cannot extract specific information for any field, provide a reasonable analysis based on the available data rather than "Not specified". For critical fields like summary_analysis, initial_flags, and validation_points, you MUST provide substantive content based on your analysis of the pitch deck.
         """
         
-        response = self.gemini_model.generate_content([prompt, pdf_part])
+        deck = self._preprocess_pdf(file_data)
+        windows = self._shard_windows(file_data, deck)
+        if windows:
+            # Large decks: extract overlapping page windows concurrently and merge
+            result = self._extract_memo_sharded(prompt, file_data, deck, windows)
+            self.logger.info("PDF processing and memo generation complete.")
+            return self._ensure_critical_fields(result)
+
+        contents = self._build_pdf_contents(prompt, file_data, gcs_uri, deck=deck)
+        document_contents = contents[1:]
+        if self._extraction_mode() == "sections":
+            # Independent section prompts against the shared document context
+            result = self._extract_memo_by_sections(prompt, document_contents)
+            self.logger.info("PDF processing and memo generation complete.")
+            return self._ensure_critical_fields(result, prompt, document_contents)
+
+        response = generate_json(self.gemini_model, contents)
         self.logger.info("PDF processing and memo generation complete.")
         
         # Extract text from Gemini response (handles multiple content parts)
@@ -375,23 +730,34 @@ class IntakeCurationAgent:
         
         return result
 
-    def _process_media(self, file_data: bytes, file_type: str) -> str:
-        """Transcribes video or audio file's audio track using Speech-to-Text."""
+    def _process_media(self, file_data: Optional[bytes], file_type: str, gcs_uri: Optional[str] = None,
+                       pending_batch: Optional[Dict[str, Any]] = None):
+        """
+        Transcribes video or audio file's audio track using Speech-to-Text.
+
+        Short and medium recordings are transcribed in overlapping segments concurrently
+        (gs:// media is read first); only large gs:// media goes through the long-running
+        batch API, which raises BatchTranscriptionPending when it outlives the deadline.
+        Returns a TranscriptionResult with the stitched transcript and segment timestamps.
+        """
+        from services.transcription_service import BatchTranscriptionPending, TranscriptionService
+
         self.logger.info(f"Transcribing {file_type} using Speech-to-Text...")
         model = "long" if file_type == 'video' else "telephony"
-        
-        config = speech.RecognitionConfig(
-            auto_decoding_config=speech.AutoDetectDecodingConfig(),
-            language_codes=["en-US", "en-GB"],  # Added GB for broader coverage
-            model=model
-        )
-        request = speech.RecognizeRequest(config=config, content=file_data, recognizer=f"projects/{self.project}/locations/global/recognizers/_")
+        media_size = self._object_size(gcs_uri) if gcs_uri and file_data is None and not pending_batch else None
         
         try:
-            response = self.speech_client.recognize(request=request)
-            transcript = " ".join([result.alternatives[0].transcript for result in response.results if result.alternatives])
-            self.logger.info(f"{file_type.capitalize()} transcription complete. Length: {len(transcript)} chars.")
-            return transcript
+            transcription = TranscriptionService(self.speech_client, self.project).transcribe(
+                file_data=file_data, gcs_uri=gcs_uri, model=model, media_size=media_size,
+                read_bytes=lambda: self._read_file_bytes(gcs_uri), pending_batch=pending_batch
+            )
+            self.logger.info(
+                f"{file_type.capitalize()} transcription complete ({transcription.mode}, "
+                f"{len(transcription.segments)} segments). Length: {len(transcription.transcript)} chars."
+            )
+            return transcription
+        except BatchTranscriptionPending:
+            raise
         except Exception as e:
             self.logger.error(f"Speech-to-Text recognition failed: {e}")
             raise  # Re-raise the exception to be caught by the main run method
@@ -536,7 +902,8 @@ class IntakeCurationAgent:
         Text to analyze:
         {text[:20000]}
         """
-        response = self.gemini_model.generate_content(prompt)
+        # No response schema, as for decks: see Memo1Response
+        response = generate_json(self.gemini_model, prompt)
         self.logger.info("Memo 1 generation from text complete.")
         
         # Extract text from Gemini response (handles multiple content parts)
@@ -555,9 +922,24 @@ class IntakeCurationAgent:
         
         return result
         
-    def _ensure_critical_fields(self, result: Dict[str, Any]) -> Dict[str, Any]:
-        """Post-process the result to ensure critical fields are never 'Not specified'."""
+    def _ensure_critical_fields(self, result: Dict[str, Any], prompt: Optional[str] = None,
+                                document_contents: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """
+        Post-process the result to ensure critical fields are never 'Not specified'.
+
+        Section extraction passes its document context so that sections that came back
+        empty are re-queried first (only those sections). Single-shot and text extraction
+        do not, so they never make extra model calls here; static defaults remain the
+        final fallback.
+        """
         self.logger.info("Post-processing result to ensure critical fields have content...")
+
+        requery = os.environ.get("INTAKE_SECTION_REQUERY", "1") != "0"
+        if requery and prompt and document_contents and self.gemini_model is not None:
+            try:
+                result = self._requery_empty_sections(result, prompt, document_contents)
+            except Exception as e:
+                self.logger.warning(f"Re-querying empty sections failed: {e}")
         
         # Ensure summary_analysis is not "Not specified"
         if not result.get("summary_analysis") or result.get("summary_analysis") == "Not specified":
@@ -593,118 +975,16 @@ class IntakeCurationAgent:
             self.logger.error(f"Memo data validation failed: {e}")
             return False
         
-    def _parse_json_from_text(self, text: str) -> Dict[str, Any]:
-        """Safely extracts and sanitizes JSON from model response."""
+    def _parse_json_from_text(self, text: str, response_type=Memo1Response,
+                              call_site: str = "intake.memo_1") -> Dict[str, Any]:
+        """Parses a JSON model response, validating it into response_type."""
         self.logger.debug(f"Attempting to parse JSON from model response: {text[:200]}...")
-        
-        # Clean control characters except newline, carriage return, tab
-        def sanitize_control_chars(s: str) -> str:
-            return re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', s)
-
-        # Normalize common smart quotes and stray unicode to strict JSON
-        def normalize_quotes_and_commas(s: str) -> str:
-            # Replace smart quotes/apostrophes with standard quotes
-            s = s.replace('\u201c', '"').replace('\u201d', '"').replace('\u2018', "'").replace('\u2019', "'")
-            s = s.replace('“', '"').replace('”', '"').replace('‘', "'").replace('’', "'")
-            # Remove BOM if present
-            s = s.replace('\ufeff', '')
-            # Remove trailing commas before closing braces/brackets
-            s = re.sub(r',\s*(\}|\])', r'\1', s)
-            return s
-        
-        # Clean up the text first
-        cleaned_text = sanitize_control_chars(text.strip())
-        cleaned_text = normalize_quotes_and_commas(cleaned_text)
-        
-        # Remove any leading/trailing non-JSON characters
-        if cleaned_text.startswith('⁠ '):
-            cleaned_text = cleaned_text[2:]  # Remove the invisible character and space
-        
-        # Try to find JSON in markdown code blocks
-        match = re.search(r'```(?:json)?\s*(\{.*\})\s*```', cleaned_text, re.DOTALL)
-        if match:
-            json_str = match.group(1)
-        else:
-            # Try to find JSON object boundaries
-            start_idx = cleaned_text.find('{')
-            if start_idx != -1:
-                # Find matching closing brace
-                brace_count = 0
-                end_idx = start_idx
-                for i, char in enumerate(cleaned_text[start_idx:], start_idx):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            end_idx = i + 1
-                            break
-                json_str = cleaned_text[start_idx:end_idx]
-            else:
-                json_str = cleaned_text
-            
-        # Add comprehensive logging before parsing
-        self.logger.debug(f"Response length: {len(text)} characters")
-        self.logger.debug(f"Cleaned text length: {len(cleaned_text)} characters")
-        self.logger.debug(f"JSON string length: {len(json_str)} characters")
-        self.logger.debug(f"First 500 chars: {json_str[:500]}")
-        self.logger.debug(f"Last 500 chars: {json_str[-500:]}")
-        
-        # First parse attempt
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError as e:
-            self.logger.warning(f"Failed to decode JSON from model response: {e}")
-            self.logger.error(f"JSON string (first 500 chars): {json_str[:500]}")
-            # Log character position for debugging
-            if hasattr(e, 'pos'):
-                self.logger.error(f"Error at character position: {e.pos}")
-                if e.pos < len(json_str):
-                    start = max(0, e.pos - 50)
-                    end = min(len(json_str), e.pos + 50)
-                    self.logger.error(f"Context around error: {json_str[start:end]}")
-            # Second attempt: aggressively normalize again
-            second = normalize_quotes_and_commas(json_str)
-            # Remove trailing commas before closing braces/brackets globally
-            second = re.sub(r',\s*(\})', r'\1', second)
-            second = re.sub(r',\s*(\])', r'\1', second)
-            # Ensure keys are quoted (best-effort, only for simple keys at line starts)
-            second = re.sub(r'(?m)^(\s*)([A-Za-z0-9_]+)\s*:', r'\1"\2":', second)
-            # Strip stray backticks and code fence markers
-            second = second.replace('```json', '').replace('```', '')
-            try:
-                return json.loads(second)
-            except Exception:
-                # Third attempt: replace single quotes with double quotes cautiously
-                third = second
-                # Only replace quotes around keys/values patterns to reduce damage
-                third = re.sub(r"'([A-Za-z0-9_\-\.\s]+)'\s*:", r'"\1":', third)
-                third = re.sub(r":\s*'([^']*)'", lambda m: ': "' + m.group(1).replace('"', '\\"') + '"', third)
-                try:
-                    return json.loads(third)
-                except Exception:
-                    # Fourth attempt: balance braces/brackets and close dangling quotes
-                    def balance_json_structure(s: str) -> str:
-                        # Close dangling quotes at end if odd count
-                        if s.count('"') % 2 != 0:
-                            s += '"'
-                        # Balance braces and brackets
-                        open_braces = s.count('{'); close_braces = s.count('}')
-                        open_brackets = s.count('['); close_brackets = s.count(']')
-                        if close_braces < open_braces:
-                            s += '}' * (open_braces - close_braces)
-                        if close_brackets < open_brackets:
-                            s += ']' * (open_brackets - close_brackets)
-                        # Remove trailing commas before appended closers
-                        s = re.sub(r',\s*(\}|\])', r'\1', s)
-                        return s
-                    balanced = balance_json_structure(third)
-                    try:
-                        return json.loads(balanced)
-                    except Exception:
-                        pass
-            # Fallback: return error with raw for client-side recovery
-            return {"error": "Failed to parse valid JSON from model response.", "raw_response": text}
+        parsed = parse_structured(text, response_type, call_site=call_site)
+        if isinstance(parsed, dict):
+            return parsed
+        # Return error with raw for client-side recovery
+        self.logger.warning(f"Failed to decode JSON from model response: {text[:500]}")
+        return {"error": "Failed to parse valid JSON from model response.", "raw_response": text}
 
     def get_founder_profile(self, founder_email: str) -> Optional[Dict[str, Any]]:
         """Get founder profile data from Firestore"""
@@ -764,8 +1044,95 @@ class IntakeCurationAgent:
             self.logger.error(f"Error storing embeddings for company {company_id}: {e}")
             return False
 
-    async def run_with_embeddings(self, file_data: bytes, filename: str, file_type: str, 
-                          founder_email: str, company_id: str = None) -> Dict[str, Any]:
+    @staticmethod
+    def _speculative_enrichment_enabled() -> bool:
+        """Speculative enrichment needs Perplexity and can be disabled with INTAKE_SPECULATIVE_ENRICHMENT=0."""
+        if os.environ.get("INTAKE_SPECULATIVE_ENRICHMENT", "1").lower() in ("0", "false", "no"):
+            return False
+        return bool(os.environ.get("PERPLEXITY_API_KEY"))
+
+    def identify_company(self, file_data: bytes):
+        """
+        Fast identification pass over the first pages of a PDF deck.
+
+        Uses a text heuristic on the first pages and falls back to a small Gemini call
+        on the same text when no company name is found.
+
+        Returns:
+            CompanyIdentity, or None when the company cannot be identified
+        """
+        from utils.company_identity import identify_from_text
+        from utils.pdf_preprocessor import preprocess_pdf
+
+        try:
+            text = preprocess_pdf(file_data, max_pages=self.SPECULATIVE_IDENTITY_PAGES).compact_text
+        except Exception as e:
+            self.logger.warning(f"Could not read the first pages for company identification: {e}")
+            return None
+
+        identity = identify_from_text(text)
+        if not identity.is_usable and text.strip():
+            identity = self._identify_company_with_model(text) or identity
+        return identity if identity.is_usable else None
+
+    def _identify_company_with_model(self, text: str):
+        """Asks Gemini for the company name, website and sector using only first-page text."""
+        from utils.company_identity import CompanyIdentity
+        from utils.response_schemas import CompanyIdentityResponse
+
+        prompt = (
+            "Identify the startup this pitch deck is about from its first pages. Respond with JSON only, "
+            'using "" for unknown values: {"company_name": "", "website": "", "sector": ""}\n\n'
+            f"FIRST PAGES:\n{text[:4000]}"
+        )
+        try:
+            response = generate_json(self.gemini_model, prompt, CompanyIdentityResponse)
+            data = self._parse_json_from_text(self._extract_gemini_response_text(response),
+                                              CompanyIdentityResponse, call_site="intake.company_identity")
+        except Exception as e:
+            self.logger.warning(f"Company identification call failed: {e}")
+            return None
+        return CompanyIdentity(
+            name=str(data.get("company_name") or ""),
+            website=str(data.get("website") or ""),
+            sector=str(data.get("sector") or ""),
+            source="model",
+        )
+
+    def _prefetch_company_research(self, identity) -> Dict[str, Any]:
+        """Runs the company-level Perplexity categories for a speculative identity."""
+        import asyncio
+        from services.perplexity_service import PerplexitySearchService
+
+        perplexity_service = PerplexitySearchService(project=self.project, location=self.location)
+        # Returned as a coroutine so SpeculativeEnrichment can cancel the searches
+        return perplexity_service.prefetch_company_research(identity.context())
+
+    def start_speculative_enrichment(self, file_data: Optional[bytes], file_type: str):
+        """
+        Starts company-level Perplexity research from the deck's first pages.
+
+        Runs in a background thread concurrently with run(); pass the returned handle to
+        enrich_ingestion_result, which uses the research only if the identified company
+        matches the finished memo. Callers that skip enrichment cancel the handle.
+
+        Returns:
+            SpeculativeEnrichment, or None when not applicable (non-PDF input, no bytes,
+            Perplexity not configured or INTAKE_SPECULATIVE_ENRICHMENT=0)
+        """
+        if file_type != 'pdf' or not file_data or not self._speculative_enrichment_enabled():
+            return None
+        from utils.company_identity import SpeculativeEnrichment
+
+        self.logger.info("Starting speculative company enrichment from the first pages")
+        return SpeculativeEnrichment().start(
+            lambda: self.identify_company(file_data),
+            self._prefetch_company_research,
+        )
+
+    async def run_with_embeddings(self, file_data: Optional[bytes], filename: str, file_type: str, 
+                          founder_email: str, company_id: str = None,
+                          gcs_uri: Optional[str] = None) -> Dict[str, Any]:
         """
         Enhanced run method that also generates and stores embeddings and enriches missing data with Perplexity
         
@@ -775,13 +1142,44 @@ class IntakeCurationAgent:
             file_type (str): The type of file ('pdf', 'video', 'audio').
             founder_email (str): Email of the founder for profile lookup.
             company_id (str): Optional company ID for embedding storage.
+            gcs_uri (Optional[str]): gs:// URI of the file, passed by reference when possible.
             
         Returns:
             Dict[str, Any]: A structured dictionary containing the processing status and results.
         """
+        if file_data is None and gcs_uri and self.needs_file_bytes(file_type, gcs_uri):
+            file_data = self._read_file_bytes(gcs_uri)
+
+        # Company-level research starts from the first pages while the full memo is extracted
+        speculation = self.start_speculative_enrichment(file_data, file_type)
+
         # Run the original processing
-        result = self.run(file_data, filename, file_type)
+        result = self.run(file_data, filename, file_type, gcs_uri=gcs_uri)
+        try:
+            return await self.enrich_ingestion_result(result, filename, founder_email, company_id,
+                                                      speculation=speculation)
+        finally:
+            if speculation is not None:
+                speculation.cancel()
+
+    async def enrich_ingestion_result(self, result: Dict[str, Any], filename: str,
+                                      founder_email: str, company_id: str = None,
+                                      speculation=None) -> Dict[str, Any]:
+        """
+        Enriches missing Memo 1 fields of a successful run() result with Perplexity + Vertex AI.
         
+        Args:
+            result (Dict[str, Any]): The result returned by run().
+            filename (str): The original name of the file.
+            founder_email (str): Email of the founder for profile lookup.
+            company_id (str): Optional company ID for embedding storage.
+            speculation: Optional SpeculativeEnrichment from start_speculative_enrichment.
+                Its research replaces the matching Perplexity searches when the company
+                it identified matches the memo, and is discarded otherwise.
+            
+        Returns:
+            Dict[str, Any]: The result with the enriched memo_1 and enrichment metadata.
+        """
         # If processing was successful, enrich missing data and store embeddings
         if result.get("status") == "SUCCESS" and result.get("memo_1"):
             memo1 = result["memo_1"]
@@ -806,35 +1204,30 @@ class IntakeCurationAgent:
                 if perplexity_service and perplexity_service.enabled:
                     self.logger.info(f"Enriching missing data for {memo1.get('title', 'Unknown Company')} using Perplexity AI + Vertex AI...")
                     
-                    # Run enrichment asynchronously with Vertex AI processing
                     import asyncio
+                    
+                    # Reconcile speculative research with the finished memo
+                    prefetched = None
+                    if speculation is not None:
+                        prefetched = await asyncio.to_thread(
+                            speculation.resolve, memo1, self.SPECULATIVE_WAIT_SECONDS
+                        )
+                        result["speculative_enrichment"] = speculation.outcome
+                    
+                    # Run enrichment asynchronously with Vertex AI processing
                     try:
-                        # Ensure we're running in an async context
-                        try:
-                            loop = asyncio.get_event_loop()
-                        except RuntimeError:
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
-                        
-                        # Run async enrichment
-                        if loop.is_running():
-                            # If loop is already running, use run_coroutine_threadsafe
-                            enriched_memo1 = asyncio.run_coroutine_threadsafe(
-                                perplexity_service.enrich_missing_fields(memo1), 
-                                loop
-                            ).result(timeout=300)  # 5 minute timeout
-                        else:
-                            # Run the async enrichment
-                            enriched_memo1 = loop.run_until_complete(
-                                perplexity_service.enrich_missing_fields(memo1)
-                            )
+                        # Run async enrichment on the current loop (5 minute timeout, less when the task's budget is lower)
+                        enriched_memo1 = await asyncio.wait_for(
+                            perplexity_service.enrich_missing_fields(memo1, prefetched=prefetched),
+                            timeout=timeout_for(300)
+                        )
                         
                         # Validate enriched data
                         if not enriched_memo1 or not isinstance(enriched_memo1, dict):
                             self.logger.warning("Enriched data is invalid, using original memo1")
                             enriched_memo1 = memo1.copy()
                     except asyncio.TimeoutError:
-                        self.logger.error("Enrichment timed out after 5 minutes")
+                        self.logger.error("Enrichment timed out")
                         enriched_memo1 = memo1.copy()
                         result["enrichment_error"] = "Enrichment timed out"
                     except Exception as async_error:
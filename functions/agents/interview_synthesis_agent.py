@@ -5,6 +5,10 @@ import json
 import logging
 from datetime import datetime
 
+from utils.response_schemas import InterviewAnalysis
+from utils.structured_output import generate_json, parse_structured
+from utils.vertex_regions import regional_model
+
 # Google Cloud imports
 try:
     import vertexai
@@ -69,7 +73,7 @@ class InterviewSynthesisAgent:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Initialize Gemini Model
-            self.gemini_model = GenerativeModel(self.model_name)
+            self.gemini_model = regional_model(self.model_name, call_site="interview_synthesis")
             self.logger.info(f"GenerativeModel ('{self.model_name}') initialized successfully.")
             
             # Initialize Firestore client
@@ -249,7 +253,7 @@ Be specific, professional, and evidence-based in your analysis.
 """
 
         try:
-            response = self.gemini_model.generate_content(prompt)
+            response = generate_json(self.gemini_model, prompt, InterviewAnalysis)
             analysis_json = self._parse_json_from_text(response.text)
             
             # Validate and structure the response
@@ -331,35 +335,11 @@ Be specific, professional, and evidence-based in your analysis.
 
     def _parse_json_from_text(self, text: str) -> Dict[str, Any]:
         """Safely extract JSON from Gemini response."""
-        try:
-            # Clean up the text first
-            cleaned_text = text.strip()
-            
-            # Try to find JSON object in the text
-            start_idx = cleaned_text.find('{')
-            if start_idx != -1:
-                # Find matching closing brace
-                brace_count = 0
-                end_idx = start_idx
-                for i, char in enumerate(cleaned_text[start_idx:], start_idx):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            end_idx = i + 1
-                            break
-                
-                json_str = cleaned_text[start_idx:end_idx]
-                return json.loads(json_str)
-            
-            # Try direct parsing
-            return json.loads(cleaned_text)
-            
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Failed to parse JSON from Gemini response: {e}")
+        parsed = parse_structured(text, InterviewAnalysis, call_site="interview_synthesis.analysis")
+        if parsed is None:
             self.logger.error(f"Response text: {text[:500]}...")
             return {}
+        return parsed
 
     def _store_summary(self, interview_id: str, summary: Dict[str, Any]):
         """Store analysis summary in Firestore."""
@@ -14,6 +14,9 @@ from datetime import datetime
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 
+from utils.model_routing import routed_model
+from utils.vertex_regions import regional_model
+
 # Google Cloud imports
 try:
     import vertexai
@@ -83,7 +86,7 @@ class InvestorMatchingAgent:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Initialize Gemini Model for embeddings and rationale generation
-            self.gemini_model = GenerativeModel("gemini-2.5-flash")
+            self.gemini_model = regional_model("gemini-2.5-flash", call_site="investor_matching")
             self.logger.info("GenerativeModel ('gemini-2.5-flash') initialized.")
             
             # Initialize Firestore client (READ-ONLY operations only)
@@ -775,7 +778,7 @@ Geography: {score_breakdown.get('geography', 0):.1%}
 
 Generate a 2-3 sentence explanation highlighting the strongest alignment factors. Be specific and compelling. Focus on mutual value creation."""
 
-            response = self.gemini_model.generate_content(prompt)
+            response = routed_model("investor_matching.why_match").generate_content(prompt)
             return response.text.strip()
             
         except Exception as e:
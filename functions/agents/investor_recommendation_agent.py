@@ -8,6 +8,9 @@ from datetime import datetime
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import MinMaxScaler
 
+from utils.model_routing import routed_model
+from utils.vertex_regions import regional_model
+
 # Google Cloud imports
 try:
     import vertexai
@@ -91,7 +94,7 @@ class InvestorRecommendationAgent:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Initialize Gemini Model
-            self.gemini_model = GenerativeModel(self.model_name)
+            self.gemini_model = regional_model(self.model_name, call_site="investor_recommendation")
             self.logger.info(f"GenerativeModel ('{self.model_name}') initialized successfully.")
             
             # Initialize Firestore client
@@ -489,7 +492,7 @@ class InvestorRecommendationAgent:
             Focus on mutual value creation and strategic fit.
             """
             
-            response = self.gemini_model.generate_content(prompt)
+            response = routed_model("investor_recommendation.rationale").generate_content(prompt)
             return response.text.strip()
         except Exception as e:
             self.logger.warning(f"Error generating enhanced rationale: {e}")
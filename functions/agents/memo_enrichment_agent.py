@@ -13,6 +13,9 @@ import firebase_admin
 from firebase_admin import firestore, initialize_app
 
 from services.perplexity_service import PerplexitySearchService
+from utils.model_routing import routed_model
+from utils.response_schemas import ValidationAssessment, findings_to_dict
+from utils.structured_output import generate_json, parse_structured
 
 
 class MemoEnrichmentAgent:
@@ -1373,21 +1376,10 @@ Return ONLY valid JSON (no markdown, no code blocks):
             Structured validation result
         """
         try:
-            # Try to extract JSON from response
-            parsed_data = None
-            
-            # Try direct JSON parsing
-            try:
-                parsed_data = json.loads(content)
-            except json.JSONDecodeError:
-                # Try extracting JSON from markdown
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    try:
-                        parsed_data = json.loads(json_match.group())
-                    except json.JSONDecodeError:
-                        pass
+            # Perplexity has no structured output mode; parse its answer tolerantly
+            parsed_data = parse_structured(content, call_site="memo_enrichment.perplexity_validation")
+            if not isinstance(parsed_data, dict):
+                parsed_data = None
             
             # If JSON parsing failed, use Vertex AI to structure the response
             if not parsed_data and self.perplexity_service.vertex_model:
@@ -1404,19 +1396,23 @@ Return JSON with these fields:
 {{
     "status": "CONFIRMED/QUESTIONABLE/MISSING",
     "confidence": 0.0-1.0,
-    "findings": {{...}},
+    "findings": [{{"name": "field", "detail": "what was found"}}],
     "sources": [...]
 }}
 
 Base status on confidence: >= 0.7 = CONFIRMED, 0.4-0.69 = QUESTIONABLE, < 0.4 = MISSING"""
                     
-                    response = self.perplexity_service.vertex_model.generate_content(structure_prompt)
+                    response = await asyncio.to_thread(
+                        generate_json, routed_model("memo_enrichment.validation_structuring"),
+                        structure_prompt, ValidationAssessment)
                     response_text = response.text if hasattr(response, 'text') else str(response)
                     
-                    # Extract JSON from response
-                    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                    if json_match:
-                        parsed_data = json.loads(json_match.group())
+                    structured = parse_structured(response_text, ValidationAssessment,
+                                                  call_site="memo_enrichment.validation_structuring")
+                    if isinstance(structured, dict):
+                        if "findings" in structured:
+                            structured["findings"] = findings_to_dict(structured["findings"])
+                        parsed_data = structured
                 except Exception as e:
                     self.logger.warning(f"Vertex AI structuring failed for {category}: {e}")
             
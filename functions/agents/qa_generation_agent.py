@@ -5,6 +5,12 @@ import json
 import logging
 from datetime import datetime
 
+from utils.hedging import hedged
+from utils.model_routing import routed_model
+from utils.response_schemas import InterviewQuestions
+from utils.structured_output import generate_json, parse_structured
+from utils.vertex_regions import regional_model
+
 # Google Cloud imports
 try:
     import vertexai
@@ -71,7 +77,7 @@ class QAGenerationAgent:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Initialize Gemini Model
-            self.gemini_model = GenerativeModel(self.model_name)
+            self.gemini_model = regional_model(self.model_name, call_site="qa_generation")
             self.logger.info(f"GenerativeModel ('{self.model_name}') initialized successfully.")
             
             # Initialize Firestore client
@@ -241,7 +247,8 @@ Generate exactly 8-10 questions. Focus on the most important validation points a
 """
 
         try:
-            response = self.gemini_model.generate_content(prompt)
+            # Interview preparation waits on this call: hedge slow calls (see utils.hedging)
+            response = generate_json(hedged(self.gemini_model, "qa_generation.questions"), prompt, InterviewQuestions)
             questions_json = self._parse_json_from_text(response.text)
             
             # Ensure we have a list of questions
@@ -281,7 +288,7 @@ Return ONLY the question text, no additional formatting.
 """
 
         try:
-            response = self.gemini_model.generate_content(prompt)
+            response = routed_model("qa_generation.followup").generate_content(prompt)
             return response.text.strip()
         except Exception as e:
             self.logger.error(f"Error generating followup with Gemini: {e}")
@@ -336,37 +343,13 @@ Return ONLY the question text, no additional formatting.
         
         return fallback_questions
 
-    def _parse_json_from_text(self, text: str) -> Dict[str, Any]:
+    def _parse_json_from_text(self, text: str) -> List[Dict[str, Any]]:
         """Safely extract JSON from Gemini response."""
-        try:
-            # Clean up the text first
-            cleaned_text = text.strip()
-            
-            # Try to find JSON array in the text
-            start_idx = cleaned_text.find('[')
-            if start_idx != -1:
-                # Find matching closing bracket
-                bracket_count = 0
-                end_idx = start_idx
-                for i, char in enumerate(cleaned_text[start_idx:], start_idx):
-                    if char == '[':
-                        bracket_count += 1
-                    elif char == ']':
-                        bracket_count -= 1
-                        if bracket_count == 0:
-                            end_idx = i + 1
-                            break
-                
-                json_str = cleaned_text[start_idx:end_idx]
-                return json.loads(json_str)
-            
-            # Try direct parsing
-            return json.loads(cleaned_text)
-            
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Failed to parse JSON from Gemini response: {e}")
+        parsed = parse_structured(text, InterviewQuestions, call_site="qa_generation.questions")
+        if parsed is None:
             self.logger.error(f"Response text: {text[:500]}...")
             return []
+        return parsed
 
 
 def test_agent(company_id: str, project_id: str):
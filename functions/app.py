@@ -3,6 +3,7 @@ import main
 import json
 import base64
 from firebase_functions import pubsub_fn
+from utils.pubsub_ledger import process_message_once
 
 app = Flask(__name__)
 
@@ -59,6 +60,8 @@ def root():
         "message": "Cloud Run service is running",
         "endpoints": [
             "/on_file_upload",
+            "/create_upload_session",
+            "/confirm_upload",
             "/validate_memo_data",
             "/run_diligence",
             "/query_diligence",
@@ -67,11 +70,15 @@ def root():
             "/submit_interview_answer",
             "/ai_feedback",
             "/check_memo",
+            "/memo_events/<upload_id>",
             "/trigger_diligence",
             "/process_ingestion_task",
+            "/on_direct_upload_finalized",
             "/process_diligence_task",
             "/conduct_interview",
-            "/generate_interview_summary"
+            "/generate_interview_summary",
+            "/metrics",
+            "/health/dependencies"
         ]
     }), 200
 
@@ -106,6 +113,18 @@ def on_file_upload_route():
     return convert_firebase_response(result)
 
 
+@app.route("/create_upload_session", methods=["POST", "OPTIONS"])
+def create_upload_session_route():
+    result = main.create_upload_session(request)
+    return convert_firebase_response(result)
+
+
+@app.route("/confirm_upload", methods=["POST", "OPTIONS"])
+def confirm_upload_route():
+    result = main.confirm_upload(request)
+    return convert_firebase_response(result)
+
+
 @app.route("/validate_memo_data", methods=["POST", "OPTIONS"])
 def validate_memo_data_route():
     result = main.validate_memo_data(request)
@@ -166,6 +185,72 @@ def check_memo_route():
     return convert_firebase_response(result)
 
 
+@app.route("/memo_events/<upload_id>", methods=["GET", "OPTIONS"])
+def memo_events_route(upload_id):
+    """Stream ingestion status for an upload as Server-Sent Events"""
+    from utils.ingestion_status import get_status_backend, parse_stream_timeout, stream_status_events
+
+    headers = main.get_cors_headers(request)
+    if request.method == "OPTIONS":
+        return FlaskResponse("", status=204, headers=headers)
+
+    try:
+        timeout_seconds = parse_stream_timeout(request.args.get("timeout"))
+    except ValueError:
+        return FlaskResponse("timeout must be a number of seconds in (0, 540]", status=400, headers=headers)
+
+    db = None
+    if get_status_backend() == "firestore":
+        main.get_firebase_app()
+        db = main.firestore.client()
+
+    headers.update({
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    return FlaskResponse(
+        stream_status_events(upload_id, db=db, timeout_seconds=timeout_seconds),
+        status=200,
+        mimetype="text/event-stream",
+        headers=headers
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    """In-process counters, gauges, rate limits, hedging, model routing, Vertex AI regions and structured output parse failure rates"""
+    from utils.hedging import hedge_stats
+    from utils.metrics import get_metrics_registry
+    from utils.model_routing import get_model_router
+    from utils.rate_limiter import get_rate_limiter_registry
+    from utils.structured_output import parse_failure_rates
+    from utils.vertex_regions import get_vertex_region_pool
+
+    registry = get_metrics_registry()
+    return jsonify({
+        "counters": registry.snapshot(),
+        "gauges": registry.gauge_snapshot(),
+        "rate_limits": get_rate_limiter_registry().snapshot(),
+        "hedging": hedge_stats(),
+        "model_routing": get_model_router().snapshot(),
+        "vertex_regions": get_vertex_region_pool().snapshot(),
+        "structured_output": parse_failure_rates()
+    }), 200
+
+
+@app.route("/health/dependencies", methods=["GET"])
+def dependency_health_route():
+    """Circuit breaker state of Perplexity, Vertex AI and SendGrid"""
+    from utils.circuit_breaker import get_circuit_breaker_registry
+
+    dependencies = get_circuit_breaker_registry().snapshot()
+    statuses = {entry["status"] for entry in dependencies.values()}
+    return jsonify({
+        "status": "healthy" if statuses <= {"ok"} else "degraded",
+        "dependencies": dependencies
+    }), 200
+
+
 @app.route("/trigger_diligence", methods=["POST", "OPTIONS"])
 def trigger_diligence_route():
     result = main.trigger_diligence(request)
@@ -175,6 +260,20 @@ def trigger_diligence_route():
 # Pub/Sub Push Subscription Endpoints
 # These endpoints receive HTTP POST requests from Pub/Sub push subscriptions
 
+@app.route("/on_direct_upload_finalized", methods=["POST"])
+def on_direct_upload_finalized_route():
+    """Handle an Eventarc google.cloud.storage.object.v1.finalized event for direct uploads"""
+    try:
+        event = request.get_json(silent=True) or {}
+        # Binary-mode CloudEvents carry the object as the body; structured mode wraps it in "data"
+        object_data = event.get("data") if isinstance(event.get("data"), dict) else event
+        main._handle_direct_upload_finalized(object_data)
+        return "", 204
+    except Exception as e:
+        error_response, status_code = handle_pubsub_error(e)
+        return jsonify(error_response), status_code
+
+
 @app.route("/process_ingestion_task", methods=["POST", "OPTIONS"])
 def process_ingestion_task_route():
     """Handle Pub/Sub push message for document ingestion"""
@@ -264,10 +363,13 @@ def process_ingestion_task_route():
         
         event = MockCloudEvent(message_bytes)
         
-        # Call the implementation function directly (bypasses firebase decorator)
-        main._process_ingestion_task_impl(message_bytes)
+        # Call the implementation function directly (bypasses firebase decorator),
+        # through the ledger so redelivered messages are acked without reprocessing
+        message_id = pubsub_message['message'].get('messageId') or pubsub_message['message'].get('message_id')
+        main.get_firebase_app()
+        outcome = process_message_once("process_ingestion_task", message_id, message_bytes, main._process_ingestion_task_impl)
         
-        return jsonify({"status": "success"}), 200
+        return jsonify({"status": "success" if outcome["status"] == "processed" else outcome["status"]}), 200
         
     except Exception as e:
         error_response, status_code = handle_pubsub_error(e)
@@ -347,10 +449,13 @@ def process_diligence_task_route():
         
         event = MockCloudEvent(message_bytes)
         
-        # Call the implementation function directly (bypasses firebase decorator)
-        main._process_diligence_task_impl(message_bytes)
+        # Call the implementation function directly (bypasses firebase decorator),
+        # through the ledger so redelivered messages are acked without reprocessing
+        message_id = pubsub_message['message'].get('messageId') or pubsub_message['message'].get('message_id')
+        main.get_firebase_app()
+        outcome = process_message_once("process_diligence_task", message_id, message_bytes, main._process_diligence_task_impl)
         
-        return jsonify({"status": "success"}), 200
+        return jsonify({"status": "success" if outcome["status"] == "processed" else outcome["status"]}), 200
         
     except Exception as e:
         error_response, status_code = handle_pubsub_error(e)
@@ -433,10 +538,13 @@ def conduct_interview_route():
         
         event = MockCloudEvent(message_bytes)
         
-        # Call the implementation function directly (bypasses firebase decorator)
-        main._conduct_interview_impl(message_bytes)
+        # Call the implementation function directly (bypasses firebase decorator),
+        # through the ledger so redelivered messages are acked without reprocessing
+        message_id = pubsub_message['message'].get('messageId') or pubsub_message['message'].get('message_id')
+        main.get_firebase_app()
+        outcome = process_message_once("conduct_interview", message_id, message_bytes, main._conduct_interview_impl)
         
-        return jsonify({"status": "success"}), 200
+        return jsonify({"status": "success" if outcome["status"] == "processed" else outcome["status"]}), 200
         
     except Exception as e:
         error_response, status_code = handle_pubsub_error(e)
@@ -519,10 +627,13 @@ def generate_interview_summary_route():
         
         event = MockCloudEvent(message_bytes)
         
-        # Call the implementation function directly (bypasses firebase decorator)
-        main._generate_interview_summary_impl(message_bytes)
+        # Call the implementation function directly (bypasses firebase decorator),
+        # through the ledger so redelivered messages are acked without reprocessing
+        message_id = pubsub_message['message'].get('messageId') or pubsub_message['message'].get('message_id')
+        main.get_firebase_app()
+        outcome = process_message_once("generate_interview_summary", message_id, message_bytes, main._generate_interview_summary_impl)
         
-        return jsonify({"status": "success"}), 200
+        return jsonify({"status": "success" if outcome["status"] == "processed" else outcome["status"]}), 200
         
     except Exception as e:
         error_response, status_code = handle_pubsub_error(e)
@@ -28,6 +28,8 @@ warnings.filterwarnings(
 from firebase_functions import storage_fn, pubsub_fn, https_fn, options
 from firebase_admin import auth as firebase_auth
 
+from utils.deadline import with_deadline
+
 # Set global options - THIS IS CRITICAL FOR YOUR REGION
 options.set_global_options(region="asia-south1")
 
@@ -136,8 +138,8 @@ def get_bigquery_client():
         bigquery_client = bigquery.Client(project="veritas-472301")
     return bigquery_client
 
-def save_to_bigquery(upload_id: str, founder_email: str, ingestion_result: dict):
-    """Save pitch deck data to BigQuery"""
+def save_to_bigquery(upload_id: str, founder_email: str, ingestion_result: dict) -> bool:
+    """Save pitch deck data to BigQuery. Returns True when the row was inserted."""
     try:
         client = get_bigquery_client()
         table_id = "veritas-472301.veritas_pitch_data.pitch_deck_data"
@@ -157,12 +159,14 @@ def save_to_bigquery(upload_id: str, founder_email: str, ingestion_result: dict)
         errors = client.insert_rows_json(table_id, [row_data])
         if errors:
             print(f"BigQuery insert errors: {errors}")
-        else:
-            print(f"Successfully saved to BigQuery: {upload_id}")
+            return False
+        print(f"Successfully saved to BigQuery: {upload_id}")
+        return True
             
     except Exception as e:
         print(f"BigQuery save failed (non-blocking): {e}")
         # Don't raise - this is fire-and-forget
+        return False
 
 def verify_firebase_token(auth_header: str) -> dict:
     """Verify Firebase ID token and return user info"""
@@ -180,6 +184,24 @@ def verify_firebase_token(auth_header: str) -> dict:
         raise ValueError(f"Invalid token: {str(e)}")
 
 # --- 2. Ingestion Pipeline: Stage 1 (File Upload) ---
+def _record_deduplicated_upload(db, reusable: dict, upload_doc: dict, content_hash: str):
+    """Create an uploads document that points at the same founder's existing ingestion result."""
+    from utils.ingestion_status import report_ingestion_stage
+    
+    memo_id = reusable['ingestion_result_id']
+    upload_doc.update({
+        'status': 'completed',
+        'ingestionStage': 'completed',
+        'memoId': memo_id,
+        'contentHash': content_hash,
+        'deduplicatedFrom': reusable.get('upload_id'),
+        'uploadedAt': firestore.SERVER_TIMESTAMP
+    })
+    upload_ref = db.collection('uploads').add(upload_doc)
+    report_ingestion_stage(upload_ref[1].id, 'completed', memo_id=memo_id)
+    print(f"Duplicate content {content_hash[:12]} reused ingestion result {memo_id}")
+    return upload_ref
+
 @https_fn.on_request(
     memory=options.MemoryOption.MB_512
 )
@@ -244,6 +266,36 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
                 
                 print(f"Processing file: {original_name} ({file.content_type}, {len(file_content)} bytes)")
                 
+                # Reuse a completed ingestion result for byte-identical content
+                from utils.upload_dedup import compute_content_hash, find_reusable_result, is_force_reprocess
+                content_hash = compute_content_hash(file_content)
+                force_reprocess = is_force_reprocess(req.form.get('force_reprocess'))
+                db = firestore.client()
+                reusable = None if force_reprocess else find_reusable_result(db, content_hash, founder_email)
+                if reusable:
+                    upload_ref = _record_deduplicated_upload(db, reusable, {
+                        'fileName': reusable.get('file_path'),
+                        'originalName': original_name,
+                        'contentType': file.content_type,
+                        'size': len(file_content),
+                        'type': file_type,
+                        'uploadedBy': 'user',
+                        'founderEmail': founder_email
+                    }, content_hash)
+                    
+                    headers = get_cors_headers(req)
+                    return https_fn.Response(
+                        json.dumps({
+                            "message": "Identical file already processed, reusing existing memo",
+                            "status": "success",
+                            "upload_id": upload_ref[1].id,
+                            "memo_id": reusable['ingestion_result_id'],
+                            "deduplicated": True
+                        }),
+                        status=200,
+                        headers=headers
+                    )
+                
                 # Upload to Firebase Storage
                 bucket = storage.bucket('veritas-472301.firebasestorage.app')
                 timestamp = int(time.time() * 1000)
@@ -253,17 +305,13 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
                 # Upload the file
                 blob.upload_from_string(file_content, content_type=file.content_type)
                 
-                # Make the file publicly accessible
-                blob.make_public()
-                
-                # Get download URL
-                download_url = blob.public_url
+                # Objects stay private; consumers read them by gs:// URI
+                download_url = f"gs://{bucket.name}/{blob_name}"
                 
                 print(f"File uploaded to storage: {blob_name}")
                 print(f"Download URL: {download_url}")
                 
                 # Save metadata to Firestore
-                db = firestore.client()
                 upload_doc = {
                     'fileName': blob_name,
                     'originalName': original_name,
@@ -274,7 +322,8 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
                     'status': 'uploaded',
                     'uploadedAt': firestore.SERVER_TIMESTAMP,
                     'uploadedBy': 'user',
-                    'founderEmail': founder_email
+                    'founderEmail': founder_email,
+                    'contentHash': content_hash
                 }
                 
                 # Add to uploads collection
@@ -292,6 +341,7 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
                     "file_type": file_type,
                     "upload_id": upload_ref[1].id,
                     "founder_email": founder_email,
+                    "content_hash": content_hash,
                     "triggered_by": "http_upload"
                 }
                 
@@ -312,6 +362,7 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
                 # Update upload document with processing status
                 upload_ref[1].update({
                     'status': 'processing',
+                    'ingestionStage': 'queued',
                     'processing_started_at': firestore.SERVER_TIMESTAMP,
                     'message_id': message_id
                 })
@@ -367,6 +418,32 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
             headers = get_cors_headers(req)
             return https_fn.Response("Invalid file data", status=400, headers=headers)
         
+        # Reuse a completed ingestion result for byte-identical content
+        from utils.upload_dedup import compute_content_hash, find_reusable_result, is_force_reprocess
+        content_hash = compute_content_hash(file_bytes)
+        founder_email = data.get('founder_email')
+        db = firestore.client()
+        reusable = None
+        if not is_force_reprocess(data.get('force_reprocess')):
+            reusable = find_reusable_result(db, content_hash, founder_email)
+        if reusable:
+            _record_deduplicated_upload(db, reusable, {
+                'fileName': reusable.get('file_path'),
+                'originalName': file_name,
+                'type': content_type,
+                'size': file_size,
+                'contentType': file_type,
+                'founderEmail': founder_email
+            }, content_hash)
+            headers = get_cors_headers(req)
+            return https_fn.Response(json.dumps({
+                'success': True,
+                'file_name': reusable.get('file_path'),
+                'message': 'Identical file already processed, reusing existing memo',
+                'memo_id': reusable['ingestion_result_id'],
+                'deduplicated': True
+            }), status=200, headers=headers)
+        
         # Create a temporary file
         with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file_name}") as temp_file:
             temp_file.write(file_bytes)
@@ -382,14 +459,10 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
             # Upload the file
             blob.upload_from_filename(temp_file_path, content_type=file_type)
             
-            # Make the file publicly accessible
-            blob.make_public()
-            
-            # Get download URL
-            download_url = blob.public_url
+            # Objects stay private; consumers read them by gs:// URI
+            download_url = f"gs://{bucket.name}/{blob_name}"
             
             # Save metadata to Firestore
-            db = firestore.client()
             upload_doc = {
                 'fileName': blob_name,
                 'originalName': file_name,
@@ -399,6 +472,7 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
                 'downloadURL': download_url,
                 'uploadedAt': firestore.SERVER_TIMESTAMP,
                 'status': 'uploaded',
+                'contentHash': content_hash,
             }
             
             doc_ref = db.collection('uploads').add(upload_doc)
@@ -411,7 +485,11 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
                     'file_path': blob_name,
                     'content_type': file_type,
                     'download_url': download_url,
+                    'upload_id': doc_ref[1].id,
+                    'content_hash': content_hash,
                 }
+                if founder_email:
+                    message_data['founder_email'] = founder_email
                 
                 # Publish to Pub/Sub topic
                 publisher = pubsub_v1.PublisherClient()
@@ -450,14 +528,151 @@ def on_file_upload(req: https_fn.Request) -> https_fn.Response:
         headers = get_cors_headers(req)
         return https_fn.Response(f"Internal server error: {str(e)}", status=500, headers=headers)
 
+def _register_direct_upload(session_id: str, object_name: str, size: int, content_type: str,
+                            triggered_by: str) -> dict:
+    """Create the uploads doc for a finished direct upload and queue ingestion."""
+    from utils.direct_upload import register_direct_upload
+    
+    def publish(message_data: dict) -> str:
+        global publisher
+        if publisher is None:
+            publisher = pubsub_v1.PublisherClient()
+        topic_path = publisher.topic_path("veritas-472301", "document-ingestion-topic")
+        message_id = publisher.publish(topic_path, json.dumps(message_data).encode('utf-8')).result()
+        print(f"Published message to document-ingestion-topic: {message_id}")
+        return message_id
+    
+    def delete_object(bucket_name: str, name: str) -> None:
+        storage.bucket(bucket_name).blob(name).delete()
+        print(f"Deleted rejected direct upload gs://{bucket_name}/{name}")
+    
+    return register_direct_upload(
+        firestore.client(), session_id, object_name, size, content_type, publish, triggered_by=triggered_by,
+        delete_object=delete_object
+    )
+
+@https_fn.on_request(
+    memory=options.MemoryOption.MB_256
+)
+def create_upload_session(req: https_fn.Request) -> https_fn.Response:
+    """Issue a signed resumable-upload URL for one object (direct upload step 1)"""
+    headers = get_cors_headers(req)
+    if req.method == 'OPTIONS':
+        headers['Access-Control-Max-Age'] = '3600'
+        return https_fn.Response('', status=204, headers=headers)
+    
+    try:
+        from utils.direct_upload import start_upload_session, validate_upload_request
+        
+        get_firebase_app()
+        data = req.get_json(silent=True) or {}
+        file_name = data.get('file_name')
+        content_type = data.get('content_type')
+        file_size = data.get('file_size')
+        
+        error = validate_upload_request(file_name, content_type, file_size)
+        if error:
+            return https_fn.Response(json.dumps({"error": error}), status=400, headers=headers)
+        
+        session = start_upload_session(
+            firestore.client(),
+            storage.bucket('veritas-472301.firebasestorage.app'),
+            file_name,
+            content_type,
+            file_size=file_size,
+            file_type=data.get('file_type', 'deck'),
+            founder_email=data.get('founder_email')
+        )
+        print(f"Created upload session {session['session_id']} for {session['object_name']}")
+        return https_fn.Response(json.dumps(session), status=200, headers=headers)
+    except Exception as e:
+        print(f"Error creating upload session: {e}")
+        return https_fn.Response(json.dumps({"error": f"Could not create upload session: {str(e)}"}),
+                                 status=500, headers=headers)
+
+@https_fn.on_request(
+    memory=options.MemoryOption.MB_256
+)
+def confirm_upload(req: https_fn.Request) -> https_fn.Response:
+    """Register a finished direct upload and queue ingestion (direct upload step 2)"""
+    headers = get_cors_headers(req)
+    if req.method == 'OPTIONS':
+        headers['Access-Control-Max-Age'] = '3600'
+        return https_fn.Response('', status=204, headers=headers)
+    
+    try:
+        from utils.direct_upload import get_upload_session
+        
+        get_firebase_app()
+        data = req.get_json(silent=True) or {}
+        session_id = data.get('session_id') or data.get('upload_id')
+        if not session_id:
+            return https_fn.Response(json.dumps({"error": "session_id is required"}), status=400, headers=headers)
+        
+        session = get_upload_session(firestore.client(), session_id)
+        if not session:
+            return https_fn.Response(json.dumps({"error": "Unknown upload session"}), status=404, headers=headers)
+        
+        blob = storage.bucket(session['bucket']).get_blob(session['objectName'])
+        if blob is None:
+            return https_fn.Response(json.dumps({"error": "Upload has not finished"}), status=409, headers=headers)
+        
+        result = _register_direct_upload(session_id, blob.name, int(blob.size or 0), blob.content_type,
+                                         triggered_by="confirm_upload")
+        status = 413 if result['status'] == 'rejected' else 200
+        return https_fn.Response(json.dumps(result), status=status, headers=headers)
+    except Exception as e:
+        print(f"Error confirming upload: {e}")
+        return https_fn.Response(json.dumps({"error": f"Could not confirm upload: {str(e)}"}),
+                                 status=500, headers=headers)
+
+def _handle_direct_upload_finalized(object_data: dict) -> None:
+    """Register a direct upload from a GCS object-finalized event payload."""
+    from utils.direct_upload import is_direct_upload_object, session_id_from_object_name
+    
+    object_name = object_data.get('name')
+    if not is_direct_upload_object(object_name):
+        return
+    get_firebase_app()
+    result = _register_direct_upload(
+        session_id_from_object_name(object_name),
+        object_name,
+        int(object_data.get('size') or 0),
+        object_data.get('contentType') or object_data.get('content_type'),
+        triggered_by="finalize_event"
+    )
+    print(f"Direct upload {object_name}: {result['status']}")
+
+@storage_fn.on_object_finalized(
+    bucket="veritas-472301.firebasestorage.app",
+    memory=options.MemoryOption.MB_256
+)
+def on_direct_upload_finalized(event: storage_fn.CloudEvent[storage_fn.StorageObjectData]) -> None:
+    """Queue ingestion when a direct upload finishes"""
+    _handle_direct_upload_finalized({
+        'name': event.data.name,
+        'size': event.data.size,
+        'contentType': event.data.content_type,
+    })
+
 # --- 3. Ingestion Pipeline: Stage 2 (AI Processing) ---
 
+# Optional ingestion stages run only with this much of the task's budget left
+INGESTION_ENRICHMENT_MIN_SECONDS = 120
+BIGQUERY_INSERT_MIN_SECONDS = 30
+# Held back from enrichment for the Firestore write and diligence trigger after it
+INGESTION_SAVE_RESERVE_SECONDS = 30
+
+
+@with_deadline(540)  # process_ingestion_task timeout
 def _process_ingestion_task_impl(message_data_bytes: bytes) -> None:
     """
     Implementation function for processing ingestion tasks.
     Accepts raw message data bytes to avoid CloudEvent dependency.
     """
     global publisher
+    from utils.deadline import has_budget, reserving, rpc_options, timeout_for
+    from utils.ingestion_status import report_ingestion_stage
     
     # Initialize Firebase app when function runs
     get_firebase_app()
@@ -465,6 +680,7 @@ def _process_ingestion_task_impl(message_data_bytes: bytes) -> None:
     # Log environment configuration for debugging
     log_environment_config()
     
+    upload_id = None
     try:
         # Lazy load the agent
         agent = get_intake_agent()
@@ -533,38 +749,98 @@ def _process_ingestion_task_impl(message_data_bytes: bytes) -> None:
             
         print(f"Received ingestion task for: {file_path}")
 
-        bucket = storage.bucket(bucket_name)
-        blob = bucket.blob(file_path)
-        file_data = blob.download_as_bytes()
+        upload_id = task_data.get("upload_id")
+        status_db = firestore.client() if upload_id else None
 
         if 'pdf' in content_type: file_type = 'pdf'
         elif 'video' in content_type: file_type = 'video'
         elif 'audio' in content_type: file_type = 'audio'
         else:
             print(f"Unsupported content type: {content_type}. Task ignored.")
+            report_ingestion_stage(upload_id, "failed", error=f"Unsupported content type: {content_type}", db=status_db)
             return
 
-        print(f"Invoking IntakeCurationAgent for file type: {file_type}...")
-        
+        # Resume from the first incomplete stage if a previous attempt was interrupted
+        from utils.ingestion_checkpoint import (
+            IngestionCheckpoint, build_checkpoint_version,
+            STAGE_EXTRACTION, STAGE_ENRICHMENT,
+            STAGE_FIRESTORE_WRITE, STAGE_BIGQUERY_INSERT, STAGE_DILIGENCE_PUBLISH
+        )
+        checkpoint = IngestionCheckpoint(
+            status_db, upload_id,
+            version=build_checkpoint_version(agent.PROMPT_VERSION),
+            source=f"{bucket_name}/{file_path}"
+        )
+        resume_stage = checkpoint.first_incomplete_stage()
+        if resume_stage != STAGE_EXTRACTION:
+            print(f"Resuming ingestion of {file_path} at stage: {resume_stage}")
+
         # Get founder email from task data
         founder_email = task_data.get("founder_email", "")
-        
-        # Use enhanced run method with embeddings if founder email is available
-        if founder_email:
-            print(f"Using enhanced intake agent with embeddings for founder: {founder_email}")
-            import asyncio
-            ingestion_result = asyncio.run(agent.run_with_embeddings(
-                file_data=file_data, 
-                filename=file_path, 
-                file_type=file_type,
-                founder_email=founder_email,
-                company_id=task_data.get("upload_id", file_path.replace('/', '_'))
-            ))
-        else:
-            print("No founder email provided, using standard intake agent")
+
+        # Stage: Gemini extraction; a retry reads the file from Cloud Storage again
+        speculation = None
+        ingestion_result = checkpoint.get(STAGE_EXTRACTION)
+        if ingestion_result is None:
+            # Gemini and Speech-to-Text read gs:// objects directly; only download
+            # the bytes for local/test storage and locally preprocessed PDFs
+            gcs_uri = f"gs://{bucket_name}/{file_path}"
+            file_data = None
+            if agent.needs_file_bytes(file_type, gcs_uri):
+                report_ingestion_stage(upload_id, "downloading", db=status_db)
+                bucket = storage.bucket(bucket_name)
+                blob = bucket.blob(file_path)
+                file_data = blob.download_as_bytes()
+
+            # Start company-level enrichment from the first pages while extraction runs
+            if founder_email:
+                speculation = agent.start_speculative_enrichment(file_data, file_type)
+
+            print(f"Invoking IntakeCurationAgent for file type: {file_type}...")
+            report_ingestion_stage(upload_id, "extracting", db=status_db)
             ingestion_result = agent.run(
-                file_data=file_data, filename=file_path, file_type=file_type
+                file_data=file_data, filename=file_path, file_type=file_type, gcs_uri=gcs_uri,
+                pending_transcription=task_data.get("pending_transcription")
             )
+            del file_data
+            if ingestion_result.get("status") == "SUCCESS":
+                checkpoint.save(STAGE_EXTRACTION, ingestion_result)
+            elif ingestion_result.get("status") == "PENDING":
+                # The batch transcription outlived this task; the next task resumes polling it
+                if publisher is None:
+                    publisher = pubsub_v1.PublisherClient()
+                topic_path = publisher.topic_path("veritas-472301", "document-ingestion-topic")
+                continuation = dict(task_data, pending_transcription=ingestion_result["pending_transcription"])
+                message_id = publisher.publish(
+                    topic_path, json.dumps(continuation).encode("utf-8")
+                ).result(timeout=timeout_for())
+                print(f"Batch transcription of {file_path} still running, continued in message {message_id}")
+                return
+
+        # Stage: Perplexity enrichment, when founder email is available
+        if ingestion_result.get("status") == "SUCCESS" and founder_email:
+            enriched_result = checkpoint.get(STAGE_ENRICHMENT)
+            if enriched_result is None and has_budget(INGESTION_ENRICHMENT_MIN_SECONDS, "ingestion.enrichment"):
+                print(f"Using enhanced intake agent with embeddings for founder: {founder_email}")
+                report_ingestion_stage(upload_id, "enriching", db=status_db)
+                import asyncio
+                with reserving(INGESTION_SAVE_RESERVE_SECONDS):
+                    enriched_result = asyncio.run(agent.enrich_ingestion_result(
+                        ingestion_result,
+                        filename=file_path,
+                        founder_email=founder_email,
+                        company_id=task_data.get("upload_id", file_path.replace('/', '_')),
+                        speculation=speculation
+                    ))
+                checkpoint.save(STAGE_ENRICHMENT, enriched_result)
+            if enriched_result is not None:
+                ingestion_result = enriched_result
+        elif not founder_email:
+            print("No founder email provided, using standard intake agent")
+
+        # Stop speculative research enrichment did not use (failed extraction, no budget)
+        if speculation is not None:
+            speculation.cancel()
         
         if ingestion_result.get("status") == "SUCCESS":
             print(f"Successfully ingested {file_path}. Memo 1 generated. Validating data before saving...")
@@ -586,36 +862,59 @@ def _process_ingestion_task_impl(message_data_bytes: bytes) -> None:
             if "memo_1" in ingestion_result and isinstance(ingestion_result["memo_1"], dict):
                 ingestion_result["memo_1"]["founder_email"] = founder_email
             
+            # Stage: Firestore write (never duplicated on retry)
             db = firestore.client()
-            doc_ref = db.collection("ingestionResults").add(ingestion_result)
-            print(f"Successfully saved results for {file_path} to Firestore with ID: {doc_ref[1].id}")
+            write_output = checkpoint.get(STAGE_FIRESTORE_WRITE)
+            if write_output is None:
+                report_ingestion_stage(upload_id, "saving", db=status_db)
+                doc_ref = db.collection("ingestionResults").add(ingestion_result, **rpc_options())
+                memo_id = doc_ref[1].id
+                checkpoint.save(STAGE_FIRESTORE_WRITE, {"ingestion_result_id": memo_id})
+                print(f"Successfully saved results for {file_path} to Firestore with ID: {memo_id}")
+            else:
+                memo_id = write_output["ingestion_result_id"]
+                print(f"Results for {file_path} already saved with ID: {memo_id}")
+            report_ingestion_stage(upload_id, "completed", memo_id=memo_id, db=status_db)
             
-            # Save to BigQuery (fire-and-forget)
-            founder_email = task_data.get("founder_email", "unknown@example.com")
-            save_to_bigquery(doc_ref[1].id, founder_email, ingestion_result)
+            # Index the content hash so identical re-uploads reuse this result
+            if task_data.get("content_hash"):
+                from utils.upload_dedup import record_content_hash
+                record_content_hash(db, task_data["content_hash"], memo_id, task_data.get("founder_email"),
+                                    upload_id=upload_id, file_path=file_path)
             
-            # Auto-trigger diligence analysis ONLY after successful save
-            print(f"Auto-triggering diligence analysis for memo ID: {doc_ref[1].id}")
-            try:
-                # Publish message to diligence topic
-                if publisher is None:
-                    publisher = pubsub_v1.PublisherClient()
-                
-                topic_path = publisher.topic_path("veritas-472301", "diligence-topic")
-                message_data = {
-                    "memo_1_id": doc_ref[1].id,
-                    "ga_property_id": "213025502",  # Your GA property ID
-                    "linkedin_url": "https://www.linkedin.com/in/your-linkedin-profile/"
-                }
-                message_bytes = json.dumps(message_data).encode("utf-8")
-                
-                publish_future = publisher.publish(topic_path, data=message_bytes)
-                publish_future.result()
-                print(f"Successfully triggered diligence analysis for memo {doc_ref[1].id}")
-            except Exception as e:
-                print(f"ERROR: Failed to auto-trigger diligence: {e}")
+            # Stage: BigQuery insert (fire-and-forget)
+            if (not checkpoint.is_complete(STAGE_BIGQUERY_INSERT)
+                    and has_budget(BIGQUERY_INSERT_MIN_SECONDS, "ingestion.bigquery_insert")):
+                if save_to_bigquery(memo_id, founder_email, ingestion_result):
+                    checkpoint.save(STAGE_BIGQUERY_INSERT, {"upload_id": memo_id})
+            
+            # Stage: auto-trigger diligence analysis ONLY after successful save
+            if checkpoint.is_complete(STAGE_DILIGENCE_PUBLISH):
+                print(f"Diligence analysis already triggered for memo ID: {memo_id}")
+            else:
+                print(f"Auto-triggering diligence analysis for memo ID: {memo_id}")
+                try:
+                    # Publish message to diligence topic
+                    if publisher is None:
+                        publisher = pubsub_v1.PublisherClient()
+                    
+                    topic_path = publisher.topic_path("veritas-472301", "diligence-topic")
+                    message_data = {
+                        "memo_1_id": memo_id,
+                        "ga_property_id": "213025502",  # Your GA property ID
+                        "linkedin_url": "https://www.linkedin.com/in/your-linkedin-profile/"
+                    }
+                    message_bytes = json.dumps(message_data).encode("utf-8")
+                    
+                    publish_future = publisher.publish(topic_path, data=message_bytes)
+                    diligence_message_id = publish_future.result(timeout=timeout_for())
+                    checkpoint.save(STAGE_DILIGENCE_PUBLISH, {"message_id": diligence_message_id})
+                    print(f"Successfully triggered diligence analysis for memo {memo_id}")
+                except Exception as e:
+                    print(f"ERROR: Failed to auto-trigger diligence: {e}")
         else:
             print(f"ERROR: Agent failed to ingest {file_path}. Reason: {ingestion_result.get('error')}")
+            report_ingestion_stage(upload_id, "failed", error=str(ingestion_result.get('error')), db=status_db)
     except Exception as e:
         print(f"A critical error occurred in process_ingestion_task: {e}")
         raise
@@ -629,13 +928,16 @@ def _process_ingestion_task_impl(message_data_bytes: bytes) -> None:
 )
 def process_ingestion_task(event: pubsub_fn.CloudEvent) -> None:
     """Firebase-decorated wrapper that calls the implementation."""
-    # Extract message data from CloudEvent and call implementation
-    message_data = event.data.message.data
-    _process_ingestion_task_impl(message_data)
+    # Extract message data from CloudEvent and call implementation once per delivery
+    from utils.pubsub_ledger import process_message_once
+    get_firebase_app()
+    message = event.data.message
+    process_message_once("process_ingestion_task", message.message_id, message.data, _process_ingestion_task_impl)
 
 
 # --- 4. Diligence Pipeline: Stage 3 (Deep Analysis) ---
 
+@with_deadline(540)  # process_diligence_task timeout
 def _process_diligence_task_impl(message_data_bytes: bytes) -> None:
     """
     Implementation function for processing diligence tasks.
@@ -645,6 +947,7 @@ def _process_diligence_task_impl(message_data_bytes: bytes) -> None:
     get_firebase_app()
     
     start_time = datetime.now()
+    report = None
     
     try:
         # Lazy load the agent
@@ -690,8 +993,9 @@ def _process_diligence_task_impl(message_data_bytes: bytes) -> None:
         print(f"Using LinkedIn URL: {linkedin_url}")
 
         # Fetch the memo from Firestore
+        from utils.deadline import rpc_options
         db = firestore.client()
-        memo_doc = db.collection("ingestionResults").document(memo_1_id).get()
+        memo_doc = db.collection("ingestionResults").document(memo_1_id).get(**rpc_options())
         
         if not memo_doc.exists:
             print(f"ERROR: Memo with ID {memo_1_id} not found.")
@@ -700,30 +1004,35 @@ def _process_diligence_task_impl(message_data_bytes: bytes) -> None:
         memo_1_data = memo_doc.to_dict()
         memo_1 = memo_1_data.get("memo_1", {})
 
+        # The report is written section by section while Memo 2 streams
+        from utils.diligence_report import DiligenceReportWriter
+        from utils.response_schemas import MEMO_2_SECTIONS
+        report = DiligenceReportWriter(db, memo_1_id, MEMO_2_SECTIONS).start()
+        print(f"Created diligence report {report.report_id} for memo ID: {memo_1_id}")
+
         print(f"Invoking DiligenceAgent for memo: {memo_1.get('title', 'Unknown')}")
         memo_2_result = agent.run(
             startup_id=memo_1_id,
             ga_property_id=ga_property_id,
-            linkedin_url=linkedin_url
+            linkedin_url=linkedin_url,
+            on_section=report.section_completed
         )
 
         if memo_2_result.get("status") == "SUCCESS":
             print(f"Successfully generated Memo 1 Diligence for {memo_1_id}. Saving to Firestore...")
-            db = firestore.client()
             # Store as memo1_diligence
-            diligence_result = {
-                "timestamp": datetime.now().isoformat(),
-                "processing_time_seconds": (datetime.now() - start_time).total_seconds(),
-                "memo1_diligence": memo_2_result.get("memo_2", memo_2_result),  # Store as memo1_diligence
-                "memo_1_id": memo_1_id,
-                "status": "SUCCESS"
-            }
-            doc_ref = db.collection("diligenceReports").add(diligence_result)
-            print(f"Successfully saved Memo 1 Diligence with ID: {doc_ref[1].id}")
+            report.complete(
+                memo_2_result.get("memo_2", memo_2_result),
+                (datetime.now() - start_time).total_seconds()
+            )
+            print(f"Successfully saved Memo 1 Diligence with ID: {report.report_id}")
         else:
             print(f"ERROR: DiligenceAgent failed. Reason: {memo_2_result.get('error')}")
+            report.fail(memo_2_result.get("error") or "DiligenceAgent failed")
     except Exception as e:
         print(f"A critical error occurred in process_diligence_task: {e}")
+        if report is not None:
+            report.fail(str(e))
         raise
 
 
@@ -735,9 +1044,11 @@ def _process_diligence_task_impl(message_data_bytes: bytes) -> None:
 )
 def process_diligence_task(event: pubsub_fn.CloudEvent) -> None:
     """Firebase-decorated wrapper that calls the implementation."""
-    # Extract message data from CloudEvent and call implementation
-    message_data = event.data.message.data
-    _process_diligence_task_impl(message_data)
+    # Extract message data from CloudEvent and call implementation once per delivery
+    from utils.pubsub_ledger import process_message_once
+    get_firebase_app()
+    message = event.data.message
+    process_message_once("process_diligence_task", message.message_id, message.data, _process_diligence_task_impl)
 
 
 # --- 5. HTTP Endpoint for Manual Diligence Trigger ---
@@ -745,6 +1056,7 @@ def process_diligence_task(event: pubsub_fn.CloudEvent) -> None:
     memory=options.MemoryOption.MB_512, 
     timeout_sec=900
 )
+@with_deadline(900)
 def trigger_diligence(req: https_fn.Request) -> https_fn.Response:
     """HTTP endpoint to manually trigger diligence analysis on a memo."""
     
@@ -888,6 +1200,7 @@ def schedule_ai_interview(req: https_fn.Request) -> https_fn.Response:
         try:
             from sendgrid import SendGridAPIClient
             from sendgrid.helpers.mail import Mail
+            from utils.circuit_breaker import SENDGRID_DEPENDENCY, get_circuit_breaker
             
             sendgrid_api_key = os.environ.get('SENDGRID_API_KEY')
             sendgrid_from_email = os.environ.get('SENDGRID_FROM_EMAIL')
@@ -989,7 +1302,9 @@ def schedule_ai_interview(req: https_fn.Request) -> https_fn.Response:
             )
             
             sg = SendGridAPIClient(sendgrid_api_key)
-            response = sg.send(message)
+            # Fails fast while SendGrid is down; the interview is scheduled either way
+            with get_circuit_breaker(SENDGRID_DEPENDENCY).guard():
+                response = sg.send(message)
             print(f"📧 Email sent to {founder_email}: Status {response.status_code}")
             
         except Exception as email_error:
@@ -1100,6 +1415,7 @@ def ai_feedback(req: https_fn.Request) -> https_fn.Response:
     memory=options.MemoryOption.MB_512,
     timeout_sec=300
 )
+@with_deadline(300)
 def run_diligence(req: https_fn.Request):
     """
     Endpoint: POST /run_diligence
@@ -1172,6 +1488,7 @@ def run_diligence(req: https_fn.Request):
     memory=options.MemoryOption.MB_512,
     timeout_sec=60
 )
+@with_deadline(60)
 def query_diligence(req: https_fn.Request):
     """
     Endpoint: POST /query_diligence
@@ -1235,6 +1552,7 @@ def query_diligence(req: https_fn.Request):
     timeout_sec=300,
     secrets=["PERPLEXITY_API_KEY"]
 )
+@with_deadline(300)
 def validate_memo_data(req: https_fn.Request):
     """
     Endpoint: POST /validate_memo_data
@@ -1493,6 +1811,7 @@ def validate_memo_data(req: https_fn.Request):
     timeout_sec=300,
     invoker="public"
 )
+@with_deadline(300)
 def validate_market_size(req: https_fn.Request):
     """
     Endpoint: POST /validate_market_size
@@ -1576,76 +1895,117 @@ def validate_market_size(req: https_fn.Request):
     timeout_sec=60,
     invoker="public"
 )
+@with_deadline(60)
 def check_memo(req: https_fn.Request):
     """
-    Endpoint: GET /check_memo?fileName=<filename>
-    Returns: Memo ID and processing status for a given filename
+    Endpoint: GET /check_memo?fileName=<filename> or /check_memo?uploadId=<upload_id>
+    Optional: view=status returns only the status projection (no memo fields).
+    Returns: Memo ID and processing status, with an ETag so unchanged polls get 304
     """
+    from utils.ingestion_status import STATUS_FIELD_PATHS, compute_status_etag
+
+    def _json_response(payload, status=200):
+        headers = {
+            **get_cors_headers(req),
+            'Content-Type': 'application/json',
+            'Cache-Control': 'no-cache',
+            'Access-Control-Expose-Headers': 'ETag'
+        }
+        if status != 200:
+            return https_fn.Response(json.dumps(payload), status=status, headers=headers)
+
+        etag = compute_status_etag(payload)
+        headers['ETag'] = etag
+        if req.headers.get('If-None-Match') == etag:
+            return https_fn.Response("", status=304, headers=headers)
+        return https_fn.Response(json.dumps(payload), status=200, headers=headers)
+
     try:
         # Handle CORS preflight
         if req.method == "OPTIONS":
             headers = get_cors_headers(req)
+            headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, If-None-Match'
             return https_fn.Response("", status=200, headers=headers)
 
         if req.method != "GET":
             headers = get_cors_headers(req)
             return https_fn.Response("Method not allowed", status=405, headers=headers)
 
-        # Get filename from query parameters
+        # Get filename or upload id from query parameters
         fileName = req.args.get('fileName')
-        if not fileName:
+        upload_id = req.args.get('uploadId')
+        status_only = req.args.get('view') == 'status'
+        if not fileName and not upload_id:
             headers = get_cors_headers(req)
-            return https_fn.Response("Missing fileName parameter", status=400, headers=headers)
-
-        print(f"Checking memo status for filename: {fileName}")
+            return https_fn.Response("Missing fileName or uploadId parameter", status=400, headers=headers)
 
         # Initialize Firebase app
         get_firebase_app()
         db = firestore.client()
 
-        # Search for memo by filename in ingestionResults
-        ingestion_query = db.collection("ingestionResults").where("original_filename", "==", fileName)
+        if upload_id:
+            # Read only the status fields of the upload document
+            upload_doc = db.collection("uploads").document(upload_id).get(field_paths=STATUS_FIELD_PATHS)
+            if not upload_doc.exists:
+                return _json_response({"error": f"Upload {upload_id} not found"}, status=404)
+
+            upload_data = upload_doc.to_dict() or {}
+            result = {
+                "memoId": upload_data.get("memoId"),
+                "status": upload_data.get("status", "processing"),
+                "stage": upload_data.get("ingestionStage")
+            }
+            return _json_response(result)
+
+        print(f"Checking memo status for filename: {fileName}")
+
+        # Search for memo by filename in ingestionResults, projecting only the fields we return
+        if status_only:
+            projection = ["status"]
+        else:
+            projection = ["status", "memo_1.title", "memo_1.founder_name", "timestamp", "processing_time_seconds"]
+        ingestion_query = (
+            db.collection("ingestionResults")
+            .where("original_filename", "==", fileName)
+            .select(projection)
+            .limit(1)
+        )
         ingestion_docs = ingestion_query.get()
 
         if ingestion_docs:
             # Found in ingestionResults
             doc = ingestion_docs[0]
             doc_data = doc.to_dict()
-            memo_1 = doc_data.get("memo_1", {})
-            
-            result = {
-                "memoId": doc.id,
-                "status": doc_data.get("status", "unknown"),
-                "title": memo_1.get("title", "Unknown"),
-                "founder_name": memo_1.get("founder_name", "Unknown"),
-                "timestamp": doc_data.get("timestamp", ""),
-                "processing_time_seconds": doc_data.get("processing_time_seconds", 0)
-            }
-            
+
+            if status_only:
+                result = {
+                    "memoId": doc.id,
+                    "status": doc_data.get("status", "unknown")
+                }
+            else:
+                memo_1 = doc_data.get("memo_1", {})
+                result = {
+                    "memoId": doc.id,
+                    "status": doc_data.get("status", "unknown"),
+                    "title": memo_1.get("title", "Unknown"),
+                    "founder_name": memo_1.get("founder_name", "Unknown"),
+                    "timestamp": doc_data.get("timestamp", ""),
+                    "processing_time_seconds": doc_data.get("processing_time_seconds", 0)
+                }
+
             print(f"Found memo in ingestionResults: {result}")
-            
-            headers = {
-                **get_cors_headers(req),
-                'Content-Type': 'application/json'
-            }
-            return https_fn.Response(json.dumps(result), status=200, headers=headers)
+            return _json_response(result)
 
-        # If not found in ingestionResults, check if it's still processing
-        # This could be enhanced to check processing status in the future
+        # If not found in ingestionResults, it is still processing
         result = {
             "memoId": None,
             "status": "processing",
             "message": "File is still being processed"
         }
-        
+
         print(f"No memo found for filename: {fileName}")
-        
-        headers = {
-            **get_cors_headers(req),
-            'Content-Type': 'application/json'
-        }
-        return https_fn.Response(json.dumps(result), status=200, headers=headers)
-        
+        return _json_response(result)
+
     except Exception as e:
         print(f"Error in check_memo: {e}")
         headers = {
@@ -1659,6 +2019,7 @@ def check_memo(req: https_fn.Request):
     timeout_sec=300,
     invoker="public"
 )
+@with_deadline(300)
 def validate_competitors(req: https_fn.Request):
     """
     Endpoint: POST /validate_competitors
@@ -1838,6 +2199,7 @@ def start_ai_interview(req: https_fn.Request) -> https_fn.Response:
         return https_fn.Response(json.dumps({"status": "FAILED", "error": str(e)}), status=500, headers=headers)
 
 
+@with_deadline(300)  # conduct_interview timeout
 def _conduct_interview_impl(message_data_bytes: bytes) -> None:
     """
     Implementation function for conducting interviews.
@@ -1913,13 +2275,17 @@ def _conduct_interview_impl(message_data_bytes: bytes) -> None:
 )
 def conduct_interview(event: pubsub_fn.CloudEvent) -> None:
     """Firebase-decorated wrapper that calls the implementation."""
-    # Extract message data from CloudEvent and call implementation
+    # Extract message data from CloudEvent and call implementation once per delivery
     import base64
+    from utils.pubsub_ledger import process_message_once
     if hasattr(event.data, 'message'):
         message_bytes = base64.b64decode(event.data.message.data)
+        message_id = event.data.message.message_id
     else:
         message_bytes = base64.b64decode(event.data["message"]["data"])
-    _conduct_interview_impl(message_bytes)
+        message_id = event.data["message"].get("messageId")
+    get_firebase_app()
+    process_message_once("conduct_interview", message_id, message_bytes, _conduct_interview_impl)
 
 
 def _generate_interview_summary_impl(message_data_bytes: bytes) -> None:
@@ -1971,13 +2337,17 @@ def _generate_interview_summary_impl(message_data_bytes: bytes) -> None:
 @pubsub_fn.on_message_published(topic="interview-completed", memory=512)
 def generate_interview_summary(event: pubsub_fn.CloudEvent) -> None:
     """Firebase-decorated wrapper that calls the implementation."""
-    # Extract message data from CloudEvent and call implementation
+    # Extract message data from CloudEvent and call implementation once per delivery
     import base64
+    from utils.pubsub_ledger import process_message_once
     if hasattr(event.data, 'message'):
         message_bytes = base64.b64decode(event.data.message.data)
+        message_id = event.data.message.message_id
     else:
         message_bytes = base64.b64decode(event.data["message"]["data"])
-    _generate_interview_summary_impl(message_bytes)
+        message_id = event.data["message"].get("messageId")
+    get_firebase_app()
+    process_message_once("generate_interview_summary", message_id, message_bytes, _generate_interview_summary_impl)
 
 
 @https_fn.on_request(region="asia-south1", memory=options.MemoryOption.MB_512)
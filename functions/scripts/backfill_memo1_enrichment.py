@@ -8,7 +8,13 @@ try:
 except ImportError:
     firestore = None
 
+from services.batch_prediction_service import (
+    BatchJob, BatchPredictionService, LocalBatchExecutor, VertexBatchExecutor,
+)
 from services.perplexity_service import PerplexitySearchService
+from utils.model_routing import get_model_router, routed_model
+
+EXTRACTION_CALL_SITE = "perplexity.field_extraction"
 
 
 logging.basicConfig(level=logging.INFO)
@@ -53,11 +59,7 @@ async def backfill(project_id: Optional[str] = None, limit: int = 50, dry_run: b
         logger.info(f"Enriching {doc.id} missing fields: {missing}")
         enriched = await svc.enrich_missing_fields(memo1)
 
-        # Merge-only-on-empty
-        merged = memo1.copy()
-        for k, v in enriched.items():
-            if k not in merged or merged.get(k) in (None, "", [], "Not specified"):
-                merged[k] = v
+        merged = _merge_only_on_empty(memo1, enriched)
 
         if dry_run:
             logger.info(f"[DRY RUN] Would update {doc.id} with {len(enriched)} fields")
@@ -69,6 +71,105 @@ async def backfill(project_id: Optional[str] = None, limit: int = 50, dry_run: b
     logger.info(f"Processed {count} documents")
 
 
+def _merge_only_on_empty(memo1: dict, enriched: dict) -> dict:
+    merged = memo1.copy()
+    for k, v in enriched.items():
+        if k not in merged or merged.get(k) in (None, "", [], "Not specified"):
+            merged[k] = v
+    return merged
+
+
+def _executor(name: str, project_id: str, bucket: Optional[str]):
+    if name == "local":
+        # Online calls through the routed model; for small runs and debugging
+        return LocalBatchExecutor(routed_model(EXTRACTION_CALL_SITE))
+    bucket = bucket or os.environ.get("BATCH_PREDICTION_BUCKET")
+    if not bucket:
+        raise ValueError("Set --bucket or BATCH_PREDICTION_BUCKET for Vertex AI batch prediction")
+    model_name = get_model_router().tier_for(EXTRACTION_CALL_SITE).models[0]
+    return VertexBatchExecutor(model_name, bucket, project=project_id)
+
+
+async def backfill_batch(job_dir: str, project_id: Optional[str] = None, limit: int = 50, dry_run: bool = True,
+                         executor: str = "vertex", bucket: Optional[str] = None, max_rounds: int = 2,
+                         timeout_seconds: Optional[float] = None):
+    """
+    Backfill with the Gemini field extraction run as one batch prediction job.
+
+    Perplexity searches still run online while prompts are collected. Re-running
+    with the same job_dir resumes: collected documents are not searched again, a
+    running job is awaited instead of resubmitted, failed requests are retried and
+    results already written are not applied twice.
+    """
+    if firestore is None:
+        logger.error("google-cloud-firestore not installed")
+        return
+
+    project_id = project_id or os.environ.get("GOOGLE_CLOUD_PROJECT") or os.environ.get("GCP_PROJECT")
+    if not project_id:
+        logger.error("Project ID not set. Set GOOGLE_CLOUD_PROJECT or pass as arg.")
+        return
+
+    db = firestore.Client(project=project_id)
+    svc = PerplexitySearchService(project=project_id)
+    if not svc.enabled:
+        logger.error("PERPLEXITY_API_KEY not configured. Aborting.")
+        return
+
+    job = BatchJob(job_dir)
+    generation_config = get_model_router().tier_for(EXTRACTION_CALL_SITE).generation_config
+
+    # 1. Collect extraction prompts for documents not yet in the job
+    collected = {line["metadata"]["doc_id"] for line in job.requests()}
+    for doc in db.collection("ingestionResults").order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit).stream():
+        if doc.id in collected:
+            continue
+        memo1 = (doc.to_dict() or {}).get("memo_1", {})
+        if not memo1:
+            continue
+        extraction = await svc.collect_extraction_prompts(memo1)
+        for category, prompt in extraction["prompts"].items():
+            job.add(f"{doc.id}/{category}", prompt, generation_config,
+                    metadata={"doc_id": doc.id, "category": category})
+        if extraction["prompts"]:
+            logger.info(f"Collected {len(extraction['prompts'])} prompts for {doc.id}")
+
+    # 2. Run the batch job
+    service = BatchPredictionService(_executor(executor, project_id, bucket))
+    service.run(job, max_rounds=max_rounds, timeout_seconds=timeout_seconds)
+
+    # 3. Apply successful results not applied yet, one update per document
+    succeeded = job.succeeded()
+    by_doc = {}
+    for line in job.requests():
+        request_id = line["id"]
+        if request_id in succeeded and not job.is_applied(request_id):
+            by_doc.setdefault(line["metadata"]["doc_id"], {})[line["metadata"]["category"]] = request_id
+
+    count = 0
+    for doc_id, request_ids in by_doc.items():
+        doc_ref = db.collection("ingestionResults").document(doc_id)
+        memo1 = ((doc_ref.get().to_dict() or {}).get("memo_1")) or {}
+        # Missing fields are recomputed so fields filled since collection are kept
+        missing = svc._identify_missing_fields(memo1)
+        responses = {category: succeeded[request_id] for category, request_id in request_ids.items()}
+        enriched = svc.apply_extraction_responses(memo1, missing, responses)
+        merged = _merge_only_on_empty(memo1, enriched)
+
+        if dry_run:
+            logger.info(f"[DRY RUN] Would update {doc_id} with {enriched.get('enrichment_count', 0)} fields")
+        else:
+            doc_ref.update({"memo_1": merged})
+            job.mark_applied(request_ids.values())
+            logger.info(f"Updated {doc_id}")
+        count += 1
+
+    failed = job.failed()
+    for request_id, error in failed.items():
+        logger.warning(f"Request {request_id} failed: {error}")
+    logger.info(f"Processed {count} documents; {len(failed)} requests failed and will be retried on the next run")
+
+
 async def _aiter(iterable):
     for item in iterable:
         yield item
@@ -80,7 +181,20 @@ if __name__ == "__main__":
     parser.add_argument("--project", type=str, default=None)
     parser.add_argument("--limit", type=int, default=50)
     parser.add_argument("--apply", action="store_true", help="Apply updates (otherwise dry-run)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Run the Gemini extraction as a batch prediction job instead of online calls")
+    parser.add_argument("--job-dir", type=str, default="backfill_memo1_batch",
+                        help="Batch job directory; re-run with the same directory to resume")
+    parser.add_argument("--executor", choices=["vertex", "local"], default="vertex")
+    parser.add_argument("--bucket", type=str, default=None, help="GCS bucket for batch input and output")
+    parser.add_argument("--max-rounds", type=int, default=2, help="Batch submissions per run, retrying failures")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds to wait for the batch job")
     args = parser.parse_args()
-    asyncio.run(backfill(project_id=args.project, limit=args.limit, dry_run=not args.apply))
+    if args.batch:
+        asyncio.run(backfill_batch(args.job_dir, project_id=args.project, limit=args.limit, dry_run=not args.apply,
+                                   executor=args.executor, bucket=args.bucket, max_rounds=args.max_rounds,
+                                   timeout_seconds=args.timeout))
+    else:
+        asyncio.run(backfill(project_id=args.project, limit=args.limit, dry_run=not args.apply))
 
 
@@ -0,0 +1,193 @@
+"""
+Offline comparison of model tiers on recorded prompts.
+
+Replays prompts recorded by utils.model_routing (MODEL_ROUTING_RECORD_PATH) through
+each tier and reports, per call site and tier, how closely the outputs agree with a
+reference and how long they took. The reference is the recorded response, or the
+output of --reference-tier when given. JSON outputs are scored by the share of
+reference leaf values reproduced; text outputs by token F1.
+
+    python scripts/evaluate_model_tiers.py --recordings prompts.jsonl --tiers lite standard
+"""
+
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.json_parsing import loads_tolerant
+from utils.model_routing import ModelRouter, load_routing_config
+
+logger = logging.getLogger("evaluate_model_tiers")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def load_recordings(path: str, call_site: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Recorded prompts from a JSONL file, optionally for one call site."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping invalid line {line_number} of {path}")
+                continue
+            if call_site and record.get("call_site") != call_site:
+                continue
+            records.append(record)
+            if limit and len(records) >= limit:
+                break
+    return records
+
+
+def _leaves(value: Any, path: str = "") -> Dict[str, str]:
+    if isinstance(value, dict):
+        leaves = {}
+        for key, item in value.items():
+            leaves.update(_leaves(item, f"{path}.{key}"))
+        return leaves
+    if isinstance(value, list):
+        leaves = {}
+        for index, item in enumerate(value):
+            leaves.update(_leaves(item, f"{path}[{index}]"))
+        return leaves
+    return {path: str(value).strip().lower()}
+
+
+def _token_f1(candidate: str, reference: str) -> float:
+    candidate_tokens = Counter(_TOKEN_RE.findall(candidate.lower()))
+    reference_tokens = Counter(_TOKEN_RE.findall(reference.lower()))
+    if not candidate_tokens or not reference_tokens:
+        return float(candidate_tokens == reference_tokens)
+    overlap = sum((candidate_tokens & reference_tokens).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(candidate_tokens.values())
+    recall = overlap / sum(reference_tokens.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def score_output(candidate: Optional[str], reference: Optional[str]) -> float:
+    """Agreement of candidate with reference between 0 and 1."""
+    if candidate is None or reference is None:
+        return 0.0
+    reference_json = loads_tolerant(reference)
+    if reference_json is not None:
+        reference_leaves = _leaves(reference_json)
+        candidate_leaves = _leaves(loads_tolerant(candidate, default={}))
+        if not reference_leaves:
+            return 1.0
+        matched = sum(1 for path, value in reference_leaves.items() if candidate_leaves.get(path) == value)
+        return matched / len(reference_leaves)
+    return _token_f1(candidate, reference)
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _generate(router: ModelRouter, tier: str, record: Dict[str, Any]):
+    model = router.model_for_tier(tier, call_site=record.get("call_site", "evaluation"))
+    started = time.monotonic()
+    response = model.generate_content(record["prompt"], generation_config=record.get("generation_config") or None)
+    return response.text, time.monotonic() - started
+
+
+def evaluate(records: Iterable[Dict[str, Any]], router: ModelRouter, tiers: List[str],
+             reference_tier: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Replays records through each tier.
+
+    Returns:
+        One row per (call_site, tier) with n, mean_score, latency_p50, latency_p95,
+        errors and mean_output_chars
+    """
+    results: Dict[tuple, Dict[str, List]] = {}
+    for record in records:
+        call_site = record.get("call_site", "unknown")
+        reference = record.get("response")
+        if reference_tier:
+            try:
+                reference, _ = _generate(router, reference_tier, record)
+            except Exception as e:
+                logger.warning(f"Reference tier {reference_tier} failed for {call_site}: {e}")
+                continue
+        for tier in tiers:
+            result = results.setdefault((call_site, tier), {"scores": [], "latencies": [], "chars": [], "errors": []})
+            try:
+                text, latency = _generate(router, tier, record)
+            except Exception as e:
+                logger.warning(f"Tier {tier} failed for {call_site}: {e}")
+                result["errors"].append(str(e))
+                continue
+            result["scores"].append(score_output(text, reference))
+            result["latencies"].append(latency)
+            result["chars"].append(len(text or ""))
+
+    rows = []
+    for (call_site, tier), result in sorted(results.items()):
+        n = len(result["scores"])
+        rows.append({
+            "call_site": call_site,
+            "tier": tier,
+            "n": n,
+            "mean_score": round(sum(result["scores"]) / n, 3) if n else None,
+            "latency_p50": _percentile(result["latencies"], 0.5),
+            "latency_p95": _percentile(result["latencies"], 0.95),
+            "errors": len(result["errors"]),
+            "mean_output_chars": round(sum(result["chars"]) / n) if n else None,
+        })
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]) -> None:
+    print(f"{'call_site':<42} {'tier':<10} {'n':>4} {'score':>6} {'p50_s':>7} {'p95_s':>7} {'errors':>6} {'chars':>6}")
+    for row in rows:
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else "-"
+        print(f"{row['call_site']:<42} {row['tier']:<10} {row['n']:>4} {fmt(row['mean_score'], '>6.3f')} "
+              f"{fmt(row['latency_p50'], '>7.2f')} {fmt(row['latency_p95'], '>7.2f')} {row['errors']:>6} "
+              f"{fmt(row['mean_output_chars'], '>6')}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compare model tiers on recorded prompts")
+    parser.add_argument("--recordings", type=str, required=True, help="JSONL file from MODEL_ROUTING_RECORD_PATH")
+    parser.add_argument("--tiers", nargs="+", default=None, help="Tiers to evaluate (default: all configured)")
+    parser.add_argument("--reference-tier", type=str, default=None,
+                        help="Score against this tier's output instead of the recorded response")
+    parser.add_argument("--call-site", type=str, default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--output", type=str, default=None, help="Write the rows as JSON to this file")
+    parser.add_argument("--project", type=str, default="veritas-472301")
+    parser.add_argument("--location", type=str, default="asia-south1")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    import vertexai
+    vertexai.init(project=args.project, location=args.location)
+
+    tiers, routes = load_routing_config()
+    router = ModelRouter(tiers, routes)
+    records = load_recordings(args.recordings, call_site=args.call_site, limit=args.limit)
+    logger.info(f"Replaying {len(records)} recorded prompts")
+    rows = evaluate(records, router, args.tiers or list(tiers), reference_tier=args.reference_tier)
+    print_report(rows)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Batch Prediction Service
+Runs many Gemini prompts as one offline job instead of one online generate_content
+call each, so backfills and bulk re-processing do not compete with production
+traffic for online quota.
+
+A BatchJob is a local directory, which makes the job resumable:
+    {job_dir}/requests.jsonl  -> {"id", "request", "metadata"} per prompt
+    {job_dir}/results.jsonl   -> {"id", "response", "error"} per finished request
+    {job_dir}/state.json      -> submissions (executor job name, request ids, status)
+                                 and the ids already applied by the caller
+
+Requests are added once per id, so collecting can be re-run after an interruption.
+BatchPredictionService.run() submits only requests without a successful result,
+waits for the executor and maps the output back by request id. Failed requests are
+resubmitted up to max_rounds times and again on the next run; a submission still in
+flight when the process stopped is resumed rather than submitted twice.
+
+Executors:
+    VertexBatchExecutor -> Vertex AI batch prediction, input and output on GCS
+    LocalBatchExecutor  -> calls a model in-process (tests and small runs)
+
+Finished requests are counted in llm_batch_requests_total by outcome (succeeded,
+failed).
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+BATCH_REQUESTS_METRIC = "llm_batch_requests_total"
+
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+
+def build_request(prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """GenerateContentRequest for a text prompt, in the batch prediction input format."""
+    request: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if generation_config:
+        # Proto JSON accepts the snake_case field names used by the online SDK
+        request["generation_config"] = dict(generation_config)
+    return request
+
+
+def prompt_of(request: Dict[str, Any]) -> str:
+    """Text of a request built by build_request."""
+    return "".join(part.get("text", "")
+                   for content in request.get("contents", [])
+                   for part in content.get("parts", []))
+
+
+def parse_prediction(line: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Response text or error of one batch prediction output line.
+
+    Returns:
+        (text, None) on success, (None, error) otherwise
+    """
+    if line.get("status"):
+        return None, str(line["status"])
+    candidates = (line.get("response") or {}).get("candidates") or []
+    if not candidates:
+        return None, "no candidates in response"
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    text = "".join(part.get("text", "") for part in parts)
+    if not text:
+        return None, f"no text in response (finish reason {candidates[0].get('finishReason', 'unknown')})"
+    return text, None
+
+
+class BatchJob:
+    """Requests, results and submission state of one batch job, kept in job_dir."""
+
+    def __init__(self, job_dir: str):
+        self.job_dir = job_dir
+        os.makedirs(job_dir, exist_ok=True)
+        self.requests_path = os.path.join(job_dir, "requests.jsonl")
+        self.results_path = os.path.join(job_dir, "results.jsonl")
+        self.state_path = os.path.join(job_dir, "state.json")
+
+        self._requests: Dict[str, Dict[str, Any]] = {}
+        for line in self._read_jsonl(self.requests_path):
+            self._requests.setdefault(line["id"], line)
+        self._results: Dict[str, Dict[str, Any]] = {}
+        for line in self._read_jsonl(self.results_path):
+            self._store_result(line)
+        self.state: Dict[str, Any] = {"submissions": [], "applied": []}
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as f:
+                self.state.update(json.load(f))
+
+    @staticmethod
+    def _read_jsonl(path: str) -> List[Dict[str, Any]]:
+        if not os.path.exists(path):
+            return []
+        lines = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    lines.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by an interrupted write
+                    logger.warning(f"Skipping invalid line in {path}")
+        return lines
+
+    def _store_result(self, result: Dict[str, Any]) -> None:
+        current = self._results.get(result["id"])
+        # A later failure (e.g. a duplicate output line) never replaces a success
+        if current is None or current.get("error") or not result.get("error"):
+            self._results[result["id"]] = result
+
+    def save_state(self) -> None:
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def add(self, request_id: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+            metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Adds a prompt unless request_id is already in the job; returns True when added."""
+        if request_id in self._requests:
+            return False
+        line = {"id": request_id, "request": build_request(prompt, generation_config), "metadata": metadata or {}}
+        with open(self.requests_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._requests[request_id] = line
+        return True
+
+    def requests(self) -> List[Dict[str, Any]]:
+        return list(self._requests.values())
+
+    def request(self, request_id: str) -> Dict[str, Any]:
+        return self._requests[request_id]
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Requests without a successful result."""
+        return [line for request_id, line in self._requests.items()
+                if not self._results.get(request_id, {}).get("response")]
+
+    def record_results(self, results: Iterable[Dict[str, Any]]) -> None:
+        with open(self.results_path, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                self._store_result(result)
+
+    def succeeded(self) -> Dict[str, str]:
+        """Request id -> response text."""
+        return {request_id: result["response"] for request_id, result in self._results.items()
+                if result.get("response")}
+
+    def failed(self) -> Dict[str, str]:
+        """Request id -> error of the latest attempt, for requests that have not succeeded."""
+        return {request_id: result["error"] for request_id, result in self._results.items()
+                if not result.get("response")}
+
+    def is_applied(self, request_id: str) -> bool:
+        return request_id in self.state["applied"]
+
+    def mark_applied(self, request_ids: Iterable[str]) -> None:
+        applied = set(self.state["applied"])
+        self.state["applied"].extend(request_id for request_id in request_ids if request_id not in applied)
+        self.save_state()
+
+    def active_submission(self) -> Optional[Dict[str, Any]]:
+        return next((submission for submission in self.state["submissions"]
+                     if submission["status"] == STATUS_RUNNING), None)
+
+    def summary(self) -> Dict[str, Any]:
+        succeeded = self.succeeded()
+        return {
+            "requests": len(self._requests),
+            "succeeded": len(succeeded),
+            "failed": len(self.failed()),
+            "pending": len(self._requests) - len(succeeded),
+            "applied": len(self.state["applied"]),
+            "running": (self.active_submission() or {}).get("name"),
+        }
+
+
+class LocalBatchExecutor:
+    """
+    Runs a batch in-process through model.generate_content, writing output in the
+    Vertex AI batch prediction format to the job directory.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def submit(self, job: BatchJob, requests: List[Dict[str, Any]], display_name: str) -> str:
+        output_path = os.path.join(job.job_dir, f"{display_name}.output.jsonl")
+        with open(output_path, "w", encoding="utf-8") as f:
+            for line in requests:
+                request = line["request"]
+                output = {"id": line["id"], "request": request, "status": ""}
+                try:
+                    response = self.model.generate_content(
+                        prompt_of(request), generation_config=request.get("generation_config")
+                    )
+                    output["response"] = {
+                        "candidates": [{"content": {"role": "model", "parts": [{"text": response.text}]}}]
+                    }
+                except Exception as e:
+                    output["status"] = str(e)
+                f.write(json.dumps(output, ensure_ascii=False) + "\n")
+        return output_path
+
+    def status(self, name: str) -> str:
+        return STATUS_SUCCEEDED if os.path.exists(name) else STATUS_FAILED
+
+    def results(self, name: str) -> Iterable[Dict[str, Any]]:
+        return BatchJob._read_jsonl(name)
+
+
+class VertexBatchExecutor:
+    """Runs a batch as a Vertex AI batch prediction job with input and output on GCS."""
+
+    def __init__(self, model_name: str, bucket: str, prefix: str = "batch-prediction",
+                 project: str = "veritas-472301"):
+        self.model_name = model_name
+        self.bucket = bucket
+        self.prefix = prefix
+        self.project = project
+        self._storage_client = None
+
+    def _storage(self):
+        if self._storage_client is None:
+            from google.cloud import storage as gcs
+            self._storage_client = gcs.Client(project=self.project)
+        return self._storage_client
+
+    def submit(self, job: BatchJob, requests: List[Dict[str, Any]], display_name: str) -> str:
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        blob_prefix = f"{self.prefix}/{display_name}"
+        payload = "".join(json.dumps({"id": line["id"], "request": line["request"]}, ensure_ascii=False) + "\n"
+                          for line in requests)
+        self._storage().bucket(self.bucket).blob(f"{blob_prefix}/input.jsonl").upload_from_string(
+            payload, content_type="application/jsonl"
+        )
+        batch_job = BatchPredictionJob.submit(
+            source_model=self.model_name,
+            input_dataset=f"gs://{self.bucket}/{blob_prefix}/input.jsonl",
+            output_uri_prefix=f"gs://{self.bucket}/{blob_prefix}/output",
+            job_display_name=display_name,
+        )
+        logger.info(f"Submitted batch prediction job {batch_job.resource_name} with {len(requests)} requests")
+        return batch_job.resource_name
+
+    def status(self, name: str) -> str:
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        batch_job = BatchPredictionJob(name)
+        if not batch_job.has_ended:
+            return STATUS_RUNNING
+        if batch_job.has_succeeded:
+            return STATUS_SUCCEEDED
+        logger.error(f"Batch prediction job {name} failed: {batch_job.error}")
+        return STATUS_FAILED
+
+    def results(self, name: str) -> Iterable[Dict[str, Any]]:
+        from vertexai.batch_prediction import BatchPredictionJob
+
+        # A failed job may still have written output for part of its requests
+        output_location = BatchPredictionJob(name).output_location
+        if not output_location or not output_location.startswith("gs://"):
+            return
+        bucket_name, _, prefix = output_location[len("gs://"):].partition("/")
+        for blob in self._storage().list_blobs(bucket_name, prefix=prefix):
+            if not blob.name.endswith(".jsonl"):
+                continue
+            for line in blob.download_as_text().splitlines():
+                if line.strip():
+                    yield json.loads(line)
+
+
+class BatchPredictionService:
+    """Submits a BatchJob's pending requests and maps the results back by request id."""
+
+    def __init__(self, executor, poll_interval_seconds: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.executor = executor
+        self.poll_interval_seconds = poll_interval_seconds
+        self._sleep = sleep
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def run(self, job: BatchJob, max_rounds: int = 2, timeout_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Runs the job until every request succeeded or max_rounds submissions finished.
+
+        Args:
+            job: The batch job
+            max_rounds: Submissions to make (or resume) in this run; each round
+                resubmits only the requests that have not succeeded
+            timeout_seconds: Stop waiting after this long; the running submission is
+                resumed by the next run
+
+        Returns:
+            job.summary()
+        """
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds is not None else None
+        for _ in range(max_rounds):
+            submission = job.active_submission()
+            if submission is None:
+                pending = job.pending()
+                if not pending:
+                    break
+                submission = self._submit(job, pending)
+            else:
+                self.logger.info(f"Resuming batch submission {submission['name']}")
+            if not self._wait(submission, deadline):
+                self.logger.warning(f"Stopped waiting for {submission['name']}; run again to resume")
+                break
+            self._collect(job, submission)
+
+        summary = job.summary()
+        self.logger.info(f"Batch job {job.job_dir}: {summary}")
+        return summary
+
+    def _submit(self, job: BatchJob, pending: List[Dict[str, Any]]) -> Dict[str, Any]:
+        job_name = os.path.basename(os.path.abspath(job.job_dir))
+        display_name = f"{job_name}-{len(job.state['submissions']) + 1}-{int(time.time())}"
+        name = self.executor.submit(job, pending, display_name)
+        submission = {
+            "name": name,
+            "request_ids": [line["id"] for line in pending],
+            "status": STATUS_RUNNING,
+            "submitted_at": time.time(),
+        }
+        job.state["submissions"].append(submission)
+        job.save_state()
+        return submission
+
+    def _wait(self, submission: Dict[str, Any], deadline: Optional[float]) -> bool:
+        while True:
+            status = self.executor.status(submission["name"])
+            if status != STATUS_RUNNING:
+                submission["status"] = status
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._sleep(self.poll_interval_seconds)
+
+    def _collect(self, job: BatchJob, submission: Dict[str, Any]) -> None:
+        submitted = set(submission["request_ids"])
+        # Output lines carry the request id; the echoed prompt identifies lines without one
+        by_prompt = {prompt_of(job.request(request_id)["request"]): request_id for request_id in submitted}
+        results = {}
+        for line in self.executor.results(submission["name"]):
+            request_id = line.get("id")
+            if request_id not in submitted:
+                request_id = by_prompt.get(prompt_of(line.get("request") or {}))
+            if request_id is None:
+                self.logger.warning("Batch output line matches no submitted request")
+                continue
+            text, error = parse_prediction(line)
+            if text is not None or request_id not in results:
+                results[request_id] = {"id": request_id, "response": text, "error": error}
+        for request_id in submitted - set(results):
+            results[request_id] = {"id": request_id, "response": None,
+                                   "error": f"missing from batch output (job {submission['status']})"}
+
+        job.record_results(results.values())
+        job.save_state()
+        registry = get_metrics_registry()
+        succeeded = sum(1 for result in results.values() if result["response"] is not None)
+        registry.increment(BATCH_REQUESTS_METRIC, succeeded, outcome=STATUS_SUCCEEDED)
+        registry.increment(BATCH_REQUESTS_METRIC, len(results) - succeeded, outcome=STATUS_FAILED)
+        self.logger.info(f"Batch submission {submission['name']}: {succeeded}/{len(results)} succeeded")
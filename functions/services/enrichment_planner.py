@@ -0,0 +1,232 @@
+"""
+Enrichment Planner
+Plans the Perplexity searches that fill a memo's missing fields.
+
+Missing fields are grouped by search affinity: the FIELD_CATEGORIES category whose
+prompt researches them. A group with fewer than min_fields_per_query missing fields
+is merged into a related group (CATEGORY_AFFINITY) as long as the combined query asks
+for at most max_fields_per_query fields. A lone missing field then rides along with
+a search that runs anyway instead of costing a call of its own. Categories that were
+already researched (prefetched) are not searched again.
+
+Queries are ordered by field priority: queries with a critical field first, then by
+the earliest of their fields in the missing-field order. Each search counts against
+the memo's budget:
+- ENRICHMENT_MAX_CALLS: at most this many searches
+- ENRICHMENT_MAX_COST_USD: at most this much, at PERPLEXITY_COST_PER_CALL_USD a search
+Both are unlimited when unset. Once the budget is spent, queries without a critical
+field are skipped; critical queries always run.
+
+The plan and the outcome of each query are recorded in the memo's
+enrichment_metadata["query_plan"] and counted in enrichment_queries_total by status.
+"""
+
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+QUERIES_METRIC = "enrichment_queries_total"
+
+PRIORITY_CRITICAL = "critical"
+PRIORITY_IMPORTANT = "important"
+
+STATUS_PLANNED = "planned"
+STATUS_PREFETCHED = "prefetched"
+STATUS_SKIPPED = "skipped_budget"
+STATUS_SEARCHED = "searched"
+STATUS_NO_RESULTS = "no_results"
+STATUS_FAILED = "failed"
+
+# sonar request fee plus ~2K tokens in and out
+DEFAULT_COST_PER_CALL_USD = 0.007
+
+# The largest category prompt asks for 7 fields
+DEFAULT_MAX_FIELDS_PER_QUERY = 7
+DEFAULT_MIN_FIELDS_PER_QUERY = 3
+
+# Categories whose searches cover overlapping sources, closest first
+CATEGORY_AFFINITY: Dict[str, List[str]] = {
+    "company_basics": ["funding_deals", "team_execution", "financial_metrics"],
+    "funding_deals": ["financial_metrics", "company_basics", "growth_exit"],
+    "financial_metrics": ["funding_deals", "growth_exit", "company_basics"],
+    "market_intelligence": ["growth_exit", "team_execution", "funding_deals"],
+    "team_execution": ["company_basics", "market_intelligence", "growth_exit"],
+    "growth_exit": ["market_intelligence", "funding_deals", "financial_metrics"],
+}
+
+
+def _env_number(name: str, cast) -> Optional[Any]:
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}")
+        return None
+
+
+@dataclass
+class EnrichmentBudget:
+    """Per-memo limit on Perplexity searches; None means unlimited."""
+    max_calls: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    cost_per_call_usd: float = DEFAULT_COST_PER_CALL_USD
+
+    def allows(self, calls: int) -> bool:
+        """True when one more search after calls stays within the budget."""
+        if self.max_calls is not None and calls + 1 > self.max_calls:
+            return False
+        if self.max_cost_usd is not None and (calls + 1) * self.cost_per_call_usd > self.max_cost_usd + 1e-9:
+            return False
+        return True
+
+    @classmethod
+    def from_env(cls) -> "EnrichmentBudget":
+        cost = _env_number("PERPLEXITY_COST_PER_CALL_USD", float)
+        return cls(
+            max_calls=_env_number("ENRICHMENT_MAX_CALLS", int),
+            max_cost_usd=_env_number("ENRICHMENT_MAX_COST_USD", float),
+            cost_per_call_usd=DEFAULT_COST_PER_CALL_USD if cost is None else cost,
+        )
+
+
+@dataclass(eq=False)
+class PlannedQuery:
+    """One Perplexity search covering the missing fields of one or more categories."""
+    categories: List[str]
+    fields: List[str]
+    priority: str = PRIORITY_IMPORTANT
+    status: str = STATUS_PLANNED
+
+    @property
+    def name(self) -> str:
+        return "+".join(self.categories)
+
+    @property
+    def merged(self) -> bool:
+        return len(self.categories) > 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "categories": list(self.categories),
+            "fields": list(self.fields),
+            "priority": self.priority,
+            "status": self.status,
+        }
+
+
+@dataclass
+class EnrichmentPlan:
+    queries: List[PlannedQuery]
+    budget: EnrichmentBudget
+    unplanned_fields: List[str] = field(default_factory=list)     # no category researches them
+
+    def to_run(self) -> List[PlannedQuery]:
+        """Queries to search, in priority order."""
+        return [query for query in self.queries if query.status == STATUS_PLANNED]
+
+    @property
+    def calls(self) -> int:
+        return sum(1 for query in self.queries if query.status not in (STATUS_PREFETCHED, STATUS_SKIPPED))
+
+    def record(self, query: PlannedQuery, status: str) -> None:
+        query.status = status
+        get_metrics_registry().increment(QUERIES_METRIC, status=status)
+
+    def to_metadata(self) -> Dict[str, Any]:
+        return {
+            "queries": [query.to_dict() for query in self.queries],
+            "calls": self.calls,
+            "estimated_cost_usd": round(self.calls * self.budget.cost_per_call_usd, 4),
+            "budget": {"max_calls": self.budget.max_calls, "max_cost_usd": self.budget.max_cost_usd},
+            "skipped_fields": [f for q in self.queries if q.status == STATUS_SKIPPED for f in q.fields],
+            "unplanned_fields": list(self.unplanned_fields),
+        }
+
+
+class EnrichmentPlanner:
+    """Groups missing fields into prioritized Perplexity queries within a budget."""
+
+    def __init__(self, categories: Dict[str, Dict[str, Any]], critical_fields: Iterable[str],
+                 budget: Optional[EnrichmentBudget] = None,
+                 max_fields_per_query: int = DEFAULT_MAX_FIELDS_PER_QUERY,
+                 min_fields_per_query: int = DEFAULT_MIN_FIELDS_PER_QUERY,
+                 affinity: Optional[Dict[str, List[str]]] = None):
+        self.categories = categories
+        self.critical_fields = set(critical_fields)
+        self.budget = budget or EnrichmentBudget()
+        self.max_fields_per_query = max_fields_per_query
+        self.min_fields_per_query = min_fields_per_query
+        self.affinity = CATEGORY_AFFINITY if affinity is None else affinity
+
+    def plan(self, missing_fields: List[str], prefetched: Iterable[str] = ()) -> EnrichmentPlan:
+        """
+        Plan the searches for missing_fields, given in priority order.
+
+        Args:
+            missing_fields: Fields to enrich, most important first
+            prefetched: Categories already researched for this memo
+
+        Returns:
+            EnrichmentPlan with queries in priority order
+        """
+        rank = {name: i for i, name in enumerate(missing_fields)}
+        prefetched = set(prefetched)
+        order = {name: i for i, name in enumerate(self.categories)}
+
+        queries: List[PlannedQuery] = []
+        researched = set()
+        for name, info in self.categories.items():
+            researched.update(info["fields"])
+            fields = [f for f in info["fields"] if f in rank]
+            if fields:
+                status = STATUS_PREFETCHED if name in prefetched else STATUS_PLANNED
+                queries.append(PlannedQuery([name], fields, self._priority(fields), status))
+
+        # Merge small groups into related searches, smallest first
+        searches = [query for query in queries if query.status == STATUS_PLANNED]
+        for query in sorted(searches, key=lambda q: (len(q.fields), order[q.categories[0]])):
+            if len(query.fields) >= self.min_fields_per_query or query not in searches:
+                continue
+            target = self._merge_target(query, searches)
+            if target is None:
+                continue
+            target.categories = sorted(target.categories + query.categories, key=order.get)
+            target.fields = sorted(target.fields + query.fields, key=rank.get)
+            target.priority = self._priority(target.fields)
+            searches.remove(query)
+            queries.remove(query)
+
+        queries.sort(key=lambda q: (q.priority != PRIORITY_CRITICAL, min(rank[f] for f in q.fields)))
+        plan = EnrichmentPlan(queries, self.budget, [f for f in missing_fields if f not in researched])
+
+        calls = 0
+        for query in plan.to_run():
+            if query.priority == PRIORITY_CRITICAL or self.budget.allows(calls):
+                calls += 1
+            else:
+                plan.record(query, STATUS_SKIPPED)
+        skipped = [q.name for q in queries if q.status == STATUS_SKIPPED]
+        if skipped:
+            logger.info(f"Enrichment budget spent after {calls} searches; skipping {skipped}")
+        return plan
+
+    def _priority(self, fields: List[str]) -> str:
+        return PRIORITY_CRITICAL if any(f in self.critical_fields for f in fields) else PRIORITY_IMPORTANT
+
+    def _merge_target(self, query: PlannedQuery, searches: List[PlannedQuery]) -> Optional[PlannedQuery]:
+        """Closest related search that can take query's fields."""
+        related = [c for category in query.categories for c in self.affinity.get(category, [])]
+        for category in related:
+            for other in searches:
+                if (other is not query and category in other.categories
+                        and len(other.fields) + len(query.fields) <= self.max_fields_per_query):
+                    return other
+        return None
@@ -10,6 +10,11 @@ from datetime import datetime
 import vertexai
 from vertexai.generative_models import GenerativeModel
 
+from utils.hedging import hedged
+from utils.response_schemas import GOOGLE_VALIDATION_RESPONSES, field_enrichment_response
+from utils.structured_output import generate_json, parse_structured
+from utils.vertex_regions import regional_model
+
 logger = logging.getLogger(__name__)
 
 class GoogleValidationService:
@@ -39,7 +44,7 @@ class GoogleValidationService:
             self.logger.info(f"Vertex AI initialized in project '{self.project}' and location '{self.location}'.")
             
             # Use Gemini 2.5 Flash for validation analysis
-            self.gemini_model = GenerativeModel("gemini-2.5-flash")
+            self.gemini_model = regional_model("gemini-2.5-flash", call_site="google_validation")
             self.logger.info("GenerativeModel ('gemini-2.5-flash') initialized for validation analysis.")
             
             self.logger.info("✅ GoogleValidationService setup complete.")
@@ -60,9 +65,11 @@ class GoogleValidationService:
             # Generate validation prompt
             prompt = self._create_market_size_validation_prompt(market_size_claim, industry_category)
             
-            # Use Gemini to analyze the claim
-            response = self.gemini_model.generate_content(
+            # Use Gemini to analyze the claim; interactive, so slow calls are hedged
+            response = generate_json(
+                hedged(self.gemini_model, "google_validation.market_size"),
                 prompt,
+                GOOGLE_VALIDATION_RESPONSES["market_size"],
                 generation_config={
                     "temperature": 0.1,
                     "top_p": 0.8,
@@ -103,8 +110,10 @@ class GoogleValidationService:
             prompt = self._create_competitor_validation_prompt(competitors, industry_category)
             
             # Use Gemini to analyze the competitors
-            response = self.gemini_model.generate_content(
+            response = generate_json(
+                self.gemini_model,
                 prompt,
+                GOOGLE_VALIDATION_RESPONSES["competitors"],
                 generation_config={
                     "temperature": 0.1,
                     "top_p": 0.8,
@@ -145,8 +154,10 @@ class GoogleValidationService:
             prompt = self._create_comprehensive_validation_prompt(memo_data)
             
             # Use Gemini to analyze the memo data
-            response = self.gemini_model.generate_content(
+            response = generate_json(
+                self.gemini_model,
                 prompt,
+                GOOGLE_VALIDATION_RESPONSES["comprehensive"],
                 generation_config={
                     "temperature": 0.1,
                     "top_p": 0.8,
@@ -195,8 +206,10 @@ class GoogleValidationService:
             prompt = self._create_field_enrichment_prompt(memo_data, missing_fields, company_context)
             
             # Use Gemini to enrich fields
-            response = self.gemini_model.generate_content(
+            response = generate_json(
+                self.gemini_model,
                 prompt,
+                field_enrichment_response(missing_fields),
                 generation_config={
                     "temperature": 0.2,
                     "top_p": 0.9,
@@ -586,38 +599,12 @@ class GoogleValidationService:
         """Parse the validation response from Gemini."""
         self.logger.debug(f"Parsing validation response for {validation_type}: {response_text[:200]}...")
         
-        # Remove markdown code blocks
-        text = response_text.replace('```json', '').replace('```', '')
-        
-        # Try direct parsing first
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-        
-        # Try to find JSON object in the text
-        start = text.find('{')
-        if start != -1:
-            # Find the matching closing brace
-            brace_count = 0
-            end = start
-            for i, char in enumerate(text[start:], start):
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        end = i + 1
-                        break
-            
-            if end > start:
-                json_str = text[start:end]
-                try:
-                    return json.loads(json_str)
-                except json.JSONDecodeError:
-                    self.logger.error(f"Failed to decode JSON: {json_str[:200]}...")
+        parsed = parse_structured(response_text, GOOGLE_VALIDATION_RESPONSES.get(validation_type),
+                                  call_site=f"google_validation.{validation_type}")
+        if isinstance(parsed, dict):
+            return parsed
         
-            # Fallback: return error structure
+        # Fallback: return error structure
         self.logger.error(f"Failed to parse validation response: {response_text[:500]}...")
         return {
             "error": "Failed to parse validation response",
@@ -628,22 +615,18 @@ class GoogleValidationService:
     def _parse_enrichment_response(self, response_text: str, expected_fields: List[str]) -> Dict[str, Any]:
         """Parse Gemini's enrichment response into structured field data."""
         try:
-            # Extract JSON from response (handle markdown code blocks if present)
-            text = response_text.strip()
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-            
-            # Parse JSON
-            parsed = json.loads(text)
+            parsed = parse_structured(response_text, field_enrichment_response(expected_fields),
+                                      call_site="google_validation.field_enrichment")
+            if not isinstance(parsed, dict):
+                self.logger.debug(f"Response text: {response_text[:500]}")
+                return {}
             
             # Extract field values and metadata
             enriched_data = {}
             for field, data in parsed.items():
                 if isinstance(data, dict) and "value" in data:
                     value = data.get("value")
-                    confidence = data.get("confidence", 0.0)
+                    confidence = data.get("confidence") or 0.0
                     
                     # Only include fields with reasonable confidence
                     if confidence > 0.3 and value is not None and value != "null":
@@ -653,10 +636,6 @@ class GoogleValidationService:
             
             return enriched_data
             
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Failed to parse enrichment JSON: {e}")
-            self.logger.debug(f"Response text: {response_text[:500]}")
-            return {}
         except Exception as e:
             self.logger.error(f"Error parsing enrichment response: {e}", exc_info=True)
             return {}
\ No newline at end of file
@@ -4,23 +4,248 @@ import logging
 import asyncio
 import aiohttp
 import re
-from typing import Dict, List, Any, Optional
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Any, Optional, Tuple
 from dotenv import load_dotenv
+
+from services.enrichment_planner import (
+    STATUS_FAILED, STATUS_NO_RESULTS, STATUS_PREFETCHED, STATUS_SEARCHED, EnrichmentBudget, EnrichmentPlan,
+    EnrichmentPlanner, PlannedQuery,
+)
+from utils.circuit_breaker import CircuitOpenError, get_circuit_breaker, is_dependency_failure
+from utils.deadline import DeadlineExceeded, timeout_for
+from utils.json_parsing import loads_tolerant
+from utils.model_routing import routed_model
+from utils.rate_limiter import (
+    PERPLEXITY_PROVIDER, RateLimitError, RetryableError, call_with_retry_async, parse_retry_after,
+)
+from utils.singleflight import fingerprint, get_singleflight
+from utils.structured_output import parse_structured
+from utils.term_matcher import term_matcher
+from utils.vertex_regions import regional_model
 load_dotenv()  # Add at top of file
 
 # Vertex AI imports for enhanced processing
 try:
     import vertexai
-    from vertexai.generative_models import GenerativeModel
     VERTEX_AI_AVAILABLE = True
 except ImportError:
     VERTEX_AI_AVAILABLE = False
+
+
+def _is_perplexity_failure(error: BaseException) -> bool:
+    return isinstance(error, aiohttp.ClientError) or is_dependency_failure(error)
+
+
+# Value patterns tried right after a field name or alias in _extract_field_data
+_FIELD_VALUE_PATTERNS = [
+    re.compile(r"\s*[:=]\s*([^\n,]+)", re.IGNORECASE),
+    re.compile(r"\s+(?:is|are|was|were)?\s+([^\n,\.]+)", re.IGNORECASE),
+    re.compile(r"\s*[-–]\s*([^\n,]+)", re.IGNORECASE),
+]
+_ALIAS_VALUE_PATTERN = re.compile(r"\s*[:=]\s*([^\n,\.]+)", re.IGNORECASE)
+
+_DATE_PATTERNS = [
+    re.compile(r"(?:founded|established|started|launched)\s+(?:in\s+)?(\d{4})"),
+    re.compile(r"(\d{4})\s+(?:founded|established|started|launched)"),
+    re.compile(r"since\s+(\d{4})"),
+]
+_CURRENCY_PATTERNS = [
+    re.compile(r"\$\s*(\d+\.?\d*)\s*[KMkmB]"),
+    re.compile(r"(\d+\.?\d*)\s*(?:million|billion|thousand)"),
+    re.compile(r"USD\s*(\d+\.?\d*)\s*[KMkmB]?"),
+]
+_LOCATION_PATTERNS = [
+    re.compile(r"(?:headquarters|hq|base|located|based)\s+(?:in|at)?\s*([A-Z][a-zA-Z\s]+(?:,\s*[A-Z][a-zA-Z\s]+)?)",
+               re.IGNORECASE),
+    re.compile(r"([A-Z][a-zA-Z]+),\s*([A-Z]{2}|[A-Z][a-zA-Z]+)", re.IGNORECASE),
+]
+
+
+def _first_match_after(pattern: "re.Pattern", text: str, positions: List[int], length: int) -> Optional["re.Match"]:
+    """First match of pattern right after a term of the given length found at positions."""
+    for position in positions:
+        match = pattern.match(text, position + length)
+        if match:
+            return match
+    return None
+
+
 class PerplexitySearchService:
     """
     Service for enriching memo data using Perplexity AI search.
     Follows the same pattern as DiligenceAgent for consistency.
     """
     
+    # Field categories with specialized prompts - Enhanced for better data extraction
+    FIELD_CATEGORIES = {
+        "company_basics": {
+            "fields": ["company_stage", "headquarters", "founded_date", "team_size"],
+            "prompt_template": """Research and provide verified company information for {company_context}. 
+                Find and extract:
+                1. Headquarters location - exact city and state/country
+                2. Founding date - year or specific date
+                3. Current funding stage - Seed, Series A/B/C, Pre-seed, Growth stage, etc.
+                4. Team size - number of employees
+                
+                Search for official sources like company website, Crunchbase, LinkedIn company page, press releases, and SEC filings.
+                Include specific dates, locations, and stage details with sources."""
+        },
+        "financial_metrics": {
+            "fields": ["current_revenue", "revenue_growth_rate", "burn_rate", "runway", "customer_acquisition_cost", "lifetime_value", "gross_margin"],
+            "prompt_template": """Find latest financial data and metrics for {company_context}. 
+                Extract:
+                1. Current revenue - annual revenue, ARR, or MRR with currency
+                2. Revenue growth rate - percentage or growth rate
+                3. Burn rate - monthly cash burn with currency
+                4. Runway - months of cash remaining
+                5. Customer Acquisition Cost (CAC) - cost per customer
+                6. Lifetime Value (LTV) - customer lifetime value
+                7. Gross margin - gross margin percentage
+                
+                Focus on recent data from 2024-2025. Look for financial disclosures, investor reports, pitch decks, or public statements.
+                Include specific numbers, currency, and sources."""
+        },
+        "funding_deals": {
+            "fields": ["amount_raising", "post_money_valuation", "pre_money_valuation", "lead_investor", "committed_funding", "use_of_funds"],
+            "prompt_template": """Research funding information for {company_context}. 
+                Find and extract:
+                1. Current funding round amount - amount raising or recently raised
+                2. Post-money valuation - valuation after funding round
+                3. Pre-money valuation - valuation before funding round
+                4. Lead investor - name of lead investment firm or investor
+                5. Committed funding - total funding committed or raised
+                6. Use of funds - how the funding will be used (product development, marketing, hiring, etc.)
+                
+                Search for recent funding announcements, press releases, TechCrunch articles, Crunchbase, and investor databases.
+                Include specific amounts with currency and recent dates."""
+        },
+        "market_intelligence": {
+            "fields": ["sam_market_size", "som_market_size", "market_penetration", "market_timing", "market_trends", "competitive_advantages"],
+            "prompt_template": """Analyze market for {company_context}. 
+                Find and extract:
+                1. SAM (Serviceable Addressable Market) size - total addressable market size with currency
+                2. SOM (Serviceable Obtainable Market) size - obtainable market size with currency
+                3. Market penetration - current market penetration percentage
+                4. Market timing - assessment of market timing (early, mature, etc.)
+                5. Market trends - current trends in the industry
+                6. Competitive advantages - key competitive advantages and differentiators
+                
+                Look for market research reports, industry analyses, competitor data, and market sizing studies.
+                Include specific market size numbers, percentages, and competitive positioning."""
+        },
+        "team_execution": {
+            "fields": ["key_team_members", "advisory_board", "go_to_market", "sales_strategy", "partnerships"],
+            "prompt_template": """Research team and execution for {company_context}. 
+                Find and extract:
+                1. Key team members - names and roles of key executives and founders
+                2. Advisory board - names and backgrounds of advisory board members
+                3. Go-to-market strategy - GTM strategy description
+                4. Sales strategy - sales approach and methodology
+                5. Key partnerships - list of important strategic partnerships
+                
+                Search company website, LinkedIn company page, press releases, and executive profiles.
+                Include LinkedIn profiles, strategic partnerships, and execution details."""
+        },
+        "growth_exit": {
+            "fields": ["scalability_plan", "exit_strategy", "exit_valuation", "potential_acquirers", "ipo_timeline"],
+            "prompt_template": """Analyze growth and exit strategy for {company_context}. 
+                Find and extract:
+                1. Scalability plan - plans for scaling the business
+                2. Exit strategy - planned exit strategy (IPO, acquisition, etc.)
+                3. Exit valuation - expected exit valuation with currency
+                4. Potential acquirers - list of potential acquirer companies
+                5. IPO timeline - IPO timeline if applicable
+                
+                Look for strategic plans, investor presentations, and industry analysis.
+                Include strategic growth plans and exit options."""
+        }
+    }
+    
+
+    # Company-level categories that only need the company identity, so they can be
+    # researched speculatively while the full memo extraction is still running
+    SPECULATIVE_CATEGORIES = ["company_basics", "funding_deals", "market_intelligence"]
+
+    # Critical fields are enriched first and always searched; important fields are
+    # searched while the per-memo enrichment budget lasts
+    CRITICAL_FIELDS = [
+        "company_stage", "headquarters", "founded_date", 
+        "current_revenue", "revenue_growth_rate", "burn_rate", "runway",
+        "amount_raising", "post_money_valuation", "lead_investor"
+    ]
+    IMPORTANT_FIELDS = [
+        "customer_acquisition_cost", "lifetime_value", "gross_margin",
+        "team_size", "key_team_members", "advisory_board",
+        "go_to_market", "sales_strategy", "partnerships",
+        "use_of_funds", "financial_projections", "potential_acquirers",
+        "sam_market_size", "som_market_size", "market_penetration",
+        "market_timing", "market_trends", "competitive_advantages",
+        "scalability_plan", "exit_strategy", "exit_valuation"
+    ]
+
+    # What to look for per field, for queries that merge several categories
+    FIELD_DESCRIPTIONS = {
+        "company_stage": "Current funding stage - Seed, Series A/B/C, Pre-seed, Growth stage, etc.",
+        "headquarters": "Headquarters location - exact city and state/country",
+        "founded_date": "Founding date - year or specific date",
+        "team_size": "Team size - number of employees",
+        "current_revenue": "Current revenue - annual revenue, ARR, or MRR with currency",
+        "revenue_growth_rate": "Revenue growth rate - percentage or growth rate",
+        "burn_rate": "Burn rate - monthly cash burn with currency",
+        "runway": "Runway - months of cash remaining",
+        "customer_acquisition_cost": "Customer Acquisition Cost (CAC) - cost per customer",
+        "lifetime_value": "Lifetime Value (LTV) - customer lifetime value",
+        "gross_margin": "Gross margin - gross margin percentage",
+        "amount_raising": "Current funding round amount - amount raising or recently raised",
+        "post_money_valuation": "Post-money valuation - valuation after funding round",
+        "pre_money_valuation": "Pre-money valuation - valuation before funding round",
+        "lead_investor": "Lead investor - name of lead investment firm or investor",
+        "committed_funding": "Committed funding - total funding committed or raised",
+        "use_of_funds": "Use of funds - how the funding will be used",
+        "sam_market_size": "SAM (Serviceable Addressable Market) size with currency",
+        "som_market_size": "SOM (Serviceable Obtainable Market) size with currency",
+        "market_penetration": "Market penetration - current market penetration percentage",
+        "market_timing": "Market timing - assessment of market timing (early, mature, etc.)",
+        "market_trends": "Market trends - current trends in the industry",
+        "competitive_advantages": "Competitive advantages - key competitive advantages and differentiators",
+        "key_team_members": "Key team members - names and roles of key executives and founders",
+        "advisory_board": "Advisory board - names and backgrounds of advisory board members",
+        "go_to_market": "Go-to-market strategy - GTM strategy description",
+        "sales_strategy": "Sales strategy - sales approach and methodology",
+        "partnerships": "Key partnerships - list of important strategic partnerships",
+        "scalability_plan": "Scalability plan - plans for scaling the business",
+        "exit_strategy": "Exit strategy - planned exit strategy (IPO, acquisition, etc.)",
+        "exit_valuation": "Exit valuation - expected exit valuation with currency",
+        "potential_acquirers": "Potential acquirers - list of potential acquirer companies",
+        "ipo_timeline": "IPO timeline - IPO timeline if applicable",
+    }
+
+    MERGED_QUERY_TEMPLATE = """Research {company_context}. 
+                Find and extract:
+{field_list}
+                
+                Search official sources like the company website, Crunchbase, LinkedIn, press releases,
+                funding announcements, investor reports and market research.
+                Include specific numbers, dates, names and sources for each item."""
+
+    # Field name mappings for better matching in _extract_field_data
+    FIELD_ALIASES = {
+        "founded_date": ["founded", "established", "founding date", "started", "launched"],
+        "headquarters": ["headquarters", "hq", "head office", "base", "located in", "based in", "city"],
+        "company_stage": ["stage", "funding stage", "round", "series", "seed", "growth stage"],
+        "amount_raising": ["raising", "funding round", "seeking", "looking to raise", "target"],
+        "post_money_valuation": ["post-money", "post money valuation", "valued at", "valuation"],
+        "current_revenue": ["revenue", "arr", "annual revenue", "recurring revenue", "income"],
+        "team_size": ["employees", "team size", "headcount", "staff", "people"],
+        "burn_rate": ["burn rate", "monthly burn", "cash burn"],
+        "runway": ["runway", "months remaining", "cash runway"],
+        "customer_acquisition_cost": ["cac", "customer acquisition cost", "acquisition cost"],
+        "lifetime_value": ["ltv", "lifetime value", "customer lifetime value"],
+        "gross_margin": ["gross margin", "margin", "gross profit margin"]
+    }
+
     def __init__(self, project: str = "veritas-472301", location: str = "asia-south1"):
         # Use environment variable for API key
         # In Cloud Functions, secrets are automatically available as environment variables
@@ -65,7 +290,7 @@ class PerplexitySearchService:
                 # Initialize Vertex AI - this can be done even if Perplexity is disabled
                 # as it might be used for other purposes or re-enabled later
                 vertexai.init(project=self.project, location=self.location)
-                self.vertex_model = GenerativeModel("gemini-2.5-flash")
+                self.vertex_model = regional_model("gemini-2.5-flash", call_site="perplexity")
                 self.logger.info(f"Vertex AI initialized for structured data extraction (project: {self.project}, location: {self.location})")
             except Exception as e:
                 self.logger.warning(f"Vertex AI initialization failed: {e}. Will use fallback extraction methods.")
@@ -81,6 +306,26 @@ class PerplexitySearchService:
         """
         Perform a search using Perplexity AI API.
         
+        Identical concurrent searches (e.g. a re-clicked validation, or diligence
+        triggered while ingestion is still enriching) share one API call, across
+        instances when singleflight leases are configured.
+        
+        Args:
+            query: The search query
+            max_results: Maximum number of results to return
+            
+        Returns:
+            List of search results with content and sources
+        """
+        return await get_singleflight("perplexity", distributed=True).do_async(
+            fingerprint("perplexity", query, max_results),
+            lambda: self._perplexity_search_once(query, max_results),
+        )
+    
+    async def _perplexity_search_once(self, query: str, max_results: int = 3) -> List[Dict[str, Any]]:
+        """
+        Perform a search using Perplexity AI API.
+        
         Args:
             query: The search query
             max_results: Maximum number of results to return
@@ -123,52 +368,85 @@ class PerplexitySearchService:
             }
             
             async with aiohttp.ClientSession() as session:
-                async with session.post(self.base_url, headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                    response_text = await response.text()
+                try:
+                    status, response_text = await call_with_retry_async(
+                        lambda: self._post(session, headers, payload), PERPLEXITY_PROVIDER, payload["model"]
+                    )
+                except RetryableError as e:
+                    # Retries exhausted; report the last response like any other error
+                    status, response_text = e.status, e.body
+                
+                if status == 200:
+                    data = json.loads(response_text)
+                    content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                    citations = data.get("citations", [])
                     
-                    if response.status == 200:
-                        data = json.loads(response_text)
-                        content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                        citations = data.get("citations", [])
-                        
-                        return [{
-                            "content": content,
-                            "citations": citations,
-                            "query": query
-                        }]
+                    return [{
+                        "content": content,
+                        "citations": citations,
+                        "query": query
+                    }]
+                else:
+                    # Gracefully handle errors with better diagnostics
+                    if status == 401:
+                        api_key_preview = f"{self.api_key[:8]}...{self.api_key[-4:]}" if len(self.api_key) > 12 else f"{self.api_key[:4]}..."
+                        error_message = (
+                            f"Perplexity API returned 401 Unauthorized. "
+                            f"This usually means the API key is invalid or expired. "
+                            f"API key preview: {api_key_preview}. "
+                            f"API key length: {len(self.api_key) if self.api_key else 0}. "
+                            f"Please verify the PERPLEXITY_API_KEY secret in Google Secret Manager. "
+                            f"Steps to fix:\n"
+                            f"1. Check if the secret exists: gcloud secrets describe PERPLEXITY_API_KEY\n"
+                            f"2. Verify the secret value starts with 'pplx-'\n"
+                            f"3. Ensure the Cloud Function has access to the secret\n"
+                            f"4. Update the secret if it's expired: gcloud secrets versions add PERPLEXITY_API_KEY --data-file=-"
+                        )
+                        self.logger.error(error_message)
+                        # Don't disable permanently - allow retries
+                        # Return empty result but keep enabled for next run
+                    elif status == 429:
+                        self.logger.warning("Perplexity API returned 429 Rate Limit after retries. Enrichment will be skipped for this run.")
+                        # Don't disable permanently for rate limits
                     else:
-                        # Gracefully handle errors with better diagnostics
-                        if response.status == 401:
-                            api_key_preview = f"{self.api_key[:8]}...{self.api_key[-4:]}" if len(self.api_key) > 12 else f"{self.api_key[:4]}..."
-                            error_message = (
-                                f"Perplexity API returned 401 Unauthorized. "
-                                f"This usually means the API key is invalid or expired. "
-                                f"API key preview: {api_key_preview}. "
-                                f"API key length: {len(self.api_key) if self.api_key else 0}. "
-                                f"Please verify the PERPLEXITY_API_KEY secret in Google Secret Manager. "
-                                f"Steps to fix:\n"
-                                f"1. Check if the secret exists: gcloud secrets describe PERPLEXITY_API_KEY\n"
-                                f"2. Verify the secret value starts with 'pplx-'\n"
-                                f"3. Ensure the Cloud Function has access to the secret\n"
-                                f"4. Update the secret if it's expired: gcloud secrets versions add PERPLEXITY_API_KEY --data-file=-"
-                            )
-                            self.logger.error(error_message)
-                            # Don't disable permanently - allow retries
-                            # Return empty result but keep enabled for next run
-                        elif response.status == 429:
-                            self.logger.warning("Perplexity API returned 429 Rate Limit. Enrichment will be skipped for this run.")
-                            # Don't disable permanently for rate limits
-                        else:
-                            # Truncate to keep logs readable
-                            truncated = (response_text[:300] + '...') if len(response_text) > 300 else response_text
-                            self.logger.warning(f"Perplexity API error {response.status}: {truncated}")
-                        # Return empty result but keep service enabled for next run
-                        return []
-                        
+                        # Truncate to keep logs readable
+                        truncated = (response_text[:300] + '...') if len(response_text) > 300 else response_text
+                        self.logger.warning(f"Perplexity API error {status}: {truncated}")
+                    # Return empty result but keep service enabled for next run
+                    return []
+                    
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            # Perplexity is failing or out of time; callers fall back as they do for an empty result
+            self.logger.warning(f"Skipping Perplexity search: {e}")
+            return []
         except Exception as e:
             self.logger.error(f"Exception in Perplexity search: {str(e)}", exc_info=True)
             return []
     
+    async def _post(self, session, headers: Dict[str, str], payload: Dict[str, Any]):
+        """
+        One Perplexity API request.
+
+        Returns:
+            (status, response text)
+
+        Raises:
+            RateLimitError: On 429, with the Retry-After hint
+            RetryableError: On 5xx
+            CircuitOpenError: Perplexity's circuit breaker is open
+        """
+        with get_circuit_breaker(PERPLEXITY_PROVIDER).guard(is_failure=_is_perplexity_failure):
+            async with session.post(self.base_url, headers=headers, json=payload,
+                                    timeout=aiohttp.ClientTimeout(total=timeout_for(30))) as response:
+                response_text = await response.text()
+                if response.status == 429:
+                    raise RateLimitError("Perplexity API returned 429", status=429, body=response_text,
+                                         retry_after=parse_retry_after(response.headers.get("Retry-After")))
+                if response.status >= 500:
+                    raise RetryableError(f"Perplexity API returned {response.status}", status=response.status,
+                                         body=response_text)
+                return response.status, response_text
+    
     def extract_json_from_response(self, response_text: str) -> Optional[Dict[str, Any]]:
         """
         Extract JSON from Gemini response, handling markdown code blocks and extra text.
@@ -183,39 +461,13 @@ class PerplexitySearchService:
         if not response_text or not response_text.strip():
             self.logger.warning("Empty response from Gemini")
             return None
-            
-        try:
-            # First try direct JSON parsing
-            return json.loads(response_text.strip())
-        except json.JSONDecodeError:
-            pass
-        
-        # Try to extract JSON from markdown code blocks
-        import re
         
-        # Pattern to match ```json ... ``` blocks
-        json_pattern = r'```(?:json)?\s*(\{.*?\})\s*```'
-        match = re.search(json_pattern, response_text, re.DOTALL)
-        
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                pass
-        
-        # Try to find JSON object boundaries
-        json_pattern = r'\{.*\}'
-        match = re.search(json_pattern, response_text, re.DOTALL)
-        
-        if match:
-            try:
-                return json.loads(match.group(0))
-            except json.JSONDecodeError:
-                pass
-        
-        # Log the actual response for debugging
-        self.logger.error(f"Failed to extract JSON from Gemini response. Response: {response_text[:500]}...")
-        return None
+        result = parse_structured(response_text, call_site="perplexity.vertex_extraction")
+        if not isinstance(result, dict):
+            # Log the actual response for debugging
+            self.logger.error(f"Failed to extract JSON from Gemini response. Response: {response_text[:500]}...")
+            return None
+        return result
     
     def _identify_missing_fields(self, memo_data: Dict[str, Any]) -> List[str]:
         """
@@ -228,33 +480,15 @@ class PerplexitySearchService:
         Returns:
             List of field names that need enrichment
         """
-        # Critical fields that should be enriched first
-        critical_fields = [
-            "company_stage", "headquarters", "founded_date", 
-            "current_revenue", "revenue_growth_rate", "burn_rate", "runway",
-            "amount_raising", "post_money_valuation", "lead_investor"
-        ]
-        
-        # Important fields for comprehensive enrichment
-        important_fields = [
-            "customer_acquisition_cost", "lifetime_value", "gross_margin",
-            "team_size", "key_team_members", "advisory_board",
-            "go_to_market", "sales_strategy", "partnerships",
-            "use_of_funds", "financial_projections", "potential_acquirers",
-            "sam_market_size", "som_market_size", "market_penetration",
-            "market_timing", "market_trends", "competitive_advantages",
-            "scalability_plan", "exit_strategy", "exit_valuation"
-        ]
-        
         # Check critical fields first
         missing_fields = []
-        for field in critical_fields:
+        for field in self.CRITICAL_FIELDS:
             value = memo_data.get(field)
             if self._is_field_missing(value):
                 missing_fields.append(field)
         
         # Add important fields if we have capacity
-        for field in important_fields:
+        for field in self.IMPORTANT_FIELDS:
             value = memo_data.get(field)
             if self._is_field_missing(value):
                 missing_fields.append(field)
@@ -271,135 +505,137 @@ class PerplexitySearchService:
             return len(value) == 0
         return False
     
-    async def _enrich_fields(self, missing_fields: List[str], company_context: str) -> Dict[str, Any]:
+    async def _enrich_category(self, category_name: str, fields: List[str], company_context: str) -> Dict[str, Any]:
+        """
+        Run one category's Perplexity search and extract the given fields from it.
+        
+        Args:
+            category_name: Key in FIELD_CATEGORIES
+            fields: Fields to extract from the search result
+            company_context: Context about the company
+            
+        Returns:
+            Dictionary of extracted field data (empty when nothing was found)
+        """
+        return await self._enrich_query(PlannedQuery([category_name], fields), company_context) or {}
+    
+    def plan_enrichment(self, missing_fields: List[str], prefetched: Optional[Iterable[str]] = None) -> EnrichmentPlan:
+        """
+        Group missing fields into prioritized searches within the per-memo budget
+        (see services.enrichment_planner).
+        
+        Args:
+            missing_fields: Fields to enrich, as returned by _identify_missing_fields
+            prefetched: Categories already researched for this memo
+            
+        Returns:
+            EnrichmentPlan with the searches to run in order
+        """
+        planner = EnrichmentPlanner(self.FIELD_CATEGORIES, self.CRITICAL_FIELDS, EnrichmentBudget.from_env())
+        return planner.plan(missing_fields, prefetched or ())
+    
+    def _query_text(self, query: PlannedQuery, company_context: str) -> str:
+        """Search prompt for a planned query: the category prompt, or a merged one."""
+        if not query.merged:
+            return self.FIELD_CATEGORIES[query.categories[0]]["prompt_template"].format(company_context=company_context)
+        field_list = "\n".join(
+            f"                {i}. {self.FIELD_DESCRIPTIONS.get(f, f.replace('_', ' ').capitalize())}"
+            for i, f in enumerate(query.fields, 1)
+        )
+        return self.MERGED_QUERY_TEMPLATE.format(company_context=company_context, field_list=field_list)
+    
+    async def _enrich_query(self, query: PlannedQuery, company_context: str) -> Optional[Dict[str, Any]]:
+        """
+        Run one planned search and extract its fields from the result.
+        
+        Returns:
+            Dictionary of extracted field data, or None when the search found nothing
         """
-        Enrich missing fields using category-specific Perplexity searches.
+        self.logger.info(f"Enriching {query.name} fields: {query.fields}")
+        results = await self._perplexity_search(self._query_text(query, company_context))
+        if not results:
+            return None
+        
+        # Process results with Vertex AI if available
+        if self.vertex_model:
+            return await self._process_with_vertex_ai(results[0]["content"], query.fields, query.name)
+        # Fallback to simple extraction
+        return self._extract_field_data(results[0]["content"], query.fields)
+    
+    async def _enrich_fields(self, missing_fields: List[str], company_context: str,
+                             prefetched: Optional[Dict[str, Dict[str, Any]]] = None,
+                             plan: Optional[EnrichmentPlan] = None) -> Dict[str, Any]:
+        """
+        Enrich missing fields with the Perplexity searches of an enrichment plan.
         
         Args:
             missing_fields: List of fields to enrich
             company_context: Context about the company
+            prefetched: Category results from prefetch_company_research; these
+                categories are not searched again
+            plan: Plan from plan_enrichment (made here when not given); each
+                query's status is updated with its outcome
             
         Returns:
             Dictionary of enriched field data
         """
         enriched_data = {}
+        prefetched = prefetched or {}
+        plan = plan or self.plan_enrichment(missing_fields, prefetched)
         
-        # Define field categories with specialized prompts - Enhanced for better data extraction
-        field_categories = {
-            "company_basics": {
-                "fields": ["company_stage", "headquarters", "founded_date", "team_size"],
-                "prompt_template": """Research and provide verified company information for {company_context}. 
-                    Find and extract:
-                    1. Headquarters location - exact city and state/country
-                    2. Founding date - year or specific date
-                    3. Current funding stage - Seed, Series A/B/C, Pre-seed, Growth stage, etc.
-                    4. Team size - number of employees
-                    
-                    Search for official sources like company website, Crunchbase, LinkedIn company page, press releases, and SEC filings.
-                    Include specific dates, locations, and stage details with sources."""
-            },
-            "financial_metrics": {
-                "fields": ["current_revenue", "revenue_growth_rate", "burn_rate", "runway", "customer_acquisition_cost", "lifetime_value", "gross_margin"],
-                "prompt_template": """Find latest financial data and metrics for {company_context}. 
-                    Extract:
-                    1. Current revenue - annual revenue, ARR, or MRR with currency
-                    2. Revenue growth rate - percentage or growth rate
-                    3. Burn rate - monthly cash burn with currency
-                    4. Runway - months of cash remaining
-                    5. Customer Acquisition Cost (CAC) - cost per customer
-                    6. Lifetime Value (LTV) - customer lifetime value
-                    7. Gross margin - gross margin percentage
-                    
-                    Focus on recent data from 2024-2025. Look for financial disclosures, investor reports, pitch decks, or public statements.
-                    Include specific numbers, currency, and sources."""
-            },
-            "funding_deals": {
-                "fields": ["amount_raising", "post_money_valuation", "pre_money_valuation", "lead_investor", "committed_funding", "use_of_funds"],
-                "prompt_template": """Research funding information for {company_context}. 
-                    Find and extract:
-                    1. Current funding round amount - amount raising or recently raised
-                    2. Post-money valuation - valuation after funding round
-                    3. Pre-money valuation - valuation before funding round
-                    4. Lead investor - name of lead investment firm or investor
-                    5. Committed funding - total funding committed or raised
-                    6. Use of funds - how the funding will be used (product development, marketing, hiring, etc.)
-                    
-                    Search for recent funding announcements, press releases, TechCrunch articles, Crunchbase, and investor databases.
-                    Include specific amounts with currency and recent dates."""
-            },
-            "market_intelligence": {
-                "fields": ["sam_market_size", "som_market_size", "market_penetration", "market_timing", "market_trends", "competitive_advantages"],
-                "prompt_template": """Analyze market for {company_context}. 
-                    Find and extract:
-                    1. SAM (Serviceable Addressable Market) size - total addressable market size with currency
-                    2. SOM (Serviceable Obtainable Market) size - obtainable market size with currency
-                    3. Market penetration - current market penetration percentage
-                    4. Market timing - assessment of market timing (early, mature, etc.)
-                    5. Market trends - current trends in the industry
-                    6. Competitive advantages - key competitive advantages and differentiators
-                    
-                    Look for market research reports, industry analyses, competitor data, and market sizing studies.
-                    Include specific market size numbers, percentages, and competitive positioning."""
-            },
-            "team_execution": {
-                "fields": ["key_team_members", "advisory_board", "go_to_market", "sales_strategy", "partnerships"],
-                "prompt_template": """Research team and execution for {company_context}. 
-                    Find and extract:
-                    1. Key team members - names and roles of key executives and founders
-                    2. Advisory board - names and backgrounds of advisory board members
-                    3. Go-to-market strategy - GTM strategy description
-                    4. Sales strategy - sales approach and methodology
-                    5. Key partnerships - list of important strategic partnerships
-                    
-                    Search company website, LinkedIn company page, press releases, and executive profiles.
-                    Include LinkedIn profiles, strategic partnerships, and execution details."""
-            },
-            "growth_exit": {
-                "fields": ["scalability_plan", "exit_strategy", "exit_valuation", "potential_acquirers", "ipo_timeline"],
-                "prompt_template": """Analyze growth and exit strategy for {company_context}. 
-                    Find and extract:
-                    1. Scalability plan - plans for scaling the business
-                    2. Exit strategy - planned exit strategy (IPO, acquisition, etc.)
-                    3. Exit valuation - expected exit valuation with currency
-                    4. Potential acquirers - list of potential acquirer companies
-                    5. IPO timeline - IPO timeline if applicable
-                    
-                    Look for strategic plans, investor presentations, and industry analysis.
-                    Include strategic growth plans and exit options."""
-            }
-        }
+        for query in plan.queries:
+            if query.status == STATUS_PREFETCHED:
+                self.logger.info(f"Using prefetched {query.name} data for: {query.fields}")
+                enriched_data.update(prefetched[query.name])
+                plan.record(query, STATUS_PREFETCHED)
         
-        # Process each category
-        for category_name, category_info in field_categories.items():
-            relevant_fields = [f for f in category_info["fields"] if f in missing_fields]
-            if not relevant_fields:
-                continue
-                
+        # Process each planned search, most important first
+        for query in plan.to_run():
             try:
-                # Create specialized query for this category
-                query = category_info["prompt_template"].format(company_context=company_context)
-                
-                self.logger.info(f"Enriching {category_name} fields: {relevant_fields}")
-                results = await self._perplexity_search(query)
-                
-                if results:
-                    # Process results with Vertex AI if available
-                    if self.vertex_model:
-                        processed_data = await self._process_with_vertex_ai(
-                            results[0]["content"], 
-                            relevant_fields, 
-                            category_name
-                        )
-                        enriched_data.update(processed_data)
-                    else:
-                        # Fallback to simple extraction
-                        enriched_data.update(self._extract_field_data(results[0]["content"], relevant_fields))
-                        
+                extracted = await self._enrich_query(query, company_context)
             except Exception as e:
-                self.logger.error(f"Error enriching {category_name}: {str(e)}")
+                self.logger.error(f"Error enriching {query.name}: {str(e)}")
+                plan.record(query, STATUS_FAILED)
+                continue
+            plan.record(query, STATUS_SEARCHED if extracted is not None else STATUS_NO_RESULTS)
+            enriched_data.update(extracted or {})
         
         return enriched_data
     
+    async def prefetch_company_research(self, company_context: str,
+                                        categories: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Research company-level categories before the memo is complete.
+        
+        Every field of each category is extracted, since it is not yet known which
+        fields the memo will be missing. Categories run concurrently; failed ones
+        are left out so enrichment searches them again later.
+        
+        Args:
+            company_context: Context about the company (name and sector)
+            categories: Categories to research (defaults to SPECULATIVE_CATEGORIES)
+            
+        Returns:
+            Dictionary of category name -> extracted field data
+        """
+        if not self.enabled:
+            return {}
+        
+        categories = categories or self.SPECULATIVE_CATEGORIES
+        results = await asyncio.gather(
+            *(self._enrich_category(name, self.FIELD_CATEGORIES[name]["fields"], company_context)
+              for name in categories),
+            return_exceptions=True,
+        )
+        
+        prefetched = {}
+        for name, result in zip(categories, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Error prefetching {name}: {str(result)}")
+            elif result:
+                prefetched[name] = result
+        return prefetched
+    
     async def _process_with_vertex_ai(self, content: str, fields: List[str], category: str) -> Dict[str, Any]:
         """
         Process Perplexity results using Vertex AI for structured data extraction.
@@ -417,152 +653,13 @@ class PerplexitySearchService:
             return {}
             
         try:
-            # Create field descriptions for better extraction
-            field_descriptions = {
-                "company_stage": "company funding stage like Seed, Series A, Series B, Pre-seed, or growth stage",
-                "headquarters": "headquarters location as City, State/Country",
-                "founded_date": "founding date as YYYY-MM-DD or YYYY",
-                "team_size": "total number of employees or team size",
-                "current_revenue": "current annual revenue with currency",
-                "revenue_growth_rate": "revenue growth rate as percentage",
-                "burn_rate": "monthly burn rate with currency",
-                "runway": "runway in months remaining",
-                "customer_acquisition_cost": "CAC cost per customer with currency",
-                "lifetime_value": "LTV lifetime value per customer with currency",
-                "gross_margin": "gross margin percentage",
-                "amount_raising": "amount currently raising in funding round with currency",
-                "post_money_valuation": "post-money valuation with currency",
-                "pre_money_valuation": "pre-money valuation with currency",
-                "lead_investor": "name of lead investor or investment firm",
-                "committed_funding": "committed funding amount with currency",
-                "use_of_funds": "how the funding will be used",
-                "sam_market_size": "SAM (Serviceable Addressable Market) size with currency",
-                "som_market_size": "SOM (Serviceable Obtainable Market) size with currency",
-                "market_penetration": "market penetration percentage",
-                "market_timing": "market timing assessment",
-                "market_trends": "current market trends description",
-                "competitive_advantages": "list of competitive advantages",
-                "key_team_members": "list of key team members with roles",
-                "advisory_board": "list of advisory board members",
-                "go_to_market": "go-to-market strategy description",
-                "sales_strategy": "sales strategy description",
-                "partnerships": "list of key partnerships",
-                "scalability_plan": "scalability plan description",
-                "exit_strategy": "exit strategy description",
-                "exit_valuation": "expected exit valuation with currency",
-                "potential_acquirers": "list of potential acquirer companies",
-                "ipo_timeline": "IPO timeline if applicable"
-            }
-            
-            # Build field descriptions string
-            fields_with_desc = []
-            for field in fields:
-                desc = field_descriptions.get(field, field.replace('_', ' '))
-                fields_with_desc.append(f"{field} ({desc})")
-            
-            prompt = f"""You are an expert data extraction specialist for startup investment due diligence. Extract structured information from the following content about a startup company.
+            prompt = self._build_extraction_prompt(content, fields, category)
 
-            **CRITICAL - RESPONSE FORMAT:**
-            Return ONLY a valid JSON object. No markdown, no code blocks, no explanations before or after.
-            Your response must start with {{ and end with }}.
-            Do not wrap in ```json``` or any other formatting.
-
-            **Required JSON Structure:**
-            {{
-                "field_name": {{
-                    "value": "extracted_value",
-                    "confidence": 0.85,
-                    "source": "brief source description"
-                }}
-            }}
-
-            **Category:** {category}
-            **Fields to extract:** {', '.join(fields)}
-            **Field Descriptions:** {', '.join(fields_with_desc)}
-            
-            **Content to analyze:**
-            {content[:6000]}
-
-            **Extraction Rules:**
-            1. **Search thoroughly** - Look for the information in multiple ways:
-               - Direct mentions (e.g., "founded in 2020", "headquartered in San Francisco")
-               - Indirect mentions (e.g., "company history shows...", "based in...")
-               - Alternative phrasings (e.g., "headquarters" vs "head office" vs "HQ" vs "base")
-               - Related information that implies the field (e.g., "Series A round" implies stage)
-            
-            2. Extract ONLY the requested fields ({', '.join(fields)})
-            3. For each field found, provide:
-               - value: The extracted data (string, number, or array as appropriate)
-               - confidence: 0.0-1.0 (1.0 = highly confident, 0.5 = somewhat confident, 0.0 = not found)
-               - source: Brief description of where the data came from (e.g., "Company website", "Crunchbase", "LinkedIn profile", "Press release")
-            
-            4. **Field-Specific Formatting:**
-               - Dates: Use YYYY-MM-DD or YYYY format (e.g., "2020-05-15" or "2020")
-               - Currency: Include currency symbol and units (e.g., "$2.5M", "$500K", "$1.2B", "$50M ARR")
-               - Percentages: Include % symbol (e.g., "85%", "12.5%")
-               - Numbers with units: Include units (e.g., "50 employees", "24 months", "120 customers")
-               - Locations: Format as "City, State/Country" (e.g., "San Francisco, CA" or "Bangalore, India")
-               - Funding stages: Use standard format (e.g., "Seed", "Series A", "Series B", "Pre-seed", "Growth")
-               - Team members: Format as "Name - Role" or array of objects
-               - URLs: Full URLs (e.g., "https://linkedin.com/in/username")
-            
-            5. **Confidence Scoring Guidelines:**
-               - 0.9-1.0: Explicitly stated in content, multiple sources agree, very clear
-               - 0.7-0.9: Clearly stated, single reliable source, unambiguous
-               - 0.5-0.7: Implied or inferred from content, reasonably clear
-               - 0.3-0.5: Possible but uncertain, needs verification
-               - 0.0-0.3: Not found or highly uncertain (use null for value)
-            
-            6. **Field Matching Strategies:**
-               - Look for exact field names (e.g., "headquarters", "HQ")
-               - Look for synonyms (e.g., "founded" = "founded_date", "established" = "founded_date")
-               - Look for related phrases (e.g., "based in" = "headquarters", "located in" = "headquarters")
-               - For financial fields, look for currency symbols and numbers together
-               - For dates, look for year mentions or date patterns
-            
-            7. If information is NOT found: Use null for value and 0.0 for confidence
-            8. For arrays/lists: Use JSON arrays ["item1", "item2"]
-            9. Preserve original data format when possible (don't convert unnecessarily)
-            10. Extract ALL available information - don't stop at first match if more data is available
-
-            **Example Output:**
-            {{
-                "founded_date": {{
-                    "value": "2020-05-15",
-                    "confidence": 0.9,
-                    "source": "Company website About page"
-                }},
-                "headquarters": {{
-                    "value": "San Francisco, CA",
-                    "confidence": 0.85,
-                    "source": "Crunchbase and company LinkedIn"
-                }},
-                "customer_acquisition_cost": {{
-                    "value": "$3,500",
-                    "confidence": 0.7,
-                    "source": "Industry report and interview mention"
-                }},
-                "lifetime_value": {{
-                    "value": "$850K",
-                    "confidence": 0.75,
-                    "source": "Public disclosure in pitch deck summary"
-                }}
-            }}
-
-            **IMPORTANT:** 
-            - Extract real data only. If a field is not found in the content, set value to null and confidence to 0.0.
-            - Do not make up or infer data that isn't present.
-            - Search for ALL requested fields ({', '.join(fields)}) - don't skip any.
-            - Be thorough and extract as much information as possible.
-            - If you find partial information, include it with appropriate confidence score.
-
-            Analyze the content carefully and return ONLY the JSON object with extracted fields."""
-            
-            # Generate content using Vertex AI (sync method)
-            # Note: Vertex AI GenerativeModel.generate_content() is synchronous
-            # In async contexts, it still works but runs synchronously
+            # generate_content() blocks, including the rate limiter wait and retry backoff,
+            # so it runs in a worker thread to keep concurrent searches moving
             try:
-                response = self.vertex_model.generate_content(prompt)
+                response = await asyncio.to_thread(
+                    routed_model("perplexity.field_extraction").generate_content, prompt)
             except Exception as gen_error:
                 self.logger.error(f"Error generating content with Vertex AI: {gen_error}", exc_info=True)
                 return {}
@@ -573,38 +670,208 @@ class PerplexitySearchService:
             # Add debug logging for Gemini response
             self.logger.debug(f"Gemini response (first 500 chars): {response_text[:500]}")
             
-            # Parse the JSON response using helper function
-            result = self.extract_json_from_response(response_text)
-            
-            if result is None:
-                self.logger.error("Failed to extract JSON from Gemini response")
-                return {}
-            
-            # Extract values and confidence scores
-            processed_data = {}
-            for field, data in result.items():
-                if isinstance(data, dict) and "value" in data:
-                    value = data["value"]
-                    confidence = data.get("confidence", 0.0)
-                    
-                    # Only include fields with reasonable confidence
-                    if confidence > 0.3:
-                        processed_data[field] = value
-                        processed_data[f"{field}_confidence"] = confidence
-                        processed_data[f"{field}_source"] = data.get("source", "")
-                        
-            self.logger.info(f"Successfully processed {len(processed_data)} fields from Gemini response")
-            return processed_data
-                
+            return self._parse_extraction_response(response_text)
+
         except Exception as e:
             self.logger.error(f"Error in Vertex AI processing: {e}")
             return {}
     
+    def _build_extraction_prompt(self, content: str, fields: List[str], category: str) -> str:
+        """
+        Prompt asking Gemini to extract fields from Perplexity content as JSON.
+        
+        Args:
+            content: Raw content from Perplexity search
+            fields: List of fields to extract
+            category: Category of fields being processed
+            
+        Returns:
+            Prompt text
+        """
+        # Create field descriptions for better extraction
+        field_descriptions = {
+            "company_stage": "company funding stage like Seed, Series A, Series B, Pre-seed, or growth stage",
+            "headquarters": "headquarters location as City, State/Country",
+            "founded_date": "founding date as YYYY-MM-DD or YYYY",
+            "team_size": "total number of employees or team size",
+            "current_revenue": "current annual revenue with currency",
+            "revenue_growth_rate": "revenue growth rate as percentage",
+            "burn_rate": "monthly burn rate with currency",
+            "runway": "runway in months remaining",
+            "customer_acquisition_cost": "CAC cost per customer with currency",
+            "lifetime_value": "LTV lifetime value per customer with currency",
+            "gross_margin": "gross margin percentage",
+            "amount_raising": "amount currently raising in funding round with currency",
+            "post_money_valuation": "post-money valuation with currency",
+            "pre_money_valuation": "pre-money valuation with currency",
+            "lead_investor": "name of lead investor or investment firm",
+            "committed_funding": "committed funding amount with currency",
+            "use_of_funds": "how the funding will be used",
+            "sam_market_size": "SAM (Serviceable Addressable Market) size with currency",
+            "som_market_size": "SOM (Serviceable Obtainable Market) size with currency",
+            "market_penetration": "market penetration percentage",
+            "market_timing": "market timing assessment",
+            "market_trends": "current market trends description",
+            "competitive_advantages": "list of competitive advantages",
+            "key_team_members": "list of key team members with roles",
+            "advisory_board": "list of advisory board members",
+            "go_to_market": "go-to-market strategy description",
+            "sales_strategy": "sales strategy description",
+            "partnerships": "list of key partnerships",
+            "scalability_plan": "scalability plan description",
+            "exit_strategy": "exit strategy description",
+            "exit_valuation": "expected exit valuation with currency",
+            "potential_acquirers": "list of potential acquirer companies",
+            "ipo_timeline": "IPO timeline if applicable"
+        }
+        
+        # Build field descriptions string
+        fields_with_desc = []
+        for field in fields:
+            desc = field_descriptions.get(field, field.replace('_', ' '))
+            fields_with_desc.append(f"{field} ({desc})")
+        
+        prompt = f"""You are an expert data extraction specialist for startup investment due diligence. Extract structured information from the following content about a startup company.
+
+        **CRITICAL - RESPONSE FORMAT:**
+        Return ONLY a valid JSON object. No markdown, no code blocks, no explanations before or after.
+        Your response must start with {{ and end with }}.
+        Do not wrap in ```json``` or any other formatting.
+
+        **Required JSON Structure:**
+        {{
+            "field_name": {{
+                "value": "extracted_value",
+                "confidence": 0.85,
+                "source": "brief source description"
+            }}
+        }}
+
+        **Category:** {category}
+        **Fields to extract:** {', '.join(fields)}
+        **Field Descriptions:** {', '.join(fields_with_desc)}
+        
+        **Content to analyze:**
+        {content[:6000]}
+
+        **Extraction Rules:**
+        1. **Search thoroughly** - Look for the information in multiple ways:
+           - Direct mentions (e.g., "founded in 2020", "headquartered in San Francisco")
+           - Indirect mentions (e.g., "company history shows...", "based in...")
+           - Alternative phrasings (e.g., "headquarters" vs "head office" vs "HQ" vs "base")
+           - Related information that implies the field (e.g., "Series A round" implies stage)
+        
+        2. Extract ONLY the requested fields ({', '.join(fields)})
+        3. For each field found, provide:
+           - value: The extracted data (string, number, or array as appropriate)
+           - confidence: 0.0-1.0 (1.0 = highly confident, 0.5 = somewhat confident, 0.0 = not found)
+           - source: Brief description of where the data came from (e.g., "Company website", "Crunchbase", "LinkedIn profile", "Press release")
+        
+        4. **Field-Specific Formatting:**
+           - Dates: Use YYYY-MM-DD or YYYY format (e.g., "2020-05-15" or "2020")
+           - Currency: Include currency symbol and units (e.g., "$2.5M", "$500K", "$1.2B", "$50M ARR")
+           - Percentages: Include % symbol (e.g., "85%", "12.5%")
+           - Numbers with units: Include units (e.g., "50 employees", "24 months", "120 customers")
+           - Locations: Format as "City, State/Country" (e.g., "San Francisco, CA" or "Bangalore, India")
+           - Funding stages: Use standard format (e.g., "Seed", "Series A", "Series B", "Pre-seed", "Growth")
+           - Team members: Format as "Name - Role" or array of objects
+           - URLs: Full URLs (e.g., "https://linkedin.com/in/username")
+        
+        5. **Confidence Scoring Guidelines:**
+           - 0.9-1.0: Explicitly stated in content, multiple sources agree, very clear
+           - 0.7-0.9: Clearly stated, single reliable source, unambiguous
+           - 0.5-0.7: Implied or inferred from content, reasonably clear
+           - 0.3-0.5: Possible but uncertain, needs verification
+           - 0.0-0.3: Not found or highly uncertain (use null for value)
+        
+        6. **Field Matching Strategies:**
+           - Look for exact field names (e.g., "headquarters", "HQ")
+           - Look for synonyms (e.g., "founded" = "founded_date", "established" = "founded_date")
+           - Look for related phrases (e.g., "based in" = "headquarters", "located in" = "headquarters")
+           - For financial fields, look for currency symbols and numbers together
+           - For dates, look for year mentions or date patterns
+        
+        7. If information is NOT found: Use null for value and 0.0 for confidence
+        8. For arrays/lists: Use JSON arrays ["item1", "item2"]
+        9. Preserve original data format when possible (don't convert unnecessarily)
+        10. Extract ALL available information - don't stop at first match if more data is available
+
+        **Example Output:**
+        {{
+            "founded_date": {{
+                "value": "2020-05-15",
+                "confidence": 0.9,
+                "source": "Company website About page"
+            }},
+            "headquarters": {{
+                "value": "San Francisco, CA",
+                "confidence": 0.85,
+                "source": "Crunchbase and company LinkedIn"
+            }},
+            "customer_acquisition_cost": {{
+                "value": "$3,500",
+                "confidence": 0.7,
+                "source": "Industry report and interview mention"
+            }},
+            "lifetime_value": {{
+                "value": "$850K",
+                "confidence": 0.75,
+                "source": "Public disclosure in pitch deck summary"
+            }}
+        }}
+
+        **IMPORTANT:** 
+        - Extract real data only. If a field is not found in the content, set value to null and confidence to 0.0.
+        - Do not make up or infer data that isn't present.
+        - Search for ALL requested fields ({', '.join(fields)}) - don't skip any.
+        - Be thorough and extract as much information as possible.
+        - If you find partial information, include it with appropriate confidence score.
+
+        Analyze the content carefully and return ONLY the JSON object with extracted fields."""
+        return prompt
+    
+    def _parse_extraction_response(self, response_text: str) -> Dict[str, Any]:
+        """
+        Field values, confidence scores and sources from a field extraction response.
+        
+        Args:
+            response_text: Gemini's answer to _build_extraction_prompt
+            
+        Returns:
+            Dictionary of processed field data (empty when the response is not usable)
+        """
+        # Parse the JSON response using helper function
+        result = self.extract_json_from_response(response_text)
+        
+        if result is None:
+            self.logger.error("Failed to extract JSON from Gemini response")
+            return {}
+        
+        # Extract values and confidence scores
+        processed_data = {}
+        for field, data in result.items():
+            if isinstance(data, dict) and "value" in data:
+                value = data["value"]
+                confidence = data.get("confidence", 0.0)
+                
+                # Only include fields with reasonable confidence
+                if confidence > 0.3:
+                    processed_data[field] = value
+                    processed_data[f"{field}_confidence"] = confidence
+                    processed_data[f"{field}_source"] = data.get("source", "")
+                    
+        self.logger.info(f"Successfully processed {len(processed_data)} fields from Gemini response")
+        return processed_data
+    
     def _extract_field_data(self, content: str, fields: List[str]) -> Dict[str, Any]:
         """
         Extract specific field data from search results with enhanced parsing.
         Uses multiple strategies to find field values.
         
+        Field names and aliases for the whole field set are found in a single pass
+        (utils.term_matcher); the value patterns are then only tried where a name or
+        alias occurs.
+        
         Args:
             content: The search result content
             fields: List of fields to extract
@@ -614,22 +881,10 @@ class PerplexitySearchService:
         """
         extracted_data = {}
         content_lower = content.lower()
-        
-        # Field name mappings for better matching
-        field_aliases = {
-            "founded_date": ["founded", "established", "founding date", "started", "launched"],
-            "headquarters": ["headquarters", "hq", "head office", "base", "located in", "based in", "city"],
-            "company_stage": ["stage", "funding stage", "round", "series", "seed", "growth stage"],
-            "amount_raising": ["raising", "funding round", "seeking", "looking to raise", "target"],
-            "post_money_valuation": ["post-money", "post money valuation", "valued at", "valuation"],
-            "current_revenue": ["revenue", "arr", "annual revenue", "recurring revenue", "income"],
-            "team_size": ["employees", "team size", "headcount", "staff", "people"],
-            "burn_rate": ["burn rate", "monthly burn", "cash burn"],
-            "runway": ["runway", "months remaining", "cash runway"],
-            "customer_acquisition_cost": ["cac", "customer acquisition cost", "acquisition cost"],
-            "lifetime_value": ["ltv", "lifetime value", "customer lifetime value"],
-            "gross_margin": ["gross margin", "margin", "gross profit margin"]
-        }
+        field_aliases = self.FIELD_ALIASES
+        occurrences = term_matcher(self._field_terms(tuple(fields))).find(content_lower)
+        lines = None
+        line_starts = None
         
         for field in fields:
             if field in extracted_data:
@@ -637,16 +892,11 @@ class PerplexitySearchService:
                 
             # Strategy 1: Direct field name match
             field_lower = field.replace('_', ' ').lower()
-            if field_lower in content_lower:
+            positions = occurrences.get(field_lower, [])
+            if any(content_lower.startswith(field_lower, p) for p in positions):
                 # Look for value patterns near the field name
-                patterns = [
-                    rf"{re.escape(field_lower)}\s*[:=]\s*([^\n,]+)",
-                    rf"{re.escape(field_lower)}\s+(?:is|are|was|were)?\s+([^\n,\.]+)",
-                    rf"{re.escape(field_lower)}\s*[-–]\s*([^\n,]+)",
-                ]
-                
-                for pattern in patterns:
-                    match = re.search(pattern, content_lower, re.IGNORECASE)
+                for pattern in _FIELD_VALUE_PATTERNS:
+                    match = _first_match_after(pattern, content_lower, positions, len(field_lower))
                     if match:
                         value = match.group(1).strip()
                         if value and value not in ["not specified", "n/a", "unknown", "tbd", ""]:
@@ -656,10 +906,10 @@ class PerplexitySearchService:
             # Strategy 2: Use field aliases
             if field not in extracted_data and field in field_aliases:
                 for alias in field_aliases[field]:
-                    if alias in content_lower:
+                    positions = occurrences.get(alias, [])
+                    if any(content_lower.startswith(alias, p) for p in positions):
                         # Find the value near the alias
-                        alias_pattern = rf"{re.escape(alias)}\s*[:=]\s*([^\n,\.]+)"
-                        match = re.search(alias_pattern, content_lower, re.IGNORECASE)
+                        match = _first_match_after(_ALIAS_VALUE_PATTERN, content_lower, positions, len(alias))
                         if match:
                             value = match.group(1).strip()
                             if value and value not in ["not specified", "n/a", "unknown", "tbd", ""]:
@@ -670,26 +920,16 @@ class PerplexitySearchService:
             if field not in extracted_data:
                 # Dates (founded_date)
                 if field == "founded_date":
-                    date_patterns = [
-                        r"(?:founded|established|started|launched)\s+(?:in\s+)?(\d{4})",
-                        r"(\d{4})\s+(?:founded|established|started|launched)",
-                        r"since\s+(\d{4})"
-                    ]
-                    for pattern in date_patterns:
-                        match = re.search(pattern, content_lower)
+                    for pattern in _DATE_PATTERNS:
+                        match = pattern.search(content_lower)
                         if match:
                             extracted_data[field] = match.group(1)
                             break
                 
                 # Currency amounts (revenue, valuation, funding)
                 elif field in ["amount_raising", "post_money_valuation", "current_revenue", "pre_money_valuation"]:
-                    currency_patterns = [
-                        r"\$\s*(\d+\.?\d*)\s*[KMkmB]",
-                        r"(\d+\.?\d*)\s*(?:million|billion|thousand)",
-                        r"USD\s*(\d+\.?\d*)\s*[KMkmB]?"
-                    ]
-                    for pattern in currency_patterns:
-                        matches = re.findall(pattern, content_lower)
+                    for pattern in _CURRENCY_PATTERNS:
+                        matches = pattern.findall(content_lower)
                         if matches:
                             # Get the largest value (likely the main amount)
                             extracted_data[field] = f"${matches[-1]}"
@@ -697,12 +937,8 @@ class PerplexitySearchService:
                 
                 # Locations (headquarters)
                 elif field == "headquarters":
-                    location_patterns = [
-                        r"(?:headquarters|hq|base|located|based)\s+(?:in|at)?\s*([A-Z][a-zA-Z\s]+(?:,\s*[A-Z][a-zA-Z\s]+)?)",
-                        r"([A-Z][a-zA-Z]+),\s*([A-Z]{2}|[A-Z][a-zA-Z]+)"
-                    ]
-                    for pattern in location_patterns:
-                        match = re.search(pattern, content, re.IGNORECASE)
+                    for pattern in _LOCATION_PATTERNS:
+                        match = pattern.search(content)
                         if match:
                             location = match.group(0) if len(match.groups()) == 0 else ', '.join(match.groups())
                             if len(location) > 3 and len(location) < 100:
@@ -711,33 +947,49 @@ class PerplexitySearchService:
             
             # Strategy 4: Line-by-line search for structured content
             if field not in extracted_data:
-                lines = content.split('\n')
-                for i, line in enumerate(lines):
-                    line_lower = line.lower()
-                    # Check if line contains field name or alias
-                    search_terms = [field.replace('_', ' ')] + field_aliases.get(field, [])
-                    
-                    for term in search_terms:
-                        if term in line_lower and ':' in line:
-                            parts = line.split(':', 1)
-                            if len(parts) == 2:
-                                value = parts[1].strip()
-                                if value and value not in ["not specified", "n/a", "unknown", "tbd", "", "none"]:
-                                    # Clean up the value
-                                    value = value.rstrip('.,;')
-                                    extracted_data[field] = value
-                                    break
-                    if field in extracted_data:
-                        break
+                if lines is None:
+                    lines = content.split('\n')
+                    # Lower-casing never adds or removes a newline, so line numbers agree
+                    line_starts = [0] + [match.end() for match in re.finditer('\n', content_lower)]
+                # Lines that contain the field name or an alias, in order
+                search_terms = [field.replace('_', ' ')] + field_aliases.get(field, [])
+                candidate_lines = sorted({
+                    bisect_right(line_starts, p) - 1
+                    for term in search_terms
+                    for p in occurrences.get(term.lower(), [])
+                    if content_lower.startswith(term, p)
+                })
+                for i in candidate_lines:
+                    line = lines[i]
+                    if ':' in line:
+                        parts = line.split(':', 1)
+                        if len(parts) == 2:
+                            value = parts[1].strip()
+                            if value and value not in ["not specified", "n/a", "unknown", "tbd", "", "none"]:
+                                # Clean up the value
+                                value = value.rstrip('.,;')
+                                extracted_data[field] = value
+                                break
         
         return extracted_data
     
-    async def enrich_missing_fields(self, memo_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _field_terms(self, fields: Tuple[str, ...]) -> Tuple[str, ...]:
+        """Field names and aliases searched for when extracting fields, lower-cased."""
+        terms = set()
+        for field in fields:
+            terms.add(field.replace('_', ' ').lower())
+            terms.update(alias.lower() for alias in self.FIELD_ALIASES.get(field, []))
+        return tuple(sorted(terms))
+    
+    async def enrich_missing_fields(self, memo_data: Dict[str, Any],
+                                    prefetched: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         Main method to enrich missing fields in memo data with enhanced validation.
         
         Args:
             memo_data: The memo data to enrich
+            prefetched: Category results already researched for this company
+                (see prefetch_company_research)
             
         Returns:
             Enriched memo data with additional fields and confidence scores
@@ -756,82 +1008,158 @@ class PerplexitySearchService:
             
             self.logger.info(f"Enriching {len(missing_fields)} missing fields: {missing_fields}")
             
-            # Get company context - check multiple possible field names
-            company_name = memo_data.get("title", memo_data.get("company_name", "the company"))
-            company_stage = memo_data.get("company_stage", "")
-            industry = memo_data.get("industry_category", memo_data.get("industry", ""))
-            
-            # Handle industry if it's a list
-            if isinstance(industry, list):
-                industry = ", ".join(industry)
-            
-            company_context = f"{company_name}"
-            if company_stage:
-                company_context += f" ({company_stage})"
-            if industry:
-                company_context += f" in {industry}"
-            
             # Enrich missing fields
-            enriched_data = await self._enrich_fields(missing_fields, company_context)
-
-            # Derive Financial Validation block if possible
-            financial_validation = self._build_financial_validation(memo_data, enriched_data)
-            if financial_validation:
-                enriched_data["financial_validation"] = financial_validation
-
-            # Build Market & Claim Validation structure if content available
-            claim_validations = self._build_claim_validations(memo_data, enriched_data)
-            if claim_validations:
-                enriched_data["claim_validations"] = claim_validations
-            
-            # Merge enriched data with validation and confidence scoring
-            result = memo_data.copy()
-            enriched_count = 0
-            enrichment_metadata = {
-                "enrichment_timestamp": str(asyncio.get_event_loop().time()),
-                "fields_enriched": [],
-                "confidence_scores": {},
-                "sources": {}
-            }
-            
-            for field, value in enriched_data.items():
-                if field in missing_fields and value:
-                    # Validate the enriched value
-                    if self._validate_enriched_value(field, value):
-                        # Store in original field
-                        result[field] = value
-                        # Store enriched version for reference
-                        result[f"{field}_enriched"] = value
-                        
-                        # Add confidence and source information
-                        confidence_key = f"{field}_confidence"
-                        source_key = f"{field}_source"
-                        
-                        if confidence_key in enriched_data:
-                            result[confidence_key] = enriched_data[confidence_key]
-                            enrichment_metadata["confidence_scores"][field] = enriched_data[confidence_key]
-                        
-                        if source_key in enriched_data:
-                            result[source_key] = enriched_data[source_key]
-                            enrichment_metadata["sources"][field] = enriched_data[source_key]
-                        
-                        enrichment_metadata["fields_enriched"].append(field)
-                        enriched_count += 1
-                    else:
-                        self.logger.warning(f"Validation failed for enriched field: {field}")
+            plan = self.plan_enrichment(missing_fields, prefetched)
+            enriched_data = await self._enrich_fields(missing_fields, self._company_context(memo_data), prefetched, plan)
             
-            # Add enrichment metadata
-            result["enrichment_metadata"] = enrichment_metadata
-            result["enrichment_success"] = enriched_count > 0
-            result["enrichment_count"] = enriched_count
-            
-            self.logger.info(f"Successfully enriched {enriched_count} fields with confidence scoring")
-            return result
+            return self._merge_enriched_data(memo_data, missing_fields, enriched_data, plan)
             
         except Exception as e:
             self.logger.error(f"Error in enrich_missing_fields: {str(e)}", exc_info=True)
             return memo_data
+    
+    def _company_context(self, memo_data: Dict[str, Any]) -> str:
+        """Company name, stage and industry used in the Perplexity queries."""
+        # Check multiple possible field names
+        company_name = memo_data.get("title", memo_data.get("company_name", "the company"))
+        company_stage = memo_data.get("company_stage", "")
+        industry = memo_data.get("industry_category", memo_data.get("industry", ""))
+        
+        # Handle industry if it's a list
+        if isinstance(industry, list):
+            industry = ", ".join(industry)
+        
+        company_context = f"{company_name}"
+        if company_stage:
+            company_context += f" ({company_stage})"
+        if industry:
+            company_context += f" in {industry}"
+        return company_context
+    
+    def _merge_enriched_data(self, memo_data: Dict[str, Any], missing_fields: List[str],
+                             enriched_data: Dict[str, Any],
+                             plan: Optional[EnrichmentPlan] = None) -> Dict[str, Any]:
+        """
+        Merge validated enriched values into the missing fields of memo_data.
+        
+        Args:
+            memo_data: The memo data being enriched
+            missing_fields: Fields that were missing from memo_data
+            enriched_data: Extracted field data with confidence and source keys
+            plan: Enrichment plan the data came from, recorded in enrichment_metadata
+            
+        Returns:
+            Enriched memo data with additional fields and confidence scores
+        """
+        # Derive Financial Validation block if possible
+        financial_validation = self._build_financial_validation(memo_data, enriched_data)
+        if financial_validation:
+            enriched_data["financial_validation"] = financial_validation
 
+        # Build Market & Claim Validation structure if content available
+        claim_validations = self._build_claim_validations(memo_data, enriched_data)
+        if claim_validations:
+            enriched_data["claim_validations"] = claim_validations
+        
+        # Merge enriched data with validation and confidence scoring
+        result = memo_data.copy()
+        enriched_count = 0
+        enrichment_metadata = {
+            "enrichment_timestamp": str(time.monotonic()),
+            "fields_enriched": [],
+            "confidence_scores": {},
+            "sources": {}
+        }
+        if plan is not None:
+            enrichment_metadata["query_plan"] = plan.to_metadata()
+        
+        for field, value in enriched_data.items():
+            if field in missing_fields and value:
+                # Validate the enriched value
+                if self._validate_enriched_value(field, value):
+                    # Store in original field
+                    result[field] = value
+                    # Store enriched version for reference
+                    result[f"{field}_enriched"] = value
+                    
+                    # Add confidence and source information
+                    confidence_key = f"{field}_confidence"
+                    source_key = f"{field}_source"
+                    
+                    if confidence_key in enriched_data:
+                        result[confidence_key] = enriched_data[confidence_key]
+                        enrichment_metadata["confidence_scores"][field] = enriched_data[confidence_key]
+                    
+                    if source_key in enriched_data:
+                        result[source_key] = enriched_data[source_key]
+                        enrichment_metadata["sources"][field] = enriched_data[source_key]
+                    
+                    enrichment_metadata["fields_enriched"].append(field)
+                    enriched_count += 1
+                else:
+                    self.logger.warning(f"Validation failed for enriched field: {field}")
+        
+        # Add enrichment metadata
+        result["enrichment_metadata"] = enrichment_metadata
+        result["enrichment_success"] = enriched_count > 0
+        result["enrichment_count"] = enriched_count
+        
+        self.logger.info(f"Successfully enriched {enriched_count} fields with confidence scoring")
+        return result
+    
+    async def collect_extraction_prompts(self, memo_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the Perplexity searches for a memo's missing fields and build the Gemini
+        extraction prompts without sending them, so backfills can submit them as one
+        batch prediction job (see services.batch_prediction_service).
+        
+        Args:
+            memo_data: The memo data to enrich
+            
+        Returns:
+            {"missing_fields": [...], "prompts": {query name: prompt}, "query_plan": {...}};
+            a query is named after its category, or its categories joined by "+" when
+            the planner merged them. Queries whose search found nothing have no prompt
+        """
+        missing_fields = self._identify_missing_fields(memo_data)
+        prompts = {}
+        if not self.enabled or not missing_fields:
+            return {"missing_fields": missing_fields, "prompts": prompts}
+        
+        company_context = self._company_context(memo_data)
+        plan = self.plan_enrichment(missing_fields)
+        for query in plan.to_run():
+            try:
+                results = await self._perplexity_search(self._query_text(query, company_context))
+            except Exception as e:
+                self.logger.error(f"Error searching {query.name}: {str(e)}")
+                plan.record(query, STATUS_FAILED)
+                continue
+            plan.record(query, STATUS_SEARCHED if results else STATUS_NO_RESULTS)
+            if results:
+                prompts[query.name] = self._build_extraction_prompt(
+                    results[0]["content"], query.fields, query.name
+                )
+        return {"missing_fields": missing_fields, "prompts": prompts, "query_plan": plan.to_metadata()}
+    
+    def apply_extraction_responses(self, memo_data: Dict[str, Any], missing_fields: List[str],
+                                   responses: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Merge batch prediction answers to collect_extraction_prompts into memo_data.
+        
+        Args:
+            memo_data: The memo data to enrich
+            missing_fields: missing_fields returned by collect_extraction_prompts
+            responses: Category -> response text; failed categories are left out
+            
+        Returns:
+            Enriched memo data, as returned by enrich_missing_fields
+        """
+        enriched_data = {}
+        for category_name, response_text in responses.items():
+            enriched_data.update(self._parse_extraction_response(response_text))
+        return self._merge_enriched_data(memo_data, missing_fields, enriched_data)
+    
     def _build_financial_validation(self, base: Dict[str, Any], enriched: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
             def pick(*keys):
@@ -999,13 +1327,8 @@ class PerplexitySearchService:
             verification_text = response.text.strip()
             
             # Extract JSON from response
-            import json
-            import re
-            
-            # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', verification_text, re.DOTALL)
-            if json_match:
-                verification_data = json.loads(json_match.group())
+            verification_data = loads_tolerant(verification_text, expect="object")
+            if verification_data is not None:
                 return verification_data
             else:
                 self.logger.warning("Could not extract JSON from LinkedIn verification response")
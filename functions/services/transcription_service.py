@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Transcription Service
+Chunked Speech-to-Text for pitch recordings (audio and video).
+
+Synchronous `recognize` only accepts about a minute of audio per request, so local
+media is decoded to PCM, split into fixed-length overlapping segments and the
+segments are transcribed concurrently. Words in the overlap are de-duplicated when
+the segments are stitched back together, and per-segment timestamps are kept.
+
+Media in GCS is routed by size and duration: up to max_chunked_bytes it is read and
+chunked as above, and only longer recordings (or media that cannot be decoded
+locally) go through the long-running `batch_recognize` API. A task waits on a batch
+operation only while its deadline allows; after that BatchTranscriptionPending
+carries the operation to the next task, which resumes polling it instead of starting
+another, until TRANSCRIPTION_BATCH_TIMEOUT_SECONDS have passed overall.
+"""
+
+import io
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.deadline import in_current_context, remaining, rpc_options
+
+try:
+    from google.cloud import speech_v2 as speech
+    SPEECH_AVAILABLE = True
+except ImportError:
+    SPEECH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Sync recognize accepts up to 60 seconds of audio per request
+SEGMENT_SECONDS = 50
+OVERLAP_SECONDS = 5
+TRANSCRIPTION_CONCURRENCY = 4
+BATCH_TIMEOUT_SECONDS = 1800
+BATCH_POLL_SECONDS = 10
+# Held back from a batch wait for handing the operation on to the next task
+BATCH_HANDOFF_RESERVE_SECONDS = 60
+
+# Larger or longer media goes through the batch API instead of chunked recognize
+MAX_CHUNKED_MEDIA_BYTES = 100 * 1024 * 1024
+MAX_CHUNKED_SECONDS = 1800
+
+TARGET_SAMPLE_RATE = 16000
+LANGUAGE_CODES = ["en-US", "en-GB"]
+
+# Longest word run compared when stitching segments without word timestamps
+MAX_TEXT_OVERLAP_WORDS = 40
+
+
+class BatchTranscriptionPending(Exception):
+    """A batch transcription outlived the task's budget; pass to_dict() on to resume it."""
+
+    def __init__(self, operation_name: str, gcs_uri: str, started_at: float):
+        super().__init__(f"Batch transcription of {gcs_uri} is still running ({operation_name})")
+        self.operation_name = operation_name
+        self.gcs_uri = gcs_uri
+        self.started_at = started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"operation_name": self.operation_name, "gcs_uri": self.gcs_uri, "started_at": self.started_at}
+
+
+@dataclass
+class TranscriptWord:
+    """A recognized word with absolute start/end times in seconds."""
+    text: str
+    start: float
+    end: float
+
+
+@dataclass
+class TranscriptSegment:
+    """Transcript of one audio segment."""
+    index: int
+    start_seconds: float
+    end_seconds: float
+    transcript: str
+    words: List[TranscriptWord] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "start_seconds": round(self.start_seconds, 3),
+            "end_seconds": round(self.end_seconds, 3),
+            "transcript": self.transcript,
+        }
+
+
+@dataclass
+class TranscriptionResult:
+    """Stitched transcript plus the segments it was built from."""
+    transcript: str
+    segments: List[TranscriptSegment] = field(default_factory=list)
+    mode: str = "single"
+    duration_seconds: Optional[float] = None
+
+    def segment_dicts(self) -> List[Dict[str, Any]]:
+        return [segment.to_dict() for segment in self.segments]
+
+
+@dataclass
+class PcmAudio:
+    """Decoded PCM audio."""
+    pcm: bytes
+    sample_rate: int
+    sample_width: int
+    channels: int
+
+    @property
+    def frame_size(self) -> int:
+        return self.sample_width * self.channels
+
+    @property
+    def duration_seconds(self) -> float:
+        return len(self.pcm) / float(self.frame_size * self.sample_rate)
+
+    def slice_wav(self, start_seconds: float, end_seconds: float) -> bytes:
+        """Return [start, end) as a standalone WAV file."""
+        start = int(start_seconds * self.sample_rate) * self.frame_size
+        end = int(end_seconds * self.sample_rate) * self.frame_size
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as out:
+            out.setnchannels(self.channels)
+            out.setsampwidth(self.sample_width)
+            out.setframerate(self.sample_rate)
+            out.writeframes(self.pcm[start:end])
+        return buffer.getvalue()
+
+
+def _read_wav(data: bytes) -> PcmAudio:
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return PcmAudio(
+            pcm=wav.readframes(wav.getnframes()),
+            sample_rate=wav.getframerate(),
+            sample_width=wav.getsampwidth(),
+            channels=wav.getnchannels(),
+        )
+
+
+def decode_audio(file_data: bytes) -> Optional[PcmAudio]:
+    """
+    Decode media bytes to PCM.
+
+    WAV is read directly; other formats (mp3, mp4, webm, ...) are converted to 16 kHz
+    mono WAV with ffmpeg when it is installed. Returns None when the media cannot be
+    decoded locally.
+    """
+    if not file_data:
+        return None
+    if file_data[:4] == b"RIFF" and file_data[8:12] == b"WAVE":
+        try:
+            return _read_wav(file_data)
+        except (wave.Error, EOFError) as e:
+            logger.warning(f"Could not read WAV data: {e}")
+
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return None
+    # Containers like mp4 need a seekable input, so go through a temp file
+    with tempfile.NamedTemporaryFile(suffix=".media") as source:
+        source.write(file_data)
+        source.flush()
+        try:
+            completed = subprocess.run(
+                [ffmpeg, "-nostdin", "-loglevel", "error", "-i", source.name,
+                 "-vn", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-f", "wav", "pipe:1"],
+                capture_output=True, check=True, timeout=600,
+            )
+            return _read_wav(completed.stdout)
+        except Exception as e:
+            logger.warning(f"ffmpeg could not decode media: {e}")
+            return None
+
+
+def segment_bounds(duration_seconds: float, segment_seconds: float,
+                   overlap_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration) into fixed-length segments that overlap by overlap_seconds.
+
+    Example: segment_bounds(100, 50, 5) -> [(0, 50), (45, 95), (90, 100)]
+    """
+    step = max(1.0, segment_seconds - max(0.0, overlap_seconds))
+    bounds = []
+    start = 0.0
+    while start < duration_seconds:
+        end = min(duration_seconds, start + segment_seconds)
+        bounds.append((start, end))
+        if end >= duration_seconds:
+            break
+        start += step
+    return bounds
+
+
+def _offset_seconds(offset: Any) -> float:
+    """Convert a proto Duration / timedelta / number to seconds."""
+    if offset is None:
+        return 0.0
+    if isinstance(offset, (int, float)):
+        return float(offset)
+    if hasattr(offset, "total_seconds"):
+        return offset.total_seconds()
+    return float(getattr(offset, "seconds", 0)) + getattr(offset, "nanos", 0) / 1e9
+
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _merge_text_overlap(merged: List[str], words: List[str]) -> List[str]:
+    """Append words, dropping the longest prefix that repeats the tail of merged."""
+    limit = min(len(merged), len(words), MAX_TEXT_OVERLAP_WORDS)
+    tail = [_normalize_word(w) for w in merged[-limit:]] if limit else []
+    head = [_normalize_word(w) for w in words[:limit]]
+    for size in range(limit, 0, -1):
+        if tail[-size:] == head[:size]:
+            return merged + words[size:]
+    return merged + words
+
+
+def stitch_segments(segments: List[TranscriptSegment]) -> str:
+    """
+    Join overlapping segment transcripts into one transcript.
+
+    With word timestamps, each overlap is cut at its midpoint: a segment keeps the
+    words that start between the previous and the next cut. Without timestamps the
+    repeated word run at each boundary is dropped.
+    """
+    segments = sorted(segments, key=lambda s: s.start_seconds)
+    if segments and all(segment.words or not segment.transcript for segment in segments):
+        kept: List[str] = []
+        for i, segment in enumerate(segments):
+            lower = (segments[i - 1].end_seconds + segment.start_seconds) / 2 if i > 0 else float("-inf")
+            upper = (segment.end_seconds + segments[i + 1].start_seconds) / 2 if i + 1 < len(segments) else float("inf")
+            kept.extend(w.text for w in segment.words if lower <= w.start < upper)
+        return " ".join(kept)
+
+    merged: List[str] = []
+    for segment in segments:
+        merged = _merge_text_overlap(merged, segment.transcript.split())
+    return " ".join(merged)
+
+
+def _parse_results(results: Any, time_offset: float = 0.0) -> Tuple[str, List[TranscriptWord]]:
+    """Transcript text and absolute word timings from SpeechRecognitionResults."""
+    texts = []
+    words = []
+    for result in results:
+        if not result.alternatives:
+            continue
+        alternative = result.alternatives[0]
+        if alternative.transcript:
+            texts.append(alternative.transcript.strip())
+        for word in alternative.words:
+            words.append(TranscriptWord(
+                text=word.word,
+                start=time_offset + _offset_seconds(word.start_offset),
+                end=time_offset + _offset_seconds(word.end_offset),
+            ))
+    return " ".join(texts), words
+
+
+class TranscriptionService:
+    """Chunked and batch Speech-to-Text transcription."""
+
+    def __init__(self, speech_client, project: str,
+                 segment_seconds: Optional[float] = None,
+                 overlap_seconds: Optional[float] = None,
+                 concurrency: Optional[int] = None):
+        self.client = speech_client
+        self.project = project
+        self.segment_seconds = segment_seconds or float(os.environ.get("TRANSCRIPTION_SEGMENT_SECONDS", SEGMENT_SECONDS))
+        self.overlap_seconds = overlap_seconds if overlap_seconds is not None else float(
+            os.environ.get("TRANSCRIPTION_OVERLAP_SECONDS", OVERLAP_SECONDS))
+        self.concurrency = concurrency or int(os.environ.get("TRANSCRIPTION_CONCURRENCY", TRANSCRIPTION_CONCURRENCY))
+        self.max_chunked_bytes = int(os.environ.get("TRANSCRIPTION_CHUNKED_MAX_BYTES", MAX_CHUNKED_MEDIA_BYTES))
+        self.max_chunked_seconds = float(os.environ.get("TRANSCRIPTION_CHUNKED_MAX_SECONDS", MAX_CHUNKED_SECONDS))
+        self.batch_timeout_seconds = float(os.environ.get("TRANSCRIPTION_BATCH_TIMEOUT_SECONDS", BATCH_TIMEOUT_SECONDS))
+        self.batch_poll_seconds = BATCH_POLL_SECONDS
+
+    @property
+    def recognizer(self) -> str:
+        return f"projects/{self.project}/locations/global/recognizers/_"
+
+    def _config(self, model: str, audio: Optional[PcmAudio] = None):
+        if audio is not None:
+            decoding = {"explicit_decoding_config": speech.ExplicitDecodingConfig(
+                encoding=speech.ExplicitDecodingConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=audio.sample_rate,
+                audio_channel_count=audio.channels,
+            )}
+        else:
+            decoding = {"auto_decoding_config": speech.AutoDetectDecodingConfig()}
+        return speech.RecognitionConfig(
+            language_codes=LANGUAGE_CODES,
+            model=model,
+            features=speech.RecognitionFeatures(enable_word_time_offsets=True),
+            **decoding,
+        )
+
+    def transcribe(self, file_data: Optional[bytes] = None, gcs_uri: Optional[str] = None,
+                   model: str = "long", media_size: Optional[int] = None,
+                   read_bytes: Optional[Callable[[], bytes]] = None,
+                   pending_batch: Optional[Dict[str, Any]] = None) -> TranscriptionResult:
+        """
+        Transcribe media, chunked when it is short enough and with the batch API otherwise.
+
+        Args:
+            file_data: Media bytes, if already read
+            gcs_uri: gs:// URI of the media, needed for batch transcription
+            model: Speech-to-Text model
+            media_size: Size of the gs:// object; media up to max_chunked_bytes is read
+                with read_bytes and chunked, larger or unknown sizes use batch
+            read_bytes: Reads the gs:// object
+            pending_batch: BatchTranscriptionPending.to_dict() of an earlier task, to
+                resume waiting on its operation
+
+        Raises:
+            BatchTranscriptionPending: a batch operation is still running at the deadline
+
+        Bytes that cannot be decoded locally go to batch when a URI is known and are
+        otherwise sent in a single request as before.
+        """
+        if pending_batch:
+            return self.resume_batch(**pending_batch)
+        if file_data is None and gcs_uri:
+            if read_bytes is None or media_size is None or media_size > self.max_chunked_bytes:
+                return self.transcribe_batch(gcs_uri, model)
+            file_data = read_bytes()
+        if not file_data:
+            raise ValueError("Either file_data or gcs_uri must be provided")
+
+        audio = decode_audio(file_data)
+        if audio is None:
+            if gcs_uri:
+                logger.warning("Media could not be decoded locally, using batch transcription")
+                return self.transcribe_batch(gcs_uri, model)
+            logger.warning("Media could not be decoded locally, transcribing it in a single request")
+            return self.transcribe_single(file_data, model)
+        if gcs_uri and audio.duration_seconds > self.max_chunked_seconds:
+            logger.info(f"{audio.duration_seconds:.0f}s of audio is too long to chunk, using batch transcription")
+            return self.transcribe_batch(gcs_uri, model)
+        return self.transcribe_chunked(audio, model)
+
+    def transcribe_single(self, file_data: bytes, model: str) -> TranscriptionResult:
+        """One synchronous request for the whole payload (short media only)."""
+        request = speech.RecognizeRequest(recognizer=self.recognizer, config=self._config(model), content=file_data)
+        response = self.client.recognize(request=request)
+        transcript, words = _parse_results(response.results)
+        end = words[-1].end if words else 0.0
+        segment = TranscriptSegment(index=0, start_seconds=0.0, end_seconds=end, transcript=transcript, words=words)
+        return TranscriptionResult(transcript=transcript, segments=[segment], mode="single")
+
+    def transcribe_chunked(self, audio: PcmAudio, model: str) -> TranscriptionResult:
+        """Transcribe overlapping segments concurrently and stitch them."""
+        bounds = segment_bounds(audio.duration_seconds, self.segment_seconds, self.overlap_seconds)
+        logger.info(f"Transcribing {audio.duration_seconds:.1f}s of audio in {len(bounds)} segments")
+        config = self._config(model, audio)
+
+        def transcribe_segment(item: Tuple[int, Tuple[float, float]]) -> TranscriptSegment:
+            index, (start, end) = item
+            request = speech.RecognizeRequest(
+                recognizer=self.recognizer, config=config, content=audio.slice_wav(start, end)
+            )
+            response = self.client.recognize(request=request, **rpc_options())
+            transcript, words = _parse_results(response.results, time_offset=start)
+            return TranscriptSegment(index=index, start_seconds=start, end_seconds=end,
+                                     transcript=transcript, words=words)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(bounds)))) as pool:
+            segments = list(pool.map(in_current_context(transcribe_segment), enumerate(bounds)))
+
+        return TranscriptionResult(
+            transcript=stitch_segments(segments),
+            segments=segments,
+            mode="chunked",
+            duration_seconds=audio.duration_seconds,
+        )
+
+    def _batch_wait_seconds(self, started_at: float) -> float:
+        """How long this task may wait on a batch operation before handing it on."""
+        overall = self.batch_timeout_seconds - (time.time() - started_at)
+        if overall <= 0:
+            raise TimeoutError(f"Batch transcription did not finish within {self.batch_timeout_seconds:.0f}s")
+        left = remaining()
+        if left is None:
+            return overall
+        return max(0.0, min(overall, left - BATCH_HANDOFF_RESERVE_SECONDS))
+
+    def transcribe_batch(self, gcs_uri: str, model: str) -> TranscriptionResult:
+        """Transcribe a GCS object with the long-running batch API."""
+        request = speech.BatchRecognizeRequest(
+            recognizer=self.recognizer,
+            config=self._config(model),
+            files=[speech.BatchRecognizeFileMetadata(uri=gcs_uri)],
+            recognition_output_config=speech.RecognitionOutputConfig(
+                inline_response_config=speech.InlineOutputConfig()
+            ),
+        )
+        logger.info(f"Starting batch transcription for {gcs_uri}")
+        started_at = time.time()
+        operation = self.client.batch_recognize(request=request)
+        wait = self._batch_wait_seconds(started_at)
+        try:
+            if wait <= 0:
+                raise FutureTimeoutError()
+            response = operation.result(timeout=wait)
+        except FutureTimeoutError:
+            raise BatchTranscriptionPending(operation.operation.name, gcs_uri, started_at) from None
+        return self._batch_result(response, gcs_uri)
+
+    def resume_batch(self, operation_name: str, gcs_uri: str, started_at: float) -> TranscriptionResult:
+        """Wait on a batch operation started by an earlier task."""
+        logger.info(f"Resuming batch transcription for {gcs_uri} ({operation_name})")
+        stop_at = time.monotonic() + self._batch_wait_seconds(started_at)
+        operation = self.client.get_operation(request={"name": operation_name}, **rpc_options())
+        while not operation.done:
+            if time.monotonic() + self.batch_poll_seconds > stop_at:
+                raise BatchTranscriptionPending(operation_name, gcs_uri, started_at)
+            time.sleep(self.batch_poll_seconds)
+            operation = self.client.get_operation(request={"name": operation_name}, **rpc_options())
+        if operation.error.code:
+            raise RuntimeError(f"Batch transcription failed: {operation.error.message}")
+        return self._batch_result(speech.BatchRecognizeResponse.deserialize(operation.response.value), gcs_uri)
+
+    def _batch_result(self, response: Any, gcs_uri: str) -> TranscriptionResult:
+        file_result = response.results[gcs_uri]
+        if file_result.error and file_result.error.message:
+            raise RuntimeError(f"Batch transcription failed: {file_result.error.message}")
+        transcript_results = file_result.inline_result.transcript.results or file_result.transcript.results
+
+        # Each recognition result covers the audio since the previous result ended
+        segments = []
+        start = 0.0
+        for result in transcript_results:
+            end = _offset_seconds(result.result_end_offset)
+            text, words = _parse_results([result])
+            if text:
+                segments.append(TranscriptSegment(index=len(segments), start_seconds=start,
+                                                  end_seconds=end, transcript=text, words=words))
+            start = end
+
+        return TranscriptionResult(
+            transcript=" ".join(segment.transcript for segment in segments),
+            segments=segments,
+            mode="batch",
+            duration_seconds=start or None,
+        )
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Local test for the batch prediction service
+Runs batch jobs through the local executor and a scripted executor to check that
+results are mapped back by request id, that failed requests are retried, that an
+interrupted job resumes without resubmitting, and that Memo 1 enrichment prompts
+can be collected and applied through a batch. No network access is needed
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import services.perplexity_service as perplexity_module
+from services.batch_prediction_service import (
+    STATUS_RUNNING, STATUS_SUCCEEDED, BatchJob, BatchPredictionService, LocalBatchExecutor, build_request,
+    parse_prediction,
+)
+from services.perplexity_service import PerplexitySearchService
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Answers with answer(prompt); fails prompts containing a failing marker until reset"""
+
+    def __init__(self, answer=lambda prompt: f"answer to {prompt}", failing=()):
+        self._model_name = "publishers/google/models/gemini-test"
+        self.answer = answer
+        self.failing = set(failing)
+        self.prompts = []
+
+    def generate_content(self, contents, **kwargs):
+        self.prompts.append(contents)
+        if any(marker in contents for marker in self.failing):
+            raise RuntimeError("500 Internal error")
+        return FakeResponse(self.answer(contents))
+
+
+class ScriptedExecutor:
+    """Stays running for running_polls status checks, then returns output lines"""
+
+    def __init__(self, running_polls=0, output=None):
+        self.running_polls = running_polls
+        self.output = output
+        self.submitted = []
+
+    def submit(self, job, requests, display_name):
+        self.submitted.append([line["id"] for line in requests])
+        return f"projects/test/batchPredictionJobs/{len(self.submitted)}"
+
+    def status(self, name):
+        if self.running_polls > 0:
+            self.running_polls -= 1
+            return STATUS_RUNNING
+        return STATUS_SUCCEEDED
+
+    def results(self, name):
+        return self.output or []
+
+
+def _no_wait_service(executor):
+    return BatchPredictionService(executor, poll_interval_seconds=0, sleep=lambda seconds: None)
+
+
+def test_prediction_format():
+    """Requests use the GenerateContentRequest format and output lines are parsed to text or error"""
+    print("\nTest: prediction format")
+    request = build_request("Hello", {"temperature": 0.1})
+    assert request == {"contents": [{"role": "user", "parts": [{"text": "Hello"}]}],
+                       "generation_config": {"temperature": 0.1}}
+    ok = {"status": "", "response": {"candidates": [{"content": {"parts": [{"text": "Hi"}, {"text": "!"}]}}]}}
+    assert parse_prediction(ok) == ("Hi!", None)
+    assert parse_prediction({"status": "Quota exceeded"}) == (None, "Quota exceeded")
+    blocked = {"status": "", "response": {"candidates": [{"finishReason": "SAFETY"}]}}
+    assert parse_prediction(blocked)[1] == "no text in response (finish reason SAFETY)"
+    print("  ✅ Request built, text and errors parsed")
+
+
+def test_partial_failure_is_retried():
+    """Failed requests are resubmitted alone in the next round"""
+    print("\nTest: partial failure")
+    with tempfile.TemporaryDirectory() as tmp:
+        job = BatchJob(tmp)
+        for i in range(4):
+            job.add(f"doc-{i}", f"prompt {i}")
+        model = FakeModel(failing=["prompt 2"])
+        service = _no_wait_service(LocalBatchExecutor(model))
+
+        summary = service.run(job, max_rounds=1)
+        assert summary["succeeded"] == 3 and summary["failed"] == 1, summary
+        assert job.failed() == {"doc-2": "500 Internal error"}
+
+        model.failing.clear()
+        model.prompts.clear()
+        summary = service.run(job)
+        assert model.prompts == ["prompt 2"], model.prompts
+        assert summary["succeeded"] == 4 and summary["failed"] == 0 and summary["pending"] == 0
+        assert job.succeeded()["doc-2"] == "answer to prompt 2"
+        assert len(job.state["submissions"]) == 2
+    print("  ✅ 3/4 then the failed request alone")
+
+
+def test_job_resumes_from_disk():
+    """A reopened job keeps its requests and results and resumes a running submission"""
+    print("\nTest: resume")
+    with tempfile.TemporaryDirectory() as tmp:
+        job = BatchJob(tmp)
+        assert job.add("a", "prompt a") and job.add("b", "prompt b")
+        executor = ScriptedExecutor(running_polls=10**6)
+        summary = _no_wait_service(executor).run(job, timeout_seconds=0)
+        assert summary["running"] == "projects/test/batchPredictionJobs/1" and summary["pending"] == 2
+
+        # The process restarts: the same directory resumes the submitted job
+        job = BatchJob(tmp)
+        assert not job.add("a", "prompt a again")
+        assert job.request("a")["request"]["contents"][0]["parts"][0]["text"] == "prompt a"
+        executor.running_polls = 2
+        executor.output = [
+            {"id": "a", "status": "", "response": {"candidates": [{"content": {"parts": [{"text": "A"}]}}]}},
+            {"id": "b", "status": "", "response": {"candidates": [{"content": {"parts": [{"text": "B"}]}}]}},
+        ]
+        summary = _no_wait_service(executor).run(job)
+        assert len(executor.submitted) == 1, executor.submitted
+        assert summary["succeeded"] == 2 and summary["running"] is None
+
+        job.mark_applied(["a"])
+        job = BatchJob(tmp)
+        assert job.succeeded() == {"a": "A", "b": "B"} and job.is_applied("a") and not job.is_applied("b")
+    print("  ✅ Running job resumed, results and applied ids reloaded")
+
+
+def test_results_mapped_without_ids():
+    """Output lines without an id are matched by their prompt; missing lines become failures"""
+    print("\nTest: result mapping")
+    with tempfile.TemporaryDirectory() as tmp:
+        job = BatchJob(tmp)
+        job.add("first", "prompt one")
+        job.add("second", "prompt two")
+        executor = ScriptedExecutor(output=[{
+            "request": build_request("prompt two"), "status": "",
+            "response": {"candidates": [{"content": {"parts": [{"text": "two"}]}}]},
+        }])
+        _no_wait_service(executor).run(job, max_rounds=1)
+        assert job.succeeded() == {"second": "two"}
+        assert job.failed()["first"].startswith("missing from batch output")
+    print("  ✅ Matched by prompt, missing line recorded as failed")
+
+
+def test_memo1_enrichment_through_batch():
+    """Collected extraction prompts run as a batch and merge like online enrichment"""
+    print("\nTest: Memo 1 enrichment batch")
+    saved = (os.environ.get("PERPLEXITY_API_KEY"), perplexity_module.VERTEX_AI_AVAILABLE,
+             PerplexitySearchService._perplexity_search)
+
+    async def search(service, query, max_results=3):
+        return [{"content": "Acme Robotics was founded in 2021 and is based in Pune, India."}]
+
+    os.environ["PERPLEXITY_API_KEY"] = "pplx-test-key-0000"
+    perplexity_module.VERTEX_AI_AVAILABLE = False
+    PerplexitySearchService._perplexity_search = search
+    try:
+        service = PerplexitySearchService(project="test-project")
+        memo = {"title": "Acme Robotics", "industry_category": "Robotics"}
+        extraction = asyncio.run(service.collect_extraction_prompts(memo))
+        assert "founded_date" in extraction["missing_fields"]
+        assert "company_basics" in extraction["prompts"] and "financial_metrics" in extraction["prompts"]
+
+        def answer(prompt):
+            return json.dumps({"founded_date": {"value": "2021", "confidence": 0.9, "source": "Company site"}})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            job = BatchJob(tmp)
+            for category, prompt in extraction["prompts"].items():
+                job.add(f"doc-1/{category}", prompt, metadata={"doc_id": "doc-1", "category": category})
+            model = FakeModel(answer, failing=["**Category:** financial_metrics"])
+            summary = _no_wait_service(LocalBatchExecutor(model)).run(job, max_rounds=1)
+            assert summary["failed"] == 1, summary
+            responses = {job.request(request_id)["metadata"]["category"]: text
+                         for request_id, text in job.succeeded().items()}
+
+        enriched = service.apply_extraction_responses(memo, extraction["missing_fields"], responses)
+        assert enriched["founded_date"] == "2021" and enriched["founded_date_confidence"] == 0.9
+        assert enriched["enrichment_metadata"]["sources"]["founded_date"] == "Company site"
+    finally:
+        key, vertex_available, original_search = saved
+        if key is None:
+            os.environ.pop("PERPLEXITY_API_KEY", None)
+        else:
+            os.environ["PERPLEXITY_API_KEY"] = key
+        perplexity_module.VERTEX_AI_AVAILABLE = vertex_available
+        PerplexitySearchService._perplexity_search = original_search
+    print("  ✅ founded_date applied from the batch, failed category left out")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Batch Prediction")
+    print("=" * 60)
+
+    tests = [
+        test_prediction_format,
+        test_partial_failure_is_retried,
+        test_job_resumes_from_disk,
+        test_results_mapped_without_ids,
+        test_memo1_enrichment_through_batch,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Local test for circuit breakers
+Checks that a breaker opens on failure and slow-call rates, fails fast while open,
+recovers through half-open trials, ignores rate limits and client errors, and that
+Perplexity searches, Gemini gateway calls and regional models fail fast to their
+fallbacks while their breaker is open. No network access is needed
+"""
+
+import asyncio
+import os
+import sys
+
+import services.perplexity_service as perplexity_module
+import utils.circuit_breaker as circuit_breaker
+from services.perplexity_service import PerplexitySearchService
+from utils.circuit_breaker import (
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, BreakerConfig, CircuitBreaker, CircuitBreakerRegistry,
+    CircuitOpenError,
+)
+from utils.llm_gateway import GatewayModel
+from utils.rate_limiter import PERPLEXITY_PROVIDER, VERTEX_PROVIDER, RateLimitError, RetryableError
+from utils.vertex_regions import RegionalModel, VertexRegion, VertexRegionPool
+
+TEST_CONFIG = BreakerConfig(slow_call_seconds=5.0, window_size=10, minimum_calls=4, open_seconds=30.0,
+                            half_open_calls=2)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fail(breaker, error):
+    try:
+        with breaker.guard():
+            raise error
+    except type(error):
+        pass
+
+
+def _succeed(breaker, clock=None, seconds=0.0):
+    with breaker.guard():
+        if clock is not None:
+            clock.now += seconds
+
+
+class InstalledRegistry:
+    """Installs a registry of test breakers inside the with block"""
+
+    def __enter__(self):
+        self._saved = circuit_breaker._circuit_breaker_registry
+        self.registry = CircuitBreakerRegistry({PERPLEXITY_PROVIDER: TEST_CONFIG, VERTEX_PROVIDER: TEST_CONFIG})
+        circuit_breaker._circuit_breaker_registry = self.registry
+        return self.registry
+
+    def __exit__(self, *exc):
+        circuit_breaker._circuit_breaker_registry = self._saved
+        return False
+
+
+def test_opens_and_recovers():
+    """Opens at the failure rate, fails fast, then closes after successful half-open trials"""
+    print("\nTest: open and recover")
+    clock = FakeClock()
+    breaker = CircuitBreaker("test.recover", TEST_CONFIG, clock=clock)
+    _succeed(breaker)
+    _succeed(breaker)
+    _fail(breaker, RetryableError("503", status=503))
+    assert breaker.state == STATE_CLOSED
+    _fail(breaker, ConnectionError("reset"))
+    assert breaker.state == STATE_OPEN
+
+    calls = []
+    try:
+        with breaker.guard():
+            calls.append("sent")
+        raise AssertionError("open breaker let a call through")
+    except CircuitOpenError as e:
+        assert e.retry_in == 30
+    assert not calls
+
+    clock.now += 30
+    assert breaker.state == STATE_HALF_OPEN
+    _succeed(breaker)
+    assert breaker.state == STATE_HALF_OPEN
+    _succeed(breaker)
+    assert breaker.state == STATE_CLOSED and breaker.snapshot()["calls"] == 0
+    print("  ✅ Opened at 2/4 failures, rejected for 30s, closed after 2 trial successes")
+
+
+def test_half_open_failure_reopens():
+    """A failed or slow trial reopens the breaker; extra callers are rejected meanwhile"""
+    print("\nTest: half-open")
+    clock = FakeClock()
+    breaker = CircuitBreaker("test.half_open", TEST_CONFIG, clock=clock)
+    for _ in range(4):
+        _fail(breaker, TimeoutError("timed out"))
+    clock.now += 30
+
+    trial = breaker.guard()
+    trial.__enter__()
+    second = breaker.guard()
+    second.__enter__()
+    try:
+        with breaker.guard():
+            pass
+        raise AssertionError("third caller admitted during half-open")
+    except CircuitOpenError:
+        pass
+    try:
+        trial.__exit__(RetryableError, RetryableError("502", status=502), None)
+    except RetryableError:
+        pass
+    assert breaker.state == STATE_OPEN
+
+    clock.now += 30
+    _succeed(breaker, clock, seconds=6.0)
+    assert breaker.state == STATE_OPEN
+    print("  ✅ Failed trial and slow trial both reopened the breaker")
+
+
+def test_slow_calls_and_ignored_errors():
+    """Slow calls open the breaker; rate limits and client errors do not count"""
+    print("\nTest: slow calls and ignored errors")
+    clock = FakeClock()
+    breaker = CircuitBreaker("test.ignored", TEST_CONFIG, clock=clock)
+    for _ in range(6):
+        _fail(breaker, RateLimitError("429", status=429))
+        _fail(breaker, ValueError("bad prompt"))
+    assert breaker.state == STATE_CLOSED and breaker.snapshot()["failure_rate"] == 0
+
+    for _ in range(7):
+        _succeed(breaker, clock, seconds=6.0)
+    assert breaker.state == STATE_CLOSED
+    _succeed(breaker, clock, seconds=6.0)
+    assert breaker.state == STATE_OPEN
+
+    os.environ["CIRCUIT_BREAKERS"] = "0"
+    try:
+        _succeed(breaker)
+    finally:
+        del os.environ["CIRCUIT_BREAKERS"]
+    print("  ✅ 429s and ValueErrors ignored; 8/10 slow calls opened it; CIRCUIT_BREAKERS=0 bypasses it")
+
+
+class FailingResponse:
+    status = 503
+    headers = {}
+
+    async def text(self):
+        return "upstream unavailable"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FailingSession:
+    def __init__(self):
+        self.posts = 0
+
+    def post(self, *args, **kwargs):
+        self.posts += 1
+        return FailingResponse()
+
+
+def test_perplexity_fails_fast():
+    """Perplexity 5xx responses open its breaker; searches then return [] without a request"""
+    print("\nTest: Perplexity")
+    saved = (os.environ.get("PERPLEXITY_API_KEY"), perplexity_module.VERTEX_AI_AVAILABLE)
+    os.environ["PERPLEXITY_API_KEY"] = "pplx-test-key-0000"
+    perplexity_module.VERTEX_AI_AVAILABLE = False
+    try:
+        with InstalledRegistry() as registry:
+            service = PerplexitySearchService(project="test-project")
+            session = FailingSession()
+
+            async def posts():
+                for _ in range(4):
+                    try:
+                        await service._post(session, {}, {})
+                    except RetryableError:
+                        pass
+                try:
+                    await service._post(session, {}, {})
+                    raise AssertionError("open breaker let a request through")
+                except CircuitOpenError:
+                    pass
+
+            asyncio.run(posts())
+            assert session.posts == 4
+            assert registry.get(PERPLEXITY_PROVIDER).state == STATE_OPEN
+            assert asyncio.run(service._perplexity_search_once("Acme funding")) == []
+            assert registry.snapshot()[PERPLEXITY_PROVIDER]["status"] == "down"
+    finally:
+        key, vertex_available = saved
+        if key is None:
+            os.environ.pop("PERPLEXITY_API_KEY", None)
+        else:
+            os.environ["PERPLEXITY_API_KEY"] = key
+        perplexity_module.VERTEX_AI_AVAILABLE = vertex_available
+    print("  ✅ 4 requests, then an empty result without a request")
+
+
+class RegionModel:
+    def __init__(self, resource_name):
+        self._model_name = resource_name
+        self.region = resource_name.split("/locations/")[1].split("/")[0]
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        return f"{self.region}: {contents}"
+
+
+def test_gemini_fails_fast_and_regions_skip_open_breakers():
+    """The gateway raises CircuitOpenError at once; regional models use the next region"""
+    print("\nTest: Gemini")
+    with InstalledRegistry() as registry:
+        model = RegionModel("projects/p/locations/cb-home/publishers/google/models/gemini-cb")
+        for _ in range(4):
+            _fail(registry.get(VERTEX_PROVIDER), ConnectionError("reset"))
+        try:
+            GatewayModel(model).generate_content("prompt")
+            raise AssertionError("open breaker let a Gemini call through")
+        except CircuitOpenError:
+            pass
+        assert model.calls == 0
+
+        models = {}
+
+        def factory(resource_name):
+            return models.setdefault(resource_name, RegionModel(resource_name))
+
+        pool = VertexRegionPool("p", [VertexRegion("cb-home"), VertexRegion("cb-backup")], model_factory=factory)
+        for _ in range(4):
+            _fail(registry.get(f"{VERTEX_PROVIDER}@cb-home"), ConnectionError("reset"))
+        regional = RegionalModel(pool, "gemini-cb")
+        assert [regional.generate_content("prompt") for _ in range(3)] == ["cb-backup: prompt"] * 3
+        assert pool.snapshot()["regions"]["cb-home"]["consecutive_failures"] == 0
+        assert registry.snapshot()[VERTEX_PROVIDER]["status"] == "degraded"
+    print("  ✅ Gateway failed fast; regional calls served by cb-backup")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Circuit Breakers")
+    print("=" * 60)
+
+    tests = [
+        test_opens_and_recovers,
+        test_half_open_failure_reopens,
+        test_slow_calls_and_ignored_errors,
+        test_perplexity_fails_fast,
+        test_gemini_fails_fast_and_regions_skip_open_breakers,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Local test for deadline propagation
+Checks that a deadline follows calls into coroutines and thread pools, that outbound
+timeouts and retries are bounded by the remaining budget, that calls which cannot
+start in time fail fast, and that optional diligence stages are skipped when the
+budget runs low. Models, Perplexity and Firestore are fakes, so no network access
+is needed
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import services.perplexity_service as perplexity_module
+from agents.diligence_agent import DiligenceAgent
+from services.perplexity_service import PerplexitySearchService
+from utils.deadline import (
+    SKIPPED_STAGES_METRIC, DeadlineExceeded, deadline_scope, has_budget, in_current_context, remaining,
+    reserving, rpc_options, timeout_for, with_deadline,
+)
+from utils.ingestion_checkpoint import STAGE_EXTRACTION, IngestionCheckpoint
+from utils.metrics import get_metrics_registry
+from utils.rate_limiter import (
+    DEFAULT_RATE_LIMITS, VERTEX_PROVIDER, AdaptiveRateLimiter, RetryableError, RetryPolicy, call_with_retry,
+)
+
+
+def test_scopes_and_timeouts():
+    """Scopes nest without extending; timeouts and RPC options follow the remaining budget"""
+    print("\nTest: scopes and timeouts")
+    assert remaining() is None and timeout_for(30) == 30 and rpc_options(10) == {}
+    with deadline_scope(20):
+        assert 19 < remaining() <= 20
+        with deadline_scope(100):
+            assert remaining() <= 20
+        with reserving(15):
+            assert remaining() <= 5
+            assert timeout_for(30) <= 5
+        assert 19 < timeout_for(30) <= 20 and timeout_for(5) == 5
+        options = rpc_options()
+        assert options["timeout"] <= 20 and options["retry"].timeout == options["timeout"]
+    with deadline_scope(0):
+        assert timeout_for(30) == 1.0
+    assert remaining() is None
+
+    @with_deadline(50)
+    def handler():
+        return remaining()
+
+    assert 49 < handler() <= 50 and remaining() is None
+    print("  ✅ Inner scopes capped at 20s; 15s reserved; timeouts bounded")
+
+
+def test_deadline_follows_coroutines_and_threads():
+    """Coroutines inherit the deadline; thread pool work gets it through in_current_context"""
+    print("\nTest: propagation")
+
+    async def budget():
+        await asyncio.sleep(0)
+        return remaining()
+
+    with deadline_scope(30):
+        assert asyncio.run(budget()) <= 30
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(budget()) <= 30
+        finally:
+            loop.close()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            assert pool.submit(remaining).result() is None
+            assert all(left <= 30 for left in pool.map(in_current_context(lambda _: remaining()), range(4)))
+    print("  ✅ asyncio.run, run_until_complete and wrapped pool work saw the deadline")
+
+
+def test_retries_stop_at_the_deadline():
+    """No attempt starts once the budget is spent, and no backoff runs past it"""
+    print("\nTest: retries")
+    limiter = AdaptiveRateLimiter(VERTEX_PROVIDER, "deadline-test", DEFAULT_RATE_LIMITS[VERTEX_PROVIDER])
+    calls = []
+
+    def failing():
+        calls.append(time.monotonic())
+        raise RetryableError("503 unavailable", status=503)
+
+    sleeps = []
+    # Backoff always at its 10s maximum
+    slow_policy = RetryPolicy(max_attempts=5, base_delay=10, max_delay=10, rng=random.Random(0))
+    slow_policy.rng.uniform = lambda low, high: high
+    with deadline_scope(5):
+        try:
+            call_with_retry(failing, VERTEX_PROVIDER, policy=slow_policy, limiter=limiter, sleep=sleeps.append)
+        except RetryableError:
+            pass
+    assert len(calls) == 1 and sleeps == [], (calls, sleeps)
+
+    with deadline_scope(0):
+        try:
+            call_with_retry(failing, VERTEX_PROVIDER, limiter=limiter, sleep=sleeps.append)
+            raise AssertionError("call started after the deadline")
+        except DeadlineExceeded:
+            pass
+    assert len(calls) == 1
+    print("  ✅ One attempt when the 10s backoff exceeded the 5s budget; none at 0s")
+
+
+class RecordingResponse:
+    status = 200
+    headers = {}
+
+    async def text(self):
+        return '{"choices": [{"message": {"content": "ok"}}]}'
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class RecordingSession:
+    def __init__(self):
+        self.timeouts = []
+
+    def post(self, *args, timeout=None, **kwargs):
+        self.timeouts.append(timeout.total)
+        return RecordingResponse()
+
+
+def test_perplexity_timeout_follows_budget():
+    """The Perplexity request timeout shrinks with the budget; a spent budget skips the search"""
+    print("\nTest: Perplexity")
+    saved = (os.environ.get("PERPLEXITY_API_KEY"), perplexity_module.VERTEX_AI_AVAILABLE)
+    os.environ["PERPLEXITY_API_KEY"] = "pplx-test-key-0000"
+    perplexity_module.VERTEX_AI_AVAILABLE = False
+    try:
+        service = PerplexitySearchService(project="test-project")
+        session = RecordingSession()
+        asyncio.run(service._post(session, {}, {}))
+        with deadline_scope(12):
+            asyncio.run(service._post(session, {}, {}))
+        assert session.timeouts[0] == 30 and session.timeouts[1] <= 12, session.timeouts
+        with deadline_scope(0):
+            assert asyncio.run(service._perplexity_search_once("Acme funding")) == []
+    finally:
+        key, vertex_available = saved
+        if key is None:
+            os.environ.pop("PERPLEXITY_API_KEY", None)
+        else:
+            os.environ["PERPLEXITY_API_KEY"] = key
+        perplexity_module.VERTEX_AI_AVAILABLE = vertex_available
+    print(f"  ✅ Timeouts {session.timeouts[0]:.0f}s then {session.timeouts[1]:.1f}s; no search at 0s")
+
+
+class RecordingDocument:
+    def __init__(self):
+        self.calls = []
+
+    def collection(self, name):
+        return self
+
+    def document(self, name):
+        return self
+
+    def get(self, **kwargs):
+        self.calls.append(("get", kwargs))
+        return type("Snapshot", (), {"exists": False})()
+
+    def set(self, data, **kwargs):
+        self.calls.append(("set", kwargs))
+
+
+def test_firestore_calls_are_bounded():
+    """Checkpoint reads and writes carry a timeout and a retry bounded by the budget"""
+    print("\nTest: Firestore")
+    db = RecordingDocument()
+    with deadline_scope(8):
+        checkpoint = IngestionCheckpoint(db, "upload-1", version="v1", source="bucket/deck.pdf")
+        checkpoint.save(STAGE_EXTRACTION, {"status": "SUCCESS"})
+    assert [kind for kind, _ in db.calls] == ["get", "set", "set"]
+    assert all(kwargs["timeout"] <= 8 and kwargs["retry"].timeout <= 8 for _, kwargs in db.calls)
+    print(f"  ✅ {len(db.calls)} Firestore calls bounded to 8s")
+
+
+def test_optional_diligence_stages_skipped():
+    """With little budget left, diligence skips optional research and keeps time for Memo 2"""
+    print("\nTest: diligence stages")
+    registry = get_metrics_registry()
+    registry.reset(SKIPPED_STAGES_METRIC)
+    agent = DiligenceAgent(project="test-project")
+    ran = []
+    captured = {}
+    agent._fetch_memo_1_data = lambda startup_id: {"title": "Acme"}
+    agent._fetch_google_analytics_data = lambda property_id: {}
+    agent._fetch_public_linkedin_data = lambda url, memo: {}
+    agent._fetch_interview_data = lambda startup_id: {}
+    agent._fetch_market_benchmarking = lambda memo: ran.append("market_benchmarking")
+    agent._generate_customer_references = lambda memo: ran.append("customer_references")
+    agent._generate_linkedin_verification = lambda memo: ran.append("linkedin_verification")
+
+    def generate(memo, ga, public, market, interview, references, verification, on_section=None):
+        captured.update(market=market, references=references, verification=verification)
+        return {"executive_summary": {}}
+
+    agent._generate_memo_2 = generate
+    with deadline_scope(agent.MEMO_2_RESERVE_SECONDS + 10):
+        result = agent.run("memo-1", "123", "https://www.linkedin.com/in/founder")
+    assert result["status"] == "SUCCESS" and ran == [], ran
+    assert captured["references"] == [] and captured["verification"] == {}
+    assert captured["market"] == agent._get_default_market_benchmarking()
+    assert registry.value(SKIPPED_STAGES_METRIC, stage="diligence.customer_references") == 1
+
+    with deadline_scope(540):
+        agent.run("memo-1", "123", "https://www.linkedin.com/in/founder")
+    assert ran == ["market_benchmarking", "customer_references", "linkedin_verification"]
+    assert has_budget(10 ** 6, "outside any deadline")
+    print("  ✅ 3 stages skipped with 190s left, all run with 540s")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Deadline Propagation")
+    print("=" * 60)
+
+    tests = [
+        test_scopes_and_timeouts,
+        test_deadline_follows_coroutines_and_threads,
+        test_retries_stop_at_the_deadline,
+        test_perplexity_timeout_follows_budget,
+        test_firestore_calls_are_bounded,
+        test_optional_diligence_stages_skipped,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
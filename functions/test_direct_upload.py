@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Local test for the signed-URL direct upload flow
+Checks session scoping, the signed size limit, single publication when the finalize
+trigger and confirm_upload race, and deletion of rejected objects.
+Uses minimal in-memory Firestore and Storage stand-ins so no GCP access is needed
+"""
+
+import itertools
+import sys
+import threading
+import time
+
+from google.api_core.exceptions import AlreadyExists
+
+from utils.direct_upload import (
+    _can_publish,
+    build_object_name,
+    is_direct_upload_object,
+    register_direct_upload as _register_direct_upload,
+    session_id_from_object_name,
+    start_upload_session,
+    validate_upload_request,
+)
+
+_ids = itertools.count(1)
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store, key):
+        self._store = store
+        self.id = key
+
+    def get(self, field_paths=None):
+        return FakeSnapshot(self._store.get(self.id))
+
+    def set(self, data, merge=False):
+        self._store[self.id] = {**self._store.get(self.id, {}), **data} if merge else dict(data)
+
+    def create(self, data):
+        if self.id in self._store:
+            raise AlreadyExists(f"Document {self.id} already exists")
+        self._store[self.id] = dict(data)
+
+    def update(self, data):
+        self._store[self.id].update(data)
+
+
+_claim_lock = threading.Lock()
+
+
+def memory_claim(db, upload_ref, triggered_by, lease_seconds=120):
+    """In-memory stand-in for the transactional 'uploaded' -> 'publishing' claim"""
+    with _claim_lock:
+        now = time.time()
+        if not _can_publish(upload_ref.get().to_dict(), now):
+            return False
+        upload_ref.update({"status": "publishing", "publishingBy": triggered_by,
+                           "publishLeaseExpiresAt": now + lease_seconds})
+        return True
+
+
+def register_direct_upload(*args, **kwargs):
+    return _register_direct_upload(*args, claim=memory_claim, **kwargs)
+
+
+class FakeCollection:
+    def __init__(self, store):
+        self._store = store
+
+    def document(self, key=None):
+        return FakeDocument(self._store, key or f"session{next(_ids)}")
+
+
+class FakeDB:
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        return FakeCollection(self.collections.setdefault(name, {}))
+
+
+class FakeBlob:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeBucket:
+    name = "test-bucket"
+
+    def blob(self, name):
+        return FakeBlob(name)
+
+
+def fake_sign_url(blob, content_type, ttl_seconds):
+    return f"https://storage.googleapis.com/test-bucket/{blob.name}?ct={content_type}&ttl={ttl_seconds}"
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.messages = []
+
+    def __call__(self, message):
+        self.messages.append(message)
+        return f"msg-{len(self.messages)}"
+
+
+def _start(db, name="Acme Deck.pdf"):
+    return start_upload_session(db, FakeBucket(), name, "application/pdf", file_size=1024,
+                                founder_email="founder@acme.com", sign_url=fake_sign_url)
+
+
+def test_request_validation():
+    """Only supported content types and sizes get a signed URL"""
+    print("\nTest: upload request validation")
+    assert validate_upload_request("deck.pdf", "application/pdf", 1024) is None
+    assert validate_upload_request("pitch.mp4", "video/mp4", None) is None
+    assert validate_upload_request("run.exe", "application/octet-stream", 10) is not None
+    assert validate_upload_request("deck.pdf", "application/pdf", 10 ** 12) is not None
+    assert validate_upload_request("", "application/pdf", 10) is not None
+    print("  ✅ Invalid requests rejected")
+
+
+def test_session_is_scoped_to_one_object():
+    """The session records one private object name and a signed resumable-start URL"""
+    print("\nTest: upload session")
+    db = FakeDB()
+    session = _start(db, name="../../etc/Acme Deck?.pdf")
+
+    object_name = session["object_name"]
+    assert object_name == build_object_name(session["session_id"], "Acme Deck?.pdf")
+    assert object_name.startswith("direct/") and ".." not in object_name and "?" not in object_name
+    assert is_direct_upload_object(object_name)
+    assert session_id_from_object_name(object_name) == session["session_id"] == session["upload_id"]
+    assert session["headers"]["x-goog-resumable"] == "start"
+    assert session["headers"]["x-goog-content-length-range"] == f"0,{2 * 1024 ** 3}"
+    assert object_name in session["upload_url"]
+    stored = db.collections["uploadSessions"][session["session_id"]]
+    assert stored["status"] == "pending" and stored["bucket"] == "test-bucket"
+    print(f"  ✅ {object_name}")
+
+
+def test_finalize_and_confirm_publish_once():
+    """The finalize event and confirm_upload together queue ingestion exactly once"""
+    print("\nTest: idempotent registration")
+    db = FakeDB()
+    session = _start(db)
+    publish = RecordingPublisher()
+
+    first = register_direct_upload(db, session["session_id"], session["object_name"], 1024,
+                                   "application/pdf", publish, triggered_by="finalize_event")
+    second = register_direct_upload(db, session["session_id"], session["object_name"], 1024,
+                                    "application/pdf", publish, triggered_by="confirm_upload")
+
+    assert first["status"] == "queued" and second["status"] == "duplicate"
+    assert len(publish.messages) == 1
+    message = publish.messages[0]
+    assert message["upload_id"] == session["session_id"]
+    assert message["file_path"] == session["object_name"]
+    assert message["founder_email"] == "founder@acme.com"
+    upload = db.collections["uploads"][session["session_id"]]
+    assert upload["status"] == "processing" and upload["message_id"] == "msg-1"
+    assert upload["storageUri"] == f"gs://test-bucket/{session['object_name']}"
+    assert db.collections["uploadSessions"][session["session_id"]]["status"] == "registered"
+    print("  ✅ One ingestion message for two notifications")
+
+
+def test_concurrent_registration_publishes_once():
+    """confirm_upload arriving while the finalize trigger is still publishing does not publish again"""
+    print("\nTest: concurrent registration")
+    db = FakeDB()
+    session = _start(db)
+    publishing = threading.Event()
+    release = threading.Event()
+    messages = []
+
+    def slow_publish(message):
+        messages.append(message)
+        publishing.set()
+        release.wait(5)
+        return "msg-1"
+
+    results = {}
+    finalize = threading.Thread(target=lambda: results.setdefault("finalize", register_direct_upload(
+        db, session["session_id"], session["object_name"], 1024, None, slow_publish)))
+    finalize.start()
+    assert publishing.wait(5)
+    results["confirm"] = register_direct_upload(db, session["session_id"], session["object_name"], 1024, None,
+                                                slow_publish, triggered_by="confirm_upload")
+    release.set()
+    finalize.join(5)
+
+    assert results["confirm"]["status"] == "duplicate" and results["finalize"]["status"] == "queued"
+    assert len(messages) == 1
+    assert db.collections["uploads"][session["session_id"]]["status"] == "processing"
+
+    # A publisher that crashed keeps its claim only until the lease expires
+    assert not _can_publish({"status": "publishing", "publishLeaseExpiresAt": time.time() + 60}, time.time())
+    assert _can_publish({"status": "publishing", "publishLeaseExpiresAt": time.time() - 1}, time.time())
+    print("  ✅ One publish while both paths registered at once")
+
+
+def test_unqueued_upload_is_published_again():
+    """An uploads doc left in 'uploaded' by a failed publish is published on the next call"""
+    print("\nTest: retry after failed publish")
+    db = FakeDB()
+    session = _start(db)
+
+    def failing_publish(message):
+        raise RuntimeError("Pub/Sub unavailable")
+
+    try:
+        register_direct_upload(db, session["session_id"], session["object_name"], 1024, None, failing_publish)
+        assert False, "publish failure should propagate so the trigger is retried"
+    except RuntimeError:
+        pass
+    assert db.collections["uploads"][session["session_id"]]["status"] == "uploaded"
+
+    publish = RecordingPublisher()
+    result = register_direct_upload(db, session["session_id"], session["object_name"], 1024, None, publish)
+    assert result["status"] == "queued" and len(publish.messages) == 1
+    assert publish.messages[0]["content_type"] == "application/pdf"
+    print("  ✅ Re-published")
+
+
+def test_oversize_and_foreign_objects_are_rejected():
+    """Oversize uploads are rejected and deleted, and objects must match their session"""
+    print("\nTest: rejected uploads")
+    db = FakeDB()
+    session = _start(db)
+    publish = RecordingPublisher()
+
+    deleted = []
+    result = register_direct_upload(db, session["session_id"], session["object_name"], 10 ** 12, None, publish,
+                                    delete_object=lambda bucket, name: deleted.append((bucket, name)))
+    assert result["status"] == "rejected" and not publish.messages
+    assert deleted == [("test-bucket", session["object_name"])]
+
+    other = _start(db)
+    try:
+        register_direct_upload(db, other["session_id"], session["object_name"], 1024, None, publish)
+        assert False, "object from another session must be rejected"
+    except ValueError:
+        pass
+    print("  ✅ Nothing published")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Direct Uploads")
+    print("=" * 60)
+
+    tests = [
+        test_request_validation,
+        test_session_is_scoped_to_one_object,
+        test_finalize_and_confirm_publish_once,
+        test_concurrent_registration_publishes_once,
+        test_unqueued_upload_is_published_again,
+        test_oversize_and_foreign_objects_are_rejected,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Local test for the enrichment query planner
+Checks that missing fields are grouped by category, that small groups are merged
+into related searches under the field limit, that searches run in priority order,
+that important searches are skipped once the per-memo call or dollar budget is spent
+while critical ones still run, and that the plan is recorded in enrichment_metadata.
+Perplexity is replaced by a fake, so no network access is needed
+"""
+
+import asyncio
+import os
+import sys
+
+import services.perplexity_service as perplexity_module
+from services.enrichment_planner import (
+    QUERIES_METRIC, STATUS_PREFETCHED, STATUS_SEARCHED, STATUS_SKIPPED, EnrichmentBudget, EnrichmentPlanner,
+)
+from services.perplexity_service import PerplexitySearchService
+from utils.metrics import get_metrics_registry
+
+ALL_MISSING = PerplexitySearchService.CRITICAL_FIELDS + PerplexitySearchService.IMPORTANT_FIELDS
+
+# A memo with most fields filled; the gaps are scattered over five categories
+SPARSE_GAPS = ["headquarters", "team_size", "lead_investor", "current_revenue", "burn_rate", "runway",
+               "market_trends", "exit_strategy"]
+
+
+class RecordingSearch:
+    """Stands in for PerplexitySearchService._perplexity_search"""
+
+    def __init__(self):
+        self.queries = []
+
+    async def __call__(self, service, query, max_results=3):
+        self.queries.append(query)
+        return [{"content": "Headquarters: Pune, India\nLead investor: Accel\nRunway: 18 months"}]
+
+
+class PerplexityFakes:
+    """Sets a Perplexity key, disables Vertex AI, records searches and sets budget variables"""
+
+    BUDGET_VARIABLES = ("ENRICHMENT_MAX_CALLS", "ENRICHMENT_MAX_COST_USD", "PERPLEXITY_COST_PER_CALL_USD")
+
+    def __init__(self, **budget):
+        self.budget = budget
+
+    def __enter__(self):
+        self.search = RecordingSearch()
+        self._saved = (os.environ.get("PERPLEXITY_API_KEY"), perplexity_module.VERTEX_AI_AVAILABLE,
+                       PerplexitySearchService._perplexity_search)
+        os.environ["PERPLEXITY_API_KEY"] = "pplx-test-key-0000"
+        for name in self.BUDGET_VARIABLES:
+            os.environ.pop(name, None)
+        for name, value in self.budget.items():
+            os.environ[name] = str(value)
+        perplexity_module.VERTEX_AI_AVAILABLE = False
+        search = self.search
+        PerplexitySearchService._perplexity_search = lambda service, query, max_results=3: search(service, query)
+        return self
+
+    def __exit__(self, *exc):
+        key, vertex_available, original_search = self._saved
+        if key is None:
+            os.environ.pop("PERPLEXITY_API_KEY", None)
+        else:
+            os.environ["PERPLEXITY_API_KEY"] = key
+        for name in self.BUDGET_VARIABLES:
+            os.environ.pop(name, None)
+        perplexity_module.VERTEX_AI_AVAILABLE = vertex_available
+        PerplexitySearchService._perplexity_search = original_search
+        return False
+
+
+def _planner(budget=None):
+    return EnrichmentPlanner(PerplexitySearchService.FIELD_CATEGORIES, PerplexitySearchService.CRITICAL_FIELDS,
+                             budget)
+
+
+def test_small_groups_are_merged():
+    """Gaps in five categories need two searches; merged queries stay within the field limit"""
+    print("\nTest: merging")
+    plan = _planner().plan(SPARSE_GAPS + ["financial_projections"])
+    assert [q.name for q in plan.queries] == [
+        "company_basics", "financial_metrics+funding_deals+market_intelligence+growth_exit"], plan.to_metadata()
+    merged = plan.queries[1]
+    assert merged.fields == ["lead_investor", "current_revenue", "burn_rate", "runway", "market_trends",
+                             "exit_strategy"]
+    assert merged.priority == "critical" and plan.unplanned_fields == ["financial_projections"]
+
+    tight = EnrichmentPlanner(PerplexitySearchService.FIELD_CATEGORIES, PerplexitySearchService.CRITICAL_FIELDS,
+                              max_fields_per_query=4).plan(SPARSE_GAPS)
+    assert all(len(q.fields) <= 4 for q in tight.queries) and len(tight.queries) == 3, tight.to_metadata()
+    assert len(_planner().plan(ALL_MISSING).queries) == 6
+    print(f"  ✅ 5 categories in {len(plan.queries)} searches, 3 with a 4-field limit; full gaps keep 6")
+
+
+def test_priority_order_and_budget():
+    """Critical searches come first and always run; important ones stop at the budget"""
+    print("\nTest: priority and budget")
+    registry = get_metrics_registry()
+    registry.reset(QUERIES_METRIC)
+    plan = _planner(EnrichmentBudget(max_calls=4)).plan(ALL_MISSING)
+    assert [(q.name, q.status) for q in plan.queries] == [
+        ("company_basics", "planned"), ("financial_metrics", "planned"), ("funding_deals", "planned"),
+        ("team_execution", "planned"), ("growth_exit", STATUS_SKIPPED), ("market_intelligence", STATUS_SKIPPED),
+    ], plan.to_metadata()
+    assert registry.value(QUERIES_METRIC, status=STATUS_SKIPPED) == 2
+
+    by_cost = _planner(EnrichmentBudget(max_cost_usd=0.02, cost_per_call_usd=0.007)).plan(ALL_MISSING)
+    assert by_cost.calls == 3 and [q.name for q in by_cost.to_run()] == [
+        "company_basics", "financial_metrics", "funding_deals"]
+    assert "sam_market_size" in by_cost.to_metadata()["skipped_fields"]
+
+    none_left = _planner(EnrichmentBudget(max_calls=0)).plan(ALL_MISSING, prefetched=["company_basics"])
+    assert [q.name for q in none_left.to_run()] == ["financial_metrics", "funding_deals"]
+    assert none_left.queries[0].status == STATUS_PREFETCHED and none_left.calls == 2
+    print("  ✅ 4-call and $0.02 budgets skip important searches; critical ones run at 0")
+
+
+def test_enrichment_follows_the_plan():
+    """Enrichment runs the planned searches and records the plan in enrichment_metadata"""
+    print("\nTest: enrichment")
+    filled = {field: "Known" for field in ALL_MISSING if field not in SPARSE_GAPS}
+    memo = {"title": "Acme Robotics", "industry_category": "Logistics", **filled}
+    with PerplexityFakes() as fakes:
+        service = PerplexitySearchService(project="test-project")
+        enriched = asyncio.run(service.enrich_missing_fields(memo))
+    assert len(fakes.search.queries) == 2, fakes.search.queries
+    merged_query = fakes.search.queries[1]
+    assert "Lead investor - name of lead investment firm" in merged_query and "Exit strategy" in merged_query
+    assert "Advisory board" not in merged_query
+    assert merged_query.index("Current revenue") < merged_query.index("Lead investor")
+    assert enriched["lead_investor"] == "accel" and enriched["runway"] == "18 months"
+
+    query_plan = enriched["enrichment_metadata"]["query_plan"]
+    assert [q["status"] for q in query_plan["queries"]] == [STATUS_SEARCHED, STATUS_SEARCHED]
+    assert query_plan["calls"] == 2 and query_plan["estimated_cost_usd"] == 0.014
+    print(f"  ✅ {len(SPARSE_GAPS)} gaps enriched with 2 searches; plan recorded")
+
+
+def test_budget_from_environment():
+    """ENRICHMENT_MAX_CALLS limits online enrichment and batch prompt collection"""
+    print("\nTest: budget from environment")
+    memo = {"title": "Acme Robotics", "industry_category": "Logistics"}
+    with PerplexityFakes(ENRICHMENT_MAX_CALLS=3) as fakes:
+        service = PerplexitySearchService(project="test-project")
+        enriched = asyncio.run(service.enrich_missing_fields(memo))
+        assert len(fakes.search.queries) == 3
+        query_plan = enriched["enrichment_metadata"]["query_plan"]
+        assert query_plan["budget"]["max_calls"] == 3 and query_plan["calls"] == 3
+        assert "market_trends" in query_plan["skipped_fields"]
+
+        fakes.search.queries.clear()
+        extraction = asyncio.run(service.collect_extraction_prompts(memo))
+        assert sorted(extraction["prompts"]) == ["company_basics", "financial_metrics", "funding_deals"]
+        assert extraction["query_plan"]["calls"] == 3 and len(fakes.search.queries) == 3
+    with PerplexityFakes(ENRICHMENT_MAX_CALLS="lots") as fakes:
+        assert PerplexitySearchService(project="test-project").plan_enrichment(ALL_MISSING).calls == 6
+    print("  ✅ 3 searches online and in batch collection; invalid value ignored")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Enrichment Planner")
+    print("=" * 60)
+
+    tests = [
+        test_small_groups_are_merged,
+        test_priority_order_and_budget,
+        test_enrichment_follows_the_plan,
+        test_budget_from_environment,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Local equivalence test and benchmark for Perplexity field extraction
+Checks that the single-pass term matcher finds every occurrence of every term and
+that PerplexitySearchService._extract_field_data returns exactly what the previous
+per-field, per-alias implementation returned, on a corpus of recorded-style
+Perplexity answers plus seeded generated ones. The benchmark compares both on
+growing responses. No network access is needed
+"""
+
+import random
+import re
+import sys
+import time
+
+import services.perplexity_service as perplexity_module
+from services.perplexity_service import PerplexitySearchService
+from utils.term_matcher import TermMatcher
+
+SEED = 4242
+ROUNDS = 400
+
+LEGACY_ALIASES = {
+    "founded_date": ["founded", "established", "founding date", "started", "launched"],
+    "headquarters": ["headquarters", "hq", "head office", "base", "located in", "based in", "city"],
+    "company_stage": ["stage", "funding stage", "round", "series", "seed", "growth stage"],
+    "amount_raising": ["raising", "funding round", "seeking", "looking to raise", "target"],
+    "post_money_valuation": ["post-money", "post money valuation", "valued at", "valuation"],
+    "current_revenue": ["revenue", "arr", "annual revenue", "recurring revenue", "income"],
+    "team_size": ["employees", "team size", "headcount", "staff", "people"],
+    "burn_rate": ["burn rate", "monthly burn", "cash burn"],
+    "runway": ["runway", "months remaining", "cash runway"],
+    "customer_acquisition_cost": ["cac", "customer acquisition cost", "acquisition cost"],
+    "lifetime_value": ["ltv", "lifetime value", "customer lifetime value"],
+    "gross_margin": ["gross margin", "margin", "gross profit margin"]
+}
+
+
+def legacy_extract_field_data(content, fields):
+    """The per-field, per-alias extraction _extract_field_data replaced"""
+    extracted_data = {}
+    content_lower = content.lower()
+    field_aliases = LEGACY_ALIASES
+
+    for field in fields:
+        if field in extracted_data:
+            continue
+        field_lower = field.replace('_', ' ').lower()
+        if field_lower in content_lower:
+            patterns = [
+                rf"{re.escape(field_lower)}\s*[:=]\s*([^\n,]+)",
+                rf"{re.escape(field_lower)}\s+(?:is|are|was|were)?\s+([^\n,\.]+)",
+                rf"{re.escape(field_lower)}\s*[-–]\s*([^\n,]+)",
+            ]
+            for pattern in patterns:
+                match = re.search(pattern, content_lower, re.IGNORECASE)
+                if match:
+                    value = match.group(1).strip()
+                    if value and value not in ["not specified", "n/a", "unknown", "tbd", ""]:
+                        extracted_data[field] = value
+                        break
+
+        if field not in extracted_data and field in field_aliases:
+            for alias in field_aliases[field]:
+                if alias in content_lower:
+                    alias_pattern = rf"{re.escape(alias)}\s*[:=]\s*([^\n,\.]+)"
+                    match = re.search(alias_pattern, content_lower, re.IGNORECASE)
+                    if match:
+                        value = match.group(1).strip()
+                        if value and value not in ["not specified", "n/a", "unknown", "tbd", ""]:
+                            extracted_data[field] = value
+                            break
+
+        if field not in extracted_data:
+            if field == "founded_date":
+                date_patterns = [
+                    r"(?:founded|established|started|launched)\s+(?:in\s+)?(\d{4})",
+                    r"(\d{4})\s+(?:founded|established|started|launched)",
+                    r"since\s+(\d{4})"
+                ]
+                for pattern in date_patterns:
+                    match = re.search(pattern, content_lower)
+                    if match:
+                        extracted_data[field] = match.group(1)
+                        break
+            elif field in ["amount_raising", "post_money_valuation", "current_revenue", "pre_money_valuation"]:
+                currency_patterns = [
+                    r"\$\s*(\d+\.?\d*)\s*[KMkmB]",
+                    r"(\d+\.?\d*)\s*(?:million|billion|thousand)",
+                    r"USD\s*(\d+\.?\d*)\s*[KMkmB]?"
+                ]
+                for pattern in currency_patterns:
+                    matches = re.findall(pattern, content_lower)
+                    if matches:
+                        extracted_data[field] = f"${matches[-1]}"
+                        break
+            elif field == "headquarters":
+                location_patterns = [
+                    r"(?:headquarters|hq|base|located|based)\s+(?:in|at)?\s*([A-Z][a-zA-Z\s]+(?:,\s*[A-Z][a-zA-Z\s]+)?)",
+                    r"([A-Z][a-zA-Z]+),\s*([A-Z]{2}|[A-Z][a-zA-Z]+)"
+                ]
+                for pattern in location_patterns:
+                    match = re.search(pattern, content, re.IGNORECASE)
+                    if match:
+                        location = match.group(0) if len(match.groups()) == 0 else ', '.join(match.groups())
+                        if len(location) > 3 and len(location) < 100:
+                            extracted_data[field] = location
+                            break
+
+        if field not in extracted_data:
+            lines = content.split('\n')
+            for i, line in enumerate(lines):
+                line_lower = line.lower()
+                search_terms = [field.replace('_', ' ')] + field_aliases.get(field, [])
+                for term in search_terms:
+                    if term in line_lower and ':' in line:
+                        parts = line.split(':', 1)
+                        if len(parts) == 2:
+                            value = parts[1].strip()
+                            if value and value not in ["not specified", "n/a", "unknown", "tbd", "", "none"]:
+                                value = value.rstrip('.,;')
+                                extracted_data[field] = value
+                                break
+                if field in extracted_data:
+                    break
+
+    return extracted_data
+
+
+# Answers in the shapes Perplexity returns: markdown lists, tables, prose with citations
+RECORDED_ANSWERS = [
+    """**Acme Robotics** is a Series A startup headquartered in Bengaluru, India.
+
+- **Headquarters:** Bengaluru, Karnataka
+- **Founded:** 2019
+- **Funding stage:** Series A (raised $12M in March 2024, led by Sequoia Capital India)[1]
+- **Team size:** approximately 85 employees[2]
+
+The company was founded in 2019 by two IIT alumni and has grown steadily since 2020.""",
+    """### Financial metrics for Acme Robotics
+| Metric | Value |
+|---|---|
+| Current revenue | ₹ 25 Cr ARR (FY24) |
+| Revenue growth rate | 140% YoY |
+| Burn rate | ~$400K per month |
+| Runway | 18 months |
+| CAC | Not specified |
+| LTV | N/A |
+| Gross margin | 62% |
+
+Annual revenue was reported at $3.1 million in 2024 [3]. Monthly burn: $0.4M.""",
+    """Acme is raising a $20 million Series B. The post-money valuation is $120M and the
+pre-money valuation is $100M according to press reports. Lead investor: Accel.
+Committed funding - $8M from existing investors. Use of funds: product development, hiring, expansion.
+Target: close by Q3 2025.""",
+    """Based on available sources, team size information is unknown. The company employs
+roughly 40 people across two offices. Headcount = 42 (LinkedIn, Jan 2025).
+HQ - San Francisco, CA. Located in the Mission district.""",
+    """Founding date: TBD
+Established in 2017 as a subsidiary; launched publicly 2018.
+Stage: seed
+Round: Pre-seed extension, $1.5M
+Series: none
+Valuation: not disclosed""",
+    """Customer acquisition cost (CAC): $120 blended. Customer lifetime value: $2,400.
+LTV:CAC ratio is 20x. Gross profit margin: 71%. Cash runway: 24 months at current burn.
+Months remaining: about 24.""",
+    """No public information on the current revenue was found. Revenue is not specified
+in filings; income: not disclosed. Recurring revenue - roughly USD 2.5M ARR.
+Burn Rate: unknown
+Runway: N/A""",
+    """**Company overview**
+Headquarters: none listed
+Head office: 12 MG Road, Bengaluru
+City: Bengaluru
+Based in India, the company operates in 4 cities.
+Founded – 2021""",
+    """Post money valuation: $45M (2024). Valued at $45 million after the seed round.
+Amount raising: ₹ 40 Cr ($4.8M)
+Seeking: strategic investors
+Looking to raise: $5M by December.""",
+    """The baſe of operations is Pune; ıt was founded ın 2016. HEADQUARTERS: PUNE, INDIA.
+Staff: 120. Team Size is 118 per the 2024 report, employees: 120+.""",
+    """Stage:
+Series A: $10M
+growth stage - expansion
+Funding stage = Series A
+Seed: 2020, $2M""",
+    """Revenue — $5M
+Revenue: $5M, up from $2M
+revenue growth rate: 150%
+ARR = $5.2M; annual revenue $5M.""",
+]
+
+FIELD_SETS = [category["fields"] for category in PerplexitySearchService.FIELD_CATEGORIES.values()]
+ALL_FIELDS = sorted({field for fields in FIELD_SETS for field in fields} | set(LEGACY_ALIASES))
+
+SEPARATORS = [": ", ":", " = ", " - ", " – ", " — ", " is ", " was ", " are ", " ", ", ", ". "]
+VALUES = ["$12M", "$ 4.5 m", "₹ 25 Cr", "2019", "since 2015", "Series A", "seed", "85 employees", "N/A",
+          "not specified", "unknown", "TBD", "none", "", "62%", "18 months", "Bengaluru, India",
+          "San Francisco, CA", "USD 3.2M", "3.5 million", "1.2 billion", "led by Accel.", "approx. 40"]
+FILLER = ["According to Crunchbase", "[1]", "**", "- ", "| ", "The company", "In 2024,", "Notably",
+          "sources indicate", "\n", "\n\n", ";", "."]
+
+
+def service():
+    saved = perplexity_module.VERTEX_AI_AVAILABLE
+    perplexity_module.VERTEX_AI_AVAILABLE = False
+    try:
+        return PerplexitySearchService(project="test-project")
+    finally:
+        perplexity_module.VERTEX_AI_AVAILABLE = saved
+
+
+def random_answer(rng, statements=None):
+    """A response mixing field names, aliases, separators, values and filler"""
+    vocabulary = [field.replace("_", " ") for field in ALL_FIELDS]
+    vocabulary += [alias for aliases in LEGACY_ALIASES.values() for alias in aliases]
+    parts = []
+    for _ in range(statements or rng.randint(1, 25)):
+        term = rng.choice(vocabulary)
+        if rng.random() < 0.3:
+            term = term.title() if rng.random() < 0.5 else term.upper()
+        parts.append(rng.choice(FILLER))
+        parts.append(f"{term}{rng.choice(SEPARATORS)}{rng.choice(VALUES)}")
+        parts.append(rng.choice(["\n", " ", ", ", ". ", "\n- "]))
+    return " ".join(parts)
+
+
+def test_term_matcher_finds_every_occurrence():
+    """Overlapping and prefix terms are all reported, at the positions re.IGNORECASE finds"""
+    print("\nTest: term matcher")
+    terms = ["revenue", "annual revenue", "rev", "arr", "founded", "founded date", "base", "ſeed", "seed"]
+    matcher = TermMatcher(terms)
+    rng = random.Random(SEED)
+    texts = RECORDED_ANSWERS + [random_answer(rng) for _ in range(50)] + ["Annual Revenue, ARRR"]
+    for text in (text.lower() for text in texts):
+        found = matcher.find(text)
+        for term in terms:
+            expected = [m.start() for m in re.finditer(f"(?={re.escape(term)})", text, re.IGNORECASE)]
+            assert found.get(term, []) == expected, (term, text)
+    assert matcher.find("annual revenue")["rev"] == [7] and TermMatcher([]).find("anything") == {}
+    print(f"  ✅ Positions of {len(terms)} terms agree with per-term searches")
+
+
+def test_recorded_answers_match_legacy():
+    """Every category's fields extract exactly as before from the recorded answers"""
+    print("\nTest: recorded answers")
+    extractor = service()
+    checked = 0
+    for answer in RECORDED_ANSWERS:
+        for fields in FIELD_SETS + [ALL_FIELDS, list(reversed(ALL_FIELDS))]:
+            expected = legacy_extract_field_data(answer, fields)
+            actual = extractor._extract_field_data(answer, fields)
+            assert actual == expected, (answer[:60], fields, actual, expected)
+            checked += 1
+    assert extractor._extract_field_data(RECORDED_ANSWERS[0], ["headquarters", "founded_date"]) == {
+        "headquarters": "** bengaluru", "founded_date": "** 2019"}
+    print(f"  ✅ {checked} answer/field set pairs identical")
+
+
+def test_generated_answers_match_legacy():
+    """Seeded random answers, field orders and duplicates extract exactly as before"""
+    print("\nTest: generated answers")
+    extractor = service()
+    rng = random.Random(SEED + 1)
+    filled = 0
+    for _ in range(ROUNDS):
+        answer = random_answer(rng)
+        fields = rng.sample(ALL_FIELDS, rng.randint(1, len(ALL_FIELDS)))
+        if rng.random() < 0.2:
+            fields.append(rng.choice(fields))
+        expected = legacy_extract_field_data(answer, fields)
+        assert extractor._extract_field_data(answer, fields) == expected, (answer, fields)
+        filled += len(expected)
+    print(f"  ✅ {ROUNDS} answers identical ({filled} field values)")
+
+
+def _time(function, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run_benchmark():
+    """Print extraction latency for the single-pass and the previous extraction"""
+    extractor = service()
+    rng = random.Random(SEED)
+    recorded = "\n\n".join(RECORDED_ANSWERS)
+    answers = [(f"generated x{n}", random_answer(rng, n)) for n in (10, 100, 1000)]
+    answers += [(f"recorded x{n}", "\n\n".join([recorded] * n)) for n in (1, 10, 50)]
+
+    print("\n📊 Benchmark: single-pass vs per-alias field extraction")
+    print(f"{'answer':<16} {'fields':<18} {'bytes':>8} {'single_ms':>10} {'legacy_ms':>10}")
+    for name, answer in answers:
+        for field_set, fields in (("financial_metrics", FIELD_SETS[1]), ("all", ALL_FIELDS)):
+            single_ms = _time(extractor._extract_field_data, answer, fields)
+            legacy_ms = _time(legacy_extract_field_data, answer, fields)
+            print(f"{name:<16} {field_set:<18} {len(answer):>8} {single_ms:>10.2f} {legacy_ms:>10.2f}")
+
+
+def main():
+    """Run all tests and the benchmark"""
+    print("🧪 Testing Field Extraction")
+    print("=" * 60)
+
+    tests = [
+        test_term_matcher_finds_every_occurrence,
+        test_recorded_answers_match_legacy,
+        test_generated_answers_match_legacy,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
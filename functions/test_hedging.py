@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Local test for hedged LLM requests
+Uses sleeping fake calls to check that only slow calls are hedged, that the first
+success wins, that the hedge budget caps hedges and that outcomes are counted. The
+simulation at the end compares tail latency with and without hedging on a
+heavy-tailed latency distribution. No network access is needed
+"""
+
+import os
+import random
+import sys
+import time
+
+import utils.hedging as hedging
+from utils.hedging import (
+    HEDGE_METRIC, HEDGE_SAVED_METRIC, HedgeBudget, HedgePolicy, LatencyTracker, hedge_stats, hedged,
+    hedged_call,
+)
+from utils.metrics import get_metrics_registry
+
+FAST_POLICY = HedgePolicy(min_samples=5, initial_delay_seconds=0.05, min_delay_seconds=0.01)
+SIMULATION_POLICY = HedgePolicy(percentile=0.9, min_samples=20, initial_delay_seconds=0.05, min_delay_seconds=0.01)
+
+
+def _reset(budget=None):
+    hedging._latency_tracker = LatencyTracker()
+    hedging._hedge_budget = budget or HedgeBudget(ratio=1.0, burst=10)
+    get_metrics_registry().reset(HEDGE_METRIC)
+    get_metrics_registry().reset(HEDGE_SAVED_METRIC)
+
+
+def _sleeper(seconds, result):
+    def call():
+        time.sleep(seconds)
+        return result
+    return call
+
+
+def _outcome(call_site, outcome):
+    return get_metrics_registry().value(HEDGE_METRIC, call_site=call_site, outcome=outcome)
+
+
+def test_fast_call_is_not_hedged():
+    """A call that returns before the hedge delay runs once"""
+    print("\nTest: fast call")
+    _reset()
+    calls = []
+    result = hedged_call(lambda: calls.append(1) or "primary", "test.fast", policy=FAST_POLICY)
+    assert result == "primary" and len(calls) == 1
+    assert _outcome("test.fast", "not_hedged") == 1
+    print("  ✅ not hedged")
+
+
+def test_slow_call_is_hedged_and_hedge_wins():
+    """A slow primary is hedged; the faster hedge answers and the time saved is recorded"""
+    print("\nTest: hedge wins")
+    _reset()
+    started = time.monotonic()
+    result = hedged_call(_sleeper(0.5, "primary"), "test.slow", hedge_fn=_sleeper(0.01, "hedge"),
+                         policy=FAST_POLICY)
+    elapsed = time.monotonic() - started
+    assert result == "hedge" and elapsed < 0.3, elapsed
+    assert _outcome("test.slow", "hedge_won") == 1
+    time.sleep(0.6)  # the abandoned primary finishes and records its latency
+    saved = get_metrics_registry().value(HEDGE_SAVED_METRIC, call_site="test.slow")
+    assert 0.3 < saved < 0.5, saved
+    stats = hedge_stats()["test.slow"]
+    assert stats["hedge_rate"] == 1.0 and stats["hedge_wins"] == 1 and stats["primary_latency_p99"] >= 0.5
+    print(f"  ✅ answered in {elapsed:.2f}s, {saved:.2f}s saved")
+
+
+def test_failures():
+    """A failed hedge falls back to the primary; when both fail the primary's error is raised"""
+    print("\nTest: failures")
+    _reset()
+
+    def failing_hedge():
+        raise RuntimeError("hedge failed")
+
+    assert hedged_call(_sleeper(0.1, "primary"), "test.failures", hedge_fn=failing_hedge,
+                       policy=FAST_POLICY) == "primary"
+    assert _outcome("test.failures", "primary_won") == 1
+
+    def failing_primary():
+        time.sleep(0.1)
+        raise ValueError("primary failed")
+
+    try:
+        hedged_call(failing_primary, "test.failures", hedge_fn=failing_hedge, policy=FAST_POLICY)
+        raise AssertionError("error was swallowed")
+    except ValueError:
+        pass
+    assert _outcome("test.failures", "failed") == 1
+    print("  ✅ primary result kept, primary error raised")
+
+
+def test_budget_caps_hedges():
+    """Without budget the slow call is awaited instead of hedged"""
+    print("\nTest: hedge budget")
+    _reset(HedgeBudget(ratio=0.0, burst=1))
+    hedge_calls = []
+
+    def hedge():
+        hedge_calls.append(1)
+        return "hedge"
+
+    results = [hedged_call(_sleeper(0.1, "primary"), "test.budget", hedge_fn=hedge, policy=FAST_POLICY)
+               for _ in range(3)]
+    assert results.count("hedge") == 1 and len(hedge_calls) == 1, results
+    assert _outcome("test.budget", "budget_exhausted") == 2
+    print("  ✅ 1 hedge, 2 calls waited for the primary")
+
+
+def test_delay_follows_latency_percentile():
+    """After min_samples the hedge delay is the configured percentile of recent latencies"""
+    print("\nTest: hedge delay")
+    tracker = LatencyTracker()
+    policy = HedgePolicy(min_samples=10, initial_delay_seconds=8.0, min_delay_seconds=0.5, max_delay_seconds=30)
+    assert tracker.hedge_delay("site", policy) == 8.0
+    for latency in range(1, 101):
+        tracker.record("site", latency / 10)
+    assert tracker.hedge_delay("site", policy) == 9.5
+    assert tracker.percentile("site", 0.5) == 5.0
+    print("  ✅ p95 of 0.1..10s is 9.5s")
+
+
+class FakeModel:
+    def __init__(self, latency, text):
+        self._model_name = "publishers/google/models/gemini-test"
+        self.latency = latency
+        self.text = text
+        self.calls = []
+
+    def generate_content(self, contents, **kwargs):
+        self.calls.append(kwargs)
+        time.sleep(self.latency)
+        return self.text
+
+
+def test_hedged_model():
+    """The model proxy hedges to the alternate, passes streams through and can be switched off"""
+    print("\nTest: hedged model")
+    _reset()
+    primary, alternate = FakeModel(0.5, "primary"), FakeModel(0.01, "alternate")
+    model = hedged(primary, "test.model", alternate=alternate, policy=FAST_POLICY)
+    assert model.generate_content("prompt", generation_config={"temperature": 0}) == "alternate"
+    assert alternate.calls == [{"generation_config": {"temperature": 0}}]
+    assert model._model_name.endswith("gemini-test")
+
+    assert model.generate_content("prompt", stream=True) == "primary"
+    assert len(alternate.calls) == 1
+
+    os.environ["LLM_HEDGING"] = "0"
+    try:
+        assert model.generate_content("prompt") == "primary" and len(alternate.calls) == 1
+    finally:
+        del os.environ["LLM_HEDGING"]
+    print("  ✅ alternate answered, stream and LLM_HEDGING=0 not hedged")
+
+
+def run_simulation(calls=300, seed=7):
+    """Print p50/p99 latency of a heavy-tailed call with and without hedging"""
+    rng = random.Random(seed)
+
+    def latency():
+        # Mostly 20-40ms, with a 5% tail of 200-400ms
+        return rng.uniform(0.2, 0.4) if rng.random() < 0.05 else rng.uniform(0.02, 0.04)
+
+    def measure(hedge):
+        timings = []
+        for _ in range(calls):
+            primary, backup = latency(), latency()
+            started = time.monotonic()
+            if hedge:
+                hedged_call(_sleeper(primary, None), "simulation", hedge_fn=_sleeper(backup, None),
+                            policy=SIMULATION_POLICY)
+            else:
+                _sleeper(primary, None)()
+            timings.append(time.monotonic() - started)
+        timings.sort()
+        return timings[len(timings) // 2] * 1000, timings[int(len(timings) * 0.99) - 1] * 1000
+
+    _reset(HedgeBudget(ratio=0.1, burst=3))
+    plain = measure(hedge=False)
+    hedged_latency = measure(hedge=True)
+    stats = hedge_stats()["simulation"]
+    print("\n📊 Simulation: heavy-tailed latency, hedge at p90, budget 10%")
+    print(f"{'mode':<10} {'p50_ms':>8} {'p99_ms':>8}")
+    print(f"{'plain':<10} {plain[0]:>8.1f} {plain[1]:>8.1f}")
+    print(f"{'hedged':<10} {hedged_latency[0]:>8.1f} {hedged_latency[1]:>8.1f}")
+    print(f"hedge rate {stats['hedge_rate']:.1%}, hedge wins {stats['hedge_wins']:.0f}")
+
+
+def main():
+    """Run all tests and the simulation"""
+    print("🧪 Testing Hedged Requests")
+    print("=" * 60)
+
+    tests = [
+        test_fast_call_is_not_hedged,
+        test_slow_call_is_hedged_and_hedge_wins,
+        test_failures,
+        test_budget_caps_hedges,
+        test_delay_follows_latency_percentile,
+        test_hedged_model,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    run_simulation()
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
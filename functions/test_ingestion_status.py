@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Local test for the ingestion status channel
+Exercises the in-memory broker, the SSE stream and status ETags without GCP access
+"""
+
+import os
+import sys
+import threading
+import time
+
+os.environ["INGESTION_STATUS_BACKEND"] = "memory"
+
+from utils.ingestion_status import (
+    compute_status_etag,
+    get_status_broker,
+    parse_stream_timeout,
+    report_ingestion_stage,
+    stream_status_events,
+)
+
+
+def test_stream_emits_each_stage_and_memo_once():
+    """Each stage change yields one status event and the memo id is sent once"""
+    print("\nTest: SSE stream emits stage events and a single memo event")
+
+    def worker():
+        time.sleep(0.1)
+        for stage in ["downloading", "extracting", "extracting", "saving"]:
+            report_ingestion_stage("upload-1", stage)
+        report_ingestion_stage("upload-1", "completed", memo_id="memo-1")
+
+    threading.Thread(target=worker).start()
+    frames = list(stream_status_events("upload-1", timeout_seconds=5, heartbeat_seconds=1))
+    status_frames = [f for f in frames if f.startswith("event: status")]
+    memo_frames = [f for f in frames if f.startswith("event: memo")]
+
+    assert len(status_frames) == 4, frames
+    assert len(memo_frames) == 1, frames
+    assert '"memo_id": "memo-1"' in memo_frames[0]
+    print(f"  ✅ {len(status_frames)} status events, {len(memo_frames)} memo event")
+
+
+def test_late_subscriber_gets_latest_stage():
+    """A subscriber that connects after completion still receives the final state"""
+    print("\nTest: late subscriber replays the latest event")
+    report_ingestion_stage("upload-2", "completed", memo_id="memo-2")
+    frames = list(stream_status_events("upload-2", timeout_seconds=2, heartbeat_seconds=1))
+
+    assert any("memo-2" in f for f in frames if f.startswith("event: memo")), frames
+    assert get_status_broker().latest("upload-2")["stage"] == "completed"
+    print("  ✅ Latest event replayed")
+
+
+def test_status_etag_is_stable():
+    """ETags only change when the status payload changes"""
+    print("\nTest: status ETag stability")
+    first = compute_status_etag({"memoId": None, "status": "processing"})
+    same = compute_status_etag({"status": "processing", "memoId": None})
+    changed = compute_status_etag({"memoId": "memo-3", "status": "SUCCESS"})
+
+    assert first == same
+    assert first != changed
+    print("  ✅ ETag is order-independent and changes with content")
+
+
+def test_stream_timeout_is_bounded():
+    """?timeout= must be a positive number and is capped at the function timeout"""
+    print("\nTest: stream timeout bounds")
+    assert parse_stream_timeout(None) == 540.0
+    assert parse_stream_timeout("30") == 30.0
+    assert parse_stream_timeout("1e9") == 540.0
+    for bad in ["abc", "0", "-5", "nan"]:
+        try:
+            parse_stream_timeout(bad)
+            raise AssertionError(f"{bad!r} was accepted")
+        except ValueError:
+            pass
+    print("  ✅ Clamped to (0, 540], invalid values rejected")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Ingestion Status Channel")
+    print("=" * 60)
+
+    tests = [
+        test_stream_emits_each_stage_and_memo_once,
+        test_late_subscriber_gets_latest_stage,
+        test_status_etag_is_stable,
+        test_stream_timeout_is_bounded,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Local fuzz test and benchmark for JSON extraction
+Generates random JSON values, damages their serialization the way LLM responses
+do (prose, code fences, trailing commas, single quotes, truncation) and checks that
+utils.json_parsing recovers them. The benchmark compares the linear extractor with
+the regex patterns it replaced on large and unbalanced responses
+"""
+
+import json
+import random
+import re
+import sys
+import time
+
+from utils.json_parsing import extract_json, loads_tolerant
+
+SEED = 1337
+ROUNDS = 300
+
+TRICKY_STRINGS = ['{', '}', '[', ']', '"quoted"', "it's", "back\\slash", "line\nbreak", "tab\there",
+                  "```", "₹ 25 Cr", "emoji 🚀", "", "a, b: c", "True"]
+PROSE = ["", "Here is the JSON:\n", "Sure! Based on the deck, ", "Analysis complete.\n\n"]
+EPILOGUE = ["", "\n\nLet me know if you need anything else.", "\nNote: figures are estimates."]
+
+
+def random_string(rng):
+    if rng.random() < 0.4:
+        return rng.choice(TRICKY_STRINGS)
+    return "".join(rng.choice("abcdefghij XYZ_-.0123") for _ in range(rng.randint(0, 12)))
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(["object", "array", "string", "number", "bool", "null"] if depth < 4 else
+                      ["string", "number", "bool", "null"])
+    if kind == "object":
+        return {f"{random_string(rng)}_{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 5))}
+    if kind == "array":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 5))]
+    if kind == "string":
+        return random_string(rng)
+    if kind == "number":
+        return rng.choice([rng.randint(-10**6, 10**6), round(rng.uniform(-1000, 1000), 3)])
+    return rng.choice([True, False]) if kind == "bool" else None
+
+
+def dump(value, rng, trailing_commas=False):
+    """Serialize with random whitespace and, optionally, trailing commas"""
+    space = rng.choice(["", " ", "\n  "])
+    if isinstance(value, dict):
+        members = [f"{json.dumps(k, ensure_ascii=rng.random() < 0.5)}:{space}{dump(v, rng, trailing_commas)}"
+                   for k, v in value.items()]
+        tail = "," if trailing_commas and members else ""
+        return "{" + space + f",{space}".join(members) + tail + space + "}"
+    if isinstance(value, list):
+        items = [dump(v, rng, trailing_commas) for v in value]
+        tail = "," if trailing_commas and items else ""
+        return "[" + f",{space}".join(items) + tail + "]"
+    return json.dumps(value, ensure_ascii=rng.random() < 0.5)
+
+
+def wrap(text, rng):
+    """Surround with prose and, sometimes, a code fence"""
+    if rng.random() < 0.5:
+        text = f"```{rng.choice(['json', ''])}\n{text}\n```"
+    return rng.choice(PROSE) + text + rng.choice(EPILOGUE)
+
+
+def random_container(rng):
+    value = random_value(rng)
+    while not isinstance(value, (dict, list)):
+        value = random_value(rng)
+    return value
+
+
+def test_roundtrip_fuzz():
+    """Wrapped JSON is extracted unchanged"""
+    print("\nTest: round-trip fuzz")
+    rng = random.Random(SEED)
+    for _ in range(ROUNDS):
+        value = random_container(rng)
+        text = wrap(dump(value, rng), rng)
+        extraction = extract_json(text)
+        assert extraction is not None and extraction.value == value, text
+        assert not extraction.truncated
+        assert json.loads(text[extraction.start:extraction.end]) == value
+    print(f"  ✅ {ROUNDS} wrapped values recovered")
+
+
+def test_trailing_comma_fuzz():
+    """Trailing commas are removed without touching string contents"""
+    print("\nTest: trailing comma fuzz")
+    rng = random.Random(SEED + 1)
+    for _ in range(ROUNDS):
+        value = random_container(rng)
+        text = wrap(dump(value, rng, trailing_commas=True), rng)
+        assert loads_tolerant(text) == value, text
+    print(f"  ✅ {ROUNDS} values with trailing commas recovered")
+
+
+def test_truncation_fuzz():
+    """Any prefix of an object yields a subset of its members and the cut is reported"""
+    print("\nTest: truncation fuzz")
+    rng = random.Random(SEED + 2)
+    recovered = 0
+    for _ in range(ROUNDS):
+        value = {f"key_{i}": random_value(rng, 1) for i in range(rng.randint(1, 6))}
+        separator = rng.choice([", ", ",\n  "])
+        members, ends, text = [], [], "{"
+        for key, member in value.items():
+            text += (separator if members else "") + f"{json.dumps(key)}: {json.dumps(member)}"
+            members.append(key)
+            ends.append(len(text))
+        text += "}"
+        cut = rng.randint(1, len(text) - 1)
+        extraction = extract_json("Result: " + text[:cut])
+        if extraction is None:
+            continue
+        recovered += 1
+        assert extraction.truncated and extraction.end == len("Result: ") + cut
+        assert extraction.truncated_path.startswith("$")
+        assert isinstance(extraction.value, dict) and set(extraction.value) <= set(value), text[:cut]
+        # Members that ended before the cut are intact
+        for key, end in zip(members, ends):
+            if end <= cut:
+                assert extraction.value.get(key) == value[key], (key, text[:cut])
+    assert recovered > ROUNDS * 0.9, recovered
+    print(f"  ✅ {recovered}/{ROUNDS} truncated objects recovered")
+
+
+def test_model_mistakes():
+    """Single quotes, bare keys, Python literals, missing commas and mismatched closers"""
+    print("\nTest: model mistakes")
+    cases = {
+        "{'status': 'CONFIRMED', confidence: 0.8}": {"status": "CONFIRMED", "confidence": 0.8},
+        '{"verified": True, "source": None}': {"verified": True, "source": None},
+        '{"a": 1\n "b": 2}': {"a": 1, "b": 2},
+        '{"flags": [{"severity": "HIGH"}}': {"flags": [{"severity": "HIGH"}]},
+        '{“title”: “Acme”}': {"title": "Acme"},
+        'Use the {company} template: {"title": "Acme"}': {"title": "Acme"},
+    }
+    for text, expected in cases.items():
+        extraction = extract_json(text)
+        assert extraction is not None and extraction.value == expected, (text, extraction)
+    assert extract_json('{"red_flags": {"flags": [{"severity": "HI').truncated_path == "$.red_flags.flags[0].severity"
+    assert loads_tolerant("[1, 2] and {\"a\": 1}", expect="object") == {"a": 1}
+    assert loads_tolerant("no json here", default={}) == {}
+    print(f"  ✅ {len(cases)} repaired")
+
+
+def test_unbalanced_input_is_linear():
+    """Megabytes of unbalanced braces are scanned in linear time"""
+    print("\nTest: unbalanced input")
+    started = time.perf_counter()
+    assert extract_json("{" * 1_000_000) is None
+    assert extract_json('{"a": ' * 200_000) is None
+    assert extract_json("} " * 1_000_000) is None
+    elapsed = time.perf_counter() - started
+    assert elapsed < 10, elapsed
+    print(f"  ✅ 3 MB of unbalanced braces in {elapsed:.2f}s")
+
+
+def regex_extract(text):
+    """The fence/greedy-brace pattern the extractor replaced"""
+    match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(1))
+        except json.JSONDecodeError:
+            pass
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _time(function, text, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run_benchmark():
+    """Print extraction latency for the linear extractor and the regex patterns"""
+    rng = random.Random(SEED)
+    memo = {"section_{}".format(i): random_value(rng, 1) for i in range(2000)}
+    body = json.dumps(memo, indent=2)
+
+    print("\n📊 Benchmark: linear extractor vs regex extraction")
+    print(f"{'input':<34} {'bytes':>9} {'linear_ms':>10} {'regex_ms':>10}")
+    inputs = [
+        ("valid memo", body),
+        ("fenced memo with prose", "Here is the memo:\n```json\n" + body + "\n```\nThanks"),
+        ("memo with trailing commas", body.replace("\n}", ",\n}")),
+        ("truncated memo", body[:len(body) // 2]),
+    ]
+    for size in (2_000, 8_000, 32_000):
+        inputs.append((f"unbalanced braces x{size}", "{ " * size + "no closing"))
+    for name, text in inputs:
+        linear_ms = _time(extract_json, text)
+        regex_ms = _time(regex_extract, text, repeat=1)
+        print(f"{name:<34} {len(text):>9} {linear_ms:>10.1f} {regex_ms:>10.1f}")
+
+
+def main():
+    """Run all tests and the benchmark"""
+    print("🧪 Testing JSON Parsing")
+    print("=" * 60)
+
+    tests = [
+        test_roundtrip_fuzz,
+        test_trailing_comma_fuzz,
+        test_truncation_fuzz,
+        test_model_mistakes,
+        test_unbalanced_input_is_linear,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Local test for streaming Memo 2 generation
+Streams a synthetic Memo 2 in small chunks, checks that sections are persisted to
+the diligence report as they close, and that a cut-off memo is completed by
+requesting only the unfinished sections. Gemini and Firestore are replaced by fakes,
+so no network access is needed
+"""
+
+import json
+import sys
+
+from agents.diligence_agent import DiligenceAgent
+from utils.diligence_report import DiligenceReportWriter
+from utils.json_parsing import StreamingObjectParser
+from utils.response_schemas import MEMO_2_SECTIONS
+
+MEMO_2 = {
+    "executive_summary": {"company_name": "Acme Robotics", "recommendation": "BUY"},
+    "founder_credibility_assessment": {"overall_score": 7.5},
+    "red_flags_concerns": {"total_flags": 1, "flags": [{"severity": "LOW", "description": "Thin {moat}"}]},
+    "financial_validation": {"unit_economics": {"cac": "$120", "ltv": "$900"}},
+    "investment_thesis": "Warehouse automation for mid-size 3PLs, \"capital efficient\".",
+    "confidence_score": 7,
+    "key_risks": ["Competition", "Hardware margins"],
+    "investment_recommendation": "BUY",
+}
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamingModel:
+    """Streams scripted responses in small chunks, one script entry per request"""
+
+    def __init__(self, responses, chunk_size=7):
+        self._model_name = "publishers/google/models/gemini-2.5-flash"
+        self.responses = list(responses)
+        self.chunk_size = chunk_size
+        self.requests = []
+
+    def generate_content(self, contents, generation_config=None, stream=False):
+        assert stream, "Memo 2 must be streamed"
+        self.requests.append({"prompt": contents, "config": generation_config or {}})
+        text = self.responses.pop(0)
+        return (FakeChunk(text[i:i + self.chunk_size]) for i in range(0, len(text), self.chunk_size))
+
+
+class FakeDocument:
+    def __init__(self, doc_id):
+        self.id = doc_id
+        self.writes = []
+
+    def set(self, data):
+        self.writes.append(("set", data))
+
+    def update(self, data):
+        self.writes.append(("update", data))
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        assert name == "diligenceReports"
+        return self
+
+    def document(self, doc_id):
+        return self.docs.setdefault(doc_id, FakeDocument(doc_id))
+
+
+def _generate(agent, on_section=None):
+    return agent._generate_memo_2({"title": "Acme Robotics"}, {}, {}, {}, on_section=on_section)
+
+
+def _agent(responses):
+    agent = DiligenceAgent(project="test-project")
+    agent.gemini_model = FakeStreamingModel(responses)
+    return agent
+
+
+def test_parser_yields_sections_as_they_close():
+    """Sections are returned by the chunk that closes them"""
+    print("\nTest: streaming parser")
+    text = "```json\n" + json.dumps(MEMO_2, indent=2) + "\n```"
+    parser = StreamingObjectParser()
+    closed_at = {}
+    for offset in range(0, len(text), 5):
+        for section, _ in parser.feed(text[offset:offset + 5]):
+            closed_at[section] = offset
+    assert parser.members == MEMO_2 and not parser.truncated
+    assert list(closed_at) == list(MEMO_2)
+    assert closed_at["executive_summary"] < len(text) // 4, closed_at
+    print(f"  ✅ {len(closed_at)} sections, first after {closed_at['executive_summary']} of {len(text)} chars")
+
+
+def test_sections_are_persisted_while_streaming():
+    """Each section reaches the report before generation finishes"""
+    print("\nTest: early persistence")
+    db = FakeFirestore()
+    report = DiligenceReportWriter(db, "memo-1", MEMO_2_SECTIONS).start()
+    agent = _agent([json.dumps(MEMO_2)])
+    memo = _generate(agent, on_section=report.section_completed)
+    report.complete(memo, 1.0)
+
+    assert memo == MEMO_2, memo
+    assert report.report_id == "memo-1"
+    writes = db.docs["memo-1"].writes
+    assert writes[0][0] == "set" and writes[0][1]["status"] == "GENERATING"
+    updates = [data for kind, data in writes if kind == "update"]
+    assert [next(k for k in data if k.startswith("memo1_diligence.")) for data in updates] == \
+        [f"memo1_diligence.{section}" for section in MEMO_2]
+    assert [data["progress"] for data in updates] == sorted(data["progress"] for data in updates)
+    assert writes[-1][0] == "set" and writes[-1][1]["status"] == "SUCCESS"
+    assert writes[-1][1]["memo1_diligence"] == MEMO_2 and writes[-1][1]["progress"] == 100
+
+    # A retried task starts the same report over rather than creating another
+    retry = DiligenceReportWriter(db, "memo-1", MEMO_2_SECTIONS).start()
+    retry.fail("timeout")
+    assert list(db.docs) == ["memo-1"]
+    assert writes[-2][0] == "set" and writes[-2][1]["memo1_diligence"] == {}
+    assert writes[-1] == ("update", {"status": "FAILED", "error": "timeout",
+                                     "last_updated": writes[-1][1]["last_updated"]})
+    print(f"  ✅ {len(updates)} section writes before the final report; a retry reuses the memo's report")
+
+
+def test_truncated_memo_requests_remaining_sections():
+    """A cut-off memo keeps its closed sections and continues with the rest"""
+    print("\nTest: continuation after truncation")
+    full = json.dumps(MEMO_2)
+    cut = full.index('"financial_validation"') + 30
+    remaining = {k: v for k, v in MEMO_2.items() if list(MEMO_2).index(k) >= 3}
+    agent = _agent([full[:cut], json.dumps(remaining)])
+    seen = []
+    memo = _generate(agent, on_section=lambda section, value: seen.append(section))
+
+    assert memo == MEMO_2, memo
+    assert seen == list(MEMO_2), seen
+    continuation = agent.gemini_model.requests[1]
+    assert "CONTINUATION" in continuation["prompt"]
+    assert "executive_summary" not in continuation["config"]["response_schema"]["properties"]
+    assert "financial_validation" in continuation["config"]["response_schema"]["properties"]
+    print(f"  ✅ Completed with {len(remaining)} sections from one continuation")
+
+
+def test_repeated_truncation_reports_incomplete_sections():
+    """After the continuation budget the memo lists what is missing"""
+    print("\nTest: continuation budget")
+    full = json.dumps(MEMO_2)
+    cut = full.index('"red_flags_concerns"') + 10
+    agent = _agent([full[:cut], '{"red_flags_concerns": {"total_', '{"red_flags_concerns": {"total_'])
+    memo = _generate(agent)
+
+    assert len(agent.gemini_model.requests) == 1 + DiligenceAgent.MEMO_2_MAX_CONTINUATIONS
+    assert set(memo) - {"incomplete_sections"} == {"executive_summary", "founder_credibility_assessment"}
+    assert memo["incomplete_sections"][0] == "pitch_consistency_check"
+    assert "red_flags_concerns" in memo["incomplete_sections"]
+    print(f"  ✅ {len(memo['incomplete_sections'])} sections reported incomplete")
+
+
+def test_response_without_json_is_a_parse_error():
+    """A response with no JSON object keeps the PARSE_ERROR result"""
+    print("\nTest: no JSON")
+    memo = _generate(_agent(["I cannot produce this analysis."]))
+    assert memo["status"] == "PARSE_ERROR", memo
+    print("  ✅ PARSE_ERROR")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Memo 2 Streaming")
+    print("=" * 60)
+
+    tests = [
+        test_parser_yields_sections_as_they_close,
+        test_sections_are_persisted_while_streaming,
+        test_truncated_memo_requests_remaining_sections,
+        test_repeated_truncation_reports_incomplete_sections,
+        test_response_without_json_is_a_parse_error,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
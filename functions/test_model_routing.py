@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Local test for per-call-site model routing
+Checks routing configuration and overrides, tier generation defaults, fallback to
+the next model when one is unavailable, prompt recording and the offline tier
+evaluation harness. Models are fakes, so no network access is needed
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+import utils.model_routing as model_routing
+from scripts.evaluate_model_tiers import evaluate, load_recordings, score_output
+from utils.metrics import get_metrics_registry
+from utils.model_routing import (
+    ROUTED_CALLS_METRIC, TIER_LITE, TIER_PRO, TIER_STANDARD, ModelRouter, ModelTier, PromptRecorder,
+    load_routing_config,
+)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Records calls; raises error, if given, instead of answering"""
+
+    def __init__(self, name, text="ok", error=None, latency=0.0):
+        self._model_name = f"publishers/google/models/{name}"
+        self.text = text
+        self.error = error
+        self.latency = latency
+        self.calls = []
+
+    def generate_content(self, contents, **kwargs):
+        self.calls.append(kwargs)
+        time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return FakeResponse(self.text)
+
+
+def _router(models, **kwargs):
+    return ModelRouter(model_factory=lambda name: models.setdefault(name, FakeModel(name)), **kwargs)
+
+
+def test_routing_config():
+    """Defaults route short tasks to lite; MODEL_ROUTING overrides routes and tiers"""
+    print("\nTest: routing config")
+    tiers, routes = load_routing_config("")
+    assert routes["investor_matching.why_match"] == TIER_LITE
+    assert ModelRouter(tiers, routes).tier_for("diligence.memo_2").name == TIER_STANDARD
+
+    tiers, routes = load_routing_config(json.dumps({
+        "routes": {"investor_matching.why_match": TIER_PRO, "bad.route": "missing"},
+        "tiers": {TIER_LITE: {"models": ["gemini-test-lite"]}},
+    }))
+    assert routes["investor_matching.why_match"] == TIER_PRO and "bad.route" not in routes
+    assert tiers[TIER_LITE].models == ["gemini-test-lite"]
+    assert tiers[TIER_LITE].generation_config == model_routing.DEFAULT_TIERS[TIER_LITE].generation_config
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"routes": {"qa_generation.followup": TIER_STANDARD}}, f)
+    try:
+        os.environ["MODEL_ROUTING"] = f.name
+        assert load_routing_config()[1]["qa_generation.followup"] == TIER_STANDARD
+    finally:
+        del os.environ["MODEL_ROUTING"]
+        os.unlink(f.name)
+    assert load_routing_config("{not json")[1] == model_routing.DEFAULT_ROUTES
+    print("  ✅ env JSON and file overrides applied, invalid entries ignored")
+
+
+def test_tier_defaults_merge():
+    """Tier generation defaults apply under the call site's explicit settings"""
+    print("\nTest: tier defaults")
+    models = {}
+    router = _router(models)
+    model = router.model_for("investor_matching.why_match")
+    assert model._model_name == "gemini-2.5-flash-lite"
+    assert model.generate_content("prompt", generation_config={"temperature": 0.7}).text == "ok"
+    assert models["gemini-2.5-flash-lite"].calls[-1]["generation_config"] == {
+        "temperature": 0.7, "max_output_tokens": 2048
+    }
+    router.model_for("unrouted.call").generate_content("prompt")
+    assert models["gemini-2.5-flash"].calls[-1]["generation_config"] is None
+
+    # GenerationConfig objects and a positional config are merged the same way
+    from vertexai.generative_models import GenerationConfig
+    model.generate_content("prompt", generation_config=GenerationConfig(temperature=0.3))
+    assert models["gemini-2.5-flash-lite"].calls[-1]["generation_config"] == {
+        "temperature": 0.3, "max_output_tokens": 2048
+    }
+    model.generate_content("prompt", {"max_output_tokens": 64})
+    assert models["gemini-2.5-flash-lite"].calls[-1]["generation_config"]["max_output_tokens"] == 64
+    try:
+        model.generate_content("prompt", {"temperature": 0.1}, generation_config={"temperature": 0.2})
+        raise AssertionError("a config passed twice was accepted")
+    except TypeError:
+        pass
+    print("  ✅ explicit temperature kept, tier max_output_tokens added; GenerationConfig and positional configs merged")
+
+
+def test_fallback_when_unavailable():
+    """A missing model falls back to the next in the chain and is skipped while cooling down"""
+    print("\nTest: fallback")
+    registry = get_metrics_registry()
+    registry.reset(ROUTED_CALLS_METRIC)
+    models = {"gemini-2.5-flash-lite": FakeModel("gemini-2.5-flash-lite",
+                                                 error=google_exceptions.NotFound("model not found"))}
+    router = _router(models)
+    model = router.model_for("perplexity.field_extraction")
+    assert model.generate_content("prompt").text == "ok"
+    assert len(models["gemini-2.5-flash"].calls) == 1
+    assert registry.value(ROUTED_CALLS_METRIC, call_site="perplexity.field_extraction", tier=TIER_LITE,
+                          model="gemini-2.5-flash-lite", outcome="unavailable") == 1
+
+    model.generate_content("prompt")
+    assert len(models["gemini-2.5-flash-lite"].calls) == 1 and len(models["gemini-2.5-flash"].calls) == 2
+    assert model._model_name == "gemini-2.5-flash"
+    assert "gemini-2.5-flash-lite" in router.snapshot()["unavailable_models"]
+    print("  ✅ served by gemini-2.5-flash, flash-lite skipped during cooldown")
+
+
+def test_other_errors_are_raised():
+    """Errors unrelated to availability are raised without trying another model"""
+    print("\nTest: other errors")
+    models = {"gemini-2.5-flash-lite": FakeModel("gemini-2.5-flash-lite", error=ValueError("bad prompt"))}
+    router = _router(models)
+    try:
+        router.model_for("qa_generation.followup").generate_content("prompt")
+        raise AssertionError("ValueError was swallowed")
+    except ValueError:
+        pass
+    assert "gemini-2.5-flash" not in models and not router.snapshot()["unavailable_models"]
+
+    tier = ModelTier("single", ["gemini-only"])
+    models["gemini-only"] = FakeModel("gemini-only", error=google_exceptions.NotFound("gone"))
+    router = ModelRouter({"single": tier}, {}, model_factory=models.get, default_tier="single")
+    try:
+        router.model_for("any").generate_content("prompt")
+        raise AssertionError("NotFound was swallowed")
+    except google_exceptions.NotFound:
+        pass
+    print("  ✅ ValueError raised, exhausted chain raises the last error")
+
+
+def test_prompt_recording():
+    """Text prompts are recorded with the serving model; streams and documents are not"""
+    print("\nTest: prompt recording")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prompts.jsonl")
+        models = {}
+        router = _router(models, recorder=PromptRecorder(path))
+        model = router.model_for("investor_recommendation.rationale")
+        model.generate_content("Why is this a match?")
+        model.generate_content("streamed", stream=True)
+        model.generate_content(["document part", "prompt"])
+        records = load_recordings(path)
+    assert len(records) == 1, records
+    assert records[0]["call_site"] == "investor_recommendation.rationale"
+    assert records[0]["model"] == "gemini-2.5-flash-lite" and records[0]["response"] == "ok"
+    assert records[0]["generation_config"]["max_output_tokens"] == 2048
+    print("  ✅ 1 of 3 calls recorded")
+
+
+def test_evaluation_harness():
+    """Tiers are scored against the recorded response or a reference tier"""
+    print("\nTest: evaluation harness")
+    assert score_output('{"a": 1, "b": [2, 3]}', '```json\n{"a": 1, "b": [2, 4]}\n```') == 2 / 3
+    assert score_output("the market is large", "the market is large") == 1.0
+    assert 0 < score_output("market is small", "the market is large") < 1
+    assert score_output(None, "text") == 0.0
+
+    answers = {"gemini-2.5-flash-lite": '{"status": "CONFIRMED", "confidence": 0.5}',
+               "gemini-2.5-flash": '{"status": "CONFIRMED", "confidence": 0.8}',
+               "gemini-2.5-pro": '{"status": "CONFIRMED", "confidence": 0.8}'}
+    router = ModelRouter(model_factory=lambda name: FakeModel(name, answers[name]))
+    records = [{"call_site": "memo_enrichment.validation_structuring", "prompt": f"prompt {i}",
+                "response": answers["gemini-2.5-flash"]} for i in range(3)]
+    rows = {row["tier"]: row for row in evaluate(records, router, [TIER_LITE, TIER_STANDARD])}
+    assert rows[TIER_LITE]["mean_score"] == 0.5 and rows[TIER_STANDARD]["mean_score"] == 1.0
+    assert rows[TIER_LITE]["n"] == 3 and rows[TIER_LITE]["errors"] == 0
+    assert rows[TIER_LITE]["latency_p95"] is not None
+
+    rows = evaluate(records, router, [TIER_LITE], reference_tier=TIER_PRO)
+    assert rows[0]["mean_score"] == 0.5
+    print("  ✅ lite 0.5, standard 1.0 against recorded responses")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Model Routing")
+    print("=" * 60)
+
+    tests = [
+        test_routing_config,
+        test_tier_defaults_merge,
+        test_fallback_when_unavailable,
+        test_other_errors_are_raised,
+        test_prompt_recording,
+        test_evaluation_harness,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
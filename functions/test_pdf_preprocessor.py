@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Local test and benchmark for PDF preprocessing
+Builds synthetic pitch decks with PyPDF2 (text slides, image-only slides, blank and
+duplicate slides) and compares estimated Gemini input tokens and preprocessing
+latency for compact text input against sending the whole PDF
+"""
+
+import io
+import sys
+import time
+
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject, NumberObject
+
+from utils.pdf_preprocessor import PageExtractCache, estimate_native_tokens, preprocess_pdf
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_synthetic_deck(slides):
+    """
+    Build a PDF from slide specs.
+
+    Each slide is ("text", title, [lines]), ("image",) or ("blank",).
+    """
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+
+    for index, slide in enumerate(slides):
+        page = PageObject.create_blank_page(width=792, height=612)
+        resources = DictionaryObject({NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})})
+        stream = DecodedStreamObject()
+
+        if slide[0] == "text":
+            _, title, lines = slide
+            ops = [f"BT /F1 28 Tf 50 540 Td ({_escape(title)}) Tj ET"]
+            for line_index, line in enumerate(lines):
+                ops.append(f"BT /F1 14 Tf 60 {480 - line_index * 22} Td ({_escape(line)}) Tj ET")
+            stream.set_data("\n".join(ops).encode("latin-1"))
+        elif slide[0] == "image":
+            image = DecodedStreamObject()
+            image.set_data(bytes([(index * 37 + i) % 256 for i in range(16 * 16 * 3)]))
+            image.update({
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Image"),
+                NameObject("/Width"): NumberObject(16),
+                NameObject("/Height"): NumberObject(16),
+                NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+                NameObject("/BitsPerComponent"): NumberObject(8),
+            })
+            resources[NameObject("/XObject")] = DictionaryObject({NameObject("/Im1"): writer._add_object(image)})
+            stream.set_data(b"q 792 0 0 612 0 0 cm /Im1 Do Q")
+        else:
+            stream.set_data(b"")
+
+        page[NameObject("/Resources")] = resources
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        writer.add_page(page)
+
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def synthetic_slides(page_count):
+    """A typical deck: mostly text slides with a few image, blank and repeated slides"""
+    slides = []
+    for i in range(page_count):
+        if i % 9 == 4:
+            slides.append(("image",))
+        elif i % 11 == 7:
+            slides.append(("blank",))
+        elif i % 13 == 10:
+            slides.append(slides[1])
+        else:
+            slides.append(("text", f"Slide {i}: Traction and Market", [
+                f"- ARR grew to ${i + 1}.2M with {i * 3 + 40}% YoY growth",
+                f"- {i * 10 + 120} enterprise customers across 4 regions",
+                "- Net revenue retention 128%, CAC payback 9 months",
+                "- Team of 24 including ex-founders and domain experts",
+            ]))
+    return slides
+
+
+def test_page_classification():
+    """Text, image-only, blank and duplicate pages are classified correctly"""
+    print("\nTest: page classification")
+    text_slide = ("text", "Problem", ["- SMBs lose 20% of revenue to late payments", "- Existing tools are manual"])
+    pdf = build_synthetic_deck([
+        text_slide,
+        ("image",),
+        ("blank",),
+        text_slide,
+        ("text", "Market", ["- TAM $40B, SAM $6B, SOM $400M"]),
+    ])
+    deck = preprocess_pdf(pdf, cache=PageExtractCache())
+
+    assert deck.page_count == 5
+    assert deck.pages[0].title == "Problem", deck.pages[0]
+    assert deck.image_page_numbers == [2]
+    assert deck.pages[2].near_empty and not deck.pages[2].has_images
+    assert deck.pages[3].duplicate_of == 1
+    assert sorted(deck.skipped_page_numbers) == [3, 4]
+    assert "# Problem" in deck.compact_text and "TAM $40B" in deck.compact_text
+    assert deck.compact_text.count("late payments") == 1
+    assert len(PdfReader(io.BytesIO(deck.image_pages_pdf)).pages) == 1
+    print(f"  ✅ Stats: {deck.stats()}")
+
+
+def test_page_cache_hits_on_reupload():
+    """Re-processing a deck with shared slides hits the page cache"""
+    print("\nTest: page extract cache")
+    cache = PageExtractCache()
+    pdf = build_synthetic_deck(synthetic_slides(12))
+    first = preprocess_pdf(pdf, cache=cache)
+    second = preprocess_pdf(pdf, cache=cache)
+
+    assert first.cache_hits < second.cache_hits == 12
+    assert first.compact_text == second.compact_text
+    print(f"  ✅ Cache hits: first={first.cache_hits}, second={second.cache_hits}")
+
+
+def test_compact_input_uses_fewer_tokens():
+    """Compact input is cheaper than sending every page as an image"""
+    print("\nTest: compact vs native token estimate")
+    deck = preprocess_pdf(build_synthetic_deck(synthetic_slides(20)), cache=PageExtractCache())
+    stats = deck.stats()
+    assert stats["estimated_tokens"] < stats["estimated_native_tokens"], stats
+    print(f"  ✅ {stats['estimated_tokens']} vs {stats['estimated_native_tokens']} tokens")
+
+
+def run_benchmark(page_counts=(10, 25, 50, 100)):
+    """Print estimated tokens and preprocessing latency for synthetic decks"""
+    print("\n📊 Benchmark: compact text input vs native PDF input")
+    print(f"{'pages':>6} {'native_tokens':>14} {'compact_tokens':>15} {'saving':>8} {'cold_ms':>9} {'warm_ms':>9}")
+    for page_count in page_counts:
+        pdf = build_synthetic_deck(synthetic_slides(page_count))
+        cache = PageExtractCache()
+
+        started = time.perf_counter()
+        deck = preprocess_pdf(pdf, cache=cache)
+        cold_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        preprocess_pdf(pdf, cache=cache)
+        warm_ms = (time.perf_counter() - started) * 1000
+
+        native = estimate_native_tokens(page_count)
+        compact = deck.stats()["estimated_tokens"]
+        print(f"{page_count:>6} {native:>14} {compact:>15} {1 - compact / native:>7.0%} {cold_ms:>9.1f} {warm_ms:>9.1f}")
+
+
+def main():
+    """Run all tests and the benchmark"""
+    print("🧪 Testing PDF Preprocessor")
+    print("=" * 60)
+
+    tests = [
+        test_page_classification,
+        test_page_cache_hits_on_reupload,
+        test_compact_input_uses_fewer_tokens,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    run_benchmark()
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
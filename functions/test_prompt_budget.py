@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Local test for prompt budgeting
+Checks compact serialization of prompt sections, that over-budget prompts reduce
+the lowest-priority sections first (summarizing where a summarizer is given), and
+that per-section token usage is recorded for every call. No network access is needed
+"""
+
+import json
+import sys
+
+from utils.metrics import get_metrics_registry
+from utils.prompt_budget import (
+    PROMPT_TOKENS_METRIC, TRUNCATION_MARKER, PromptSection, build_prompt, compact_json,
+    estimate_tokens, fit_sections,
+)
+
+MEMO_1 = {
+    "title": "Acme Robotics",
+    "founder_name": "A. Founder",
+    "market_size": None,
+    "competition": [],
+    "traction": {"arr": "$1.2M", "customers": 14, "notes": ""},
+    "key_risks": ["Competition", "Competition", "Hardware margins"],
+    "citations": ["https://example.com/a", "https://example.com/b"],
+    "valuation": "Not specified",
+    "is_profitable": False,
+}
+
+TRANSCRIPT = " ".join(f"Q{i}: How many pilots converted? A{i}: Nine of fourteen, mostly 3PLs." for i in range(400))
+
+
+def test_compact_json():
+    """Nulls, empties, placeholders, citations and duplicates are dropped"""
+    print("\nTest: compact serialization")
+    compact = compact_json(MEMO_1)
+    assert json.loads(compact) == {
+        "title": "Acme Robotics",
+        "founder_name": "A. Founder",
+        "traction": {"arr": "$1.2M", "customers": 14},
+        "key_risks": ["Competition", "Hardware margins"],
+        "is_profitable": False,
+    }, compact
+    assert estimate_tokens(compact) < estimate_tokens(json.dumps(MEMO_1, indent=2)) / 2
+    assert compact_json("  plain text \n") == "plain text"
+    print(f"  ✅ {estimate_tokens(json.dumps(MEMO_1, indent=2))} -> {estimate_tokens(compact)} tokens")
+
+
+def test_within_budget_is_untouched():
+    """Sections that fit are only compacted"""
+    print("\nTest: within budget")
+    budgeted = build_prompt("Memo: {memo}\nTranscript: {transcript}", [
+        PromptSection("memo", MEMO_1, priority=0),
+        PromptSection("transcript", TRANSCRIPT[:400], priority=2),
+    ], budget_tokens=10_000, call_site="test.within_budget")
+    assert budgeted.text == f"Memo: {compact_json(MEMO_1)}\nTranscript: {TRANSCRIPT[:400].strip()}"
+    assert [u.action for u in budgeted.usage] == ["kept", "kept"]
+    assert not budgeted.over_budget
+    print(f"  ✅ {budgeted.total_tokens} tokens")
+
+
+def test_lowest_priority_reduced_first():
+    """The lowest-priority section absorbs the overflow before higher ones"""
+    print("\nTest: priority order")
+    budgeted = fit_sections([
+        PromptSection("memo", MEMO_1, priority=0),
+        PromptSection("benchmarks", TRANSCRIPT, priority=2, min_tokens=100),
+        PromptSection("references", TRANSCRIPT, priority=4, min_tokens=100),
+    ], budget_tokens=estimate_tokens(TRANSCRIPT) + 400, call_site="test.priority")
+    usage = {u.name: u for u in budgeted.usage}
+    assert usage["memo"].action == "kept"
+    assert usage["references"].action == "truncated" and usage["benchmarks"].action == "kept"
+    assert budgeted.sections["references"].endswith(TRUNCATION_MARKER)
+    assert not budgeted.over_budget, budgeted.total_tokens
+
+    budgeted = fit_sections([
+        PromptSection("memo", MEMO_1, priority=0),
+        PromptSection("benchmarks", TRANSCRIPT, priority=2, min_tokens=100),
+        PromptSection("references", TRANSCRIPT, priority=4, min_tokens=100),
+    ], budget_tokens=400, call_site="test.priority")
+    usage = {u.name: u for u in budgeted.usage}
+    assert usage["references"].tokens <= 100 and usage["benchmarks"].action == "truncated"
+    assert not budgeted.over_budget, budgeted.total_tokens
+    assert budgeted.sections["memo"] == compact_json(MEMO_1)
+    print(f"  ✅ references then benchmarks reduced, memo kept ({budgeted.total_tokens} tokens)")
+
+
+def test_caps_and_summaries():
+    """max_tokens caps a section; a summarizer replaces truncation and its failures fall back"""
+    print("\nTest: caps and summaries")
+    calls = []
+
+    def summarize(text, max_tokens):
+        calls.append(max_tokens)
+        return "Nine of fourteen pilots converted, mostly 3PLs."
+
+    budgeted = fit_sections([
+        PromptSection("deck", TRANSCRIPT, priority=1, max_tokens=750),
+        PromptSection("interview", TRANSCRIPT, priority=2, summarize=summarize),
+    ], budget_tokens=1000, call_site="test.summaries")
+    usage = {u.name: u for u in budgeted.usage}
+    assert usage["deck"].tokens <= 750 and usage["deck"].action == "truncated"
+    assert usage["interview"].action == "summarized" and calls == [250]
+    assert budgeted.sections["interview"].startswith("Nine of fourteen")
+
+    def broken(text, max_tokens):
+        raise RuntimeError("model unavailable")
+
+    budgeted = fit_sections([PromptSection("interview", TRANSCRIPT, priority=2, summarize=broken)],
+                            budget_tokens=200, call_site="test.summaries")
+    assert budgeted.usage[0].action == "truncated" and budgeted.usage[0].tokens <= 200
+    print("  ✅ capped, summarized, and truncated after a failed summary")
+
+
+def test_usage_is_recorded_per_section():
+    """Every call adds its section tokens to the prompt token metric"""
+    print("\nTest: usage metric")
+    registry = get_metrics_registry()
+    registry.reset(PROMPT_TOKENS_METRIC)
+    for _ in range(2):
+        fit_sections([PromptSection("memo", MEMO_1, priority=0)], 1000, call_site="test.metric")
+    expected = 2 * estimate_tokens(compact_json(MEMO_1))
+    assert registry.value(PROMPT_TOKENS_METRIC, call_site="test.metric", section="memo") == expected
+    print(f"  ✅ {expected} tokens recorded")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Prompt Budget")
+    print("=" * 60)
+
+    tests = [
+        test_compact_json,
+        test_within_budget_is_untouched,
+        test_lowest_priority_reduced_first,
+        test_caps_and_summaries,
+        test_usage_is_recorded_per_section,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Local test for the adaptive rate limiter and retry policy
+Checks token bucket pacing, AIMD adaptation to 429s and Retry-After, the shared
+retry policy for sync and async calls, rate limit classification, the Gemini gateway
+wrapper, and that async callers wait for it off the event loop. Clocks and models are
+fakes, so no network access is needed
+"""
+
+import asyncio
+import random
+import sys
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+from utils.llm_gateway import GatewayModel
+from utils.metrics import get_metrics_registry
+from utils.rate_limiter import (
+    QUEUE_DEPTH_GAUGE, RATE_LIMIT_GAUGE, RETRIES_METRIC, AdaptiveRateLimiter, RateLimitConfig,
+    RateLimitError, RetryableError, RetryPolicy, call_with_retry, call_with_retry_async, is_rate_limit_error,
+    parse_retry_after,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _limiter(clock, **overrides):
+    config = RateLimitConfig(**{"initial_rps": 2.0, "min_rps": 0.25, "max_rps": 4.0, "burst": 2.0, **overrides})
+    return AdaptiveRateLimiter("test", "model", config, clock=clock, sleep=clock.sleep)
+
+
+def _no_wait_policy(max_attempts=4):
+    return RetryPolicy(max_attempts=max_attempts, base_delay=0.0, max_delay=0.0, rng=random.Random(0))
+
+
+def test_bucket_paces_after_burst():
+    """A burst is admitted at once, then calls are spaced 1/rate apart"""
+    print("\nTest: token bucket pacing")
+    clock = FakeClock()
+    limiter = _limiter(clock)
+    waits = [limiter.acquire() for _ in range(6)]
+    assert waits[:2] == [0.0, 0.0], waits
+    assert all(abs(wait - 0.5) < 1e-9 for wait in waits[2:]), waits
+    assert abs(clock.now - 2.0) < 1e-9 and limiter.queue_depth == 0
+    print(f"  ✅ 6 calls in {clock.now:.1f}s at 2 rps")
+
+
+def test_aimd_adaptation():
+    """429s halve the rate once per cooldown; successes raise it additively to the max"""
+    print("\nTest: AIMD")
+    clock = FakeClock()
+    limiter = _limiter(clock)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 1.0, limiter.rate
+    clock.now += 3
+    limiter.on_throttle()
+    assert limiter.rate == 0.5
+    for _ in range(10):
+        limiter.on_throttle()
+        clock.now += 3
+    assert limiter.rate == 0.25
+    for _ in range(200):
+        limiter.on_success()
+    assert limiter.rate == 4.0
+    registry = get_metrics_registry()
+    assert registry.gauge(RATE_LIMIT_GAUGE, provider="test", model="model") == 4.0
+    print("  ✅ 2.0 -> 1.0 -> 0.5 -> 0.25 (floor) -> 4.0 (ceiling)")
+
+
+def test_retry_after_pauses_bucket():
+    """Retry-After holds every caller until it passes, then pacing resumes"""
+    print("\nTest: Retry-After")
+    clock = FakeClock()
+    limiter = _limiter(clock, burst=5.0)
+    limiter.on_throttle(retry_after=10)
+    waits = [limiter._reserve() for _ in range(3)]
+    assert waits[0] >= 10 and waits[1] > waits[0] and waits[2] > waits[1], waits
+    assert limiter.queue_depth == 3
+    assert get_metrics_registry().gauge(QUEUE_DEPTH_GAUGE, provider="test", model="model") == 3
+    assert parse_retry_after("7") == 7.0 and parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    print(f"  ✅ queued callers released at {[round(w, 1) for w in waits]}s")
+
+
+def test_retry_policy():
+    """Rate limits and 5xx are retried; other errors and exhausted retries are raised"""
+    print("\nTest: retry policy")
+    clock = FakeClock()
+    limiter = _limiter(clock)
+    registry = get_metrics_registry()
+    registry.reset(RETRIES_METRIC)
+    errors = [google_exceptions.ResourceExhausted("429 Resource exhausted"),
+              google_exceptions.ServiceUnavailable("503 unavailable")]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert call_with_retry(flaky, "test", limiter=limiter, policy=_no_wait_policy(), sleep=clock.sleep) == "ok"
+    assert registry.value(RETRIES_METRIC, reason="rate_limit") == 1
+    assert registry.value(RETRIES_METRIC, reason="transient") == 1
+    assert limiter.rate < 2.0
+
+    calls = []
+
+    def invalid():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    try:
+        call_with_retry(invalid, "test", limiter=limiter, policy=_no_wait_policy(), sleep=clock.sleep)
+        raise AssertionError("ValueError was swallowed")
+    except ValueError:
+        assert len(calls) == 1
+
+    def always_throttled():
+        calls.append(1)
+        raise RateLimitError("429", status=429, retry_after=3)
+
+    calls.clear()
+    try:
+        call_with_retry(always_throttled, "test", limiter=limiter, policy=_no_wait_policy(3), sleep=clock.sleep)
+        raise AssertionError("RateLimitError was swallowed")
+    except RateLimitError:
+        assert len(calls) == 3
+    delays = [RetryPolicy(base_delay=1, max_delay=8, rng=random.Random(1)).delay(n) for n in range(1, 7)]
+    assert all(0 <= d <= min(8, 2 ** (n - 1)) for n, d in zip(range(1, 7), delays)), delays
+    assert RetryPolicy().delay(1, retry_after=30) == 30
+    print("  ✅ retried 429/503, raised ValueError at once, gave up after 3 throttled attempts")
+
+
+def test_async_retry():
+    """Coroutines share the same limiter and policy"""
+    print("\nTest: async retry")
+    limiter = _limiter(FakeClock(), burst=10.0)
+    attempts = []
+
+    async def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimitError("429", status=429, body="slow down")
+        return 200, "{}"
+
+    result = asyncio.run(call_with_retry_async(request, "test", limiter=limiter, policy=_no_wait_policy()))
+    assert result == (200, "{}") and len(attempts) == 3
+    print("  ✅ succeeded on attempt 3")
+
+
+class StatusError(Exception):
+    """Error with an HTTP status attribute, like aiohttp.ClientResponseError"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def test_rate_limit_classification():
+    """Statuses and exception types decide first; a bare 429 in a message must stand alone"""
+    print("\nTest: rate limit classification")
+    assert is_rate_limit_error(google_exceptions.ResourceExhausted("quota"))
+    assert is_rate_limit_error(StatusError("slow down", status=429))
+    assert not is_rate_limit_error(StatusError("prompt has 429 tokens too many", status=400))
+    assert not is_rate_limit_error(RetryableError("upstream 429 relay", status=503))
+    assert not is_rate_limit_error(google_exceptions.InvalidArgument("request 84291 has 1429 tokens"))
+    assert not is_rate_limit_error(ValueError("upload gs://bucket/deck-4290.pdf is 14290 bytes"))
+    assert is_rate_limit_error(RuntimeError("HTTP 429: quota exceeded"))
+    assert is_rate_limit_error(RuntimeError("Too Many Requests"))
+    print("  ✅ IDs, byte and token counts containing 429 are not rate limits")
+
+
+class SlowModel:
+    """generate_content blocks like a rate-limited call waiting out its backoff"""
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(0.3)
+        return type("Response", (), {"text": '{"headquarters": {"value": "Pune", "confidence": 0.9}}'})()
+
+
+def test_async_callers_do_not_block_loop():
+    """Perplexity field extraction waits for Gemini in a worker thread"""
+    print("\nTest: async callers off the event loop")
+    import services.perplexity_service as perplexity_module
+
+    service = perplexity_module.PerplexitySearchService(project="test-project")
+    service.vertex_model = SlowModel()
+    original = perplexity_module.routed_model
+    perplexity_module.routed_model = lambda call_site: service.vertex_model
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+    async def run():
+        _, extracted = await asyncio.gather(
+            ticker(), service._process_with_vertex_ai("Based in Pune", ["headquarters"], "company_basics"))
+        return extracted
+
+    try:
+        extracted = asyncio.run(run())
+    finally:
+        perplexity_module.routed_model = original
+    assert extracted, extracted
+    assert ticks[-1] - ticks[0] < 0.28, ticks
+    print("  ✅ the loop kept running while generate_content blocked")
+
+
+class FlakyModel:
+    def __init__(self, failures):
+        self._model_name = "publishers/google/models/gemini-test"
+        self.failures = failures
+        self.calls = []
+
+    def generate_content(self, contents, **kwargs):
+        self.calls.append(kwargs)
+        if self.failures:
+            self.failures -= 1
+            if kwargs.get("stream"):
+                return self._failing_stream()
+            raise google_exceptions.ResourceExhausted("429 Resource exhausted")
+        if kwargs.get("stream"):
+            return iter(["chunk-1", "chunk-2"])
+        return "response"
+
+    @staticmethod
+    def _failing_stream():
+        raise google_exceptions.ResourceExhausted("429 Resource exhausted")
+        yield
+
+
+def test_gateway_model():
+    """GatewayModel retries plain and streamed calls and delegates everything else"""
+    print("\nTest: gateway model")
+    import utils.rate_limiter as rate_limiter
+
+    original = rate_limiter.DEFAULT_RETRY_POLICY
+    rate_limiter.DEFAULT_RETRY_POLICY = _no_wait_policy()
+    try:
+        model = GatewayModel(FlakyModel(failures=2))
+        assert model.generate_content("prompt", generation_config={"temperature": 0}) == "response"
+        assert len(model.calls) == 3 and model.model_name == "gemini-test"
+        assert model._model_name.endswith("gemini-test")
+
+        model = GatewayModel(FlakyModel(failures=1))
+        assert list(model.generate_content("prompt", stream=True)) == ["chunk-1", "chunk-2"]
+        assert len(model.calls) == 2
+    finally:
+        rate_limiter.DEFAULT_RETRY_POLICY = original
+    print("  ✅ retried until the first chunk, attributes delegated")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Rate Limiter")
+    print("=" * 60)
+
+    tests = [
+        test_bucket_paces_after_burst,
+        test_aimd_adaptation,
+        test_retry_after_pauses_bucket,
+        test_retry_policy,
+        test_async_retry,
+        test_rate_limit_classification,
+        test_gateway_model,
+        test_async_callers_do_not_block_loop,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Local test for singleflight coalescing
+Checks that concurrent identical calls from threads and coroutines share one call,
+that errors reach every waiting caller, that a cancelled leader hands the flight on,
+that instances coalesce through a lease store, and that the Gemini gateway and
+Perplexity searches are coalesced. No network access is needed
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import services.perplexity_service as perplexity_module
+import utils.singleflight as singleflight
+from services.perplexity_service import PerplexitySearchService
+from utils.deadline import DeadlineExceeded, deadline_scope
+from utils.hedging import HedgeBudget, HedgePolicy, LatencyTracker, hedged
+from utils.llm_gateway import GatewayModel
+from utils.metrics import get_metrics_registry
+from utils.singleflight import SINGLEFLIGHT_METRIC, InMemoryLeaseStore, SingleFlight, fingerprint
+
+
+class CountingCall:
+    """Sleeps, then returns result; counts how often it ran"""
+
+    def __init__(self, seconds=0.1, result="value", error=None):
+        self.seconds = seconds
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            self.calls += 1
+
+    def __call__(self):
+        self._start()
+        time.sleep(self.seconds)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    async def run_async(self):
+        self._start()
+        await asyncio.sleep(self.seconds)
+        return self.result
+
+
+def test_threads_share_one_call():
+    """Threads with the same key share the leader's call; other keys run separately"""
+    print("\nTest: threads")
+    group = SingleFlight("test.threads")
+    registry = get_metrics_registry()
+    registry.reset(SINGLEFLIGHT_METRIC)
+    call = CountingCall()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: group.do("same", call), range(8)))
+    assert results == ["value"] * 8 and call.calls == 1, (results, call.calls)
+    assert registry.value(SINGLEFLIGHT_METRIC, group="test.threads", role="leader") == 1
+    assert registry.value(SINGLEFLIGHT_METRIC, group="test.threads", role="follower") == 7
+    assert group.in_flight() == 0
+
+    group.do("same", call)
+    assert call.calls == 2
+    other = CountingCall()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        list(pool.map(lambda key: group.do(key, other), ["a", "b"]))
+    assert other.calls == 2
+    print("  ✅ 8 threads, 1 call; finished keys and other keys run again")
+
+
+def test_async_and_threads_coalesce():
+    """Coroutines share a call, also with a thread and a coroutine on another event loop"""
+    print("\nTest: async")
+    group = SingleFlight("test.async")
+    call = CountingCall()
+
+    async def callers():
+        return await asyncio.gather(*(group.do_async("key", call.run_async) for _ in range(5)))
+
+    assert asyncio.run(callers()) == ["value"] * 5 and call.calls == 1
+
+    call = CountingCall(seconds=0.2)
+    leader = threading.Thread(target=lambda: group.do("mixed", call))
+    leader.start()
+    time.sleep(0.05)
+    assert asyncio.run(group.do_async("mixed", call.run_async)) == "value"
+    leader.join()
+    assert call.calls == 1
+    print("  ✅ 5 coroutines, 1 call; thread leader shared with another event loop")
+
+
+def test_errors_and_cancelled_leader():
+    """The leader's error reaches its followers; a cancelled leader hands the flight on"""
+    print("\nTest: errors and cancellation")
+    group = SingleFlight("test.errors")
+    call = CountingCall(error=ValueError("bad request"))
+    errors = []
+
+    def caller():
+        try:
+            group.do("key", call)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 4 and call.calls == 1, (errors, call.calls)
+
+    call = CountingCall(seconds=0.1)
+
+    async def scenario():
+        leader = asyncio.ensure_future(group.do_async("cancel", call.run_async))
+        await asyncio.sleep(0.02)
+        follower = asyncio.ensure_future(group.do_async("cancel", call.run_async))
+        await asyncio.sleep(0.02)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == "value" and call.calls == 2
+    print("  ✅ 1 call, 4 errors; follower led the retry after cancellation")
+
+
+def test_lease_coalesces_instances():
+    """Instances sharing a lease store wait for the holder and reuse its fresh result"""
+    print("\nTest: distributed lease")
+    store = InMemoryLeaseStore()
+    instance_a = SingleFlight("test.lease", lease_store=store, result_ttl_seconds=0.3, poll_interval_seconds=0.01)
+    instance_b = SingleFlight("test.lease", lease_store=store, result_ttl_seconds=0.3, poll_interval_seconds=0.01)
+    call = CountingCall(seconds=0.1, result={"content": "shared"})
+
+    leader = threading.Thread(target=lambda: instance_a.do("key", call))
+    leader.start()
+    time.sleep(0.02)
+    assert instance_b.do("key", call) == {"content": "shared"}
+    leader.join()
+    assert call.calls == 1
+    assert instance_b.do("key", call) == {"content": "shared"} and call.calls == 1
+
+    time.sleep(0.35)
+    instance_b.do("key", call)
+    assert call.calls == 2
+
+    failing = CountingCall(seconds=0, error=RuntimeError("down"))
+    try:
+        instance_a.do("failing", failing)
+        raise AssertionError("error was swallowed")
+    except RuntimeError:
+        pass
+    assert instance_b.do("failing", call) == {"content": "shared"}
+
+    class BrokenStore:
+        def try_claim(self, *args):
+            raise ConnectionError("firestore unavailable")
+
+    assert SingleFlight("test.broken", lease_store=BrokenStore()).do("key", lambda: "local") == "local"
+    print("  ✅ Waited for and reused the holder's result; expired and failed keys run again")
+
+
+def test_waits_bounded_by_deadline():
+    """A follower of a hung leader and a lease waiter stop waiting at the deadline"""
+    print("\nTest: deadline-bounded waits")
+    group = SingleFlight("test.deadline")
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: group.do("hung", lambda: release.wait(5)))
+    leader.start()
+    time.sleep(0.02)
+    started = time.monotonic()
+    try:
+        with deadline_scope(0.2):
+            group.do("hung", lambda: "unreachable")
+        raise AssertionError("follower waited past the deadline")
+    except DeadlineExceeded:
+        pass
+
+    async def async_follower():
+        with deadline_scope(0.2):
+            return await group.do_async("hung", CountingCall(seconds=0).run_async)
+
+    try:
+        asyncio.run(async_follower())
+        raise AssertionError("async follower waited past the deadline")
+    except DeadlineExceeded:
+        pass
+    assert time.monotonic() - started < 3
+    assert group.in_flight() == 1
+    release.set()
+    leader.join()
+    assert group.in_flight() == 0
+
+    registry = get_metrics_registry()
+    registry.reset(SINGLEFLIGHT_METRIC)
+    store = InMemoryLeaseStore()
+    # Another instance holds the lease and never finishes
+    store.try_claim("held", lease_seconds=60, result_ttl_seconds=60)
+    instance = SingleFlight("test.deadline.lease", lease_store=store, poll_interval_seconds=0.01,
+                            run_reserve_seconds=0.5)
+    call = CountingCall(seconds=0, result="local")
+    started = time.monotonic()
+    with deadline_scope(0.7):
+        assert instance.do("held", call) == "local"
+    assert 0.1 < time.monotonic() - started < 0.6 and call.calls == 1
+    assert registry.value(SINGLEFLIGHT_METRIC, group="test.deadline.lease", role="lease_abandoned") == 1
+    assert store.try_claim("held", 60, 60)[0] == singleflight.DECISION_WAIT
+
+    async def async_waiter():
+        with deadline_scope(0.7):
+            return await instance.do_async("held", call.run_async)
+
+    assert asyncio.run(async_waiter()) == "local" and call.calls == 2
+    print("  ✅ Followers raised DeadlineExceeded; lease waits ran the call locally, lease left to its holder")
+
+
+class SlowModel:
+    def __init__(self, latency=0.1):
+        self._model_name = "publishers/google/models/gemini-test"
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, **kwargs):
+        with self._lock:
+            self.calls.append(contents)
+        time.sleep(self.latency)
+        return f"response to {contents}"
+
+
+def test_gateway_coalesces_prompts():
+    """Identical text prompts share a Gemini call; streams, other prompts and hedges do not"""
+    print("\nTest: gateway")
+    model = SlowModel()
+    gateway = GatewayModel(model)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(lambda prompt: gateway.generate_content(prompt, generation_config={"temperature": 0}),
+                                ["same"] * 4 + ["other"] * 2))
+    assert results == ["response to same"] * 4 + ["response to other"] * 2
+    assert sorted(model.calls) == ["other", "same"], model.calls
+
+    model.calls.clear()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        list(pool.map(lambda temperature: gateway.generate_content("same", generation_config={"temperature": temperature}),
+                      [0, 1]))
+    assert len(model.calls) == 2
+
+    import utils.hedging as hedging
+    hedging._latency_tracker = LatencyTracker()
+    hedging._hedge_budget = HedgeBudget(ratio=1.0, burst=10)
+    model = SlowModel(latency=0.2)
+    hedged_model = hedged(GatewayModel(model), "test.singleflight", policy=HedgePolicy(
+        min_samples=5, initial_delay_seconds=0.05, min_delay_seconds=0.01))
+    assert hedged_model.generate_content("prompt") == "response to prompt"
+    time.sleep(0.25)
+    assert len(model.calls) == 2, model.calls
+
+    os.environ["SINGLEFLIGHT"] = "0"
+    try:
+        model = SlowModel()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(GatewayModel(model).generate_content, ["same", "same"]))
+        assert len(model.calls) == 2
+    finally:
+        del os.environ["SINGLEFLIGHT"]
+    print("  ✅ 2 calls for 6 prompts; other configs, hedges and SINGLEFLIGHT=0 not coalesced")
+
+
+def test_perplexity_searches_coalesce():
+    """Concurrent identical Perplexity searches make one API call"""
+    print("\nTest: Perplexity")
+    saved = (os.environ.get("PERPLEXITY_API_KEY"), perplexity_module.VERTEX_AI_AVAILABLE,
+             PerplexitySearchService._perplexity_search_once)
+    calls = []
+
+    async def search_once(service, query, max_results=3):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return [{"content": f"About {query}", "citations": [], "query": query}]
+
+    os.environ["PERPLEXITY_API_KEY"] = "pplx-test-key-0000"
+    perplexity_module.VERTEX_AI_AVAILABLE = False
+    PerplexitySearchService._perplexity_search_once = search_once
+    singleflight._singleflights.pop("perplexity", None)
+    try:
+        first, second = PerplexitySearchService(project="test-project"), PerplexitySearchService(project="test-project")
+
+        async def searches():
+            return await asyncio.gather(first._perplexity_search("Acme funding"),
+                                        second._perplexity_search("Acme funding"),
+                                        first._perplexity_search("Acme team"))
+
+        results = asyncio.run(searches())
+        assert results[0] == results[1] and results[2][0]["content"] == "About Acme team"
+        assert sorted(calls) == ["Acme funding", "Acme team"], calls
+    finally:
+        key, vertex_available, original = saved
+        if key is None:
+            os.environ.pop("PERPLEXITY_API_KEY", None)
+        else:
+            os.environ["PERPLEXITY_API_KEY"] = key
+        perplexity_module.VERTEX_AI_AVAILABLE = vertex_available
+        PerplexitySearchService._perplexity_search_once = original
+    assert fingerprint("a", {"x": 1, "y": 2}) == fingerprint("a", {"y": 2, "x": 1})
+    print("  ✅ 2 API calls for 3 searches")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Singleflight")
+    print("=" * 60)
+
+    tests = [
+        test_threads_share_one_call,
+        test_async_and_threads_coalesce,
+        test_errors_and_cancelled_leader,
+        test_lease_coalesces_instances,
+        test_waits_bounded_by_deadline,
+        test_gateway_coalesces_prompts,
+        test_perplexity_searches_coalesce,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Local test for speculative early enrichment
+Identifies the company from the first pages of a synthetic deck and checks that the
+company-level Perplexity research started during extraction is reused when the memo
+names the same company and discarded when it does not. Perplexity and Gemini are
+replaced by fakes, so no network access is needed
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+import services.perplexity_service as perplexity_module
+from agents.intake_agent import IntakeCurationAgent
+from services.perplexity_service import PerplexitySearchService
+from utils.company_identity import (
+    CompanyIdentity, SpeculativeEnrichment, identify_from_text, identities_match, normalize_company_name
+)
+from test_pdf_preprocessor import build_synthetic_deck
+
+FIRST_PAGES = """--- Page 1 [2 bullets] ---
+# Acme Robotics
+- Warehouse automation for mid-size 3PL logistics providers
+- www.acmerobotics.ai
+
+--- Page 2 ---
+# Problem
+Picking is 60% of warehouse labor cost in supply chain operations"""
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """Returns a fixed memo for extraction prompts"""
+
+    def __init__(self, title, delay=0.0):
+        self.title = title
+        self.delay = delay
+
+    def generate_content(self, contents, **kwargs):
+        time.sleep(self.delay)
+        return FakeResponse(json.dumps({
+            "title": self.title, "industry_category": "Logistics",
+            "summary_analysis": "Strong team.", "initial_flags": ["Early"], "validation_points": ["ARR"],
+        }))
+
+
+class RecordingSearch:
+    """Stands in for PerplexitySearchService._perplexity_search"""
+
+    def __init__(self):
+        self.queries = []
+        self._lock = threading.Lock()
+
+    async def __call__(self, service, query, max_results=3):
+        with self._lock:
+            self.queries.append(query)
+        return [{"content": "The company was founded in 2021."}]
+
+    def categories(self):
+        return sorted(
+            name for name, info in PerplexitySearchService.FIELD_CATEGORIES.items()
+            if any(info["prompt_template"].split("{")[0] in q for q in self.queries)
+        )
+
+
+class PerplexityFakes:
+    """Sets a Perplexity key, disables Vertex AI and records searches"""
+
+    def __enter__(self):
+        self.search = RecordingSearch()
+        self._saved = (os.environ.get("PERPLEXITY_API_KEY"), perplexity_module.VERTEX_AI_AVAILABLE,
+                       PerplexitySearchService._perplexity_search)
+        os.environ["PERPLEXITY_API_KEY"] = "pplx-test-key-0000"
+        os.environ["INTAKE_SECTION_REQUERY"] = "0"
+        perplexity_module.VERTEX_AI_AVAILABLE = False
+        search = self.search
+        PerplexitySearchService._perplexity_search = lambda service, query, max_results=3: search(service, query)
+        return self
+
+    def __exit__(self, *exc):
+        key, vertex_available, original_search = self._saved
+        if key is None:
+            os.environ.pop("PERPLEXITY_API_KEY", None)
+        else:
+            os.environ["PERPLEXITY_API_KEY"] = key
+        os.environ.pop("INTAKE_SECTION_REQUERY", None)
+        perplexity_module.VERTEX_AI_AVAILABLE = vertex_available
+        PerplexitySearchService._perplexity_search = original_search
+        return False
+
+
+def _deck():
+    return build_synthetic_deck([
+        ("text", "Acme Robotics", ["- Warehouse automation for mid-size 3PL logistics providers",
+                                   "- www.acmerobotics.ai"]),
+        ("text", "Traction", ["- Revenue: $2.4M ARR"]),
+    ])
+
+
+def test_identity_heuristic():
+    """Name, website and sector come from the first pages"""
+    print("\nTest: identity heuristic")
+    identity = identify_from_text(FIRST_PAGES)
+    assert identity.name == "Acme Robotics", identity
+    assert identity.website == "acmerobotics.ai"
+    assert identity.sector == "Logistics"
+    assert identity.context() == "Acme Robotics in Logistics"
+    assert identify_from_text("--- Page 1 ---\n# Pitch Deck\nglobex.io").name == "Globex"
+    print(f"  ✅ {identity.to_dict()}")
+
+
+def test_identity_reconciliation():
+    """Legal suffixes and websites match; different companies do not"""
+    print("\nTest: identity reconciliation")
+    identity = CompanyIdentity(name="Acme Robotics", website="acmerobotics.ai")
+    assert normalize_company_name("Acme Robotics Pvt. Ltd.") == "acmerobotics"
+    assert identities_match(identity, {"title": "Acme Robotics Pvt. Ltd."})
+    assert identities_match(identity, {"title": "Acme"})
+    assert identities_match(CompanyIdentity(name="Project Falcon", website="acmerobotics.ai"),
+                            {"title": "AcmeRobotics"})
+    assert not identities_match(identity, {"title": "Globex Logistics"})
+    assert not identities_match(identity, {"title": ""})
+    print("  ✅ Matches reconciled")
+
+
+def test_prefetched_categories_are_not_searched_again():
+    """Enrichment only searches the categories that were not prefetched"""
+    print("\nTest: prefetched categories")
+    with PerplexityFakes() as fakes:
+        service = PerplexitySearchService(project="test-project")
+        prefetched = asyncio.run(service.prefetch_company_research("Acme Robotics in Logistics"))
+        assert sorted(prefetched) == ["company_basics"], prefetched
+        assert prefetched["company_basics"]["founded_date"] == "2021"
+        assert fakes.search.categories() == sorted(PerplexitySearchService.SPECULATIVE_CATEGORIES)
+
+        fakes.search.queries.clear()
+        memo = {"title": "Acme Robotics", "industry_category": "Logistics"}
+        enriched = asyncio.run(service.enrich_missing_fields(memo, prefetched=prefetched))
+        assert enriched["founded_date"] == "2021"
+        assert "company_basics" not in fakes.search.categories()
+        assert "financial_metrics" in fakes.search.categories()
+    print("  ✅ company_basics reused")
+
+
+def test_mismatch_discards_without_waiting():
+    """A known identity mismatch is discarded before the prefetch finishes"""
+    print("\nTest: mismatch discard")
+    release = threading.Event()
+
+    def slow_prefetch(identity):
+        release.wait(5)
+        return {"company_basics": {"founded_date": "2021"}}
+
+    speculation = SpeculativeEnrichment().start(lambda: CompanyIdentity(name="Acme Robotics"), slow_prefetch)
+    while speculation.identity is None:
+        time.sleep(0.01)
+
+    started = time.perf_counter()
+    assert speculation.resolve({"title": "Globex"}, timeout=5) is None
+    assert time.perf_counter() - started < 1
+    assert speculation.outcome["used"] is False
+    assert "mismatch" in speculation.outcome["discarded_reason"]
+    release.set()
+    print("  ✅ Discarded immediately")
+
+
+def test_unused_prefetch_is_cancelled():
+    """Discarded research stops its running searches instead of finishing them"""
+    print("\nTest: prefetch cancellation")
+    searched = []
+    started = threading.Event()
+
+    async def prefetch(identity):
+        for category in ["company_basics", "market_analysis", "financial_metrics"]:
+            started.set()
+            await asyncio.sleep(0.2)
+            searched.append(category)
+        return {"company_basics": {"founded_date": "2021"}}
+
+    speculation = SpeculativeEnrichment().start(lambda: CompanyIdentity(name="Acme Robotics"), prefetch)
+    started.wait(1)
+    assert speculation.resolve({"title": "Globex"}, timeout=5) is None
+    speculation.future.result(timeout=1)
+    time.sleep(0.3)
+    assert searched == [], searched
+
+    searched.clear()
+    started.clear()
+    speculation = SpeculativeEnrichment().start(lambda: CompanyIdentity(name="Acme Robotics"), prefetch)
+    started.wait(1)
+    assert speculation.resolve({"title": "Acme Robotics"}, timeout=0.3) is None
+    assert "not finished" in speculation.outcome["discarded_reason"]
+    assert speculation.future.result(timeout=1) == {}
+    time.sleep(0.3)
+    assert searched == ["company_basics"], searched
+    print("  ✅ Mismatched and timed-out prefetches stopped mid-search")
+
+
+def _run_with_speculation(memo_title):
+    agent = IntakeCurationAgent(project="test-project")
+    agent.gemini_model = FakeGeminiModel(memo_title, delay=0.2)
+    identities = []
+    original_prefetch = agent._prefetch_company_research
+
+    def prefetch(identity):
+        identities.append(identity)
+        return original_prefetch(identity)
+
+    agent._prefetch_company_research = prefetch
+    result = asyncio.run(agent.run_with_embeddings(_deck(), "acme.pdf", "pdf", "founder@acme.com"))
+    return result, identities
+
+
+def test_agent_uses_matching_speculation():
+    """run_with_embeddings starts research during extraction and reuses it"""
+    print("\nTest: agent speculative enrichment")
+    with PerplexityFakes() as fakes:
+        result, identities = _run_with_speculation("Acme Robotics Inc.")
+
+        assert result["status"] == "SUCCESS", result
+        assert [i.name for i in identities] == ["Acme Robotics"]
+        outcome = result["speculative_enrichment"]
+        assert outcome["used"] is True and outcome["categories"] == ["company_basics"], outcome
+        assert result["memo_1"]["founded_date"] == "2021"
+        # company_basics was searched once, speculatively
+        basics_template = PerplexitySearchService.FIELD_CATEGORIES["company_basics"]["prompt_template"]
+        assert sum(basics_template.split("{")[0] in q for q in fakes.search.queries) == 1
+    print(f"  ✅ Outcome: {outcome}")
+
+
+def test_agent_discards_mismatched_speculation():
+    """A memo for a different company discards the speculative research"""
+    print("\nTest: agent mismatch")
+    with PerplexityFakes() as fakes:
+        result, _ = _run_with_speculation("Globex")
+
+        outcome = result["speculative_enrichment"]
+        assert outcome["used"] is False and "mismatch" in outcome["discarded_reason"], outcome
+        basics_template = PerplexitySearchService.FIELD_CATEGORIES["company_basics"]["prompt_template"]
+        assert sum(basics_template.split("{")[0] in q for q in fakes.search.queries) == 2
+        assert any("Globex" in q for q in fakes.search.queries)
+    print("  ✅ Researched again for the memo's company")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Speculative Enrichment")
+    print("=" * 60)
+
+    tests = [
+        test_identity_heuristic,
+        test_identity_reconciliation,
+        test_prefetched_categories_are_not_searched_again,
+        test_mismatch_discards_without_waiting,
+        test_unused_prefetch_is_cancelled,
+        test_agent_uses_matching_speculation,
+        test_agent_discards_mismatched_speculation,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
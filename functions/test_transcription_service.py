@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Local test for chunked media transcription
+Builds a synthetic WAV where each second of audio encodes one spoken word, and a fake
+Speech-to-Text client that 'recognizes' those words, so segmenting, overlap
+de-duplication and timestamps can be checked without Google Cloud access
+"""
+
+import io
+import json
+import os
+import struct
+import sys
+import threading
+import wave
+from datetime import timedelta
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from google.cloud import speech_v2 as speech
+from google.longrunning import operations_pb2
+
+from agents.intake_agent import IntakeCurationAgent
+from services.transcription_service import (
+    BatchTranscriptionPending, TranscriptionService, TranscriptSegment, TranscriptWord, decode_audio,
+    segment_bounds, stitch_segments
+)
+from utils.deadline import deadline_scope
+
+SAMPLE_RATE = 8000
+
+
+def build_spoken_wav(word_count):
+    """One word per second; every sample in second i has the value i + 1"""
+    frames = b"".join(struct.pack("<h", i + 1) * SAMPLE_RATE for i in range(word_count))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+
+class FakeSpeechClient:
+    """Recognizes the words encoded in each WAV segment it receives"""
+
+    def __init__(self, word_timestamps=True):
+        self.word_timestamps = word_timestamps
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def recognize(self, request):
+        with self._lock:
+            self.requests.append(request)
+        with wave.open(io.BytesIO(request.content), "rb") as wav:
+            rate = wav.getframerate()
+            samples = struct.unpack(f"<{wav.getnframes()}h", wav.readframes(wav.getnframes()))
+
+        words = []
+        position = 0
+        while position < len(samples):
+            value = samples[position]
+            run = position
+            while run < len(samples) and samples[run] == value:
+                run += 1
+            # Only words spoken completely inside the segment are recognized
+            if run - position == SAMPLE_RATE:
+                words.append(speech.WordInfo(
+                    word=f"w{value - 1}",
+                    start_offset=timedelta(seconds=position / rate),
+                    end_offset=timedelta(seconds=run / rate),
+                ))
+            position = run
+
+        alternative = speech.SpeechRecognitionAlternative(
+            transcript=" ".join(w.word for w in words),
+            words=words if self.word_timestamps else [],
+        )
+        return speech.RecognizeResponse(results=[speech.SpeechRecognitionResult(alternatives=[alternative])])
+
+
+class FakeOperation:
+    """A batch operation that finishes after seconds"""
+
+    def __init__(self, response, seconds=0.0):
+        self.response = response
+        self.seconds = seconds
+        self.operation = operations_pb2.Operation(name="operations/batch-1")
+
+    def result(self, timeout=None):
+        if timeout is not None and timeout < self.seconds:
+            raise FutureTimeoutError()
+        return self.response
+
+
+class FakeBatchClient:
+    """Returns a canned long-running batch response"""
+
+    def __init__(self, uri, seconds=0.0):
+        self.uri = uri
+        self.seconds = seconds
+        self.requests = []
+        self.polls = []
+
+    def batch_recognize(self, request):
+        self.requests.append(request)
+        return FakeOperation(self._response(), self.seconds)
+
+    def get_operation(self, request, **kwargs):
+        self.polls.append(request["name"])
+        operation = operations_pb2.Operation(name=request["name"], done=True)
+        operation.response.Pack(speech.BatchRecognizeResponse.pb(self._response()))
+        return operation
+
+    def _response(self):
+        results = [
+            speech.SpeechRecognitionResult(
+                alternatives=[speech.SpeechRecognitionAlternative(transcript=text)],
+                result_end_offset=timedelta(seconds=end),
+            )
+            for text, end in [("We help warehouses automate picking.", 42.5), ("Revenue is 2.4 million.", 95.0)]
+        ]
+        file_result = speech.BatchRecognizeFileResult(
+            inline_result=speech.InlineResult(transcript=speech.BatchRecognizeResults(results=results))
+        )
+        return speech.BatchRecognizeResponse(results={self.uri: file_result})
+
+
+def expected_words(count):
+    return " ".join(f"w{i}" for i in range(count))
+
+
+def test_segment_bounds_overlap():
+    """Segments have fixed length and overlap; WAV input decodes locally"""
+    print("\nTest: segment bounds")
+    assert segment_bounds(120, 50, 5) == [(0.0, 50.0), (45.0, 95.0), (90.0, 120.0)]
+    assert segment_bounds(30, 50, 5) == [(0.0, 30.0)]
+    assert decode_audio(build_spoken_wav(3)).duration_seconds == 3.0
+    print("  ✅ Bounds cover the whole recording")
+
+
+def test_chunked_transcription_with_timestamps():
+    """Overlapping segments are stitched without repeated words; timestamps are absolute"""
+    print("\nTest: chunked transcription with word timestamps")
+    client = FakeSpeechClient()
+    service = TranscriptionService(client, "test-project", segment_seconds=50, overlap_seconds=5)
+    result = service.transcribe(file_data=build_spoken_wav(120))
+
+    assert result.mode == "chunked"
+    assert len(client.requests) == 3
+    assert result.transcript == expected_words(120)
+    assert [(s["start_seconds"], s["end_seconds"]) for s in result.segment_dicts()] == [(0, 50), (45, 95), (90, 120)]
+    assert result.segments[1].words[0].text == "w45" and result.segments[1].words[0].start == 45.0
+    print(f"  ✅ {len(result.segments)} segments stitched into {len(result.transcript.split())} words")
+
+
+def test_chunked_transcription_without_timestamps():
+    """Without word timestamps the repeated words at each boundary are dropped"""
+    print("\nTest: chunked transcription text overlap")
+    service = TranscriptionService(FakeSpeechClient(word_timestamps=False), "test-project",
+                                   segment_seconds=50, overlap_seconds=5)
+    result = service.transcribe(file_data=build_spoken_wav(120))
+    assert result.transcript == expected_words(120), result.transcript
+    print("  ✅ Overlap de-duplicated from text")
+
+
+def test_stitch_midpoint_cut():
+    """Words in the overlap are kept from exactly one segment"""
+    print("\nTest: stitch at overlap midpoint")
+    first = TranscriptSegment(0, 0, 10, "a b c", [TranscriptWord("a", 1, 2), TranscriptWord("b", 8, 8.5),
+                                                  TranscriptWord("c", 9.2, 9.6)])
+    second = TranscriptSegment(1, 8, 18, "b c d", [TranscriptWord("b", 8, 8.5), TranscriptWord("c", 9.2, 9.6),
+                                                   TranscriptWord("d", 12, 13)])
+    assert stitch_segments([second, first]) == "a b c d"
+    print("  ✅ a b c d")
+
+
+def test_batch_transcription_for_gcs_uri():
+    """Large gs:// media uses the long-running batch API and keeps result timestamps"""
+    print("\nTest: batch transcription")
+    uri = "gs://bucket/pitch/1-demo.mp4"
+    client = FakeBatchClient(uri)
+    result = TranscriptionService(client, "test-project").transcribe(
+        gcs_uri=uri, model="long", media_size=500 * 1024 * 1024, read_bytes=lambda: b""
+    )
+
+    assert result.mode == "batch"
+    assert client.requests[0].files[0].uri == uri
+    assert result.transcript == "We help warehouses automate picking. Revenue is 2.4 million."
+    assert result.segment_dicts()[1] == {"index": 1, "start_seconds": 42.5, "end_seconds": 95.0,
+                                         "transcript": "Revenue is 2.4 million."}
+    print("  ✅ Segments built from result end offsets")
+
+
+def test_gcs_media_routed_by_size_and_duration():
+    """Short gs:// media is read and chunked; long media goes to batch"""
+    print("\nTest: routing by size and duration")
+    uri = "gs://bucket/pitch/1-demo.wav"
+    wav = build_spoken_wav(70)
+    client = FakeSpeechClient()
+    result = TranscriptionService(client, "test-project").transcribe(
+        gcs_uri=uri, media_size=len(wav), read_bytes=lambda: wav
+    )
+    assert result.mode == "chunked" and result.transcript == expected_words(70)
+
+    batch_client = FakeBatchClient(uri)
+    service = TranscriptionService(batch_client, "test-project")
+    service.max_chunked_seconds = 60
+    assert service.transcribe(gcs_uri=uri, media_size=len(wav), read_bytes=lambda: wav).mode == "batch"
+    assert TranscriptionService(batch_client, "test-project").transcribe(gcs_uri=uri).mode == "batch"
+    print("  ✅ 70s chunked; over the duration limit and unknown size use batch")
+
+
+def test_batch_handed_on_at_deadline():
+    """A batch that outlives the budget is handed on and resumed without starting another"""
+    print("\nTest: batch hand-off")
+    uri = "gs://bucket/pitch/1-demo.mp4"
+    client = FakeBatchClient(uri, seconds=600)
+    service = TranscriptionService(client, "test-project")
+    try:
+        with deadline_scope(120):
+            service.transcribe(gcs_uri=uri)
+        raise AssertionError("batch wait ran past the deadline")
+    except BatchTranscriptionPending as e:
+        pending = e.to_dict()
+    assert pending["operation_name"] == "operations/batch-1" and pending["gcs_uri"] == uri
+
+    with deadline_scope(540):
+        result = service.transcribe(gcs_uri=uri, pending_batch=pending)
+    assert len(client.requests) == 1 and client.polls == ["operations/batch-1"]
+    assert result.mode == "batch" and result.transcript.startswith("We help warehouses")
+
+    pending["started_at"] -= 2 * service.batch_timeout_seconds
+    try:
+        service.transcribe(gcs_uri=uri, pending_batch=pending)
+        raise AssertionError("expired batch was resumed")
+    except TimeoutError:
+        pass
+    print("  ✅ Operation resumed by the next task; gave up after the overall timeout")
+
+
+class FakeGeminiModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, contents, **kwargs):
+        self.prompts.append(contents)
+
+        class Response:
+            text = json.dumps({"title": "Acme", "summary_analysis": "Strong team.",
+                               "initial_flags": ["Early"], "validation_points": ["ARR"]})
+        return Response()
+
+
+def test_agent_stores_segment_timestamps():
+    """IntakeCurationAgent.run returns the segment timestamps for media"""
+    print("\nTest: agent media run")
+    agent = IntakeCurationAgent(project="test-project")
+    agent.speech_client = FakeSpeechClient()
+    agent.gemini_model = FakeGeminiModel()
+    os.environ["INTAKE_SECTION_REQUERY"] = "0"
+    try:
+        result = agent.run(build_spoken_wav(70), "pitch/1-demo.wav", "audio")
+    finally:
+        os.environ.pop("INTAKE_SECTION_REQUERY", None)
+
+    assert result["status"] == "SUCCESS", result
+    assert result["transcription_mode"] == "chunked"
+    assert len(result["transcript_segments"]) == 2
+    assert expected_words(70) in agent.gemini_model.prompts[0]
+    print(f"  ✅ Segments: {[(s['start_seconds'], s['end_seconds']) for s in result['transcript_segments']]}")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Chunked Media Transcription")
+    print("=" * 60)
+
+    tests = [
+        test_segment_bounds_overlap,
+        test_chunked_transcription_with_timestamps,
+        test_chunked_transcription_without_timestamps,
+        test_stitch_midpoint_cut,
+        test_batch_transcription_for_gcs_uri,
+        test_gcs_media_routed_by_size_and_duration,
+        test_batch_handed_on_at_deadline,
+        test_agent_stores_segment_timestamps,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
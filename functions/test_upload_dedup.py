@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Local test for upload content deduplication
+Checks reuse within the window, founder scoping and force_reprocess parsing.
+Uses a minimal in-memory Firestore stand-in so no GCP access is needed
+"""
+
+import sys
+import time
+
+from utils.upload_dedup import (
+    compute_content_hash,
+    content_hash_key,
+    find_reusable_result,
+    is_force_reprocess,
+    record_content_hash,
+)
+
+FOUNDER = "founder@acme.io"
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store, key):
+        self._store = store
+        self._key = key
+
+    def get(self, field_paths=None):
+        return FakeSnapshot(self._store.get(self._key))
+
+    def set(self, data, merge=False):
+        self._store[self._key] = data
+
+
+class FakeCollection:
+    def __init__(self, store):
+        self._store = store
+
+    def document(self, key):
+        return FakeDocument(self._store, key)
+
+
+class FakeDB:
+    def __init__(self):
+        self.collections = {}
+
+    def collection(self, name):
+        return FakeCollection(self.collections.setdefault(name, {}))
+
+
+def test_identical_content_reuses_completed_result():
+    """A recorded hash pointing at a successful result is reusable by the same founder"""
+    print("\nTest: identical content reuses the completed result")
+    db = FakeDB()
+    content_hash = compute_content_hash(b"%PDF-1.4 deck")
+    db.collection("ingestionResults").document("memo-1").set({"status": "SUCCESS"})
+    record_content_hash(db, content_hash, "memo-1", FOUNDER, upload_id="upload-1", file_path="deck/1-a.pdf")
+
+    entry = find_reusable_result(db, content_hash, FOUNDER, window_seconds=60)
+    assert entry is not None
+    assert entry["ingestion_result_id"] == "memo-1"
+    assert find_reusable_result(db, content_hash, " Founder@Acme.io ", window_seconds=60) is not None
+    assert find_reusable_result(db, compute_content_hash(b"other"), FOUNDER, window_seconds=60) is None
+    print("  ✅ Reused memo-1")
+
+
+def test_reuse_is_scoped_by_founder():
+    """Another founder uploading the same bytes never gets the first founder's memo"""
+    print("\nTest: reuse is scoped by founder")
+    db = FakeDB()
+    content_hash = compute_content_hash(b"%PDF-1.4 shared deck")
+    db.collection("ingestionResults").document("memo-3").set(
+        {"status": "SUCCESS", "memo_1": {"founder_email": FOUNDER}})
+    record_content_hash(db, content_hash, "memo-3", FOUNDER, upload_id="upload-3")
+
+    assert find_reusable_result(db, content_hash, FOUNDER, window_seconds=60) is not None
+    assert find_reusable_result(db, content_hash, "other@rival.io", window_seconds=60) is None
+    assert "memo-3" not in str(db.collections["contentHashes"].get(content_hash))
+
+    # Unknown founders neither record nor reuse
+    record_content_hash(db, content_hash, "memo-4", "unknown@example.com")
+    record_content_hash(db, content_hash, "memo-5", None)
+    assert len(db.collections["contentHashes"]) == 1
+    assert find_reusable_result(db, content_hash, "unknown@example.com", window_seconds=60) is None
+    assert find_reusable_result(db, content_hash, "", window_seconds=60) is None
+
+    # An entry whose memo belongs to someone else is not reused
+    db.collection("ingestionResults").document("memo-3").set(
+        {"status": "SUCCESS", "memo_1": {"founder_email": "other@rival.io"}})
+    assert find_reusable_result(db, content_hash, FOUNDER, window_seconds=60) is None
+    print("  ✅ Same bytes from another or unknown founder are processed separately")
+
+
+def test_window_and_failed_results_are_not_reused():
+    """Expired entries, disabled windows and failed results are never reused"""
+    print("\nTest: reuse window and result status are respected")
+    db = FakeDB()
+    content_hash = compute_content_hash(b"deck")
+    db.collection("ingestionResults").document("memo-2").set({"status": "SUCCESS"})
+    db.collection("contentHashes").document(content_hash_key(content_hash, FOUNDER)).set({
+        "ingestion_result_id": "memo-2",
+        "founder_email": FOUNDER,
+        "completed_at": time.time() - 120,
+    })
+    assert find_reusable_result(db, content_hash, FOUNDER, window_seconds=60) is None
+    assert find_reusable_result(db, content_hash, FOUNDER, window_seconds=0) is None
+    assert find_reusable_result(db, content_hash, FOUNDER, window_seconds=600) is not None
+
+    db.collection("ingestionResults").document("memo-2").set({"status": "FAILED"})
+    assert find_reusable_result(db, content_hash, FOUNDER, window_seconds=600) is None
+    print("  ✅ Window and status checks passed")
+
+
+def test_force_reprocess_flag():
+    """Form and JSON values for force_reprocess are interpreted consistently"""
+    print("\nTest: force_reprocess parsing")
+    assert is_force_reprocess("true") and is_force_reprocess("1") and is_force_reprocess(True)
+    assert not is_force_reprocess(None) and not is_force_reprocess("false") and not is_force_reprocess("")
+    print("  ✅ Flag parsing passed")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Upload Deduplication")
+    print("=" * 60)
+
+    tests = [
+        test_identical_content_reuses_completed_result,
+        test_reuse_is_scoped_by_founder,
+        test_window_and_failed_results_are_not_reused,
+        test_force_reprocess_flag,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Local test for multi-region Vertex AI calls
+Checks region configuration and pins, weighted round-robin by configured weight and
+limiter headroom, failover on quota and unavailable errors, region cooldowns and
+residency pins, and that routed call sites use the region pool. Models are fakes,
+so no network access is needed
+"""
+
+import random
+import sys
+
+from google.api_core import exceptions as google_exceptions
+
+import utils.rate_limiter as rate_limiter
+import utils.vertex_regions as vertex_regions
+from utils.metrics import get_metrics_registry
+from utils.model_routing import ModelRouter
+from utils.rate_limiter import (
+    DEFAULT_RATE_LIMITS, VERTEX_PROVIDER, AdaptiveRateLimiter, RetryPolicy, get_rate_limiter_registry,
+)
+from utils.vertex_regions import (
+    REGION_CALLS_METRIC, VertexRegion, VertexRegionPool, parse_pins, parse_regions,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RegionModel:
+    """Fake GenerativeModel for one region; fails while failing is set"""
+
+    def __init__(self, resource_name, failing):
+        self._model_name = resource_name
+        self.region = resource_name.split("/locations/")[1].split("/")[0]
+        self.failing = failing
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        error = self.failing.get(self.region)
+        if error is not None:
+            raise error
+        return f"{self.region}: {contents}"
+
+
+class Regions:
+    """Model factory for a pool; failing maps region -> error"""
+
+    def __init__(self):
+        self.failing = {}
+        self.models = {}
+
+    def __call__(self, resource_name):
+        model = RegionModel(resource_name, self.failing)
+        self.models.setdefault(model.region, []).append(model)
+        return model
+
+    def calls(self, region):
+        return sum(model.calls for model in self.models.get(region, []))
+
+
+def _pool(regions, factory, pins=None, clock=None):
+    return VertexRegionPool("test-project", regions, pins, model_factory=factory, clock=clock or FakeClock())
+
+
+class NoWaitPolicies:
+    """Retries without backoff inside the with block"""
+
+    def __enter__(self):
+        self._saved = (rate_limiter.DEFAULT_RETRY_POLICY, vertex_regions.FAILOVER_RETRY_POLICY)
+        rng = random.Random(0)
+        rate_limiter.DEFAULT_RETRY_POLICY = RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, rng=rng)
+        vertex_regions.FAILOVER_RETRY_POLICY = RetryPolicy(max_attempts=2, base_delay=0, max_delay=0, rng=rng)
+        return self
+
+    def __exit__(self, *exc):
+        rate_limiter.DEFAULT_RETRY_POLICY, vertex_regions.FAILOVER_RETRY_POLICY = self._saved
+        return False
+
+
+def test_configuration():
+    """Regions, weights and pins are parsed; the most specific pin applies"""
+    print("\nTest: configuration")
+    regions = parse_regions("asia-south1:3, us-central1,europe-west4:bad")
+    assert [(r.name, r.weight) for r in regions] == [("asia-south1", 3.0), ("us-central1", 1.0),
+                                                    ("europe-west4", 1.0)]
+    pins = parse_pins('{"intake": ["asia-south1"], "intake.summary": "europe-west4"}')
+    pool = _pool(regions, Regions(), pins)
+    assert pool.allowed_regions("intake") == ["asia-south1"]
+    assert pool.allowed_regions("intake.extraction") == ["asia-south1"]
+    assert pool.allowed_regions("intake.summary") == ["europe-west4"]
+    assert pool.allowed_regions("diligence") == ["asia-south1", "us-central1", "europe-west4"]
+    assert parse_pins("not json") == {} and parse_pins('["asia-south1"]') == {}
+
+    for empty in ('{"intake": []}', '{"intake": ""}', '{"intake": [" "]}'):
+        try:
+            _pool(regions, Regions(), parse_pins(empty))
+            raise AssertionError(f"{empty} was accepted")
+        except ValueError as e:
+            assert "'intake'" in str(e), e
+    print("  ✅ Weights parsed, pins matched by call site prefix, empty pins rejected")
+
+
+def test_weighted_round_robin():
+    """Picks follow the configured weights, scaled by each region's limiter headroom"""
+    print("\nTest: weighted round-robin")
+    pool = _pool([VertexRegion("wrr-a", 3), VertexRegion("wrr-b", 1)], Regions())
+    picks = [pool.order("gemini-wrr")[0] for _ in range(40)]
+    assert picks.count("wrr-a") == 30 and picks.count("wrr-b") == 10, picks
+    assert picks[:4].count("wrr-b") == 1
+
+    # wrr-a is throttled down to min_rps, so wrr-b now has far more headroom
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(VERTEX_PROVIDER, "gemini-wrr@wrr-a", DEFAULT_RATE_LIMITS[VERTEX_PROVIDER],
+                                  clock=clock)
+    get_rate_limiter_registry()._limiters[(VERTEX_PROVIDER, "gemini-wrr@wrr-a")] = limiter
+    while limiter.rate > limiter.config.min_rps:
+        limiter.on_throttle()
+        clock.now += limiter.config.cooldown_seconds
+    picks = [pool.order("gemini-wrr")[0] for _ in range(40)]
+    assert picks.count("wrr-b") > 32, picks
+    print("  ✅ 30/10 split by weight; traffic moves off the throttled region")
+
+
+def test_failover_and_cooldown():
+    """Quota errors fail over to the next region; the failed region sits out its cooldown"""
+    print("\nTest: failover")
+    registry = get_metrics_registry()
+    registry.reset(REGION_CALLS_METRIC)
+    factory = Regions()
+    clock = FakeClock()
+    pool = _pool([VertexRegion("fo-home"), VertexRegion("fo-backup")], factory, clock=clock)
+    model = vertex_regions.RegionalModel(pool, "gemini-fo")
+    factory.failing["fo-home"] = google_exceptions.ResourceExhausted("429 Quota exceeded")
+    with NoWaitPolicies():
+        answers = [model.generate_content("prompt") for _ in range(4)]
+    assert answers == ["fo-backup: prompt"] * 4, answers
+    assert factory.calls("fo-home") == 2, factory.calls("fo-home")
+    assert registry.value(REGION_CALLS_METRIC, region="fo-home", outcome="failed_over") == 1
+    assert pool.snapshot()["regions"]["fo-home"]["unhealthy_for_seconds"] == 30
+
+    factory.failing.clear()
+    clock.now += 31
+    with NoWaitPolicies():
+        regions = {model.generate_content("prompt").split(":")[0] for _ in range(4)}
+    assert regions == {"fo-home", "fo-backup"}, regions
+    print("  ✅ Backup served during the 30s cooldown, then both regions again")
+
+
+def test_pins_and_errors():
+    """Pinned call sites never leave their regions; other errors are raised at once"""
+    print("\nTest: pins and errors")
+    factory = Regions()
+    pool = _pool([VertexRegion("pin-home"), VertexRegion("pin-other")], factory, {"intake": ["pin-home"]})
+    factory.failing["pin-home"] = google_exceptions.ServiceUnavailable("503 unavailable")
+    with NoWaitPolicies():
+        try:
+            vertex_regions.RegionalModel(pool, "gemini-pin", call_site="intake.extraction").generate_content("deck")
+            raise AssertionError("ServiceUnavailable was swallowed")
+        except google_exceptions.ServiceUnavailable:
+            pass
+        assert factory.calls("pin-other") == 0 and factory.calls("pin-home") == 3
+
+        factory.failing["pin-home"] = ValueError("invalid argument")
+        pool = _pool([VertexRegion("pin-home"), VertexRegion("pin-other")], factory)
+        try:
+            vertex_regions.RegionalModel(pool, "gemini-pin").generate_content("prompt")
+            raise AssertionError("ValueError was swallowed")
+        except ValueError:
+            pass
+        assert factory.calls("pin-other") == 0 and factory.calls("pin-home") == 4
+
+    resource_names = [m._model_name for models in factory.models.values() for m in models]
+    assert "projects/test-project/locations/pin-home/publishers/google/models/gemini-pin" in resource_names
+    print("  ✅ intake stayed in pin-home; ValueError not failed over")
+
+
+def test_routed_calls_use_region_pool():
+    """Routed models come from the pool with the call site's pin"""
+    print("\nTest: routing")
+    factory = Regions()
+    saved = vertex_regions._vertex_region_pool
+    vertex_regions._vertex_region_pool = _pool(
+        [VertexRegion("route-a"), VertexRegion("route-b")], factory, {"investor_matching": ["route-b"]}
+    )
+    try:
+        router = ModelRouter()
+        with NoWaitPolicies():
+            answer = router.model_for("investor_matching.why_match").generate_content("why")
+        assert answer == "route-b: why", answer
+        assert vertex_regions.get_vertex_region_pool().snapshot()["pins"] == {"investor_matching": ["route-b"]}
+    finally:
+        vertex_regions._vertex_region_pool = saved
+    print("  ✅ why_match served in its pinned region")
+
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing Vertex AI Regions")
+    print("=" * 60)
+
+    tests = [
+        test_configuration,
+        test_weighted_round_robin,
+        test_failover_and_cooldown,
+        test_pins_and_errors,
+        test_routed_calls_use_region_pool,
+    ]
+
+    failures = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failures += 1
+            print(f"  ❌ {test.__name__} failed: {e}")
+
+    all_passed = failures == 0
+    print(f"\n{'✅ ALL TESTS PASSED' if all_passed else '❌ SOME TESTS FAILED'}")
+    return 0 if all_passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Circuit Breaker
+Per-dependency circuit breakers for Perplexity, Vertex AI and SendGrid.
+
+A breaker watches the outcome and latency of the last window_size calls to its
+dependency. It opens when, after at least minimum_calls, the failure rate or the
+slow-call rate reaches its threshold. While open, calls fail at once with
+CircuitOpenError, so callers drop straight to their fallbacks (GoogleValidationService,
+mock data, empty enrichment) instead of waiting out timeouts. After open_seconds
+the breaker is half-open: half_open_calls trial calls are let through, and it
+closes when they all succeed or opens again on the first failure.
+
+Only dependency failures count: transient errors (5xx, timeouts, connection
+errors). Rate limits are left to utils.rate_limiter, and client errors (bad
+requests, invalid keys) are the caller's. Breakers are shared within the process
+(get_circuit_breaker); Vertex AI has one per region ("vertex@asia-south1").
+
+CIRCUIT_BREAKERS=0 turns breakers off. States are published as the
+circuit_breaker_state gauge (0 closed, 1 half-open, 2 open); rejected calls and
+transitions are counted (circuit_breaker_rejected_total, circuit_breaker_transitions_total).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.metrics import get_metrics_registry
+from utils.rate_limiter import PERPLEXITY_PROVIDER, VERTEX_PROVIDER, is_rate_limit_error, is_transient_error
+
+logger = logging.getLogger(__name__)
+
+SENDGRID_DEPENDENCY = "sendgrid"
+
+STATE_GAUGE = "circuit_breaker_state"
+REJECTED_METRIC = "circuit_breaker_rejected_total"
+TRANSITIONS_METRIC = "circuit_breaker_transitions_total"
+
+STATE_CLOSED = "closed"
+STATE_HALF_OPEN = "half_open"
+STATE_OPEN = "open"
+
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """The dependency's breaker is open; the call was not made."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit breaker {name} is open, failing fast (retry in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+@dataclass
+class BreakerConfig:
+    failure_rate_threshold: float = 0.5
+    slow_call_seconds: float = 30.0
+    slow_call_rate_threshold: float = 0.8
+    window_size: int = 20
+    minimum_calls: int = 5
+    open_seconds: float = 30.0
+    half_open_calls: int = 2
+
+
+# Slow-call thresholds sit well above normal latency: a Perplexity search takes a
+# few seconds, a long Gemini generation can take a minute
+DEFAULT_BREAKER_CONFIGS: Dict[str, BreakerConfig] = {
+    PERPLEXITY_PROVIDER: BreakerConfig(slow_call_seconds=20.0),
+    VERTEX_PROVIDER: BreakerConfig(slow_call_seconds=120.0),
+    SENDGRID_DEPENDENCY: BreakerConfig(slow_call_seconds=10.0, minimum_calls=3, open_seconds=60.0),
+}
+
+
+def circuit_breakers_enabled() -> bool:
+    return os.environ.get("CIRCUIT_BREAKERS", "1") != "0"
+
+
+def dependency_of(name: str) -> str:
+    """Dependency of a breaker name, e.g. "vertex" for "vertex@asia-south1"."""
+    return name.partition("@")[0]
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for holder in (error, getattr(error, "response", None)):
+        for attribute in ("status_code", "status", "code"):
+            value = getattr(holder, attribute, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """True when error says the dependency is unhealthy rather than the call being wrong."""
+    if isinstance(error, CircuitOpenError) or is_rate_limit_error(error):
+        return False
+    if is_transient_error(error) or isinstance(error, OSError):
+        return True
+    status = _status_code(error)
+    return status is not None and status >= 500
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding window of recent calls."""
+
+    def __init__(self, name: str, config: Optional[BreakerConfig] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.config = config or DEFAULT_BREAKER_CONFIGS.get(dependency_of(name)) or BreakerConfig()
+        self._clock = clock
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._outcomes: deque = deque(maxlen=self.config.window_size)   # (failed, slow) per call
+        self._trials = 0
+        self._trial_successes = 0
+        self._lock = threading.Lock()
+        self._publish_state()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(self._clock())
+            return self._state
+
+    def _refresh(self, now: float) -> None:
+        if self._state == STATE_OPEN and now - self._opened_at >= self.config.open_seconds:
+            self._transition(STATE_HALF_OPEN)
+
+    def _transition(self, state: str) -> None:
+        previous, self._state = self._state, state
+        if state == STATE_OPEN:
+            self._opened_at = self._clock()
+        if state != STATE_CLOSED:
+            self._trials = 0
+            self._trial_successes = 0
+        if state == STATE_CLOSED:
+            self._outcomes.clear()
+        self._publish_state()
+        get_metrics_registry().increment(TRANSITIONS_METRIC, breaker=self.name, state=state)
+        log = logger.warning if state == STATE_OPEN else logger.info
+        log(f"Circuit breaker {self.name}: {previous} -> {state}")
+
+    def _publish_state(self) -> None:
+        get_metrics_registry().set_gauge(STATE_GAUGE, _STATE_VALUES[self._state], breaker=self.name)
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError."""
+        if not circuit_breakers_enabled():
+            return
+        with self._lock:
+            now = self._clock()
+            self._refresh(now)
+            if self._state == STATE_CLOSED:
+                return
+            if self._state == STATE_HALF_OPEN and self._trials < self.config.half_open_calls:
+                self._trials += 1
+                return
+            retry_in = max(0.0, self._opened_at + self.config.open_seconds - now)
+        get_metrics_registry().increment(REJECTED_METRIC, breaker=self.name)
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record(self, seconds: float, failed: bool) -> None:
+        """Record the outcome of an admitted call."""
+        if not circuit_breakers_enabled():
+            return
+        slow = seconds >= self.config.slow_call_seconds
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                if failed or slow:
+                    self._transition(STATE_OPEN)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.config.half_open_calls:
+                        self._transition(STATE_CLOSED)
+                return
+            if self._state == STATE_OPEN:
+                return
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if calls < self.config.minimum_calls:
+                return
+            failure_rate = sum(1 for f, _ in self._outcomes if f) / calls
+            slow_rate = sum(1 for _, s in self._outcomes if s) / calls
+            if (failure_rate >= self.config.failure_rate_threshold
+                    or slow_rate >= self.config.slow_call_rate_threshold):
+                self._transition(STATE_OPEN)
+
+    def _abandon(self) -> None:
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._trials > self._trial_successes:
+                self._trials -= 1
+
+    @contextmanager
+    def guard(self, is_failure: Callable[[BaseException], bool] = is_dependency_failure) -> Iterator[None]:
+        """
+        Runs the with block as one call through the breaker.
+
+        Raises:
+            CircuitOpenError: The breaker is open; the block is not run
+        """
+        self.before_call()
+        started = self._clock()
+        try:
+            yield
+        except Exception as e:
+            self.record(self._clock() - started, failed=is_failure(e))
+            raise
+        except BaseException:
+            # Cancelled: no outcome, but a half-open trial slot is handed back
+            self._abandon()
+            raise
+        self.record(self._clock() - started, failed=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            self._refresh(now)
+            calls = len(self._outcomes)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "calls": calls,
+                "failure_rate": round(sum(1 for f, _ in self._outcomes if f) / calls, 3) if calls else 0.0,
+                "slow_call_rate": round(sum(1 for _, s in self._outcomes if s) / calls, 3) if calls else 0.0,
+                "open_for_seconds": (max(0, round(self._opened_at + self.config.open_seconds - now))
+                                     if self._state == STATE_OPEN else 0),
+            }
+
+
+class CircuitBreakerRegistry:
+    """One breaker per name for the whole process."""
+
+    def __init__(self, configs: Optional[Dict[str, BreakerConfig]] = None):
+        self.configs = dict(configs or DEFAULT_BREAKER_CONFIGS)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, self.configs.get(dependency_of(name)))
+                self._breakers[name] = breaker
+            return breaker
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Breakers grouped by dependency; a dependency is down when all its breakers are open."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        dependencies: Dict[str, Any] = {}
+        for breaker in breakers:
+            entry = dependencies.setdefault(dependency_of(breaker.name), {"breakers": []})
+            entry["breakers"].append(breaker.snapshot())
+        for entry in dependencies.values():
+            states = [b["state"] for b in entry["breakers"]]
+            if all(state == STATE_OPEN for state in states):
+                entry["status"] = "down"
+            elif all(state == STATE_CLOSED for state in states):
+                entry["status"] = "ok"
+            else:
+                entry["status"] = "degraded"
+        return dependencies
+
+
+# Global instance
+_circuit_breaker_registry = None
+
+
+def get_circuit_breaker_registry() -> CircuitBreakerRegistry:
+    """Get or create the global circuit breaker registry."""
+    global _circuit_breaker_registry
+    if _circuit_breaker_registry is None:
+        _circuit_breaker_registry = CircuitBreakerRegistry()
+    return _circuit_breaker_registry
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    return get_circuit_breaker_registry().get(name)
@@ -0,0 +1,278 @@
+"""
+Company Identity
+Fast identification of the company behind a pitch deck (name, website, sector) from
+the text of its first pages, so company-level enrichment can start while the full
+Memo 1 extraction is still running.
+
+Speculative enrichment results are only used when the identity found here matches
+the company in the finished memo; otherwise they are discarded.
+"""
+
+import asyncio
+import inspect
+import logging
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+from utils.deadline import in_current_context
+
+logger = logging.getLogger(__name__)
+
+_DOMAIN_RE = re.compile(
+    r"\b(?:https?://)?(?:www\.)?((?:[a-z0-9-]+\.)+(?:com|ai|io|co|in|app|tech|net|org|xyz|dev|so|vc))\b",
+    re.IGNORECASE,
+)
+_IGNORED_DOMAINS = ("linkedin.com", "google.com", "gmail.com", "youtube.com", "twitter.com", "x.com",
+                    "facebook.com", "instagram.com", "crunchbase.com", "medium.com")
+
+_GENERIC_TITLES = {
+    "pitch deck", "investor presentation", "investor deck", "confidential", "company overview",
+    "introduction", "agenda", "welcome", "seed round", "series a", "presentation",
+}
+
+_NAME_SUFFIXES = {
+    "inc", "llc", "ltd", "limited", "pvt", "private", "corp", "corporation", "co", "company",
+    "technologies", "technology", "tech", "labs", "ai", "hq", "io", "app",
+}
+
+# Sector keywords, matched case-insensitively on the first pages
+SECTOR_KEYWORDS = {
+    "FinTech": ["fintech", "payment", "payments", "lending", "banking", "credit", "insurance", "wealth"],
+    "HealthTech": ["health", "healthcare", "clinic", "patient", "medical", "diagnostic", "hospital"],
+    "EdTech": ["edtech", "education", "learning", "students", "teachers", "courses", "upskilling"],
+    "HRTech": ["hrtech", "hiring", "recruit", "recruiting", "talent", "payroll", "workforce"],
+    "Logistics": ["logistics", "warehouse", "supply chain", "3pl", "shipping", "fleet", "delivery"],
+    "E-commerce": ["e-commerce", "ecommerce", "marketplace", "d2c", "retail", "shoppers"],
+    "ClimateTech": ["climate", "carbon", "renewable", "solar", "energy storage", "emissions"],
+    "AI/ML": ["artificial intelligence", "machine learning", "llm", "generative ai", "ai-powered", "computer vision"],
+    "SaaS": ["saas", "subscription software", "b2b software", "platform for teams"],
+}
+
+
+@dataclass
+class CompanyIdentity:
+    """Company identity found on the first pages of a deck."""
+    name: str = ""
+    website: str = ""
+    sector: str = ""
+    source: str = "heuristic"
+
+    @property
+    def is_usable(self) -> bool:
+        return bool(normalize_company_name(self.name))
+
+    def context(self) -> str:
+        """Company context string in the form used by the Perplexity queries."""
+        return f"{self.name} in {self.sector}" if self.sector else self.name
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def normalize_company_name(name: Any) -> str:
+    """Lowercase alphanumeric name without legal/common suffixes ('Acme Robotics Inc.' -> 'acmerobotics')."""
+    if not isinstance(name, str):
+        return ""
+    tokens = re.findall(r"[a-z0-9]+", name.lower())
+    while len(tokens) > 1 and tokens[-1] in _NAME_SUFFIXES:
+        tokens.pop()
+    return "".join(tokens)
+
+
+def _domain_label(domain: str) -> str:
+    return domain.lower().split(".")[0]
+
+
+def find_website(text: str) -> str:
+    """First company-looking domain in the text."""
+    for match in _DOMAIN_RE.finditer(text or ""):
+        domain = match.group(1).lower()
+        if not domain.endswith(_IGNORED_DOMAINS) and "@" not in text[max(0, match.start() - 1):match.start()]:
+            return domain
+    return ""
+
+
+def find_sector(text: str) -> str:
+    """Sector with the most keyword hits, or '' when nothing matches."""
+    lowered = (text or "").lower()
+    counts = Counter({
+        sector: sum(len(re.findall(rf"\b{re.escape(keyword)}\b", lowered)) for keyword in keywords)
+        for sector, keywords in SECTOR_KEYWORDS.items()
+    })
+    sector, hits = counts.most_common(1)[0]
+    return sector if hits else ""
+
+
+def find_company_name(text: str, website: str = "") -> str:
+    """
+    Company name from first-page text.
+
+    Prefers the first page's title ('# Title' in compact deck text), then its first
+    short line, skipping generic titles; falls back to the website's domain label.
+    """
+    pages = [page for page in re.split(r"^--- Page .*---$", text or "", flags=re.MULTILINE) if page.strip()]
+    titles, lines = [], []
+    for line in (pages[0] if pages else "").splitlines():
+        line = line.strip()
+        if line.startswith("# "):
+            titles.append(line[2:].strip())
+        elif line:
+            lines.append(line)
+
+    for candidate in (titles + lines)[:6]:
+        cleaned = re.sub(r"^[•\-\*\s]+", "", candidate).strip(" :|-")
+        if not cleaned or cleaned.lower() in _GENERIC_TITLES or len(cleaned.split()) > 5:
+            continue
+        if _DOMAIN_RE.fullmatch(cleaned):
+            continue
+        return cleaned
+    return _domain_label(website).capitalize() if website else ""
+
+
+def identify_from_text(text: str) -> CompanyIdentity:
+    """Identify the company from the text of the first pages."""
+    website = find_website(text)
+    return CompanyIdentity(
+        name=find_company_name(text, website),
+        website=website,
+        sector=find_sector(text),
+    )
+
+
+def identities_match(identity: CompanyIdentity, memo: Dict[str, Any]) -> bool:
+    """
+    True when the speculative identity refers to the company in the finished memo.
+
+    Names match when their normalized forms are equal or one is a prefix of the
+    other; a website mentioned anywhere in the memo's company fields also matches.
+    """
+    speculative = normalize_company_name(identity.name)
+    for key in ("title", "company_name"):
+        final = normalize_company_name(memo.get(key))
+        if speculative and final and len(min(speculative, final, key=len)) >= 3:
+            if speculative == final or final.startswith(speculative) or speculative.startswith(final):
+                return True
+
+    if identity.website:
+        label = _domain_label(identity.website)
+        for key in ("website", "company_website", "company_linkedin_url", "title"):
+            value = memo.get(key)
+            if isinstance(value, str) and label and label in normalize_company_name(value):
+                return True
+    return False
+
+
+class SpeculativeEnrichment:
+    """
+    Company-level enrichment started in a background thread while Memo 1 is extracted.
+
+    The worker first identifies the company, then prefetches research for it.
+    resolve() reconciles the result with the finished memo. A prefetch returning a
+    coroutine runs as an asyncio task that cancel() stops, searches in flight
+    included; resolve() cancels it when the research will not be used.
+    """
+
+    def __init__(self):
+        self.identity: Optional[CompanyIdentity] = None
+        self.future = None
+        self.outcome: Dict[str, Any] = {"used": False}
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, identify: Callable[[], Optional[CompanyIdentity]],
+              prefetch: Callable[[CompanyIdentity], Dict[str, Any]]) -> "SpeculativeEnrichment":
+        """
+        Run identify() and then prefetch(identity) in a background thread.
+
+        Args:
+            identify: Returns the speculative identity, or None when it cannot be found
+            prefetch: Returns the prefetched enrichment data for an identity, or a
+                coroutine producing it
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative-enrichment")
+        self.future = executor.submit(in_current_context(self._run), identify, prefetch)
+        executor.shutdown(wait=False)
+        return self
+
+    def _run(self, identify, prefetch) -> Dict[str, Any]:
+        self.identity = identify()
+        if self.identity is None or self._cancelled:
+            return {}
+        logger.info(f"Speculatively enriching {self.identity.context()!r}")
+        prefetched = prefetch(self.identity)
+        if inspect.isawaitable(prefetched):
+            prefetched = asyncio.run(self._run_task(prefetched))
+        return prefetched or {}
+
+    async def _run_task(self, awaitable) -> Dict[str, Any]:
+        task = asyncio.ensure_future(awaitable)
+        with self._lock:
+            self._loop, self._task = asyncio.get_running_loop(), task
+            if self._cancelled:
+                task.cancel()
+        try:
+            return await task
+        except asyncio.CancelledError:
+            logger.info("Speculative enrichment cancelled")
+            return {}
+        finally:
+            with self._lock:
+                self._loop, self._task = None, None
+
+    def cancel(self) -> None:
+        """Stop the prefetch, including searches already running; a no-op once it finished."""
+        with self._lock:
+            self._cancelled = True
+            loop, task = self._loop, self._task
+        if self.future is not None:
+            self.future.cancel()
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # The loop closed after the task finished
+                pass
+
+    def _discard(self, reason: str) -> None:
+        self.outcome["discarded_reason"] = reason
+        logger.info(f"Discarding speculative enrichment: {reason}")
+
+    def resolve(self, memo: Dict[str, Any], timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the prefetched data when the identity matches the memo, else None.
+
+        Does not wait for the prefetch when the identity is already known not to
+        match. Mismatched, failed or timed-out speculative work is discarded.
+        """
+        if self.identity is not None and not identities_match(self.identity, memo):
+            self.cancel()
+            self.outcome["identity"] = self.identity.to_dict()
+            self._discard(f"identity mismatch (memo title: {memo.get('title')!r})")
+            return None
+        try:
+            prefetched = self.future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            self.cancel()
+            self._discard(f"not finished {timeout}s after extraction")
+            return None
+        except Exception as e:
+            self._discard(f"speculative enrichment failed: {e}")
+            return None
+
+        if self.identity is None:
+            self._discard("company not identified from the first pages")
+            return None
+        self.outcome["identity"] = self.identity.to_dict()
+        if not identities_match(self.identity, memo):
+            self._discard(f"identity mismatch (memo title: {memo.get('title')!r})")
+            return None
+
+        self.outcome["used"] = bool(prefetched)
+        self.outcome["categories"] = sorted(prefetched)
+        return prefetched or None
@@ -0,0 +1,167 @@
+"""
+Deadline
+Carries the time budget of a request or task through agents and services.
+
+Entry points run under a deadline (with_deadline / deadline_scope) derived from
+their function timeout: 540 s for Pub/Sub tasks, the timeout_sec of HTTP functions.
+The deadline lives in a context variable, so it follows the call into coroutines;
+thread pools get it with in_current_context().
+
+Outbound calls take their timeouts from the remaining budget:
+- timeout_for(default) bounds an existing timeout (Perplexity, enrichment waits).
+- rpc_options(default) gives timeout/retry arguments for google-cloud calls
+  (Firestore), so their retries stop at the deadline too.
+- check_deadline() fails a call that cannot start in time with DeadlineExceeded;
+  utils.rate_limiter checks it before every attempt and does not back off past it.
+Optional stages ask has_budget() first and are skipped when too little time is
+left; skips are counted in deadline_skipped_stages_total by stage. reserving()
+holds part of the budget back, e.g. for saving a result after a long stage.
+
+Without a deadline every helper leaves the call as it was.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.metrics import get_metrics_registry
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    from google.api_core.retry import Retry, if_exception_type
+    _RPC_RETRY_PREDICATE = if_exception_type(
+        google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded, google_exceptions.ResourceExhausted,
+    )
+except ImportError:
+    Retry = None
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_STAGES_METRIC = "deadline_skipped_stages_total"
+
+# Shortest timeout handed to a call, so an almost spent budget still gets an answer or an error
+MIN_CALL_TIMEOUT_SECONDS = 1.0
+
+_current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Too little of the request's time budget is left to start the operation."""
+
+    def __init__(self, operation: str, remaining_seconds: float):
+        super().__init__(f"Out of time budget for {operation} ({remaining_seconds:.1f}s left)")
+        self.operation = operation
+        self.remaining_seconds = remaining_seconds
+
+
+def current_deadline() -> Optional[float]:
+    """time.monotonic() value of the current deadline, if any."""
+    return _current_deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None without one."""
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[float]:
+    """Runs the with block under a deadline seconds from now; never extends an outer one."""
+    deadline = time.monotonic() + seconds
+    outer = _current_deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+@contextmanager
+def reserving(seconds: float) -> Iterator[Optional[float]]:
+    """Runs the with block with seconds of the budget held back for the work after it."""
+    outer = _current_deadline.get()
+    if outer is None:
+        yield None
+        return
+    token = _current_deadline.set(outer - seconds)
+    try:
+        yield outer - seconds
+    finally:
+        _current_deadline.reset(token)
+
+
+def with_deadline(seconds: float) -> Callable:
+    """Decorator running a handler under a deadline, e.g. its function timeout."""
+    def decorator(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with deadline_scope(seconds):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with deadline_scope(seconds):
+                return fn(*args, **kwargs)
+        return run
+    return decorator
+
+
+def timeout_for(default: Optional[float] = None, minimum: float = MIN_CALL_TIMEOUT_SECONDS) -> Optional[float]:
+    """default bounded by the remaining budget (at least minimum); default without a deadline."""
+    left = remaining()
+    if left is None:
+        return default
+    bounded = left if default is None else min(default, left)
+    return max(minimum, bounded)
+
+
+def rpc_options(default: Optional[float] = None) -> Dict[str, Any]:
+    """timeout and retry keyword arguments for a google-cloud call; {} without a deadline."""
+    if remaining() is None:
+        return {}
+    timeout = timeout_for(default)
+    options: Dict[str, Any] = {"timeout": timeout}
+    if Retry is not None:
+        options["retry"] = Retry(predicate=_RPC_RETRY_PREDICATE, timeout=timeout)
+    return options
+
+
+def check_deadline(operation: str, needed_seconds: float = 0.0) -> None:
+    """
+    Raises:
+        DeadlineExceeded: needed_seconds or less of the budget is left
+    """
+    left = remaining()
+    if left is not None and left <= needed_seconds:
+        raise DeadlineExceeded(operation, left)
+
+
+def has_budget(seconds: float, stage: str) -> bool:
+    """True when at least seconds of the budget are left for the optional stage; counts skips."""
+    left = remaining()
+    if left is None or left >= seconds:
+        return True
+    get_metrics_registry().increment(SKIPPED_STAGES_METRIC, stage=stage)
+    logger.warning(f"Skipping {stage}: {max(0.0, left):.0f}s of the time budget left, needs {seconds:.0f}s")
+    return False
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """fn bound to the caller's context, for work handed to another thread."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call runs in a copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run
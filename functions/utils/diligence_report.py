@@ -0,0 +1,121 @@
+"""
+Diligence Reports
+Writes a diligenceReports document section by section while Memo 2 is generated,
+so completed sections and progress are visible before the whole memo is done.
+
+There is one report per memo, keyed by the Memo 1 id: a retried or redelivered task
+starts the same document over instead of leaving another partial or FAILED report.
+
+Layout of diligenceReports/{memo_1_id} while generating:
+    status             -> "GENERATING", then "SUCCESS" or "FAILED"
+    memo1_diligence.*  -> Memo 2 sections completed so far
+    sections_completed -> section names in completion order
+    progress           -> percent of the expected sections completed
+    currentStep        -> last completed section
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.deadline import rpc_options
+
+logger = logging.getLogger(__name__)
+
+REPORT_COLLECTION = "diligenceReports"
+
+STATUS_GENERATING = "GENERATING"
+STATUS_SUCCESS = "SUCCESS"
+STATUS_FAILED = "FAILED"
+
+
+class DiligenceReportWriter:
+    """
+    Incremental writer for one diligence report.
+
+    When db is None the report is kept in memory only, so callers can use the same
+    code path without persistence.
+    """
+
+    def __init__(self, db, memo_1_id: str, sections: List[str]):
+        self.db = db
+        self.memo_1_id = memo_1_id
+        self.sections = list(sections)
+        self.memo: Dict[str, Any] = {}
+        self.sections_completed: List[str] = []
+        self.status = STATUS_GENERATING
+        self._doc_ref = db.collection(REPORT_COLLECTION).document(memo_1_id) if db is not None else None
+
+    @property
+    def report_id(self) -> Optional[str]:
+        return self._doc_ref.id if self._doc_ref is not None else None
+
+    @property
+    def progress(self) -> int:
+        expected = len(set(self.sections) | set(self.sections_completed))
+        return int(100 * len(self.sections_completed) / expected) if expected else 0
+
+    def _write(self, data: Dict[str, Any], merge: bool = False) -> None:
+        if self._doc_ref is None:
+            return
+        try:
+            if merge:
+                self._doc_ref.update(data, **rpc_options())
+            else:
+                self._doc_ref.set(data, **rpc_options())
+        except Exception as e:
+            # Progress writes are best effort; the final write carries the full memo
+            logger.warning(f"Failed to write diligence report {self.report_id}: {e}")
+
+    def start(self) -> "DiligenceReportWriter":
+        """Create the report document in the GENERATING state, replacing an earlier attempt."""
+        now = datetime.now().isoformat()
+        self._write({
+            "timestamp": now,
+            "last_updated": now,
+            "memo_1_id": self.memo_1_id,
+            "status": STATUS_GENERATING,
+            "memo1_diligence": {},
+            "sections_completed": [],
+            "progress": 0,
+            "currentStep": "Generating Memo 1 Diligence",
+        })
+        return self
+
+    def section_completed(self, section: str, value: Any) -> None:
+        """Persist a completed Memo 2 section and update progress."""
+        self.memo[section] = value
+        if section not in self.sections_completed:
+            self.sections_completed.append(section)
+        self._write({
+            f"memo1_diligence.{section}": value,
+            "sections_completed": list(self.sections_completed),
+            "progress": self.progress,
+            "currentStep": f"Completed {section.replace('_', ' ')}",
+            "last_updated": datetime.now().isoformat(),
+        }, merge=True)
+
+    def complete(self, memo_2: Dict[str, Any], processing_time_seconds: float) -> None:
+        """Replace the partial report with the final memo."""
+        self.status = STATUS_SUCCESS
+        now = datetime.now().isoformat()
+        self._write({
+            "timestamp": now,
+            "last_updated": now,
+            "processing_time_seconds": processing_time_seconds,
+            "memo1_diligence": memo_2,
+            "memo_1_id": self.memo_1_id,
+            "status": STATUS_SUCCESS,
+            "sections_completed": list(self.sections_completed),
+            "progress": 100,
+            "currentStep": "Completed",
+        })
+
+    def fail(self, error: str) -> None:
+        """Mark the report as failed, keeping the sections completed so far."""
+        self.status = STATUS_FAILED
+        self._write({
+            "status": STATUS_FAILED,
+            "error": error,
+            "last_updated": datetime.now().isoformat(),
+        }, merge=True)
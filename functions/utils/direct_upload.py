@@ -0,0 +1,326 @@
+"""
+Direct Uploads
+Two-step upload flow that keeps file bytes out of function memory:
+
+1. create_upload_session issues a short-lived V4 signed URL that starts a GCS
+   resumable upload for exactly one object (direct/{session_id}/{file_name}).
+   The client POSTs to it with `x-goog-resumable: start` and then uploads the file
+   in chunks to the returned session URI.
+   The URL is signed with x-goog-content-length-range, so GCS itself refuses
+   objects larger than DIRECT_UPLOAD_MAX_BYTES.
+2. When the object is finalized (storage trigger) or the client calls confirm_upload,
+   register_direct_upload creates uploads/{session_id} and publishes the ingestion
+   message. Both paths may fire for the same object, even at the same moment; the
+   publisher is chosen by moving the upload from 'uploaded' to 'publishing' in a
+   transaction, so the file is queued once. Objects rejected at registration are
+   deleted.
+
+Objects are private. The uploads document id equals the session id, so clients can
+subscribe to ingestion status as soon as the session is created.
+"""
+
+import logging
+import os
+import re
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_SESSION_COLLECTION = "uploadSessions"
+DIRECT_UPLOAD_PREFIX = "direct/"
+
+# Signed URLs only need to live long enough to start the resumable session
+DEFAULT_URL_TTL_SECONDS = 15 * 60
+DEFAULT_MAX_UPLOAD_BYTES = 2 * 1024 ** 3
+# A publisher that crashed mid-publish gives up its claim after this long
+DEFAULT_PUBLISH_LEASE_SECONDS = 120
+
+ALLOWED_CONTENT_TYPE_PREFIXES = ("application/pdf", "video/", "audio/")
+
+SESSION_PENDING = "pending"
+SESSION_REGISTERED = "registered"
+SESSION_REJECTED = "rejected"
+
+UPLOAD_UPLOADED = "uploaded"
+UPLOAD_PUBLISHING = "publishing"
+
+
+def get_url_ttl_seconds() -> int:
+    """Return the signed URL lifetime in seconds."""
+    return int(os.environ.get("DIRECT_UPLOAD_URL_TTL_SECONDS", DEFAULT_URL_TTL_SECONDS))
+
+
+def get_max_upload_bytes() -> int:
+    """Return the largest accepted upload size in bytes."""
+    return int(os.environ.get("DIRECT_UPLOAD_MAX_BYTES", DEFAULT_MAX_UPLOAD_BYTES))
+
+
+def content_length_range() -> str:
+    """x-goog-content-length-range value that caps uploads at the configured maximum."""
+    return f"0,{get_max_upload_bytes()}"
+
+
+def sanitize_file_name(file_name: str) -> str:
+    """Keep the base name and replace characters that are awkward in object names."""
+    base = (file_name or "").replace("\\", "/").split("/")[-1].strip()
+    base = re.sub(r"[^A-Za-z0-9._() -]", "_", base)
+    return base[:200] or "upload"
+
+
+def build_object_name(session_id: str, file_name: str) -> str:
+    return f"{DIRECT_UPLOAD_PREFIX}{session_id}/{sanitize_file_name(file_name)}"
+
+
+def is_direct_upload_object(object_name: Optional[str]) -> bool:
+    return bool(object_name) and object_name.startswith(DIRECT_UPLOAD_PREFIX) and object_name.count("/") >= 2
+
+
+def session_id_from_object_name(object_name: str) -> str:
+    return object_name[len(DIRECT_UPLOAD_PREFIX):].split("/", 1)[0]
+
+
+def validate_upload_request(file_name: Optional[str], content_type: Optional[str],
+                            file_size: Any) -> Optional[str]:
+    """Return an error message for an invalid upload request, or None."""
+    if not file_name:
+        return "file_name is required"
+    if not content_type or not content_type.lower().startswith(ALLOWED_CONTENT_TYPE_PREFIXES):
+        return f"Unsupported content type: {content_type}"
+    if file_size is not None:
+        try:
+            size = int(file_size)
+        except (TypeError, ValueError):
+            return "file_size must be an integer"
+        if size <= 0 or size > get_max_upload_bytes():
+            return f"file_size must be between 1 and {get_max_upload_bytes()} bytes"
+    return None
+
+
+def _signing_kwargs() -> Dict[str, Any]:
+    """
+    Extra generate_signed_url arguments for credentials without a private key.
+
+    Cloud Functions run with token-based credentials, so signing goes through the IAM
+    signBlob API using the service account email and an access token.
+    """
+    import google.auth
+    from google.auth import credentials as auth_credentials
+    from google.auth.transport import requests as auth_requests
+
+    credentials, _ = google.auth.default()
+    if isinstance(credentials, auth_credentials.Signing):
+        return {}
+    credentials.refresh(auth_requests.Request())
+    return {
+        "service_account_email": credentials.service_account_email,
+        "access_token": credentials.token,
+    }
+
+
+def resumable_start_headers(content_type: str) -> Dict[str, str]:
+    """Headers the client sends to start the resumable upload; all but Content-Type are signed."""
+    return {
+        "x-goog-resumable": "start",
+        "x-goog-content-length-range": content_length_range(),
+        "Content-Type": content_type,
+    }
+
+
+def generate_resumable_upload_url(blob, content_type: str, ttl_seconds: int) -> str:
+    """V4 signed URL that starts a resumable upload of this one object, up to the size limit."""
+    headers = resumable_start_headers(content_type)
+    headers.pop("Content-Type")
+    return blob.generate_signed_url(
+        version="v4",
+        expiration=timedelta(seconds=ttl_seconds),
+        method="POST",
+        content_type=content_type,
+        headers=headers,
+        **_signing_kwargs(),
+    )
+
+
+def start_upload_session(db, bucket, file_name: str, content_type: str, file_size: Optional[int] = None,
+                         file_type: str = "deck", founder_email: Optional[str] = None,
+                         sign_url: Callable = generate_resumable_upload_url) -> Dict[str, Any]:
+    """
+    Create an upload session and its signed resumable-upload URL.
+
+    Args:
+        db: Firestore client
+        bucket: Storage bucket the object is uploaded to
+        file_name: Original file name
+        content_type: MIME type the client will upload with
+        file_size: Declared size in bytes (optional)
+        file_type: Upload category (e.g. 'deck')
+        founder_email: Founder email forwarded to ingestion
+        sign_url: Signs the URL for (blob, content_type, ttl_seconds)
+
+    Returns:
+        Session id, object name, signed URL and the headers the client must send
+    """
+    session_ref = db.collection(UPLOAD_SESSION_COLLECTION).document()
+    session_id = session_ref.id
+    object_name = build_object_name(session_id, file_name)
+    ttl_seconds = get_url_ttl_seconds()
+    now = time.time()
+
+    upload_url = sign_url(bucket.blob(object_name), content_type, ttl_seconds)
+    session_ref.set({
+        "status": SESSION_PENDING,
+        "bucket": bucket.name,
+        "objectName": object_name,
+        "originalName": file_name,
+        "contentType": content_type,
+        "declaredSize": int(file_size) if file_size is not None else None,
+        "fileType": file_type,
+        "founderEmail": founder_email,
+        "createdAt": now,
+        "urlExpiresAt": now + ttl_seconds,
+    })
+    logger.info(f"Created upload session {session_id} for {object_name}")
+
+    return {
+        "session_id": session_id,
+        "upload_id": session_id,
+        "object_name": object_name,
+        "upload_url": upload_url,
+        "method": "POST",
+        "headers": resumable_start_headers(content_type),
+        "expires_in": ttl_seconds,
+    }
+
+
+def get_upload_session(db, session_id: str) -> Optional[Dict[str, Any]]:
+    snapshot = db.collection(UPLOAD_SESSION_COLLECTION).document(session_id).get()
+    return snapshot.to_dict() if snapshot.exists else None
+
+
+def _can_publish(upload: Optional[Dict[str, Any]], now: float) -> bool:
+    """An upload may be published when it is registered but not queued, or its publisher's lease expired."""
+    status = (upload or {}).get("status")
+    if status == UPLOAD_UPLOADED:
+        return True
+    return status == UPLOAD_PUBLISHING and (upload or {}).get("publishLeaseExpiresAt", 0) <= now
+
+
+def claim_publish(db, upload_ref, triggered_by: str, lease_seconds: float = DEFAULT_PUBLISH_LEASE_SECONDS) -> bool:
+    """Move the upload to 'publishing' in a transaction; True for the one caller that did."""
+    from firebase_admin import firestore
+
+    @firestore.transactional
+    def claim_in_transaction(transaction):
+        now = time.time()
+        snapshot = upload_ref.get(transaction=transaction)
+        if not _can_publish(snapshot.to_dict() if snapshot.exists else None, now):
+            return False
+        transaction.update(upload_ref, {
+            "status": UPLOAD_PUBLISHING,
+            "publishingBy": triggered_by,
+            "publishLeaseExpiresAt": now + lease_seconds,
+        })
+        return True
+
+    return claim_in_transaction(db.transaction())
+
+
+def register_direct_upload(db, session_id: str, object_name: str, size: int,
+                           content_type: Optional[str], publish: Callable[[Dict[str, Any]], str],
+                           triggered_by: str = "finalize_event",
+                           delete_object: Optional[Callable[[str, str], None]] = None,
+                           claim: Callable = claim_publish) -> Dict[str, Any]:
+    """
+    Create uploads/{session_id} for a finished upload and publish the ingestion message.
+
+    Idempotent: the finalize trigger and confirm_upload may both call this, concurrently.
+    The uploads document is created in 'uploaded', and only the caller that moves it to
+    'publishing' (claim) publishes. A failed publish hands the upload back to 'uploaded'
+    for the next call; a crashed publisher's claim lapses after its lease.
+
+    Args:
+        db: Firestore client
+        session_id: Upload session id
+        object_name: Finalized object name
+        size: Object size in bytes
+        content_type: Object content type
+        publish: Publishes the ingestion message and returns its message id
+        triggered_by: Which path registered the upload
+        delete_object: Deletes (bucket_name, object_name); rejected objects are removed with it
+        claim: Claims publishing for (db, upload_ref, triggered_by)
+
+    Returns:
+        {"status": "queued" | "duplicate" | "rejected", "upload_id", ...}
+    """
+    from google.api_core.exceptions import AlreadyExists, Conflict
+
+    session_ref = db.collection(UPLOAD_SESSION_COLLECTION).document(session_id)
+    snapshot = session_ref.get()
+    if not snapshot.exists:
+        raise ValueError(f"Unknown upload session: {session_id}")
+    session = snapshot.to_dict() or {}
+    if session.get("objectName") != object_name:
+        raise ValueError(f"Object {object_name} does not belong to upload session {session_id}")
+
+    bucket_name = session.get("bucket")
+    if size > get_max_upload_bytes():
+        session_ref.update({"status": SESSION_REJECTED, "error": f"Upload exceeds {get_max_upload_bytes()} bytes"})
+        if delete_object is not None:
+            try:
+                delete_object(bucket_name, object_name)
+            except Exception as e:
+                logger.warning(f"Could not delete rejected upload {object_name}: {e}")
+        return {"status": "rejected", "upload_id": session_id, "error": "Upload too large"}
+
+    content_type = content_type or session.get("contentType")
+    upload_ref = db.collection("uploads").document(session_id)
+    try:
+        upload_ref.create({
+            "fileName": object_name,
+            "originalName": session.get("originalName"),
+            "contentType": content_type,
+            "size": size,
+            "type": session.get("fileType", "deck"),
+            "status": UPLOAD_UPLOADED,
+            "ingestionStage": "uploaded",
+            "uploadedAt": time.time(),
+            "uploadedBy": "user",
+            "founderEmail": session.get("founderEmail"),
+            "storageUri": f"gs://{bucket_name}/{object_name}",
+            "uploadSessionId": session_id,
+        })
+    except (AlreadyExists, Conflict):
+        logger.info(f"Upload {session_id} is already registered")
+
+    if not claim(db, upload_ref, triggered_by):
+        return {"status": "duplicate", "upload_id": session_id}
+
+    try:
+        message_id = publish({
+            "bucket_name": bucket_name,
+            "file_path": object_name,
+            "content_type": content_type,
+            "original_name": session.get("originalName"),
+            "file_size": size,
+            "file_type": session.get("fileType", "deck"),
+            "upload_id": session_id,
+            "founder_email": session.get("founderEmail") or "",
+            "triggered_by": triggered_by,
+        })
+    except Exception:
+        # Hand the upload back so the retried trigger or confirm_upload publishes it
+        try:
+            upload_ref.update({"status": UPLOAD_UPLOADED, "publishLeaseExpiresAt": 0})
+        except Exception as e:
+            logger.warning(f"Could not release publish claim on upload {session_id}: {e}")
+        raise
+
+    upload_ref.update({
+        "status": "processing",
+        "ingestionStage": "queued",
+        "processing_started_at": time.time(),
+        "message_id": message_id,
+    })
+    session_ref.update({"status": SESSION_REGISTERED, "registeredBy": triggered_by, "registeredAt": time.time()})
+    return {"status": "queued", "upload_id": session_id, "message_id": message_id}
@@ -0,0 +1,280 @@
+"""
+Hedging
+Hedged requests for latency-sensitive LLM calls.
+
+hedged_call() starts the call and, if it has not returned after the hedge delay,
+starts a duplicate (the same call, or another model/region via hedge_fn) and returns
+whichever succeeds first. The delay is a percentile (p95 by default) of the
+primary call's recent latencies at that call site, so only the slow tail is hedged.
+Hedges are paid for from a process-wide HedgeBudget, which earns a fraction of a
+hedge per call, capping the extra cost at that fraction.
+
+Calls run on a shared thread pool. The losing call is cancelled if it has not
+started; a call already in flight cannot be interrupted through the synchronous
+Vertex AI client, so its result is discarded when it arrives.
+
+Call sites opt in by wrapping their model: hedged(self.gemini_model, "call.site").
+LLM_HEDGING=0 turns hedging off everywhere.
+
+Outcomes are counted in llm_hedge_total by call site (not_hedged, primary_won,
+hedge_won, budget_exhausted, failed) and the time saved by winning hedges in
+llm_hedge_latency_saved_seconds_total; hedge_stats() summarizes both with the
+latency percentiles.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+from utils.deadline import in_current_context
+from utils.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+HEDGE_METRIC = "llm_hedge_total"
+HEDGE_SAVED_METRIC = "llm_hedge_latency_saved_seconds_total"
+
+OUTCOME_NOT_HEDGED = "not_hedged"
+OUTCOME_PRIMARY_WON = "primary_won"
+OUTCOME_HEDGE_WON = "hedge_won"
+OUTCOME_BUDGET_EXHAUSTED = "budget_exhausted"
+OUTCOME_FAILED = "failed"                # primary and hedge both failed
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+def hedging_enabled() -> bool:
+    return os.environ.get("LLM_HEDGING", "1") != "0"
+
+
+@dataclass
+class HedgePolicy:
+    percentile: float = 0.95       # hedge calls slower than this share of recent calls
+    min_samples: int = 20          # below this, initial_delay_seconds is used
+    initial_delay_seconds: float = 8.0
+    min_delay_seconds: float = 0.5
+    max_delay_seconds: float = 30.0
+
+
+DEFAULT_HEDGE_POLICY = HedgePolicy()
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class LatencyTracker:
+    """Recent primary-call latencies per call site."""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call_site: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(call_site, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, call_site: str, fraction: float) -> Optional[float]:
+        with self._lock:
+            latencies = list(self._latencies.get(call_site, ()))
+        return _percentile(latencies, fraction) if latencies else None
+
+    def samples(self, call_site: str) -> int:
+        with self._lock:
+            return len(self._latencies.get(call_site, ()))
+
+    def call_sites(self):
+        with self._lock:
+            return list(self._latencies)
+
+    def hedge_delay(self, call_site: str, policy: HedgePolicy) -> float:
+        """Seconds to wait for the primary call before hedging."""
+        if self.samples(call_site) < policy.min_samples:
+            return policy.initial_delay_seconds
+        delay = self.percentile(call_site, policy.percentile)
+        return min(policy.max_delay_seconds, max(policy.min_delay_seconds, delay))
+
+
+class HedgeBudget:
+    """
+    Process-wide allowance for hedges.
+
+    Every call earns ratio of a hedge (up to burst saved), and every hedge spends
+    one, so hedges stay below ratio of all calls over time.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 3.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def record_call(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def available(self) -> float:
+        return self._tokens
+
+
+def hedged_call(fn: Callable[[], Any], call_site: str, hedge_fn: Optional[Callable[[], Any]] = None,
+                policy: Optional[HedgePolicy] = None) -> Any:
+    """
+    Calls fn, hedging with hedge_fn (default: fn again) when it is slow.
+
+    Returns:
+        The result of the first call to succeed; if both fail, the primary's error
+        is raised
+    """
+    if not hedging_enabled():
+        return fn()
+    policy = policy or DEFAULT_HEDGE_POLICY
+    tracker = get_latency_tracker()
+    budget = get_hedge_budget()
+    registry = get_metrics_registry()
+    budget.record_call()
+
+    started = time.monotonic()
+    finished: Dict[str, float] = {}
+    lock = threading.Lock()
+
+    def on_primary_done(_future):
+        # The primary's latency is recorded even when a hedge won, so slow calls stay in the window
+        elapsed = time.monotonic() - started
+        tracker.record(call_site, elapsed)
+        with lock:
+            finished["primary"] = elapsed
+            hedge_latency = finished.get("hedge_won")
+        if hedge_latency is not None:
+            registry.increment(HEDGE_SAVED_METRIC, max(0.0, elapsed - hedge_latency), call_site=call_site)
+
+    primary = _executor.submit(in_current_context(fn))
+    primary.add_done_callback(on_primary_done)
+    delay = tracker.hedge_delay(call_site, policy)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        registry.increment(HEDGE_METRIC, call_site=call_site, outcome=OUTCOME_NOT_HEDGED)
+        return primary.result()
+    if not budget.try_spend():
+        registry.increment(HEDGE_METRIC, call_site=call_site, outcome=OUTCOME_BUDGET_EXHAUSTED)
+        return primary.result()
+
+    logger.info(f"Hedging {call_site}: no response after {delay:.2f}s")
+    hedge = _executor.submit(in_current_context(hedge_fn or fn))
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner = next((future for future in done if future.exception() is None), None)
+        if winner is None:
+            continue
+        for loser in pending:
+            loser.cancel()
+        if winner is hedge:
+            with lock:
+                finished["hedge_won"] = time.monotonic() - started
+                primary_latency = finished.get("primary")
+            if primary_latency is not None:
+                # The primary finished between the hedge returning and this check
+                registry.increment(HEDGE_SAVED_METRIC, max(0.0, primary_latency - finished["hedge_won"]),
+                                   call_site=call_site)
+            registry.increment(HEDGE_METRIC, call_site=call_site, outcome=OUTCOME_HEDGE_WON)
+        else:
+            registry.increment(HEDGE_METRIC, call_site=call_site, outcome=OUTCOME_PRIMARY_WON)
+        return winner.result()
+    registry.increment(HEDGE_METRIC, call_site=call_site, outcome=OUTCOME_FAILED)
+    return primary.result()
+
+
+class HedgedModel:
+    """Proxy for a model whose non-streaming generate_content calls are hedged."""
+
+    def __init__(self, model, call_site: str, alternate=None, policy: Optional[HedgePolicy] = None):
+        self._model = model
+        self._alternate = alternate
+        self.call_site = call_site
+        self.policy = policy
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._model, name)
+
+    def generate_content(self, contents, *args, **kwargs):
+        if kwargs.get("stream"):
+            return self._model.generate_content(contents, *args, **kwargs)
+        hedge_model = self._alternate or self._model
+        if hasattr(hedge_model, "uncoalesced"):
+            # Otherwise the hedge would join the in-flight primary call
+            hedge_model = hedge_model.uncoalesced()
+        return hedged_call(
+            lambda: self._model.generate_content(contents, *args, **kwargs),
+            self.call_site,
+            hedge_fn=lambda: hedge_model.generate_content(contents, *args, **kwargs),
+            policy=self.policy,
+        )
+
+
+def hedged(model, call_site: str, alternate=None, policy: Optional[HedgePolicy] = None) -> HedgedModel:
+    """model with hedged calls; alternate (another model or region) serves the hedges."""
+    return HedgedModel(model, call_site, alternate=alternate, policy=policy)
+
+
+def hedge_stats() -> Dict[str, Dict[str, Any]]:
+    """Hedge rate, wins, time saved and latency percentiles per call site."""
+    registry = get_metrics_registry()
+    tracker = get_latency_tracker()
+    call_sites = set(tracker.call_sites())
+    call_sites.update(series["labels"]["call_site"] for series in registry.series(HEDGE_METRIC))
+    stats = {}
+    for call_site in sorted(call_sites):
+        outcomes = {outcome: registry.value(HEDGE_METRIC, call_site=call_site, outcome=outcome)
+                    for outcome in (OUTCOME_NOT_HEDGED, OUTCOME_PRIMARY_WON, OUTCOME_HEDGE_WON,
+                                    OUTCOME_BUDGET_EXHAUSTED, OUTCOME_FAILED)}
+        calls = sum(outcomes.values())
+        hedges = outcomes[OUTCOME_PRIMARY_WON] + outcomes[OUTCOME_HEDGE_WON] + outcomes[OUTCOME_FAILED]
+        stats[call_site] = {
+            "calls": calls,
+            "hedges": hedges,
+            "hedge_rate": hedges / calls if calls else 0.0,
+            "hedge_wins": outcomes[OUTCOME_HEDGE_WON],
+            "budget_exhausted": outcomes[OUTCOME_BUDGET_EXHAUSTED],
+            "latency_saved_seconds": registry.value(HEDGE_SAVED_METRIC, call_site=call_site),
+            "primary_latency_p50": tracker.percentile(call_site, 0.5),
+            "primary_latency_p99": tracker.percentile(call_site, 0.99),
+        }
+    return stats
+
+
+# Global instances
+_latency_tracker = None
+_hedge_budget = None
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Get or create the global latency tracker."""
+    global _latency_tracker
+    if _latency_tracker is None:
+        _latency_tracker = LatencyTracker()
+    return _latency_tracker
+
+
+def get_hedge_budget() -> HedgeBudget:
+    """Get or create the global hedge budget."""
+    global _hedge_budget
+    if _hedge_budget is None:
+        _hedge_budget = HedgeBudget(ratio=float(os.environ.get("LLM_HEDGE_BUDGET_RATIO", "0.1")))
+    return _hedge_budget
@@ -0,0 +1,131 @@
+"""
+Ingestion Checkpoints
+Persists the output of each ingestion stage under the upload id so a retried
+ingestion task resumes at the first incomplete stage instead of starting over.
+
+Layout:
+    ingestionCheckpoints/{upload_id}                 -> version, source, completed stages
+    ingestionCheckpoints/{upload_id}/stages/{stage}  -> stage output
+
+The checkpoint version combines the storage format version with the intake prompt
+version, so changing the extraction prompt invalidates previously stored results.
+
+Downloading is not a stage: the file stays in Cloud Storage and its bytes are too
+large to store here, so a retry that still has to extract reads the file again.
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.deadline import rpc_options
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_COLLECTION = "ingestionCheckpoints"
+CHECKPOINT_FORMAT_VERSION = 1
+
+# Ordered ingestion stages
+STAGE_EXTRACTION = "extraction"
+STAGE_ENRICHMENT = "enrichment"
+STAGE_FIRESTORE_WRITE = "firestore_write"
+STAGE_BIGQUERY_INSERT = "bigquery_insert"
+STAGE_DILIGENCE_PUBLISH = "diligence_publish"
+
+CHECKPOINT_STAGES = [
+    STAGE_EXTRACTION,
+    STAGE_ENRICHMENT,
+    STAGE_FIRESTORE_WRITE,
+    STAGE_BIGQUERY_INSERT,
+    STAGE_DILIGENCE_PUBLISH,
+]
+
+
+def build_checkpoint_version(prompt_version: str) -> str:
+    """Combine the checkpoint format version with the prompt version."""
+    return f"v{CHECKPOINT_FORMAT_VERSION}:{prompt_version}"
+
+
+class IngestionCheckpoint:
+    """
+    Stage checkpoints for a single upload.
+
+    When no upload id is available (or db is None) the checkpoint is kept in memory
+    only, so callers can use the same code path without persistence.
+    """
+
+    def __init__(self, db, upload_id: Optional[str], version: str, source: str = ""):
+        self.db = db if upload_id else None
+        self.upload_id = upload_id
+        self.version = version
+        self.source = source
+        self._outputs: Dict[str, Dict[str, Any]] = {}
+        self._completed: List[str] = []
+        self._load()
+
+    def _doc_ref(self):
+        return self.db.collection(CHECKPOINT_COLLECTION).document(self.upload_id)
+
+    def _load(self) -> None:
+        if self.db is None:
+            return
+        try:
+            snapshot = self._doc_ref().get(**rpc_options())
+            if not snapshot.exists:
+                return
+            data = snapshot.to_dict() or {}
+            if data.get("version") != self.version or data.get("source") != self.source:
+                logger.info(
+                    f"Discarding stale checkpoint for {self.upload_id} "
+                    f"(version {data.get('version')} != {self.version} or source changed)"
+                )
+                return
+            self._completed = [s for s in data.get("completed_stages", []) if s in CHECKPOINT_STAGES]
+            for stage in self._completed:
+                stage_doc = self._doc_ref().collection("stages").document(stage).get(**rpc_options())
+                if not stage_doc.exists:
+                    # Stage marker without output: treat it and everything after as incomplete
+                    self._completed = self._completed[:self._completed.index(stage)]
+                    break
+                self._outputs[stage] = (stage_doc.to_dict() or {}).get("output", {})
+        except Exception as e:
+            logger.warning(f"Failed to load checkpoint for {self.upload_id}, starting fresh: {e}")
+            self._outputs = {}
+            self._completed = []
+
+    def is_complete(self, stage: str) -> bool:
+        """Return True if the stage already completed under the current version."""
+        return stage in self._completed
+
+    def get(self, stage: str) -> Optional[Dict[str, Any]]:
+        """Return the stored output of a completed stage."""
+        return self._outputs.get(stage) if self.is_complete(stage) else None
+
+    def first_incomplete_stage(self) -> Optional[str]:
+        """Return the stage a retry resumes at, or None when all stages are done."""
+        for stage in CHECKPOINT_STAGES:
+            if not self.is_complete(stage):
+                return stage
+        return None
+
+    def save(self, stage: str, output: Dict[str, Any]) -> None:
+        """Record a stage as complete with its output. Persistence is best-effort."""
+        self._outputs[stage] = output
+        if stage not in self._completed:
+            self._completed.append(stage)
+
+        if self.db is None:
+            return
+        try:
+            self._doc_ref().collection("stages").document(stage).set({
+                "output": output,
+                "saved_at": time.time(),
+            }, **rpc_options())
+            self._doc_ref().set({
+                "version": self.version,
+                "source": self.source,
+                "completed_stages": self._completed,
+                "updated_at": time.time(),
+            }, **rpc_options())
+        except Exception as e:
+            logger.warning(f"Failed to persist checkpoint stage '{stage}' for {self.upload_id}: {e}")
@@ -0,0 +1,253 @@
+"""
+Ingestion Status Channel
+Publishes per-stage ingestion progress for an upload and lets HTTP handlers either
+stream it (Server-Sent Events) or read a cheap projection of it (polling).
+
+Two backends are supported:
+- "firestore" (default): the ingestion worker writes the stage onto uploads/{upload_id}
+  and subscribers attach a Firestore snapshot listener to that document.
+- "memory": an in-process pub/sub, used for local testing and for the Flask push
+  routes when the worker runs in the same instance as the subscriber.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.deadline import rpc_options
+
+logger = logging.getLogger(__name__)
+
+# Ordered ingestion stages reported by the worker
+INGESTION_STAGES = [
+    "uploaded",
+    "queued",
+    "downloading",
+    "extracting",
+    "enriching",
+    "saving",
+    "completed",
+    "failed",
+]
+TERMINAL_STAGES = {"completed", "failed"}
+
+# Longest an SSE stream stays open: the function timeout
+MAX_STREAM_SECONDS = 540.0
+
+# Fields read by the polling projection (never the memo body)
+STATUS_FIELD_PATHS = ["status", "ingestionStage", "ingestionStageAt", "memoId", "error"]
+
+
+def get_status_backend() -> str:
+    """Return the configured status backend ('firestore' or 'memory')."""
+    return os.environ.get("INGESTION_STATUS_BACKEND", "firestore").lower()
+
+
+def build_status_event(upload_id: str, stage: str, memo_id: Optional[str] = None,
+                       error: Optional[str] = None) -> Dict[str, Any]:
+    """Build the status event payload sent to subscribers."""
+    event = {
+        "upload_id": upload_id,
+        "stage": stage,
+        "timestamp": datetime.now().isoformat(),
+    }
+    if memo_id:
+        event["memo_id"] = memo_id
+    if error:
+        event["error"] = error
+    return event
+
+
+def compute_status_etag(payload: Dict[str, Any]) -> str:
+    """Compute a strong ETag for a status payload."""
+    serialized = json.dumps(payload, sort_keys=True, default=str)
+    return '"' + hashlib.sha1(serialized.encode("utf-8")).hexdigest() + '"'
+
+
+class InMemoryStatusBroker:
+    """In-process pub/sub of ingestion status events keyed by upload id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._latest: Dict[str, Dict[str, Any]] = {}
+
+    def publish(self, upload_id: str, event: Dict[str, Any]) -> None:
+        """Record the latest event and fan it out to all subscribers."""
+        with self._lock:
+            self._latest[upload_id] = event
+            subscribers = list(self._subscribers.get(upload_id, []))
+        for subscriber in subscribers:
+            subscriber.put(event)
+
+    def subscribe(self, upload_id: str) -> queue.Queue:
+        """Subscribe to an upload; the latest known event is replayed first."""
+        subscriber: queue.Queue = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(upload_id, []).append(subscriber)
+            latest = self._latest.get(upload_id)
+        if latest:
+            subscriber.put(latest)
+        return subscriber
+
+    def unsubscribe(self, upload_id: str, subscriber: queue.Queue) -> None:
+        """Remove a subscriber queue."""
+        with self._lock:
+            subscribers = self._subscribers.get(upload_id, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            if not subscribers:
+                self._subscribers.pop(upload_id, None)
+
+    def latest(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Return the latest event published for an upload, if any."""
+        with self._lock:
+            return self._latest.get(upload_id)
+
+
+class FirestoreStatusSubscription:
+    """Streams status events from a snapshot listener on uploads/{upload_id}."""
+
+    def __init__(self, db, upload_id: str):
+        self.upload_id = upload_id
+        self.queue: queue.Queue = queue.Queue()
+        self._doc_ref = db.collection("uploads").document(upload_id)
+        self._watch = self._doc_ref.on_snapshot(self._on_snapshot)
+
+    def _on_snapshot(self, doc_snapshots, changes, read_time):
+        for snapshot in doc_snapshots:
+            if not snapshot.exists:
+                continue
+            data = snapshot.to_dict() or {}
+            stage = data.get("ingestionStage") or data.get("status")
+            if not stage:
+                continue
+            self.queue.put(build_status_event(
+                self.upload_id, stage, memo_id=data.get("memoId"), error=data.get("error")
+            ))
+
+    def close(self) -> None:
+        """Detach the snapshot listener."""
+        try:
+            self._watch.unsubscribe()
+        except Exception as e:
+            logger.warning(f"Failed to unsubscribe status listener for {self.upload_id}: {e}")
+
+
+# Global instance
+_status_broker = None
+
+
+def get_status_broker() -> InMemoryStatusBroker:
+    """Get or create the process-wide in-memory status broker"""
+    global _status_broker
+    if _status_broker is None:
+        _status_broker = InMemoryStatusBroker()
+    return _status_broker
+
+
+def report_ingestion_stage(upload_id: Optional[str], stage: str, memo_id: Optional[str] = None,
+                           error: Optional[str] = None, db=None) -> None:
+    """
+    Report an ingestion stage for an upload. Best-effort: never raises.
+
+    Args:
+        upload_id: The uploads document id (skipped when missing)
+        stage: One of INGESTION_STAGES
+        memo_id: The ingestionResults id, once the memo has been saved
+        error: Failure reason for the 'failed' stage
+        db: Firestore client used to persist the stage (firestore backend only)
+    """
+    if not upload_id:
+        return
+
+    event = build_status_event(upload_id, stage, memo_id=memo_id, error=error)
+    get_status_broker().publish(upload_id, event)
+
+    if db is None or get_status_backend() != "firestore":
+        return
+
+    try:
+        update = {
+            "ingestionStage": stage,
+            "ingestionStageAt": event["timestamp"],
+        }
+        if memo_id:
+            update["memoId"] = memo_id
+        if error:
+            update["error"] = error
+        if stage in TERMINAL_STAGES:
+            update["status"] = stage
+        db.collection("uploads").document(upload_id).set(update, merge=True, **rpc_options())
+    except Exception as e:
+        logger.warning(f"Failed to persist ingestion stage '{stage}' for {upload_id}: {e}")
+
+
+def parse_stream_timeout(value: Optional[str]) -> float:
+    """
+    Stream timeout from a ?timeout= query value, capped at MAX_STREAM_SECONDS.
+
+    Raises:
+        ValueError: value is not a positive number
+    """
+    if value is None or value == "":
+        return MAX_STREAM_SECONDS
+    seconds = float(value)
+    if not seconds > 0:
+        raise ValueError(f"timeout must be a positive number of seconds, got {value!r}")
+    return min(seconds, MAX_STREAM_SECONDS)
+
+
+def format_sse(event_name: str, data: Dict[str, Any]) -> str:
+    """Format a single Server-Sent Event frame."""
+    return f"event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream_status_events(upload_id: str, db=None, timeout_seconds: float = MAX_STREAM_SECONDS,
+                         heartbeat_seconds: float = 15.0) -> Iterator[str]:
+    """
+    Yield SSE frames for an upload until it reaches a terminal stage.
+
+    A 'status' event is sent for each new stage, and a single 'memo' event carries
+    the final memo id. Comment heartbeats keep idle connections open.
+    """
+    use_firestore = db is not None and get_status_backend() == "firestore"
+    broker = get_status_broker()
+    subscription = FirestoreStatusSubscription(db, upload_id) if use_firestore else None
+    events = subscription.queue if subscription else broker.subscribe(upload_id)
+
+    deadline = time.monotonic() + timeout_seconds
+    last_stage = None
+    memo_sent = False
+
+    try:
+        while time.monotonic() < deadline:
+            wait = min(heartbeat_seconds, max(0.0, deadline - time.monotonic()))
+            try:
+                event = events.get(timeout=wait)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+
+            stage = event.get("stage")
+            if stage != last_stage:
+                last_stage = stage
+                yield format_sse("status", event)
+
+            if event.get("memo_id") and not memo_sent:
+                memo_sent = True
+                yield format_sse("memo", {"upload_id": upload_id, "memo_id": event["memo_id"]})
+
+            if stage in TERMINAL_STAGES:
+                break
+    finally:
+        if subscription:
+            subscription.close()
+        else:
+            broker.unsubscribe(upload_id, events)
@@ -0,0 +1,389 @@
+"""
+JSON Parsing
+Linear-time extraction of JSON from LLM response text.
+
+extract_json() skips prose and code fences before the first object or array and
+copies it through a bracket-balancing scanner, repairing common model mistakes on
+the way: trailing or missing commas, smart and single quotes, bare keys, Python
+literals, raw control characters in strings, mismatched closers and truncated
+tails. Tokens are matched at the current position with single character-class
+patterns, so every character is visited once and there is no backtracking, even
+on multi-megabyte responses with unbalanced braces. Responses that are already
+valid JSON between their first and last bracket go straight to json.loads.
+
+A truncated response is closed at the cut and reported with the offset and the
+JSON path of the innermost open container.
+
+StreamingObjectParser handles streamed responses: it yields each top-level member
+of an object as soon as that member closes.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+_OPEN = re.compile(r"[{\[]")
+_TOKEN = re.compile(r"\s+|[A-Za-z0-9_.+\-]+|.", re.DOTALL)
+
+# Plain runs inside a string, by opening quote
+_STRING_RUNS = {
+    '"': re.compile(r'[^"\\\x00-\x1f]+'),
+    "“": re.compile(r'[^"”\\\x00-\x1f]+'),
+    "”": re.compile(r'[^"”\\\x00-\x1f]+'),
+    "'": re.compile(r"[^'\"\\\x00-\x1f]+"),
+}
+_STRING_CLOSERS = {'"': '"', "“": "”\"", "”": "”\"", "'": "'"}
+
+_CLOSERS = {"{": "}", "[": "]"}
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_VALID_ESCAPES = frozenset('"\\/bfnrtu')
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_KINDS = {None: "{[", "object": "{", "array": "["}
+
+
+@dataclass
+class JSONExtraction:
+    """JSON value found in a text, with where it was found and what was repaired."""
+    value: Any
+    start: int                          # offset of the opening bracket
+    end: int                            # offset just past the JSON (len(text) when truncated)
+    truncated: bool = False
+    truncated_path: str = ""            # innermost open container at the cut, e.g. "$.flags[2]"
+    repairs: List[str] = field(default_factory=list)
+
+    @property
+    def repaired(self) -> bool:
+        return bool(self.repairs)
+
+
+class _Container:
+    __slots__ = ("closer", "member_start", "key_span", "index")
+
+    def __init__(self, closer: str, member_start: int):
+        self.closer = closer
+        self.member_start = member_start  # output chunk where the current member begins
+        self.key_span = None              # output chunks holding the current key
+        self.index = 0                    # current element of an array
+
+
+def _path(chunks: List[str], stack: List[_Container]) -> str:
+    parts = ["$"]
+    for container in stack:
+        if container.closer == "]":
+            parts.append(f"[{container.index}]")
+        elif container.key_span is not None:
+            try:
+                parts.append("." + str(json.loads("".join(chunks[slice(*container.key_span)]))))
+            except ValueError:
+                parts.append(".?")
+    return "".join(parts)
+
+
+def _close(chunks: List[str], stack: List[_Container], drop_member: bool) -> str:
+    """Text of a truncated value with its open containers closed."""
+    chunks = chunks[:stack[-1].member_start] if drop_member else list(chunks)
+    while chunks and chunks[-1] in (",", ":"):
+        chunks.pop()
+    return "".join(chunks) + "".join(container.closer for container in reversed(stack))
+
+
+def _scan(text: str, start: int):
+    """
+    Scan one candidate starting at the bracket at text[start].
+
+    Returns:
+        (JSONExtraction or None, end offset of the candidate)
+    """
+    chunks: List[str] = []
+    repairs: List[str] = []
+    stack: List[_Container] = []
+    expect_key = False
+    after_value = False
+    quote = None
+    string_run = None
+    string_closers = ""
+    string_is_key = False
+    key_start = 0
+    pos = start
+    n = len(text)
+
+    def repair(name):
+        if name not in repairs:
+            repairs.append(name)
+
+    def separate():
+        # Missing comma between two members
+        nonlocal expect_key
+        chunks.append(",")
+        top = stack[-1]
+        top.member_start = len(chunks)
+        top.index += 1
+        top.key_span = None
+        expect_key = top.closer == "}"
+        repair("missing_comma")
+
+    while pos < n:
+        if quote is not None:
+            match = string_run.match(text, pos)
+            if match:
+                chunks.append(match.group())
+                pos = match.end()
+                continue
+            char = text[pos]
+            pos += 1
+            if char in string_closers:
+                chunks.append('"')
+                quote = None
+                if string_is_key:
+                    stack[-1].key_span = (key_start, len(chunks))
+                else:
+                    after_value = True
+            elif char == "\\":
+                escaped = text[pos:pos + 1]
+                pos += 1
+                if escaped in _VALID_ESCAPES:
+                    chunks.append("\\" + escaped)
+                elif escaped == "'":
+                    chunks.append("'")
+                elif escaped:
+                    chunks.append("\\\\" + escaped)
+                    repair("invalid_escape")
+            elif char == '"':
+                chunks.append('\\"')
+            else:
+                chunks.append(_CONTROL_ESCAPES.get(char, ""))
+                repair("control_character")
+            continue
+
+        match = _TOKEN.match(text, pos)
+        token = match.group()
+        pos = match.end()
+        char = token[0]
+
+        if char in "{[":
+            if after_value and stack:
+                separate()
+            chunks.append(char)
+            stack.append(_Container(_CLOSERS[char], len(chunks)))
+            expect_key = char == "{"
+            after_value = False
+        elif char in "}]":
+            if chunks[-1] == ",":
+                chunks.pop()
+                repair("trailing_comma")
+            if stack[-1].closer != char:
+                if not any(container.closer == char for container in stack):
+                    repair("stray_bracket")
+                    continue
+                while stack[-1].closer != char:
+                    chunks.append(stack.pop().closer)
+                repair("mismatched_bracket")
+            chunks.append(char)
+            stack.pop()
+            expect_key = False
+            after_value = True
+            if not stack:
+                break
+        elif char == ",":
+            if chunks[-1] in (",", "{", "["):
+                repair("extra_comma")
+                continue
+            chunks.append(",")
+            top = stack[-1]
+            top.member_start = len(chunks)
+            top.index += 1
+            top.key_span = None
+            expect_key = top.closer == "}"
+            after_value = False
+        elif char == ":":
+            chunks.append(":")
+            expect_key = False
+            after_value = False
+        elif char in _STRING_CLOSERS:
+            if after_value:
+                separate()
+            if char != '"':
+                repair("quotes")
+            quote = char
+            string_run = _STRING_RUNS[char]
+            string_closers = _STRING_CLOSERS[char]
+            string_is_key = expect_key
+            key_start = len(chunks)
+            chunks.append('"')
+        elif char.isalnum() or char in "_.+-":
+            if after_value:
+                separate()
+            if expect_key:
+                chunks.append(f'"{token}"')
+                stack[-1].key_span = (len(chunks) - 1, len(chunks))
+                repair("bare_key")
+            else:
+                literal = _PYTHON_LITERALS.get(token)
+                if literal:
+                    repair("python_literal")
+                chunks.append(literal or token)
+                after_value = True
+        elif not token.isspace():
+            repair("stray_character")
+
+    if not stack:
+        try:
+            return JSONExtraction(json.loads("".join(chunks)), start, pos, repairs=repairs), pos
+        except (ValueError, RecursionError):
+            return None, pos
+
+    # Truncated: close the open string and containers at the cut
+    truncated_path = _path(chunks, stack)
+    if quote is not None:
+        chunks.append('"')
+    repairs.append("truncated")
+    for drop_member in (string_is_key and quote is not None, True):
+        try:
+            value = json.loads(_close(chunks, stack, drop_member))
+        except (ValueError, RecursionError):
+            continue
+        return JSONExtraction(value, start, n, truncated=True, truncated_path=truncated_path,
+                              repairs=repairs), n
+    return None, n
+
+
+def extract_json(text: str, expect: Optional[str] = None) -> Optional[JSONExtraction]:
+    """
+    First JSON object or array in text.
+
+    Args:
+        text: Model response text
+        expect: "object" or "array" to skip candidates of the other kind
+
+    Returns:
+        The extraction, or None when no JSON could be recovered
+    """
+    if not isinstance(text, str) or not text:
+        return None
+    kinds = _KINDS[expect]
+
+    # Fast path: valid JSON between the first opening and the last closing bracket
+    # (structured output mode, or a clean answer inside a code fence)
+    match = _OPEN.search(text)
+    if match is not None and text[match.start()] in kinds:
+        start = match.start()
+        end = text.rfind(_CLOSERS[text[start]]) + 1
+        if end > start:
+            try:
+                return JSONExtraction(json.loads(text[start:end]), start, end)
+            except (ValueError, RecursionError):
+                pass
+
+    pos = 0
+    while True:
+        match = _OPEN.search(text, pos)
+        if match is None:
+            return None
+        if text[match.start()] not in kinds:
+            pos = match.start() + 1
+            continue
+        # Candidates do not overlap, so the text is still scanned once overall
+        extraction, pos = _scan(text, match.start())
+        if extraction is not None:
+            return extraction
+        if pos >= len(text):
+            return None
+
+
+def loads_tolerant(text: str, default: Any = None, expect: Optional[str] = None) -> Any:
+    """Value of the first JSON object or array in text, or default."""
+    extraction = extract_json(text, expect)
+    return extraction.value if extraction is not None else default
+
+
+class StreamingObjectParser:
+    """
+    Incremental parser for a JSON object that arrives in chunks.
+
+    feed() returns the top-level members completed by each chunk, so a caller can
+    use a section as soon as it closes instead of waiting for the whole object.
+    Text before the opening brace (prose, a code fence) is skipped, and the scanner
+    state carries over between chunks, so every character is scanned once.
+    """
+
+    def __init__(self):
+        self.members: Dict[str, Any] = {}
+        self.started = False
+        self.closed = False
+        self._chunks: List[str] = []
+        self._member: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def text(self) -> str:
+        """All text received so far."""
+        return "".join(self._chunks)
+
+    @property
+    def truncated(self) -> bool:
+        """True when the object was opened but not closed."""
+        return self.started and not self.closed
+
+    def _complete_member(self, completed: List[Tuple[str, Any]]) -> None:
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return
+        member = loads_tolerant("{" + text + "}", expect="object")
+        if not isinstance(member, dict):
+            return
+        for key, value in member.items():
+            self.members[key] = value
+            completed.append((key, value))
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add a chunk of the streamed text.
+
+        Returns:
+            [(key, value)] for the top-level members completed by this chunk
+        """
+        completed: List[Tuple[str, Any]] = []
+        if not chunk:
+            return completed
+        self._chunks.append(chunk)
+        if self.closed:
+            return completed
+
+        start = 0
+        for i, char in enumerate(chunk):
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self._depth = 1
+                    start = i + 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._member.append(chunk[start:i])
+                    self._complete_member(completed)
+                    self.closed = True
+                    return completed
+            elif char == "," and self._depth == 1:
+                self._member.append(chunk[start:i])
+                self._complete_member(completed)
+                start = i + 1
+
+        if self.started:
+            self._member.append(chunk[start:])
+        return completed
@@ -0,0 +1,79 @@
+"""
+LLM Gateway
+Single path for Gemini calls.
+
+GatewayModel wraps a GenerativeModel; callers use it like the model itself, and
+generate_content() goes through the process-wide rate limiter of the model and the
+shared retry policy in utils.rate_limiter. Agents get their models from
+utils.vertex_regions.regional_model(), which builds one GatewayModel per region. Streamed
+calls are retried until their first chunk arrives, since that is where a
+rate-limited stream fails.
+
+Identical concurrent text prompts to the same model are coalesced into one call
+(utils.singleflight); streams and prompts with documents or images are not.
+Hedges use uncoalesced() so they do not join the call they are racing.
+
+Every attempt goes through the circuit breaker of the dependency (utils.circuit_breaker);
+while it is open, calls raise CircuitOpenError at once.
+"""
+
+import itertools
+import logging
+from typing import Any, Optional
+
+from utils.circuit_breaker import get_circuit_breaker
+from utils.rate_limiter import VERTEX_PROVIDER, RetryPolicy, call_with_retry
+from utils.singleflight import fingerprint, get_singleflight
+
+logger = logging.getLogger(__name__)
+
+
+def _model_name(model) -> str:
+    name = getattr(model, "_model_name", None) or getattr(model, "model_name", None) or ""
+    return str(name).rsplit("/", 1)[-1] or "default"
+
+
+class GatewayModel:
+    """Proxy for a GenerativeModel whose calls are rate limited and retried."""
+
+    def __init__(self, model, provider: str = VERTEX_PROVIDER, coalesce: bool = True,
+                 limiter_key: Optional[str] = None, retry_policy: Optional[RetryPolicy] = None,
+                 breaker: Optional[str] = None):
+        self._model = model
+        self.provider = provider
+        self.coalesce = coalesce
+        self.model_name = _model_name(model)
+        # Rate limiter of the model; regional models use "model@region" (utils.vertex_regions)
+        self.limiter_key = limiter_key or self.model_name
+        self.retry_policy = retry_policy
+        # Circuit breaker name; regional models have one per region ("vertex@asia-south1")
+        self.breaker = breaker or provider
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything but generate_content (e.g. _model_name, count_tokens) is the model's
+        return getattr(self._model, name)
+
+    def generate_content(self, contents, *args, stream: bool = False, **kwargs):
+        def call():
+            with get_circuit_breaker(self.breaker).guard():
+                if not stream:
+                    return self._model.generate_content(contents, *args, **kwargs)
+                chunks = iter(self._model.generate_content(contents, *args, stream=True, **kwargs))
+                try:
+                    first = next(chunks)
+                except StopIteration:
+                    return iter(())
+            return itertools.chain([first], chunks)
+
+        def retried():
+            return call_with_retry(call, self.provider, self.limiter_key, policy=self.retry_policy)
+
+        if stream or not self.coalesce or not isinstance(contents, str):
+            return retried()
+        key = fingerprint(self.model_name, contents, args, kwargs)
+        return get_singleflight("gemini").do(key, retried)
+
+    def uncoalesced(self) -> "GatewayModel":
+        """The same model without coalescing, for duplicate calls made on purpose."""
+        return GatewayModel(self._model, self.provider, coalesce=False, limiter_key=self.limiter_key,
+                            retry_policy=self.retry_policy, breaker=self.breaker)
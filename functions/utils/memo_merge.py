@@ -0,0 +1,147 @@
+"""
+Memo Merge
+Deterministic merging of partial Memo 1 extractions (one per page window of a large
+deck) into a single memo.
+
+Rules, applied per field in shard (page) order:
+- Scalars: first non-empty value wins.
+- Numeric values (numbers or strings such as "$1.2M", "40%"): when shards disagree,
+  the value reported by the most shards wins; ties go to the earliest shard.
+- Lists: union in shard order, de-duplicated on a normalized form.
+- Dicts: merged recursively with the same rules.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+EMPTY_MARKERS = {
+    "", "not specified", "not disclosed", "n/a", "na", "none", "null", "unknown",
+    "not available", "not mentioned", "tbd", "to be determined", "-", "—",
+}
+
+_NUMBER_RE = re.compile(
+    r"^\s*(?P<currency>[\$₹€£]|usd|inr|rs\.?)?\s*(?P<number>\d[\d,]*(?:\.\d+)?)\s*"
+    r"(?P<unit>%|k|thousand|m|mn|million|b|bn|billion|cr|crore|crores|l|lakh|lakhs)?\s*$",
+    re.IGNORECASE,
+)
+
+_UNIT_MULTIPLIERS = {
+    "k": 1e3, "thousand": 1e3,
+    "m": 1e6, "mn": 1e6, "million": 1e6,
+    "b": 1e9, "bn": 1e9, "billion": 1e9,
+    "l": 1e5, "lakh": 1e5, "lakhs": 1e5,
+    "cr": 1e7, "crore": 1e7, "crores": 1e7,
+}
+
+
+def is_empty_value(value: Any) -> bool:
+    """True for None, empty containers and placeholder strings like 'Not specified'."""
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in EMPTY_MARKERS
+    if isinstance(value, (list, dict)):
+        return len(value) == 0
+    return False
+
+
+def parse_numeric(value: Any) -> Optional[Tuple[str, float]]:
+    """
+    Parse a numeric value into (kind, magnitude) for reconciliation.
+
+    kind is 'percent', 'currency' or 'number'. Returns None for non-numeric values.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return "number", float(value)
+    if not isinstance(value, str):
+        return None
+
+    match = _NUMBER_RE.match(value)
+    if not match:
+        return None
+    number = float(match.group("number").replace(",", ""))
+    unit = (match.group("unit") or "").lower()
+    if unit == "%":
+        return "percent", number
+    number *= _UNIT_MULTIPLIERS.get(unit, 1)
+    return ("currency" if match.group("currency") else "number"), round(number, 6)
+
+
+def _dedupe_key(item: Any) -> str:
+    if isinstance(item, str):
+        return re.sub(r"\s+", " ", item.strip().lower()).rstrip(".")
+    try:
+        return json.dumps(item, sort_keys=True, default=str).lower()
+    except (TypeError, ValueError):
+        return repr(item)
+
+
+def merge_lists(values: List[List[Any]]) -> List[Any]:
+    """Union of lists in order, de-duplicated on normalized content."""
+    merged = []
+    seen = set()
+    for items in values:
+        for item in items:
+            if is_empty_value(item):
+                continue
+            key = _dedupe_key(item)
+            if key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged
+
+
+def reconcile_numeric(values: List[Any]) -> Any:
+    """Pick the numeric value most shards agree on; ties go to the earliest shard."""
+    counts: Dict[Tuple[str, float], int] = {}
+    first_value: Dict[Tuple[str, float], Any] = {}
+    order: List[Tuple[str, float]] = []
+    for value in values:
+        parsed = parse_numeric(value)
+        if parsed not in counts:
+            counts[parsed] = 0
+            first_value[parsed] = value
+            order.append(parsed)
+        counts[parsed] += 1
+    best = max(order, key=lambda key: (counts[key], -order.index(key)))
+    return first_value[best]
+
+
+def merge_values(values: List[Any]) -> Any:
+    """Merge one field's values from all shards (in shard order)."""
+    present = [v for v in values if not is_empty_value(v)]
+    if not present:
+        return values[0] if values else None
+
+    if all(isinstance(v, list) for v in present):
+        return merge_lists(present)
+    if all(isinstance(v, dict) for v in present):
+        return merge_memo_shards(present)
+    if len(present) > 1 and all(parse_numeric(v) is not None for v in present):
+        return reconcile_numeric(present)
+    return present[0]
+
+
+def merge_memo_shards(shards: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge partial memos (ordered by page window) into one memo.
+
+    Args:
+        shards: Partial memos, earliest page window first
+
+    Returns:
+        The merged memo; field order follows first appearance across shards
+    """
+    keys: List[str] = []
+    for shard in shards:
+        for key in shard:
+            if key not in keys:
+                keys.append(key)
+
+    return {
+        key: merge_values([shard[key] for shard in shards if key in shard])
+        for key in keys
+    }
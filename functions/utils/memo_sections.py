@@ -0,0 +1,164 @@
+"""
+Memo Sections
+Splits Memo 1 extraction into independent section prompts (company, market,
+financials, team, ...) that run concurrently against one shared document context.
+A slow or truncated generation then only loses its own section, and a section that
+comes back empty can be re-queried on its own.
+
+Field descriptions are taken from the full Memo 1 prompt, so the section prompts
+stay in sync with the single-shot schema.
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+from utils.memo_merge import is_empty_value
+
+# Ordered sections of the memo_1 schema; assembly follows this order
+MEMO_1_SECTIONS: Dict[str, Dict[str, Any]] = {
+    "company": {
+        "label": "Company Overview",
+        "fields": [
+            "title", "founder_name", "founder_linkedin_url", "company_linkedin_url",
+            "company_stage", "headquarters", "founded_date", "industry_category",
+            "key_thesis", "key_metric",
+        ],
+    },
+    "product": {
+        "label": "Product & Technology",
+        "fields": [
+            "problem", "solution", "technology_stack", "product_features",
+            "technology_advantages", "innovation_level", "scalability_plan", "product_roadmap",
+        ],
+    },
+    "market": {
+        "label": "Market & Competition",
+        "fields": [
+            "market_size", "target_market", "target_customers", "market_timing",
+            "market_penetration", "market_trends", "competition", "competitive_advantages",
+        ],
+    },
+    "business": {
+        "label": "Business Model & Go-To-Market",
+        "fields": [
+            "business_model", "revenue_model", "pricing_strategy", "unit_economics",
+            "go_to_market", "sales_strategy", "customer_segments", "partnerships",
+            "distribution_channels",
+        ],
+    },
+    "financials": {
+        "label": "Traction & Financials",
+        "fields": [
+            "traction", "current_revenue", "revenue_growth_rate", "customer_acquisition_cost",
+            "lifetime_value", "gross_margin", "burn_rate", "runway", "financial_projections",
+            "user_growth", "revenue_growth", "customer_growth", "key_milestones",
+            "upcoming_milestones",
+        ],
+    },
+    "deal": {
+        "label": "Funding & Deal Terms",
+        "fields": [
+            "funding_history", "funding_ask", "use_of_funds", "amount_raising",
+            "pre_money_valuation", "post_money_valuation", "investment_sought",
+            "ownership_target", "lead_investor", "committed_funding", "round_stage",
+        ],
+    },
+    "team": {
+        "label": "Team & Execution",
+        "fields": [
+            "team", "team_size", "key_team_members", "advisory_board",
+            "execution_track_record", "hiring_plan",
+        ],
+    },
+    "risk_and_exit": {
+        "label": "Risk, Growth & Exit",
+        "fields": [
+            "regulatory_considerations", "intellectual_property", "key_risks",
+            "risk_mitigation", "competitive_risks", "regulatory_risks", "growth_strategy",
+            "international_expansion", "exit_strategy", "exit_valuation",
+            "potential_acquirers", "ipo_timeline",
+        ],
+    },
+    "analysis": {
+        "label": "Investment Analysis",
+        "fields": ["initial_flags", "validation_points", "summary_analysis"],
+        # Any empty field here makes the section count as empty
+        "critical": True,
+    },
+}
+
+_FIELD_LINE_RE = re.compile(r'^\s*- "(\w+)": (.+?)\s*$', re.MULTILINE)
+
+
+def parse_field_descriptions(prompt: str) -> Dict[str, str]:
+    """Map field name -> description from the '- "field": description' lines of a prompt."""
+    descriptions: Dict[str, str] = {}
+    for field, description in _FIELD_LINE_RE.findall(prompt):
+        descriptions.setdefault(field, description)
+    return descriptions
+
+
+def build_section_prompt(section: str, descriptions: Dict[str, str]) -> str:
+    """Build the extraction prompt for one section."""
+    spec = MEMO_1_SECTIONS[section]
+    field_lines = "\n".join(
+        f'- "{field}": {descriptions.get(field, field.replace("_", " ").capitalize() + " if mentioned.")}'
+        for field in spec["fields"]
+    )
+    prompt = f"""
+        You are an elite AI Venture Capital Analyst. Using the startup material provided above,
+        extract ONLY the {spec['label']} section of the Founders Checklist (Memo 1).
+
+        **CRITICAL - RESPONSE FORMAT:**
+        Return ONLY a valid JSON object with exactly the keys listed below. No markdown, no code blocks,
+        no explanations before or after. If a specific piece of information is not found, return a
+        relevant empty value (e.g., an empty string "" or an empty list []).
+
+        JSON Schema:
+{field_lines}
+        """
+    if spec.get("critical"):
+        prompt += """
+        CRITICAL: These fields MUST contain real, actionable content based on your analysis of the
+        material, never "Not specified". Lists MUST be arrays of strings.
+        """
+    return prompt
+
+
+def field_is_empty(memo: Dict[str, Any], field: str) -> bool:
+    """True when a memo field is missing or empty (list fields must be lists)."""
+    value = memo.get(field)
+    if field in ("initial_flags", "validation_points") and not isinstance(value, list):
+        return True
+    return is_empty_value(value)
+
+
+def empty_sections(memo: Dict[str, Any], sections: Optional[List[str]] = None) -> List[str]:
+    """
+    Sections that came back empty.
+
+    A section is empty when all of its fields are empty; a critical section is empty
+    when any of its fields is.
+    """
+    empty = []
+    for section in sections or list(MEMO_1_SECTIONS):
+        spec = MEMO_1_SECTIONS[section]
+        checks = [field_is_empty(memo, field) for field in spec["fields"]]
+        if (any(checks) if spec.get("critical") else all(checks)):
+            empty.append(section)
+    return empty
+
+
+def assemble_sections(section_results: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Assemble per-section results into a memo_1 dict.
+
+    Only each section's own fields are taken from its result; fields of failed or
+    missing sections are set to "".
+    """
+    memo: Dict[str, Any] = {}
+    for section, spec in MEMO_1_SECTIONS.items():
+        result = section_results.get(section) or {}
+        for field in spec["fields"]:
+            memo[field] = result.get(field, "")
+    return memo
@@ -0,0 +1,68 @@
+"""
+Memory Usage Tracking
+Lightweight process memory measurements (RSS and peak RSS) for per-run reporting.
+"""
+
+import logging
+import os
+import sys
+from typing import Dict, Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> Optional[float]:
+    """Return the current resident set size in MB, if it can be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Return the peak resident set size of the process in MB, if available."""
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+class MemoryTracker:
+    """Context manager that records RSS before/after a block and the peak RSS growth."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.start_rss_mb = None
+        self.start_peak_mb = None
+        self.usage: Dict[str, Optional[float]] = {}
+
+    def __enter__(self):
+        self.start_rss_mb = current_rss_mb()
+        self.start_peak_mb = peak_rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_rss = current_rss_mb()
+        end_peak = peak_rss_mb()
+        self.usage = {
+            "rss_start_mb": self.start_rss_mb,
+            "rss_end_mb": end_rss,
+            "peak_rss_mb": end_peak,
+            "peak_growth_mb": (
+                round(end_peak - self.start_peak_mb, 1)
+                if end_peak is not None and self.start_peak_mb is not None else None
+            ),
+        }
+        if self.label:
+            logger.info(f"Memory usage for {self.label}: {self.usage}")
+        return False
@@ -0,0 +1,90 @@
+"""
+Metrics
+In-process counters for pipeline health (e.g. LLM output parse outcomes) and
+gauges for current values (e.g. rate limits and queue depths).
+
+Counters and gauges are per instance; they are exposed on the /metrics route and every
+increment of a failure counter is also logged, so log-based metrics can aggregate
+them across instances.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Thread-safe labelled counters and gauges."""
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._gauges: Dict[str, Dict[LabelSet, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _label_set(labels: Dict[str, Any]) -> LabelSet:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Add value to the counter series identified by name and labels."""
+        key = self._label_set(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Set the gauge series identified by name and labels."""
+        key = self._label_set(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def gauge(self, name: str, **labels) -> Optional[float]:
+        """Current value of a gauge series, or None if it was never set."""
+        with self._lock:
+            return self._gauges.get(name, {}).get(self._label_set(labels))
+
+    def gauge_snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            return {name: [{"labels": dict(key), "value": v} for key, v in series.items()]
+                    for name, series in self._gauges.items()}
+
+    def value(self, name: str, **labels) -> float:
+        """Sum of all series of a counter whose labels include the given labels."""
+        wanted = set(self._label_set(labels))
+        with self._lock:
+            return sum(v for key, v in self._counters.get(name, {}).items() if wanted <= set(key))
+
+    def series(self, name: str) -> List[Dict[str, Any]]:
+        """All series of a counter as [{"labels": {...}, "value": n}]."""
+        with self._lock:
+            return [{"labels": dict(key), "value": v} for key, v in self._counters.get(name, {}).items()]
+
+    def snapshot(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            names = list(self._counters)
+        return {name: self.series(name) for name in names}
+
+    def reset(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._counters.clear()
+                self._gauges.clear()
+            else:
+                self._counters.pop(name, None)
+                self._gauges.pop(name, None)
+
+
+# Global instance
+_metrics_registry = None
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get or create the global metrics registry."""
+    global _metrics_registry
+    if _metrics_registry is None:
+        _metrics_registry = MetricsRegistry()
+    return _metrics_registry
@@ -0,0 +1,306 @@
+"""
+Model Routing
+Maps call sites to model tiers instead of hardcoding one model everywhere.
+
+Each call site (e.g. "investor_matching.why_match") is routed to a tier (lite,
+standard, pro). A tier has a fallback chain of models and default generation
+settings; explicit generation_config values from the call site override the
+defaults. When a model is unavailable (not found or not enabled in the region,
+or still failing after the gateway's retries) the next model in the chain serves
+the call, and the model is skipped for UNAVAILABLE_COOLDOWN_SECONDS.
+
+Routes and tiers are configured with MODEL_ROUTING, a JSON object (or a path to a
+JSON file) overriding the defaults below:
+
+    {"routes": {"investor_matching.why_match": "standard"},
+     "tiers": {"lite": {"models": ["gemini-2.5-flash-lite"], "generation_config": {"temperature": 0.1}}}}
+
+With MODEL_ROUTING_RECORD_PATH set, routed text prompts and responses are appended
+to that JSONL file (sampled by MODEL_ROUTING_RECORD_SAMPLE) for the offline tier
+evaluation in scripts/evaluate_model_tiers.py.
+
+Models are served by the Vertex AI region pool (utils.vertex_regions), with the
+call site's region pin applied.
+
+Routed calls are counted in llm_routed_calls_total by call site, tier, model and
+outcome (ok, unavailable).
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.metrics import get_metrics_registry
+from utils.rate_limiter import is_rate_limit_error, is_transient_error
+from utils.vertex_regions import RegionalModel, regional_model
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _MODEL_UNAVAILABLE_ERRORS = (google_exceptions.NotFound, google_exceptions.PermissionDenied)
+except ImportError:
+    _MODEL_UNAVAILABLE_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+TIER_LITE = "lite"
+TIER_STANDARD = "standard"
+TIER_PRO = "pro"
+
+ROUTED_CALLS_METRIC = "llm_routed_calls_total"
+
+UNAVAILABLE_COOLDOWN_SECONDS = 300
+
+
+@dataclass
+class ModelTier:
+    name: str
+    models: List[str]                    # fallback chain; the first available model serves the call
+    generation_config: Dict[str, Any] = field(default_factory=dict)
+
+
+DEFAULT_TIERS: Dict[str, ModelTier] = {
+    TIER_LITE: ModelTier(TIER_LITE, ["gemini-2.5-flash-lite", "gemini-2.5-flash"],
+                         {"temperature": 0.1, "max_output_tokens": 2048}),
+    TIER_STANDARD: ModelTier(TIER_STANDARD, ["gemini-2.5-flash", "gemini-2.0-flash"]),
+    TIER_PRO: ModelTier(TIER_PRO, ["gemini-2.5-pro", "gemini-2.5-flash"], {"temperature": 0.1}),
+}
+
+# Short extraction and writing tasks; everything else uses DEFAULT_TIER
+DEFAULT_ROUTES: Dict[str, str] = {
+    "memo_enrichment.validation_structuring": TIER_LITE,
+    "perplexity.field_extraction": TIER_LITE,
+    "investor_matching.why_match": TIER_LITE,
+    "investor_recommendation.rationale": TIER_LITE,
+    "qa_generation.followup": TIER_LITE,
+}
+
+DEFAULT_TIER = TIER_STANDARD
+
+
+def load_routing_config(value: Optional[str] = None):
+    """
+    Tiers and routes with the MODEL_ROUTING overrides applied.
+
+    Returns:
+        (tiers, routes)
+    """
+    tiers = dict(DEFAULT_TIERS)
+    routes = dict(DEFAULT_ROUTES)
+    value = os.environ.get("MODEL_ROUTING", "") if value is None else value
+    if not value.strip():
+        return tiers, routes
+    try:
+        if not value.lstrip().startswith("{"):
+            with open(value) as f:
+                value = f.read()
+        config = json.loads(value)
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring invalid MODEL_ROUTING configuration: {e}")
+        return tiers, routes
+
+    for name, spec in (config.get("tiers") or {}).items():
+        base = tiers.get(name)
+        tiers[name] = ModelTier(
+            name,
+            list(spec.get("models") or (base.models if base else [])),
+            dict(spec.get("generation_config", base.generation_config if base else {})),
+        )
+    for call_site, tier in (config.get("routes") or {}).items():
+        if tier not in tiers:
+            logger.error(f"Ignoring route {call_site} -> unknown tier {tier}")
+            continue
+        routes[call_site] = tier
+    return tiers, routes
+
+
+def is_model_unavailable(error: BaseException) -> bool:
+    """True when another model should serve the call instead."""
+    if isinstance(error, _MODEL_UNAVAILABLE_ERRORS):
+        return True
+    return is_rate_limit_error(error) or is_transient_error(error)
+
+
+def _text_of(response) -> Optional[str]:
+    try:
+        return response.text
+    except (AttributeError, ValueError):
+        return None
+
+
+class PromptRecorder:
+    """Appends routed text prompts and responses to a JSONL file."""
+
+    def __init__(self, path: str, sample_rate: float = 1.0, rng: Optional[random.Random] = None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+    def record(self, call_site: str, tier: str, model: str, contents: Any,
+               generation_config: Optional[Dict[str, Any]], response_text: Optional[str],
+               latency_seconds: float) -> None:
+        # Only text prompts can be replayed (documents and images are not recorded)
+        if not isinstance(contents, str) or response_text is None:
+            return
+        if self._rng.random() >= self.sample_rate:
+            return
+        line = json.dumps({
+            "call_site": call_site,
+            "tier": tier,
+            "model": model,
+            "prompt": contents,
+            "generation_config": generation_config or {},
+            "response": response_text,
+            "latency_seconds": round(latency_seconds, 3),
+            "recorded_at": time.time(),
+        }, ensure_ascii=False, default=str)
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to record prompt for {call_site}: {e}")
+
+
+def _config_dict(generation_config: Any) -> Dict[str, Any]:
+    """generation_config as a dict; accepts a dict or a vertexai GenerationConfig."""
+    if generation_config is None:
+        return {}
+    if isinstance(generation_config, dict):
+        return generation_config
+    to_dict = getattr(generation_config, "to_dict", None)
+    if callable(to_dict):
+        return to_dict()
+    raise TypeError(f"Unsupported generation_config type: {type(generation_config).__name__}")
+
+
+class RoutedModel:
+    """Model for one call site; generate_content is served by its tier's fallback chain."""
+
+    def __init__(self, router: "ModelRouter", call_site: str, tier: ModelTier):
+        self.router = router
+        self.call_site = call_site
+        self.tier = tier
+
+    @property
+    def _model_name(self) -> str:
+        # Read by utils.structured_output to decide on JSON output support
+        return self.router.candidates(self.tier)[0]
+
+    def generate_content(self, contents, *args, generation_config: Optional[Any] = None, **kwargs):
+        if args:
+            # GenerativeModel takes only contents positionally; a second argument can only be a config
+            if len(args) > 1 or generation_config is not None:
+                raise TypeError("generate_content() takes generation_config once, positionally or by keyword")
+            generation_config, args = args[0], ()
+        config = {**self.tier.generation_config, **_config_dict(generation_config)}
+        registry = get_metrics_registry()
+        last_error: Optional[BaseException] = None
+        for name in self.router.candidates(self.tier):
+            started = time.monotonic()
+            model = self.router.model(name)
+            if isinstance(model, RegionalModel):
+                # Region pins apply per call site
+                model = model.for_call_site(self.call_site)
+            try:
+                response = model.generate_content(contents, *args, generation_config=config or None, **kwargs)
+            except Exception as e:
+                if not is_model_unavailable(e):
+                    raise
+                self.router.mark_unavailable(name, e)
+                registry.increment(ROUTED_CALLS_METRIC, call_site=self.call_site, tier=self.tier.name,
+                                   model=name, outcome="unavailable")
+                last_error = e
+                continue
+            registry.increment(ROUTED_CALLS_METRIC, call_site=self.call_site, tier=self.tier.name,
+                               model=name, outcome="ok")
+            if self.router.recorder is not None and not kwargs.get("stream"):
+                self.router.recorder.record(self.call_site, self.tier.name, name, contents, config,
+                                            _text_of(response), time.monotonic() - started)
+            return response
+        raise last_error
+
+
+class ModelRouter:
+    """Routes call sites to tiers and keeps one model per name."""
+
+    def __init__(self, tiers: Optional[Dict[str, ModelTier]] = None, routes: Optional[Dict[str, str]] = None,
+                 model_factory: Optional[Callable[[str], Any]] = None, recorder: Optional[PromptRecorder] = None,
+                 default_tier: str = DEFAULT_TIER):
+        self.tiers = dict(tiers or DEFAULT_TIERS)
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        self.default_tier = default_tier
+        self.recorder = recorder
+        self._model_factory = model_factory
+        self._models: Dict[str, Any] = {}
+        self._unavailable: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def tier_for(self, call_site: str) -> ModelTier:
+        return self.tiers[self.routes.get(call_site, self.default_tier)]
+
+    def model_for(self, call_site: str) -> RoutedModel:
+        """Model to use at call_site."""
+        return RoutedModel(self, call_site, self.tier_for(call_site))
+
+    def model_for_tier(self, tier: str, call_site: str = "evaluation") -> RoutedModel:
+        return RoutedModel(self, call_site, self.tiers[tier])
+
+    def model(self, name: str):
+        with self._lock:
+            model = self._models.get(name)
+            if model is None:
+                model = (self._model_factory or regional_model)(name)
+                self._models[name] = model
+            return model
+
+    def candidates(self, tier: ModelTier) -> List[str]:
+        """Models of a tier in fallback order, skipping recently unavailable ones."""
+        now = time.monotonic()
+        with self._lock:
+            available = [name for name in tier.models if self._unavailable.get(name, float("-inf")) <= now]
+        # When every model is cooling down, try them all rather than failing outright
+        return available or list(tier.models)
+
+    def mark_unavailable(self, name: str, error: BaseException) -> None:
+        logger.warning(f"Model {name} unavailable, falling back for {UNAVAILABLE_COOLDOWN_SECONDS}s: {error}")
+        with self._lock:
+            self._unavailable[name] = time.monotonic() + UNAVAILABLE_COOLDOWN_SECONDS
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            unavailable = {name: round(until - now) for name, until in self._unavailable.items() if until > now}
+        return {
+            "routes": dict(self.routes),
+            "default_tier": self.default_tier,
+            "tiers": {name: {"models": tier.models, "generation_config": tier.generation_config}
+                      for name, tier in self.tiers.items()},
+            "unavailable_models": unavailable,
+        }
+
+
+# Global instance
+_model_router = None
+
+
+def get_model_router() -> ModelRouter:
+    """Get or create the global model router from MODEL_ROUTING."""
+    global _model_router
+    if _model_router is None:
+        tiers, routes = load_routing_config()
+        record_path = os.environ.get("MODEL_ROUTING_RECORD_PATH")
+        recorder = None
+        if record_path:
+            recorder = PromptRecorder(record_path, float(os.environ.get("MODEL_ROUTING_RECORD_SAMPLE", "1.0")))
+        _model_router = ModelRouter(tiers, routes, recorder=recorder)
+    return _model_router
+
+
+def routed_model(call_site: str) -> RoutedModel:
+    """Model for call_site according to the global routing configuration."""
+    return get_model_router().model_for(call_site)
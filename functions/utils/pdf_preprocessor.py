@@ -0,0 +1,342 @@
+"""
+PDF Preprocessor
+Extracts per-page text and layout hints from pitch decks locally with PyPDF2 so the
+Memo 1 prompt can carry compact text instead of the full PDF. Pages whose text
+cannot be extracted (scanned or image-only slides) are kept as a small PDF of just
+those pages so Gemini can still read them visually.
+
+Page extracts are cached in-process by a hash of the page content, so shared slides
+across re-uploads and deck revisions are only parsed once.
+"""
+
+import hashlib
+import io
+import logging
+import re
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    from PyPDF2 import PdfReader, PdfWriter
+    PYPDF2_AVAILABLE = True
+except ImportError:
+    PYPDF2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# A page with fewer meaningful characters than this is considered near-empty
+NEAR_EMPTY_CHAR_THRESHOLD = 20
+
+# Gemini bills each PDF page as an image of roughly this many tokens
+TOKENS_PER_PDF_PAGE = 258
+CHARS_PER_TOKEN = 4
+
+_NUMERIC_RE = re.compile(r"[\$₹€£]?\d[\d,\.]*\s?(%|[kKmMbB]n?|cr|crore|lakh)?")
+_BULLET_RE = re.compile(r"^\s*([•\-\*▪●◦]|\d+[\.\)])\s+")
+
+
+@dataclass
+class PageExtract:
+    """Text and layout hints extracted from a single PDF page."""
+    page_number: int
+    text: str
+    content_hash: str
+    title: str = ""
+    bullet_count: int = 0
+    numeric_tokens: int = 0
+    has_images: bool = False
+    near_empty: bool = False
+    duplicate_of: Optional[int] = None
+
+    @property
+    def needs_image(self) -> bool:
+        """True when text extraction failed but the page carries visual content."""
+        return self.near_empty and self.has_images
+
+
+@dataclass
+class PreprocessedDeck:
+    """Result of preprocessing a deck."""
+    pages: List[PageExtract] = field(default_factory=list)
+    compact_text: str = ""
+    image_page_numbers: List[int] = field(default_factory=list)
+    image_pages_pdf: Optional[bytes] = None
+    cache_hits: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def skipped_page_numbers(self) -> List[int]:
+        return [p.page_number for p in self.pages
+                if p.duplicate_of is not None or (p.near_empty and not p.has_images)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Summary stats for logging and memo metadata."""
+        return {
+            "page_count": self.page_count,
+            "text_pages": self.page_count - len(self.image_page_numbers) - len(self.skipped_page_numbers),
+            "image_pages": self.image_page_numbers,
+            "skipped_pages": self.skipped_page_numbers,
+            "cache_hits": self.cache_hits,
+            "compact_chars": len(self.compact_text),
+            "estimated_tokens": estimate_compact_tokens(self),
+            "estimated_native_tokens": estimate_native_tokens(self.page_count),
+            "elapsed_seconds": round(self.elapsed_seconds, 4),
+        }
+
+
+class PageExtractCache:
+    """Thread-safe LRU cache of PageExtract by page content hash."""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, PageExtract]" = OrderedDict()
+
+    def get(self, content_hash: str) -> Optional[PageExtract]:
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is not None:
+                self._entries.move_to_end(content_hash)
+            return entry
+
+    def put(self, content_hash: str, extract: PageExtract) -> None:
+        with self._lock:
+            self._entries[content_hash] = extract
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Global instance
+_page_cache = None
+
+
+def get_page_cache() -> PageExtractCache:
+    """Get or create the process-wide page extract cache"""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageExtractCache()
+    return _page_cache
+
+
+def estimate_native_tokens(page_count: int) -> int:
+    """Estimate input tokens when the whole PDF is sent to Gemini."""
+    return page_count * TOKENS_PER_PDF_PAGE
+
+
+def estimate_compact_tokens(deck: PreprocessedDeck) -> int:
+    """Estimate input tokens for compact text plus image-only pages."""
+    return len(deck.compact_text) // CHARS_PER_TOKEN + len(deck.image_page_numbers) * TOKENS_PER_PDF_PAGE
+
+
+def _page_images(page) -> List[Any]:
+    """Return the image XObjects referenced by a page."""
+    try:
+        resources = page.get("/Resources") or {}
+        resources = resources.get_object() if hasattr(resources, "get_object") else resources
+        xobjects = resources.get("/XObject") or {}
+        xobjects = xobjects.get_object() if hasattr(xobjects, "get_object") else xobjects
+        images = []
+        for name in sorted(xobjects.keys()):
+            xobject = xobjects[name].get_object()
+            if xobject.get("/Subtype") == "/Image":
+                images.append(xobject)
+        return images
+    except Exception:
+        return []
+
+
+def _page_content_hash(page, images: List[Any]) -> str:
+    """Hash the page content stream and the raw data of its images."""
+    digest = hashlib.sha256()
+    try:
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+    except Exception:
+        digest.update(repr(page.get("/Contents")).encode("utf-8"))
+    for image in images:
+        digest.update(getattr(image, "_data", b"") or b"")
+    return digest.hexdigest()
+
+
+def _extract_page(page, page_number: int, content_hash: str, images: List[Any]) -> PageExtract:
+    """Extract text and layout hints (title by font size, bullets, numeric density)."""
+    runs = []
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        if text and text.strip():
+            scale = abs(tm[3] if tm[3] else tm[0]) * abs(cm[3] if cm[3] else 1)
+            runs.append((float(font_size or 0) * (scale or 1), text.strip()))
+
+    try:
+        text = page.extract_text(visitor_text=visitor) or ""
+    except Exception as e:
+        logger.debug(f"Text extraction failed on page {page_number}: {e}")
+        text = ""
+
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    text = "\n".join(lines)
+
+    title = ""
+    sizes = [size for size, _ in runs if size > 0]
+    if sizes:
+        largest = max(sizes)
+        if len(set(sizes)) > 1 and largest >= 1.2 * statistics.median(sizes):
+            title = " ".join(t for size, t in runs if size == largest)[:200]
+
+    meaningful_chars = len(re.sub(r"\W", "", text))
+    return PageExtract(
+        page_number=page_number,
+        text=text,
+        content_hash=content_hash,
+        title=title,
+        bullet_count=sum(1 for line in lines if _BULLET_RE.match(line)),
+        numeric_tokens=len(_NUMERIC_RE.findall(text)),
+        has_images=bool(images),
+        near_empty=meaningful_chars < NEAR_EMPTY_CHAR_THRESHOLD,
+    )
+
+
+def _normalized_text_hash(text: str) -> str:
+    return hashlib.sha1(re.sub(r"\s+", " ", text.lower()).strip().encode("utf-8")).hexdigest()
+
+
+def _build_compact_text(pages: List[PageExtract]) -> str:
+    """Render page extracts as compact, page-delimited text for the prompt."""
+    sections = []
+    for page in pages:
+        if page.duplicate_of is not None:
+            continue
+        if page.near_empty:
+            if page.has_images:
+                sections.append(f"--- Page {page.page_number} (visual content attached as image) ---")
+            continue
+
+        hints = []
+        if page.bullet_count:
+            hints.append(f"{page.bullet_count} bullets")
+        if page.numeric_tokens >= 5:
+            hints.append("metrics-heavy")
+        header = f"--- Page {page.page_number}" + (f" [{', '.join(hints)}]" if hints else "") + " ---"
+
+        body = page.text
+        if page.title:
+            body = f"# {page.title}\n" + (body.replace(page.title, "", 1).strip() if page.title in body else body)
+        sections.append(f"{header}\n{body}")
+    return "\n\n".join(sections)
+
+
+def _extract_pages_pdf(reader, page_numbers: List[int]) -> Optional[bytes]:
+    """Write only the given 1-based pages into a new PDF."""
+    if not page_numbers:
+        return None
+    writer = PdfWriter()
+    for number in page_numbers:
+        writer.add_page(reader.pages[number - 1])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def page_windows(page_count: int, window_size: int, overlap: int) -> List[List[int]]:
+    """
+    Split 1-based page numbers into overlapping windows.
+
+    Example: page_windows(10, 4, 1) -> [[1, 2, 3, 4], [4, 5, 6, 7], [7, 8, 9, 10]]
+    """
+    window_size = max(1, window_size)
+    step = max(1, window_size - max(0, overlap))
+    windows = []
+    start = 1
+    while start <= page_count:
+        end = min(page_count, start + window_size - 1)
+        windows.append(list(range(start, end + 1)))
+        if end == page_count:
+            break
+        start += step
+    return windows
+
+
+def compact_text_for_pages(deck: PreprocessedDeck, page_numbers: List[int]) -> str:
+    """Compact text for a subset of the deck's pages."""
+    wanted = set(page_numbers)
+    return _build_compact_text([p for p in deck.pages if p.page_number in wanted])
+
+
+def extract_pages_pdf(file_data: bytes, page_numbers: List[int]) -> Optional[bytes]:
+    """Return a PDF containing only the given 1-based pages of file_data."""
+    if not PYPDF2_AVAILABLE:
+        raise ImportError("PyPDF2 is required for PDF preprocessing")
+    return _extract_pages_pdf(PdfReader(io.BytesIO(file_data)), page_numbers)
+
+
+def count_pdf_pages(file_data: bytes) -> int:
+    """Return the number of pages in a PDF."""
+    if not PYPDF2_AVAILABLE:
+        raise ImportError("PyPDF2 is required for PDF preprocessing")
+    return len(PdfReader(io.BytesIO(file_data)).pages)
+
+
+def preprocess_pdf(file_data: bytes, cache: Optional[PageExtractCache] = None,
+                   max_pages: Optional[int] = None) -> PreprocessedDeck:
+    """
+    Preprocess a PDF deck into compact text plus image-only pages.
+
+    Args:
+        file_data: Raw PDF bytes
+        cache: Page extract cache (defaults to the process-wide cache)
+        max_pages: Only preprocess the first max_pages pages (e.g. to identify the company)
+
+    Returns:
+        PreprocessedDeck with per-page extracts, compact text and a PDF of image-only pages
+    """
+    if not PYPDF2_AVAILABLE:
+        raise ImportError("PyPDF2 is required for PDF preprocessing")
+
+    started = time.perf_counter()
+    cache = cache or get_page_cache()
+    reader = PdfReader(io.BytesIO(file_data))
+    deck = PreprocessedDeck()
+    seen_text: Dict[str, int] = {}
+
+    pages = reader.pages if max_pages is None else list(reader.pages)[:max_pages]
+    for index, page in enumerate(pages):
+        page_number = index + 1
+        images = _page_images(page)
+        content_hash = _page_content_hash(page, images)
+
+        cached = cache.get(content_hash)
+        if cached is not None:
+            deck.cache_hits += 1
+            extract = PageExtract(**{**cached.__dict__, "page_number": page_number, "duplicate_of": None})
+        else:
+            extract = _extract_page(page, page_number, content_hash, images)
+            cache.put(content_hash, extract)
+
+        if not extract.near_empty:
+            text_hash = _normalized_text_hash(extract.text)
+            if text_hash in seen_text:
+                extract.duplicate_of = seen_text[text_hash]
+            else:
+                seen_text[text_hash] = page_number
+
+        deck.pages.append(extract)
+
+    deck.image_page_numbers = [p.page_number for p in deck.pages if p.needs_image]
+    deck.compact_text = _build_compact_text(deck.pages)
+    deck.image_pages_pdf = _extract_pages_pdf(reader, deck.image_page_numbers)
+    deck.elapsed_seconds = time.perf_counter() - started
+    return deck
@@ -0,0 +1,238 @@
+"""
+Prompt Budget
+Token budgeting and compact serialization for prompts assembled from large inputs.
+
+A prompt is built from named sections (Memo 1, analytics, benchmarking, interview
+transcripts, ...). Each section is serialized compactly: no indentation, no null or
+empty values, no duplicate list items and no citation/raw-response fields. When the
+sections do not fit the token budget, the lowest-priority sections are summarized
+(if the section has a summarizer) or truncated first; priority 0 sections are never
+reduced.
+
+Token counts are estimated from characters (see CHARS_PER_TOKEN). Per-section usage
+is logged for every call and counted in the llm_prompt_tokens_total metric.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Same estimate as utils.pdf_preprocessor
+CHARS_PER_TOKEN = 4
+
+PROMPT_TOKENS_METRIC = "llm_prompt_tokens_total"
+
+TRUNCATION_MARKER = " …[truncated]"
+
+# Fields that only add tokens for the model
+DROPPED_KEYS = frozenset({"citations", "raw_response", "raw_content", "embedding", "embeddings"})
+
+# Placeholder values treated as empty
+EMPTY_PLACEHOLDERS = frozenset({
+    "n/a", "na", "none", "null", "not specified", "not available", "not disclosed", "unknown", "tbd",
+})
+
+ACTION_KEPT = "kept"
+ACTION_TRUNCATED = "truncated"
+ACTION_SUMMARIZED = "summarized"
+ACTION_DROPPED = "dropped"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated token count of text."""
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _is_empty(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return not value or value.lower() in EMPTY_PLACEHOLDERS
+    if isinstance(value, (list, dict)):
+        return not value
+    return False
+
+
+def compact_value(value: Any, drop_keys=DROPPED_KEYS) -> Any:
+    """Copy of value without null/empty values, dropped keys and duplicate list items."""
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            if key in drop_keys:
+                continue
+            item = compact_value(item, drop_keys)
+            if not _is_empty(item):
+                compacted[key] = item
+        return compacted
+    if isinstance(value, (list, tuple, set)):
+        items, seen = [], set()
+        for item in value:
+            item = compact_value(item, drop_keys)
+            if _is_empty(item):
+                continue
+            marker = json.dumps(item, sort_keys=True, default=str)
+            if marker not in seen:
+                seen.add(marker)
+                items.append(item)
+        return items
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def compact_json(value: Any, drop_keys=DROPPED_KEYS) -> str:
+    """Compact text for a prompt section; strings are passed through stripped."""
+    if isinstance(value, str):
+        return value.strip()
+    return json.dumps(compact_value(value, drop_keys), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens at a whitespace or comma boundary, with a marker."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER))
+    cut = text[:limit]
+    boundary = max(cut.rfind(" "), cut.rfind("\n"), cut.rfind(","))
+    if boundary > limit - 200:
+        cut = cut[:boundary]
+    return cut + TRUNCATION_MARKER
+
+
+@dataclass
+class PromptSection:
+    """A named part of a prompt."""
+    name: str
+    content: Any
+    priority: int = 1                    # 0 is never reduced; higher values are reduced first
+    max_tokens: Optional[int] = None     # cap applied regardless of the budget
+    min_tokens: int = 0                  # floor when reduced for the budget
+    summarize: Optional[Callable[[str, int], str]] = None  # (text, max_tokens) -> summary
+
+
+@dataclass
+class SectionUsage:
+    name: str
+    priority: int
+    original_tokens: int                 # as json.dumps(indent=2) would have sent it
+    compact_tokens: int
+    tokens: int                          # after budgeting
+    action: str = ACTION_KEPT
+
+
+@dataclass
+class BudgetedPrompt:
+    """Section texts fitted to a budget, with their token usage."""
+    sections: Dict[str, str]
+    usage: List[SectionUsage]
+    budget_tokens: int
+    fixed_tokens: int = 0
+    text: str = ""
+
+    @property
+    def total_tokens(self) -> int:
+        return estimate_tokens(self.text) if self.text else self.fixed_tokens + sum(u.tokens for u in self.usage)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.total_tokens > self.budget_tokens
+
+
+def _reduce(section: PromptSection, text: str, max_tokens: int):
+    """Text of a section reduced to max_tokens, and the action taken."""
+    if max_tokens <= 0:
+        return "", ACTION_DROPPED
+    if section.summarize is not None:
+        try:
+            summary = (section.summarize(text, max_tokens) or "").strip()
+        except Exception as e:
+            logger.warning(f"Summarizing prompt section {section.name} failed, truncating instead: {e}")
+            summary = ""
+        if summary:
+            return truncate_to_tokens(summary, max_tokens), ACTION_SUMMARIZED
+    return truncate_to_tokens(text, max_tokens), ACTION_TRUNCATED
+
+
+def fit_sections(sections: List[PromptSection], budget_tokens: int, call_site: str,
+                 fixed_tokens: int = 0) -> BudgetedPrompt:
+    """
+    Serialize sections compactly and fit them into budget_tokens.
+
+    Args:
+        sections: Prompt sections
+        budget_tokens: Token budget for the whole prompt
+        call_site: Label for logs and the prompt token metric
+        fixed_tokens: Tokens of the prompt outside the sections (instructions)
+
+    Returns:
+        The budgeted section texts and per-section usage
+    """
+    rendered: Dict[str, str] = {}
+    usage: Dict[str, SectionUsage] = {}
+    for section in sections:
+        text = compact_json(section.content)
+        original = section.content if isinstance(section.content, str) else \
+            json.dumps(section.content, indent=2, default=str)
+        usage[section.name] = SectionUsage(
+            name=section.name,
+            priority=section.priority,
+            original_tokens=estimate_tokens(original),
+            compact_tokens=estimate_tokens(text),
+            tokens=estimate_tokens(text),
+        )
+        if section.max_tokens is not None and usage[section.name].tokens > section.max_tokens:
+            text, usage[section.name].action = _reduce(section, text, section.max_tokens)
+            usage[section.name].tokens = estimate_tokens(text)
+        rendered[section.name] = text
+
+    overflow = fixed_tokens + sum(u.tokens for u in usage.values()) - budget_tokens
+    reducible = [s for s in sections if s.priority > 0]
+    for section in sorted(reducible, key=lambda s: (-s.priority, -usage[s.name].tokens)):
+        if overflow <= 0:
+            break
+        current = usage[section.name].tokens
+        target = max(section.min_tokens, current - overflow)
+        if target >= current:
+            continue
+        rendered[section.name], usage[section.name].action = _reduce(section, rendered[section.name], target)
+        usage[section.name].tokens = estimate_tokens(rendered[section.name])
+        overflow -= current - usage[section.name].tokens
+
+    budgeted = BudgetedPrompt(rendered, list(usage.values()), budget_tokens, fixed_tokens)
+    _record_usage(budgeted, call_site)
+    return budgeted
+
+
+def build_prompt(template: str, sections: List[PromptSection], budget_tokens: int,
+                 call_site: str) -> BudgetedPrompt:
+    """Fit sections into the budget and format them into template (str.format fields)."""
+    budgeted = fit_sections(sections, budget_tokens, call_site, fixed_tokens=estimate_tokens(template))
+    budgeted.text = template.format(**budgeted.sections)
+    return budgeted
+
+
+def _record_usage(budgeted: BudgetedPrompt, call_site: str) -> None:
+    registry = get_metrics_registry()
+    for usage in budgeted.usage:
+        registry.increment(PROMPT_TOKENS_METRIC, usage.tokens, call_site=call_site, section=usage.name)
+    details = ", ".join(
+        f"{u.name}={u.tokens}" + (f" ({u.action} from {u.compact_tokens})" if u.action != ACTION_KEPT else "")
+        for u in budgeted.usage
+    )
+    original = budgeted.fixed_tokens + sum(u.original_tokens for u in budgeted.usage)
+    message = (f"Prompt tokens for {call_site}: ~{budgeted.total_tokens}/{budgeted.budget_tokens} "
+               f"(~{original} before compaction; {details})")
+    if budgeted.over_budget:
+        logger.warning(message + " - over budget after reducing all reducible sections")
+    else:
+        logger.info(message)
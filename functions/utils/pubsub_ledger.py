@@ -0,0 +1,217 @@
+"""
+Pub/Sub Processing Ledger
+Makes Pub/Sub handlers idempotent. Every delivery is keyed by handler, message id and
+payload hash; a handler only runs after it claims the key with a transactional create
+and a lease. The terminal outcome is recorded so duplicate deliveries are acked
+without repeating the work.
+
+Backends:
+- "firestore" (default): pubsubLedger/{key} documents claimed in a transaction.
+- "memory": an in-process store for local testing and replay harnesses.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEDGER_COLLECTION = "pubsubLedger"
+DEFAULT_LEASE_SECONDS = 600
+
+STATE_PROCESSING = "processing"
+STATE_COMPLETED = "completed"
+STATE_FAILED = "failed"
+
+
+def compute_payload_hash(data: Any) -> str:
+    """Return the SHA-256 of a message payload (bytes or str)."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data or b"").hexdigest()
+
+
+def build_ledger_key(handler: str, message_id: Optional[str], payload_hash: str) -> str:
+    """Build the ledger document id for a delivery."""
+    raw = f"{handler}:{message_id or ''}:{payload_hash}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _can_claim(existing: Optional[Dict[str, Any]], now: float) -> bool:
+    """A key can be claimed if unseen, previously failed, or its lease expired."""
+    if not existing:
+        return True
+    state = existing.get("state")
+    if state == STATE_COMPLETED:
+        return False
+    if state == STATE_FAILED:
+        return True
+    return existing.get("lease_expires_at", 0) <= now
+
+
+class InMemoryLedgerStore:
+    """Thread-safe in-process ledger store."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+
+    def try_claim(self, key: str, record: Dict[str, Any], lease_seconds: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            existing = self._records.get(key)
+            if not _can_claim(existing, now):
+                return False, dict(existing)
+            attempts = (existing or {}).get("attempts", 0) + 1
+            self._records[key] = {
+                **record,
+                "state": STATE_PROCESSING,
+                "attempts": attempts,
+                "claimed_at": now,
+                "lease_expires_at": now + lease_seconds,
+            }
+            return True, None
+
+    def finish(self, key: str, update: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records.setdefault(key, {}).update(update)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(key)
+            return dict(record) if record else None
+
+
+class FirestoreLedgerStore:
+    """Ledger store backed by Firestore transactions."""
+
+    def __init__(self, db, collection: str = LEDGER_COLLECTION):
+        self.db = db
+        self.collection = collection
+
+    def try_claim(self, key: str, record: Dict[str, Any], lease_seconds: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        from firebase_admin import firestore
+
+        doc_ref = self.db.collection(self.collection).document(key)
+
+        @firestore.transactional
+        def claim_in_transaction(transaction):
+            now = time.time()
+            snapshot = doc_ref.get(transaction=transaction)
+            existing = snapshot.to_dict() if snapshot.exists else None
+            if not _can_claim(existing, now):
+                return False, existing
+            transaction.set(doc_ref, {
+                **record,
+                "state": STATE_PROCESSING,
+                "attempts": (existing or {}).get("attempts", 0) + 1,
+                "claimed_at": now,
+                "lease_expires_at": now + lease_seconds,
+            })
+            return True, None
+
+        return claim_in_transaction(self.db.transaction())
+
+    def finish(self, key: str, update: Dict[str, Any]) -> None:
+        self.db.collection(self.collection).document(key).set(update, merge=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        snapshot = self.db.collection(self.collection).document(key).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+
+class ProcessingLedger:
+    """Runs a handler at most once per delivery key."""
+
+    def __init__(self, store, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.store = store
+        self.lease_seconds = lease_seconds
+
+    def process(self, handler: str, message_id: Optional[str], data: Any,
+                fn: Callable[[Any], Any]) -> Dict[str, Any]:
+        """
+        Claim the delivery and run fn(data) if this is the first successful delivery.
+
+        Args:
+            handler: Logical handler name (part of the key)
+            message_id: Pub/Sub message id, if known
+            data: Raw message payload passed to fn
+            fn: The handler implementation
+
+        Returns:
+            Dict with 'status' ('processed' or 'duplicate') and the ledger 'key'
+
+        Raises:
+            Whatever fn raises, after the ledger entry is marked failed so a redelivery can retry
+        """
+        payload_hash = compute_payload_hash(data)
+        key = build_ledger_key(handler, message_id, payload_hash)
+
+        try:
+            claimed, existing = self.store.try_claim(key, {
+                "handler": handler,
+                "message_id": message_id,
+                "payload_hash": payload_hash,
+            }, self.lease_seconds)
+        except Exception as e:
+            # Never drop work because the ledger is unavailable
+            logger.warning(f"Ledger claim failed for {handler} ({message_id}), processing anyway: {e}")
+            fn(data)
+            return {"status": "processed", "key": key, "ledger": "unavailable"}
+
+        if not claimed:
+            logger.info(f"Duplicate delivery for {handler} ({message_id}), state={existing.get('state')}; skipping")
+            return {"status": "duplicate", "key": key, "state": existing.get("state")}
+
+        started = time.time()
+        try:
+            fn(data)
+        except Exception as e:
+            self._finish(key, {
+                "state": STATE_FAILED,
+                "error": str(e)[:500],
+                "lease_expires_at": 0,
+                "finished_at": time.time(),
+            })
+            raise
+
+        self._finish(key, {
+            "state": STATE_COMPLETED,
+            "outcome": "success",
+            "duration_seconds": round(time.time() - started, 3),
+            "finished_at": time.time(),
+        })
+        return {"status": "processed", "key": key}
+
+    def _finish(self, key: str, update: Dict[str, Any]) -> None:
+        try:
+            self.store.finish(key, update)
+        except Exception as e:
+            logger.warning(f"Failed to record ledger outcome for {key[:12]}: {e}")
+
+
+# Global instance
+_processing_ledger = None
+
+
+def get_processing_ledger() -> ProcessingLedger:
+    """Get or create the process-wide ledger for the configured backend"""
+    global _processing_ledger
+    if _processing_ledger is None:
+        lease_seconds = int(os.environ.get("PUBSUB_LEDGER_LEASE_SECONDS", DEFAULT_LEASE_SECONDS))
+        if os.environ.get("PUBSUB_LEDGER_BACKEND", "firestore").lower() == "memory":
+            store = InMemoryLedgerStore()
+        else:
+            from firebase_admin import firestore
+            store = FirestoreLedgerStore(firestore.client())
+        _processing_ledger = ProcessingLedger(store, lease_seconds=lease_seconds)
+    return _processing_ledger
+
+
+def process_message_once(handler: str, message_id: Optional[str], data: Any,
+                         fn: Callable[[Any], Any]) -> Dict[str, Any]:
+    """Run a Pub/Sub handler through the process-wide ledger."""
+    return get_processing_ledger().process(handler, message_id, data, fn)
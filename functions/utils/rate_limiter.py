@@ -0,0 +1,410 @@
+"""
+Rate Limiter
+Process-wide adaptive rate limiting and one retry policy for outbound model calls.
+
+Every Vertex AI and Perplexity call takes a token from the limiter of its provider
+and model before it is sent. Limiters adapt AIMD-style: each successful call raises
+the rate additively, and a 429 halves it (at most once per cooldown, so a burst
+of 429s from the same overload counts once). A Retry-After hint pauses the limiter
+until then. Callers are released in reservation order, so a burst of uploads queues
+instead of fanning out into a wall of 429s.
+
+call_with_retry()/call_with_retry_async() apply the shared RetryPolicy: rate limits
+and transient server errors are retried with jittered exponential backoff (or the
+Retry-After delay when longer); anything else is raised at once. Under a request
+deadline (utils.deadline) no attempt starts, and no retry waits, past it.
+call_with_retry() sleeps in the calling thread, so coroutines either use
+call_with_retry_async() or run the blocking call in asyncio.to_thread().
+
+A 429 is recognized by exception type or HTTP status first; only errors that carry
+neither are classified by message, where "429" has to stand alone.
+
+Current limits and queue depths are published as gauges (llm_rate_limit_rps,
+llm_rate_limit_queue_depth); throttles and retries are counted
+(llm_rate_limited_total, llm_retries_total).
+"""
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.deadline import check_deadline, remaining
+from utils.metrics import get_metrics_registry
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    GOOGLE_API_CORE_AVAILABLE = True
+except ImportError:
+    GOOGLE_API_CORE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+VERTEX_PROVIDER = "vertex"
+PERPLEXITY_PROVIDER = "perplexity"
+
+RATE_LIMIT_GAUGE = "llm_rate_limit_rps"
+QUEUE_DEPTH_GAUGE = "llm_rate_limit_queue_depth"
+RATE_LIMITED_METRIC = "llm_rate_limited_total"
+RETRIES_METRIC = "llm_retries_total"
+
+if GOOGLE_API_CORE_AVAILABLE:
+    _GOOGLE_RATE_LIMIT_ERRORS: Tuple[type, ...] = (google_exceptions.TooManyRequests,
+                                                   google_exceptions.ResourceExhausted)
+    _GOOGLE_TRANSIENT_ERRORS: Tuple[type, ...] = (google_exceptions.InternalServerError,
+                                                  google_exceptions.BadGateway,
+                                                  google_exceptions.ServiceUnavailable,
+                                                  google_exceptions.GatewayTimeout,
+                                                  google_exceptions.DeadlineExceeded)
+else:
+    _GOOGLE_RATE_LIMIT_ERRORS = ()
+    _GOOGLE_TRANSIENT_ERRORS = ()
+
+# Message fallbacks for errors that carry no status; "429" must stand alone, not sit
+# inside an ID, byte count or token count
+_RATE_LIMIT_MARKERS = ("resource exhausted", "resourceexhausted", "rate limit", "too many requests")
+_RATE_LIMIT_STATUS_PATTERN = re.compile(r"\b429\b")
+_TRANSIENT_MARKERS = ("500 ", "502 ", "503 ", "504 ", "service unavailable", "deadline exceeded", "timed out")
+
+
+class RetryableError(Exception):
+    """Transient failure of an outbound call (e.g. an HTTP 5xx) that may be retried."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None,
+                 body: str = ""):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.body = body
+
+
+class RateLimitError(RetryableError):
+    """The provider rejected a call for exceeding its rate limit (HTTP 429)."""
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """Seconds to wait from a Retry-After value (delta seconds or an HTTP date)."""
+    if value is None or value == "":
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        moment = parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """Retry-After hint carried by an error or by the HTTP response attached to it."""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        return parse_retry_after(headers.get("Retry-After"))
+    except AttributeError:
+        return None
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an error (aiohttp .status, google-api-core .code, .response.status_code)."""
+    for value in (getattr(error, "status", None), getattr(error, "code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return int(value)
+    return None
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    if isinstance(error, RateLimitError) or isinstance(error, _GOOGLE_RATE_LIMIT_ERRORS):
+        return True
+    status = status_of(error)
+    if status is not None:
+        return status == 429
+    message = str(error).lower()
+    return (any(marker in message for marker in _RATE_LIMIT_MARKERS)
+            or _RATE_LIMIT_STATUS_PATTERN.search(message) is not None)
+
+
+def is_transient_error(error: BaseException) -> bool:
+    if isinstance(error, (RetryableError, asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, _GOOGLE_TRANSIENT_ERRORS):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _TRANSIENT_MARKERS)
+
+
+@dataclass
+class RateLimitConfig:
+    initial_rps: float
+    min_rps: float
+    max_rps: float
+    burst: float = 1.0
+    additive_increase: float = 0.5    # rps gained per second of successful traffic
+    decrease_factor: float = 0.5      # rate multiplier on a 429
+    cooldown_seconds: float = 2.0     # 429s within this window count as one decrease
+
+
+# Starting points; the limiters converge on what each quota actually allows
+DEFAULT_RATE_LIMITS: Dict[str, RateLimitConfig] = {
+    VERTEX_PROVIDER: RateLimitConfig(initial_rps=5.0, min_rps=0.2, max_rps=30.0, burst=10.0),
+    PERPLEXITY_PROVIDER: RateLimitConfig(initial_rps=1.0, min_rps=0.1, max_rps=5.0, burst=3.0),
+}
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate follows AIMD.
+
+    acquire() reserves a token and sleeps until it is due. Reservations may run
+    the bucket negative, which queues callers in order instead of letting them race.
+    """
+
+    def __init__(self, provider: str, model: str, config: RateLimitConfig,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.provider = provider
+        self.model = model
+        self.config = config
+        self._clock = clock
+        self._sleep = sleep
+        self._rate = config.initial_rps
+        self._tokens = config.burst
+        self._updated = clock()            # may be in the future while paused by Retry-After
+        self._last_decrease = float("-inf")
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._publish_rate()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.config.burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+
+    def _reserve(self) -> float:
+        """Take a token and return the seconds until it is due."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, self._updated - now) + max(0.0, -self._tokens) / self._rate
+            if wait > 0:
+                self._waiting += 1
+                self._publish_queue_depth()
+            return wait
+
+    def _release(self) -> None:
+        with self._lock:
+            self._waiting -= 1
+            self._publish_queue_depth()
+
+    def acquire(self) -> float:
+        """Block until a call may be sent; returns the seconds waited."""
+        wait = self._reserve()
+        if wait > 0:
+            try:
+                self._sleep(wait)
+            finally:
+                self._release()
+        return wait
+
+    async def acquire_async(self) -> float:
+        """acquire() for coroutines."""
+        wait = self._reserve()
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._release()
+        return wait
+
+    def on_success(self) -> None:
+        """Additive increase: about additive_increase rps per second of traffic."""
+        with self._lock:
+            if self._rate < self.config.max_rps:
+                self._rate = min(self.config.max_rps, self._rate + self.config.additive_increase / self._rate)
+                self._publish_rate()
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Multiplicative decrease, and a pause until Retry-After when given."""
+        with self._lock:
+            now = self._clock()
+            if now - self._last_decrease >= self.config.cooldown_seconds:
+                self._rate = max(self.config.min_rps, self._rate * self.config.decrease_factor)
+                self._last_decrease = now
+                self._publish_rate()
+            if retry_after:
+                self._refill(now)
+                self._tokens = min(self._tokens, 0.0)
+                self._updated = max(self._updated, now + retry_after)
+        get_metrics_registry().increment(RATE_LIMITED_METRIC, provider=self.provider, model=self.model)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "model": self.model,
+                "rate_rps": round(self._rate, 3),
+                "queue_depth": self._waiting,
+                "paused_seconds": round(max(0.0, self._updated - self._clock()), 3),
+            }
+
+    def _publish_rate(self) -> None:
+        get_metrics_registry().set_gauge(RATE_LIMIT_GAUGE, self._rate, provider=self.provider, model=self.model)
+
+    def _publish_queue_depth(self) -> None:
+        get_metrics_registry().set_gauge(QUEUE_DEPTH_GAUGE, self._waiting, provider=self.provider, model=self.model)
+
+
+class RateLimiterRegistry:
+    """One limiter per (provider, model) for the whole process."""
+
+    def __init__(self, limits: Optional[Dict[str, RateLimitConfig]] = None):
+        self.limits = dict(limits or DEFAULT_RATE_LIMITS)
+        self._limiters: Dict[Tuple[str, str], AdaptiveRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, model: str = "default") -> AdaptiveRateLimiter:
+        key = (provider, model or "default")
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                config = self.limits.get(provider) or DEFAULT_RATE_LIMITS[VERTEX_PROVIDER]
+                limiter = AdaptiveRateLimiter(provider, key[1], config)
+                self._limiters[key] = limiter
+            return limiter
+
+    def snapshot(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.snapshot() for limiter in limiters]
+
+
+@dataclass
+class RetryPolicy:
+    """Jittered exponential backoff shared by all outbound model calls."""
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    rng: random.Random = field(default_factory=random.Random, repr=False)
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before retry number attempt (1-based)."""
+        backoff = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(backoff, retry_after or 0.0)
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        return attempt < self.max_attempts and (is_rate_limit_error(error) or is_transient_error(error))
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def _on_failure(limiter: AdaptiveRateLimiter, policy: RetryPolicy, error: BaseException,
+                attempt: int) -> Optional[float]:
+    """Records a failed attempt; returns the delay before retrying, or None to give up."""
+    throttled = is_rate_limit_error(error)
+    retry_after = retry_after_of(error)
+    if throttled:
+        limiter.on_throttle(retry_after)
+    if not policy.should_retry(error, attempt):
+        return None
+    delay = policy.delay(attempt, retry_after)
+    left = remaining()
+    if left is not None and delay >= left:
+        # The retry could not start before the request's deadline
+        return None
+    reason = "rate_limit" if throttled else "transient"
+    get_metrics_registry().increment(RETRIES_METRIC, provider=limiter.provider, model=limiter.model, reason=reason)
+    logger.warning(f"{limiter.provider}/{limiter.model} call failed ({reason}: {error}); "
+                   f"retry {attempt}/{policy.max_attempts - 1} in {delay:.1f}s")
+    return delay
+
+
+def call_with_retry(fn: Callable[[], Any], provider: str, model: str = "default",
+                    policy: Optional[RetryPolicy] = None, limiter: Optional[AdaptiveRateLimiter] = None,
+                    sleep: Callable[[float], None] = time.sleep) -> Any:
+    """
+    Calls fn under the provider/model rate limiter and the shared retry policy.
+
+    Returns:
+        fn's result; the last error is raised once retries are exhausted or when it
+        is not retryable
+    """
+    limiter = limiter or get_rate_limiter(provider, model)
+    policy = policy or DEFAULT_RETRY_POLICY
+    attempt = 0
+    while True:
+        check_deadline(f"{provider}/{model}")
+        limiter.acquire()
+        attempt += 1
+        try:
+            result = fn()
+        except Exception as e:
+            delay = _on_failure(limiter, policy, e, attempt)
+            if delay is None:
+                raise
+            sleep(delay)
+            continue
+        limiter.on_success()
+        return result
+
+
+async def call_with_retry_async(fn: Callable[[], Awaitable[Any]], provider: str, model: str = "default",
+                                policy: Optional[RetryPolicy] = None,
+                                limiter: Optional[AdaptiveRateLimiter] = None) -> Any:
+    """call_with_retry() for coroutines; fn returns a new awaitable per attempt."""
+    limiter = limiter or get_rate_limiter(provider, model)
+    policy = policy or DEFAULT_RETRY_POLICY
+    attempt = 0
+    while True:
+        check_deadline(f"{provider}/{model}")
+        await limiter.acquire_async()
+        attempt += 1
+        try:
+            result = await fn()
+        except Exception as e:
+            delay = _on_failure(limiter, policy, e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        limiter.on_success()
+        return result
+
+
+# Global instance
+_rate_limiter_registry = None
+
+
+def get_rate_limiter_registry() -> RateLimiterRegistry:
+    """Get or create the global rate limiter registry."""
+    global _rate_limiter_registry
+    if _rate_limiter_registry is None:
+        _rate_limiter_registry = RateLimiterRegistry()
+    return _rate_limiter_registry
+
+
+def get_rate_limiter(provider: str, model: str = "default") -> AdaptiveRateLimiter:
+    return get_rate_limiter_registry().get(provider, model)
@@ -0,0 +1,526 @@
+"""
+Response Schemas
+Typed models for the JSON returned by each Gemini call site. They are sent as the
+request's response_schema (see utils.structured_output) and used to validate the
+parsed response.
+
+Fields are optional so a partial answer still validates, and unknown keys are kept.
+"""
+
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+
+from pydantic import BaseModel, ConfigDict, create_model, field_validator
+
+Number = Union[int, float]
+
+
+class ResponseModel(BaseModel):
+    """Base for response models: keeps keys the schema does not declare."""
+    model_config = ConfigDict(extra="allow")
+
+
+# ---------------------------------------------------------------------------
+# Intake (Memo 1)
+# ---------------------------------------------------------------------------
+
+class Memo1Response(ResponseModel):
+    """
+    Memo 1 extraction, from decks and from pitch transcripts.
+
+    Requested in JSON mode without a response schema: its ~90 fields are defined by
+    the prompt and several of them are returned either as text or as lists. A schema
+    declaring only the fields below would limit Gemini to them, so the model only
+    validates the parsed response.
+    """
+    title: Optional[str] = None
+    summary_analysis: Optional[str] = None
+    initial_flags: Optional[List[str]] = None
+    validation_points: Optional[List[str]] = None
+
+
+class CompanyIdentityResponse(ResponseModel):
+    company_name: Optional[str] = None
+    website: Optional[str] = None
+    sector: Optional[str] = None
+
+
+# ---------------------------------------------------------------------------
+# Diligence (Memo 2)
+# ---------------------------------------------------------------------------
+
+class ExecutiveSummary(ResponseModel):
+    overall_dd_score: Optional[Number] = None
+    recommendation: Optional[str] = None
+    founder_credibility_score: Optional[Number] = None
+    claim_consistency_percentage: Optional[Number] = None
+    red_flags_count: Optional[Number] = None
+    validation_gaps: Optional[Number] = None
+    key_findings: Optional[str] = None
+
+
+class ScoredEvidence(ResponseModel):
+    score: Optional[Number] = None
+    evidence: Optional[str] = None
+
+
+class CredibilityDimensions(ResponseModel):
+    communication_quality: Optional[ScoredEvidence] = None
+    domain_expertise: Optional[ScoredEvidence] = None
+    market_understanding: Optional[ScoredEvidence] = None
+    financial_acumen: Optional[ScoredEvidence] = None
+    realistic_risk_assessment: Optional[ScoredEvidence] = None
+    leadership_execution: Optional[ScoredEvidence] = None
+    investor_alignment: Optional[ScoredEvidence] = None
+
+
+class FounderCredibilityAssessment(ResponseModel):
+    overall_score: Optional[Number] = None
+    credibility_rating: Optional[str] = None
+    dimensions: Optional[CredibilityDimensions] = None
+
+
+class ClaimValidation(ResponseModel):
+    claim: Optional[str] = None
+    pitch_value: Optional[str] = None
+    interview_response: Optional[str] = None
+    variance: Optional[str] = None
+    status: Optional[str] = None
+
+
+class PitchConsistencyCheck(ResponseModel):
+    overall_consistency_score: Optional[Number] = None
+    match_percentage: Optional[Number] = None
+    claims_validation: Optional[List[ClaimValidation]] = None
+
+
+class RedFlag(ResponseModel):
+    flag_type: Optional[str] = None
+    severity: Optional[str] = None
+    description: Optional[str] = None
+    founder_response: Optional[str] = None
+    mitigation: Optional[str] = None
+    investment_impact: Optional[str] = None
+
+
+class RedFlagsConcerns(ResponseModel):
+    total_flags: Optional[Number] = None
+    critical_blockers: Optional[Number] = None
+    mitigation_level: Optional[str] = None
+    flags: Optional[List[RedFlag]] = None
+
+
+class MarketValidationChecks(ResponseModel):
+    tam_verification: Optional[str] = None
+    industry_statistics_accuracy: Optional[str] = None
+    competitive_landscape: Optional[str] = None
+    market_timing: Optional[str] = None
+    growth_projections_realism: Optional[str] = None
+
+
+class ReferenceContact(ResponseModel):
+    name: Optional[str] = None
+    title: Optional[str] = None
+    department: Optional[str] = None
+
+
+class ReferenceCall(ResponseModel):
+    customer_name: Optional[str] = None
+    industry: Optional[str] = None
+    reference_contact: Optional[ReferenceContact] = None
+    nps_score: Optional[Number] = None
+    renewal_likelihood: Optional[str] = None
+    key_benefits: Optional[List[str]] = None
+    minor_issues: Optional[List[str]] = None
+    overall_assessment: Optional[str] = None
+
+
+class CustomerValidation(ResponseModel):
+    average_nps: Optional[Number] = None
+    churn_risk: Optional[str] = None
+    expansion_likelihood: Optional[str] = None
+    testimonial_quality: Optional[str] = None
+    reference_calls: Optional[List[ReferenceCall]] = None
+
+
+class UnitEconomics(ResponseModel):
+    cac_current: Optional[str] = None
+    cac_eoy: Optional[str] = None
+    ltv_range: Optional[str] = None
+    cac_ltv_ratio: Optional[str] = None
+    payback_period: Optional[str] = None
+    gross_margin: Optional[str] = None
+
+
+class BurnRateAnalysis(ResponseModel):
+    monthly_burn: Optional[str] = None
+    runway_months: Optional[Number] = None
+    runway_assessment: Optional[str] = None
+    revenue_growth_required: Optional[str] = None
+
+
+class FinancialValidation(ResponseModel):
+    unit_economics: Optional[UnitEconomics] = None
+    burn_rate_analysis: Optional[BurnRateAnalysis] = None
+    financial_risk_level: Optional[str] = None
+
+
+class ComponentScores(ResponseModel):
+    founder_credibility: Optional[Number] = None
+    claim_consistency: Optional[Number] = None
+    red_flags_risks: Optional[Number] = None
+    financial_validation: Optional[Number] = None
+    customer_validation: Optional[Number] = None
+    market_validation: Optional[Number] = None
+
+
+class OverallRecommendation(ResponseModel):
+    component_scores: Optional[ComponentScores] = None
+    overall_dd_score: Optional[Number] = None
+    confidence_level: Optional[Number] = None
+    investment_recommendation: Optional[str] = None
+    mandatory_conditions: Optional[List[str]] = None
+    next_steps: Optional[List[str]] = None
+
+
+class SentimentAnalysis(ResponseModel):
+    overall_tone: Optional[str] = None
+    red_flag_indicators: Optional[Number] = None
+    credibility_signals: Optional[Number] = None
+    evasiveness_level: Optional[str] = None
+
+
+class ConfidenceMetrics(ResponseModel):
+    conviction_level: Optional[Number] = None
+    addressed_tough_questions: Optional[Number] = None
+    provided_specific_data: Optional[Number] = None
+
+
+class InterviewTranscriptAnalysis(ResponseModel):
+    overall_quality_score: Optional[Number] = None
+    sentiment_analysis: Optional[SentimentAnalysis] = None
+    confidence_metrics: Optional[ConfidenceMetrics] = None
+    key_insights: Optional[List[str]] = None
+
+
+class Memo2Response(ResponseModel):
+    """Comprehensive Memo 2 (DiligenceAgent.MEMO_2_PROMPT_TEMPLATE)."""
+    executive_summary: Optional[ExecutiveSummary] = None
+    founder_credibility_assessment: Optional[FounderCredibilityAssessment] = None
+    pitch_consistency_check: Optional[PitchConsistencyCheck] = None
+    red_flags_concerns: Optional[RedFlagsConcerns] = None
+    market_validation_checks: Optional[MarketValidationChecks] = None
+    customer_validation: Optional[CustomerValidation] = None
+    financial_validation: Optional[FinancialValidation] = None
+    overall_dd_score_recommendation: Optional[OverallRecommendation] = None
+    interview_transcript_analysis: Optional[InterviewTranscriptAnalysis] = None
+    investment_thesis: Optional[str] = None
+    confidence_score: Optional[Number] = None
+    key_risks: Optional[List[str]] = None
+    investment_recommendation: Optional[str] = None
+
+
+# Top-level Memo 2 sections, in the order the prompt asks for them
+MEMO_2_SECTIONS: List[str] = list(Memo2Response.model_fields)
+
+
+@lru_cache(maxsize=64)
+def _memo_2_sections_model(sections: Tuple[str, ...]) -> Type[ResponseModel]:
+    fields = Memo2Response.model_fields
+    return create_model(
+        "Memo2SectionsResponse",
+        __base__=ResponseModel,
+        **{section: (fields[section].annotation, None) for section in sections},
+    )
+
+
+def memo_2_sections_response(sections: List[str]) -> Type[ResponseModel]:
+    """Response model with only the given Memo 2 sections (continuations of a cut-off memo)."""
+    return _memo_2_sections_model(tuple(section for section in sections if section in Memo2Response.model_fields))
+
+
+class BenchmarkMetric(ResponseModel):
+    label: Optional[str] = None
+    value: Optional[str] = None
+
+
+class IndustryAverages(ResponseModel):
+    metrics: Optional[List[BenchmarkMetric]] = None
+
+
+class BenchmarkCompetitor(ResponseModel):
+    company_name: Optional[str] = None
+    is_target: Optional[bool] = None
+    metric1_value: Optional[str] = None
+    metric2_value: Optional[str] = None
+    fees: Optional[str] = None
+    ai_powered: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class BenchmarkMetricLabels(ResponseModel):
+    metric1: Optional[str] = None
+    metric2: Optional[str] = None
+
+
+class MarketOpportunity(ResponseModel):
+    description: Optional[str] = None
+
+
+class MarketBenchmarking(ResponseModel):
+    """Market benchmarking extracted from Perplexity research (DiligenceAgent)."""
+    industry_averages: Optional[IndustryAverages] = None
+    competitive_landscape: Optional[List[BenchmarkCompetitor]] = None
+    metric_labels: Optional[BenchmarkMetricLabels] = None
+    market_opportunity: Optional[MarketOpportunity] = None
+
+
+# ---------------------------------------------------------------------------
+# Interviews
+# ---------------------------------------------------------------------------
+
+class InterviewQuestion(ResponseModel):
+    questionNumber: Optional[int] = None
+    question: Optional[str] = None
+    category: Optional[str] = None
+    purpose: Optional[str] = None
+
+
+InterviewQuestions = List[InterviewQuestion]
+
+
+class InterviewAnalysis(ResponseModel):
+    executiveSummary: Optional[str] = None
+    keyInsights: Optional[List[str]] = None
+    redFlags: Optional[List[str]] = None
+    validationPoints: Optional[List[str]] = None
+    confidenceScore: Optional[Number] = None
+    recommendations: Optional[str] = None
+
+
+# ---------------------------------------------------------------------------
+# Memo enrichment validation
+# ---------------------------------------------------------------------------
+
+class ValidationFinding(ResponseModel):
+    name: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class ValidationAssessment(ResponseModel):
+    status: Optional[str] = None
+    confidence: Optional[Number] = None
+    findings: Optional[List[ValidationFinding]] = None
+    sources: Optional[List[str]] = None
+
+    @field_validator("findings", mode="before")
+    @classmethod
+    def _findings_from_mapping(cls, value):
+        # Models without schema support answer with a {name: detail} object
+        if isinstance(value, dict):
+            return [{"name": str(k), "detail": v if isinstance(v, str) else json.dumps(v)} for k, v in value.items()]
+        return value
+
+
+def findings_to_dict(findings: Any) -> Any:
+    """[{"name", "detail"}] findings as a {name: detail} mapping; other values unchanged."""
+    if isinstance(findings, list) and all(isinstance(f, dict) and "name" in f for f in findings):
+        return {f["name"]: f.get("detail") for f in findings}
+    return findings
+
+
+# ---------------------------------------------------------------------------
+# Google validation service
+# ---------------------------------------------------------------------------
+
+class ClaimCheck(ResponseModel):
+    is_accurate: Optional[bool] = None
+    confidence_score: Optional[Number] = None
+    verification_notes: Optional[str] = None
+    industry_benchmarks: Optional[str] = None
+    methodology_assessment: Optional[str] = None
+    potential_concerns: Optional[List[str]] = None
+    data_quality: Optional[str] = None
+
+
+class MarketAnalysis(ResponseModel):
+    market_size_estimate: Optional[str] = None
+    growth_rate: Optional[str] = None
+    key_drivers: Optional[List[str]] = None
+    market_segments: Optional[List[str]] = None
+    competitive_landscape: Optional[str] = None
+    market_maturity: Optional[str] = None
+
+
+class InvestmentImplications(ResponseModel):
+    market_attractiveness: Optional[Union[str, Number]] = None
+    scalability_potential: Optional[str] = None
+    barriers_to_entry: Optional[str] = None
+    growth_potential: Optional[str] = None
+
+
+class MarketSizeValidation(ResponseModel):
+    claim_validation: Optional[ClaimCheck] = None
+    market_analysis: Optional[MarketAnalysis] = None
+    investment_implications: Optional[InvestmentImplications] = None
+    validation_summary: Optional[str] = None
+    recommendations: Optional[List[str]] = None
+
+
+class CompetitorProfile(ResponseModel):
+    name: Optional[str] = None
+    market_position: Optional[str] = None
+    funding_status: Optional[str] = None
+    market_share: Optional[str] = None
+    key_differentiators: Optional[List[str]] = None
+    geographic_presence: Optional[str] = None
+    recent_developments: Optional[str] = None
+    competitive_strengths: Optional[List[str]] = None
+    competitive_weaknesses: Optional[List[str]] = None
+    funding_amount: Optional[str] = None
+    employee_count: Optional[str] = None
+    founded_year: Optional[str] = None
+    key_products: Optional[List[str]] = None
+    target_market: Optional[str] = None
+    business_model: Optional[str] = None
+    competitive_threat_level: Optional[str] = None
+    founder_linkedin_urls: Optional[List[str]] = None
+    founder_backgrounds: Optional[List[str]] = None
+    key_executives: Optional[List[str]] = None
+
+
+class CompetitorMatrix(ResponseModel):
+    industry_category: Optional[str] = None
+    analysis_timestamp: Optional[str] = None
+    competitors: Optional[List[CompetitorProfile]] = None
+    market_leaders: Optional[List[str]] = None
+    emerging_players: Optional[List[str]] = None
+    competitive_intensity: Optional[str] = None
+    market_concentration: Optional[str] = None
+    total_competitors_analyzed: Optional[Number] = None
+    market_gaps_identified: Optional[List[str]] = None
+    key_market_trends: Optional[List[str]] = None
+
+
+class CompetitiveLandscape(ResponseModel):
+    market_dynamics: Optional[str] = None
+    competitive_barriers: Optional[str] = None
+    market_opportunities: Optional[List[str]] = None
+    competitive_threats: Optional[List[str]] = None
+
+
+class CompetitorValidation(ResponseModel):
+    competitor_matrix: Optional[CompetitorMatrix] = None
+    competitive_landscape: Optional[CompetitiveLandscape] = None
+    sources: Optional[List[str]] = None
+    data_quality: Optional[str] = None
+    analysis_confidence: Optional[Number] = None
+
+
+class DataValidation(ResponseModel):
+    accuracy_score: Optional[Number] = None
+    completeness_score: Optional[Number] = None
+    consistency_score: Optional[Number] = None
+    validation_notes: Optional[str] = None
+    data_quality: Optional[str] = None
+    red_flags: Optional[List[str]] = None
+
+
+class MarketValidation(ResponseModel):
+    market_size_accuracy: Optional[Number] = None
+    competitive_landscape: Optional[str] = None
+    market_timing: Optional[str] = None
+    growth_potential: Optional[str] = None
+    market_attractiveness: Optional[Number] = None
+    competitive_positioning: Optional[str] = None
+
+
+class FinancialAssessment(ResponseModel):
+    revenue_projections: Optional[str] = None
+    unit_economics: Optional[str] = None
+    funding_requirements: Optional[str] = None
+    valuation_reasonableness: Optional[str] = None
+    financial_viability: Optional[Number] = None
+    burn_rate_analysis: Optional[str] = None
+
+
+class TeamValidation(ResponseModel):
+    founder_background: Optional[str] = None
+    team_completeness: Optional[str] = None
+    execution_capability: Optional[str] = None
+    advisory_board: Optional[str] = None
+    team_strength: Optional[Number] = None
+    execution_risk: Optional[str] = None
+
+
+class StrategicAnalysis(ResponseModel):
+    competitive_advantages: Optional[List[str]] = None
+    differentiation: Optional[str] = None
+    scalability: Optional[str] = None
+    market_opportunity: Optional[str] = None
+    business_model: Optional[str] = None
+
+
+class RiskAssessment(ResponseModel):
+    key_risks: Optional[List[str]] = None
+    risk_mitigation: Optional[str] = None
+    regulatory_risks: Optional[str] = None
+    market_risks: Optional[str] = None
+    execution_risks: Optional[str] = None
+
+
+class OverallAssessment(ResponseModel):
+    investment_readiness: Optional[Number] = None
+    key_strengths: Optional[List[str]] = None
+    key_concerns: Optional[List[str]] = None
+    investment_attractiveness: Optional[Number] = None
+    due_diligence_priority: Optional[str] = None
+
+
+class ValidationRecommendations(ResponseModel):
+    immediate_actions: Optional[List[str]] = None
+    additional_research: Optional[List[str]] = None
+    investment_considerations: Optional[List[str]] = None
+    next_steps: Optional[List[str]] = None
+
+
+class ComprehensiveValidation(ResponseModel):
+    data_validation: Optional[DataValidation] = None
+    market_validation: Optional[MarketValidation] = None
+    financial_validation: Optional[FinancialAssessment] = None
+    team_validation: Optional[TeamValidation] = None
+    strategic_analysis: Optional[StrategicAnalysis] = None
+    risk_assessment: Optional[RiskAssessment] = None
+    overall_assessment: Optional[OverallAssessment] = None
+    recommendations: Optional[ValidationRecommendations] = None
+    sources: Optional[List[str]] = None
+    data_quality: Optional[str] = None
+    analysis_confidence: Optional[Number] = None
+
+
+class EnrichedFieldValue(ResponseModel):
+    value: Optional[Union[str, Number, List[str]]] = None
+    confidence: Optional[Number] = None
+    source: Optional[str] = None
+
+
+@lru_cache(maxsize=64)
+def _field_enrichment_model(fields: Tuple[str, ...]) -> Type[ResponseModel]:
+    return create_model(
+        "FieldEnrichmentResponse",
+        __base__=ResponseModel,
+        **{field: (Optional[EnrichedFieldValue], None) for field in fields},
+    )
+
+
+def field_enrichment_response(fields: List[str]) -> Type[ResponseModel]:
+    """Response model with one {value, confidence, source} entry per requested field."""
+    return _field_enrichment_model(tuple(fields))
+
+
+GOOGLE_VALIDATION_RESPONSES: Dict[str, Type[ResponseModel]] = {
+    "market_size": MarketSizeValidation,
+    "competitors": CompetitorValidation,
+    "comprehensive": ComprehensiveValidation,
+}
@@ -0,0 +1,346 @@
+"""
+Singleflight
+Coalesces identical in-flight calls. Concurrent callers with the same key share one
+call: the first caller (the leader) runs it and the others wait for its result or
+error. Once the call finishes the key is released, so later callers run it again;
+nothing is cached beyond the flight.
+
+Flights are shared through a concurrent.futures.Future, so threads (do) and
+coroutines on any event loop (do_async) coalesce with each other. A leader that is
+cancelled hands the flight on: a waiting caller becomes the next leader.
+
+With a lease store, leaders also coalesce across instances. The leader claims a
+lease on the key before running; an instance that finds the lease held waits for
+the holder's result, and a result completed within result_ttl_seconds is reused.
+Waits are bounded by the request's deadline (utils.deadline): a follower whose leader
+outlives the budget gets DeadlineExceeded, and an instance stops polling a held lease
+once only run_reserve_seconds of the budget are left and runs the call itself,
+uncoalesced. Lease results must be JSON-serializable.
+
+Backends (SINGLEFLIGHT_LEASE_BACKEND):
+- "" (default): in-process coalescing only.
+- "firestore": singleflightLeases/{key} documents claimed in a transaction.
+- "memory": an in-process store for local testing.
+
+SINGLEFLIGHT=0 turns coalescing off. Callers are counted in singleflight_calls_total
+by group and role (leader, follower, lease_reused, lease_waited, lease_abandoned).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.deadline import DeadlineExceeded, has_budget, remaining, timeout_for
+from utils.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_METRIC = "singleflight_calls_total"
+
+LEASE_COLLECTION = "singleflightLeases"
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_RESULT_TTL_SECONDS = 60
+# Budget kept back for running the call locally when a lease holder takes too long
+DEFAULT_RUN_RESERVE_SECONDS = 30
+
+STATE_RUNNING = "running"
+STATE_COMPLETED = "completed"
+STATE_FAILED = "failed"
+
+DECISION_CLAIM = "claim"
+DECISION_REUSE = "reuse"
+DECISION_WAIT = "wait"
+
+
+def singleflight_enabled() -> bool:
+    return os.environ.get("SINGLEFLIGHT", "1") != "0"
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable key for a call from its arguments."""
+    raw = json.dumps(parts, sort_keys=True, default=repr, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _LeaderAborted(Exception):
+    """The leader stopped without a result; a waiting caller takes over."""
+
+
+def _lease_decision(existing: Optional[Dict[str, Any]], now: float, result_ttl_seconds: float) -> str:
+    if not existing:
+        return DECISION_CLAIM
+    state = existing.get("state")
+    if state == STATE_COMPLETED:
+        return DECISION_REUSE if now - existing.get("completed_at", 0) <= result_ttl_seconds else DECISION_CLAIM
+    if state == STATE_RUNNING and existing.get("lease_expires_at", 0) > now:
+        return DECISION_WAIT
+    return DECISION_CLAIM
+
+
+class InMemoryLeaseStore:
+    """Thread-safe in-process lease store."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: Dict[str, Dict[str, Any]] = {}
+
+    def try_claim(self, key: str, lease_seconds: float,
+                  result_ttl_seconds: float) -> Tuple[str, Optional[Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            existing = self._records.get(key)
+            decision = _lease_decision(existing, now, result_ttl_seconds)
+            if decision != DECISION_CLAIM:
+                return decision, dict(existing)
+            self._records[key] = {"state": STATE_RUNNING, "claimed_at": now, "lease_expires_at": now + lease_seconds}
+            return decision, None
+
+    def finish(self, key: str, update: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records.setdefault(key, {}).update(update)
+
+
+class FirestoreLeaseStore:
+    """Lease store backed by Firestore transactions."""
+
+    def __init__(self, db, collection: str = LEASE_COLLECTION):
+        self.db = db
+        self.collection = collection
+
+    def try_claim(self, key: str, lease_seconds: float,
+                  result_ttl_seconds: float) -> Tuple[str, Optional[Dict[str, Any]]]:
+        from firebase_admin import firestore
+
+        doc_ref = self.db.collection(self.collection).document(key)
+
+        @firestore.transactional
+        def claim_in_transaction(transaction):
+            now = time.time()
+            snapshot = doc_ref.get(transaction=transaction)
+            existing = snapshot.to_dict() if snapshot.exists else None
+            decision = _lease_decision(existing, now, result_ttl_seconds)
+            if decision != DECISION_CLAIM:
+                return decision, existing
+            transaction.set(doc_ref, {"state": STATE_RUNNING, "claimed_at": now,
+                                      "lease_expires_at": now + lease_seconds})
+            return decision, None
+
+        return claim_in_transaction(self.db.transaction())
+
+    def finish(self, key: str, update: Dict[str, Any]) -> None:
+        self.db.collection(self.collection).document(key).set(update, merge=True)
+
+
+class SingleFlight:
+    """A group of coalesced calls, e.g. all Perplexity searches."""
+
+    def __init__(self, name: str, lease_store=None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 result_ttl_seconds: float = DEFAULT_RESULT_TTL_SECONDS, poll_interval_seconds: float = 0.5,
+                 run_reserve_seconds: float = DEFAULT_RUN_RESERVE_SECONDS):
+        self.name = name
+        self.lease_store = lease_store
+        self.lease_seconds = lease_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.run_reserve_seconds = run_reserve_seconds
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """The flight for key and whether the caller leads it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = Future()
+            # A running future cannot be cancelled by a waiting caller
+            flight.set_running_or_notify_cancel()
+            self._flights[key] = flight
+            return flight, True
+
+    def _land(self, key: str, flight: Future, result: Any = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            # Released first, so callers arriving after the result start a new flight
+            self._flights.pop(key, None)
+        if error is None:
+            flight.set_result(result)
+        elif isinstance(error, Exception):
+            flight.set_exception(error)
+        else:
+            flight.set_exception(_LeaderAborted(f"{self.name} leader stopped: {error!r}"))
+
+    def _count(self, role: str) -> None:
+        get_metrics_registry().increment(SINGLEFLIGHT_METRIC, group=self.name, role=role)
+
+    def _wait_expired(self) -> DeadlineExceeded:
+        return DeadlineExceeded(f"{self.name} singleflight wait", max(0.0, remaining() or 0.0))
+
+    def _keep_polling(self) -> bool:
+        """False once waiting for another instance's lease would leave too little budget to run."""
+        if has_budget(self.run_reserve_seconds + self.poll_interval_seconds, f"{self.name} lease wait"):
+            return True
+        self._count("lease_abandoned")
+        return False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """fn(), shared with concurrent callers of the same key."""
+        if not singleflight_enabled():
+            return fn()
+        while True:
+            flight, leader = self._join(key)
+            if not leader:
+                self._count("follower")
+                try:
+                    return flight.result(timeout=timeout_for())
+                except FutureTimeoutError:
+                    raise self._wait_expired() from None
+                except _LeaderAborted:
+                    continue
+            self._count("leader")
+            try:
+                result = self._run_leased(key, fn)
+            except BaseException as e:
+                self._land(key, flight, error=e)
+                raise
+            self._land(key, flight, result)
+            return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """await fn(), shared with concurrent callers of the same key."""
+        if not singleflight_enabled():
+            return await fn()
+        while True:
+            flight, leader = self._join(key)
+            if not leader:
+                self._count("follower")
+                try:
+                    # Shielded, so a timed out follower leaves the shared flight running
+                    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(flight)), timeout_for())
+                except asyncio.TimeoutError:
+                    raise self._wait_expired() from None
+                except _LeaderAborted:
+                    continue
+            self._count("leader")
+            try:
+                result = await self._run_leased_async(key, fn)
+            except BaseException as e:
+                self._land(key, flight, error=e)
+                raise
+            self._land(key, flight, result)
+            return result
+
+    def _claim(self, key: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        try:
+            return self.lease_store.try_claim(key, self.lease_seconds, self.result_ttl_seconds)
+        except Exception as e:
+            # Never block the call because the lease store is unavailable
+            logger.warning(f"Singleflight lease claim failed for {self.name}, running locally: {e}")
+            return DECISION_CLAIM, None
+
+    def _finish(self, key: str, update: Dict[str, Any]) -> None:
+        try:
+            self.lease_store.finish(key, update)
+        except Exception as e:
+            logger.warning(f"Failed to record singleflight lease for {self.name} {key[:12]}: {e}")
+
+    def _lease_result(self, key: str) -> Tuple[str, Any]:
+        decision, existing = self._claim(key)
+        if decision == DECISION_REUSE:
+            self._count("lease_reused")
+            return decision, existing.get("result")
+        if decision == DECISION_WAIT:
+            self._count("lease_waited")
+        return decision, None
+
+    def _record(self, key: str, result: Any = None, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self._finish(key, {"state": STATE_FAILED, "error": str(error)[:500], "lease_expires_at": 0})
+        else:
+            self._finish(key, {"state": STATE_COMPLETED, "result": result, "completed_at": time.time()})
+
+    def _run_leased(self, key: str, fn: Callable[[], Any]) -> Any:
+        if self.lease_store is None:
+            return fn()
+        decision, result = self._lease_result(key)
+        while decision == DECISION_WAIT:
+            if not self._keep_polling():
+                # The holder keeps the lease; this instance runs the call without recording it
+                return fn()
+            time.sleep(self.poll_interval_seconds)
+            decision, result = self._lease_result(key)
+        if decision == DECISION_REUSE:
+            return result
+        try:
+            result = fn()
+        except BaseException as e:
+            self._record(key, error=e)
+            raise
+        self._record(key, result)
+        return result
+
+    async def _run_leased_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.lease_store is None:
+            return await fn()
+        decision, result = self._lease_result(key)
+        while decision == DECISION_WAIT:
+            if not self._keep_polling():
+                return await fn()
+            await asyncio.sleep(self.poll_interval_seconds)
+            decision, result = self._lease_result(key)
+        if decision == DECISION_REUSE:
+            return result
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._record(key, error=e)
+            raise
+        self._record(key, result)
+        return result
+
+
+# Global instances
+_singleflights: Dict[str, SingleFlight] = {}
+_singleflights_lock = threading.Lock()
+
+
+def _configured_lease_store():
+    backend = os.environ.get("SINGLEFLIGHT_LEASE_BACKEND", "").lower()
+    if backend == "memory":
+        return InMemoryLeaseStore()
+    if backend == "firestore":
+        from firebase_admin import firestore
+        return FirestoreLeaseStore(firestore.client())
+    return None
+
+
+def get_singleflight(name: str, distributed: bool = False) -> SingleFlight:
+    """
+    Get or create the process-wide group for name.
+
+    Args:
+        name: Group name (e.g. "perplexity")
+        distributed: Use the configured lease store so instances coalesce too;
+            only for calls with JSON-serializable results
+    """
+    with _singleflights_lock:
+        group = _singleflights.get(name)
+        if group is None:
+            lease_store = None
+            if distributed:
+                try:
+                    lease_store = _configured_lease_store()
+                except Exception as e:
+                    logger.warning(f"Singleflight leases unavailable for {name}: {e}")
+            group = SingleFlight(name, lease_store=lease_store)
+            _singleflights[name] = group
+        return group
@@ -0,0 +1,252 @@
+"""
+Structured Output
+Native JSON output for Gemini calls.
+
+Call sites pass a response model from utils.response_schemas. Requests set
+response_mime_type="application/json" and, where the model supports it, a
+response_schema derived from the response model, so Gemini returns JSON that already
+matches the expected shape. The response is then validated into the model.
+
+Models without schema support (or that reject the JSON options) and non-Gemini
+sources such as Perplexity go through the single fallback parser for malformed JSON,
+utils.json_parsing.extract_json. Every parse is counted in the llm_structured_output_total metric
+by call site and outcome, and parse_failure_rates() reports the failure rate.
+"""
+
+import itertools
+import json
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from pydantic import TypeAdapter, ValidationError
+
+from utils.json_parsing import extract_json, loads_tolerant
+from utils.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+STRUCTURED_OUTPUT_METRIC = "llm_structured_output_total"
+
+OUTCOME_OK = "ok"              # valid JSON matching the response model
+OUTCOME_REPAIRED = "repaired"  # recovered by the tolerant fallback parser
+OUTCOME_INVALID = "invalid"    # JSON that does not match the response model
+OUTCOME_FAILED = "failed"      # no JSON could be recovered
+
+# Model families without controlled generation (response_mime_type/response_schema)
+SCHEMA_UNSUPPORTED_MODEL_PREFIXES = ("gemini-1.0", "gemini-pro")
+
+# Models that rejected the JSON options at runtime
+_json_rejected_models = set()
+_json_rejected_lock = threading.Lock()
+
+_SCHEMA_KEYS = ("type", "description", "enum")
+
+
+def model_name_of(model) -> str:
+    """Short model name ('gemini-2.5-flash') of a GenerativeModel, or '' if unknown."""
+    name = getattr(model, "_model_name", None) or getattr(model, "model_name", None) or ""
+    return str(name).rsplit("/", 1)[-1]
+
+
+def supports_json_output(model) -> bool:
+    """True when the model accepts response_mime_type and response_schema."""
+    name = model_name_of(model)
+    if name in _json_rejected_models:
+        return False
+    return not name.startswith(SCHEMA_UNSUPPORTED_MODEL_PREFIXES)
+
+
+@lru_cache(maxsize=128)
+def _type_adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def _to_openapi(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts a pydantic JSON schema node to the OpenAPI subset Vertex AI accepts."""
+    if "$ref" in node:
+        return _to_openapi(defs[node["$ref"].rsplit("/", 1)[-1]], defs)
+
+    if "anyOf" in node:
+        options = [option for option in node["anyOf"] if option.get("type") != "null"]
+        nullable = len(options) < len(node["anyOf"])
+        kinds = {option.get("type") for option in options}
+        if len(options) == 1:
+            result = _to_openapi(options[0], defs)
+        elif kinds <= {"integer", "number"}:
+            result = {"type": "number"}
+        else:
+            # Unions of different kinds are requested as text
+            result = {"type": "string"}
+        if nullable:
+            result["nullable"] = True
+        return result
+
+    result = {key: node[key] for key in _SCHEMA_KEYS if key in node}
+    if node.get("type") == "object":
+        properties = node.get("properties") or {}
+        if not properties:
+            raise ValueError("Response schema objects must declare their properties")
+        result["properties"] = {name: _to_openapi(spec, defs) for name, spec in properties.items()}
+        if node.get("required"):
+            result["required"] = list(node["required"])
+    elif node.get("type") == "array":
+        result["items"] = _to_openapi(node.get("items") or {"type": "string"}, defs)
+    return result
+
+
+def to_response_schema(response_type) -> Dict[str, Any]:
+    """Vertex AI response_schema for a pydantic model (or List[model])."""
+    schema = _type_adapter(response_type).json_schema()
+    return _to_openapi(schema, schema.get("$defs", {}))
+
+
+def json_generation_config(model, response_type=None,
+                           generation_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    generation_config requesting JSON output.
+
+    Args:
+        model: The GenerativeModel the config is for
+        response_type: Response model sent as response_schema; None requests JSON
+            without a schema
+        generation_config: Base generation settings (temperature, max tokens, ...)
+    """
+    config = dict(generation_config or {})
+    if not supports_json_output(model):
+        return config
+    config["response_mime_type"] = "application/json"
+    if response_type is not None:
+        config["response_schema"] = to_response_schema(response_type)
+    return config
+
+
+def _is_json_option_rejection(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in ("response_schema", "response_mime_type", "controlled generation"))
+
+
+def generate_json(model, contents, response_type=None, generation_config: Optional[Dict[str, Any]] = None,
+                  stream: bool = False):
+    """
+    Calls model.generate_content requesting JSON output.
+
+    A model that rejects the JSON options is remembered and the call is retried
+    without them; its responses are then handled by the fallback parser.
+
+    Args:
+        stream: Return an iterator of response chunks instead of one response
+
+    Returns:
+        The model response, or an iterator of response chunks when streaming
+    """
+    config = json_generation_config(model, response_type, generation_config)
+    try:
+        return _generate(model, contents, config, stream)
+    except Exception as e:
+        if "response_mime_type" not in config or not _is_json_option_rejection(e):
+            raise
+        name = model_name_of(model)
+        logger.warning(f"Model {name or 'unknown'} rejected JSON output options, using the fallback parser: {e}")
+        with _json_rejected_lock:
+            _json_rejected_models.add(name)
+        return _generate(model, contents, generation_config, stream)
+
+
+def _generate(model, contents, config, stream: bool):
+    if not stream:
+        return model.generate_content(contents, generation_config=config or None)
+    # Streaming requests fail on the first chunk, so fetch it here to surface errors
+    chunks = iter(model.generate_content(contents, generation_config=config or None, stream=True))
+    try:
+        first = next(chunks)
+    except StopIteration:
+        return iter(())
+    return itertools.chain([first], chunks)
+
+
+def response_text(response) -> str:
+    """Text of a response or stream chunk; '' when it carries none (e.g. a final chunk)."""
+    try:
+        return response.text or ""
+    except (AttributeError, ValueError):
+        return ""
+
+
+def parse_json_tolerant(text: str) -> Any:
+    """
+    Recovers JSON from model text (see utils.json_parsing.extract_json).
+
+    Returns:
+        The parsed value, or None when no JSON can be recovered
+    """
+    return loads_tolerant(text)
+
+
+def record_parse_outcome(call_site: str, outcome: str) -> None:
+    get_metrics_registry().increment(STRUCTURED_OUTPUT_METRIC, call_site=call_site, outcome=outcome)
+    if outcome in (OUTCOME_INVALID, OUTCOME_FAILED):
+        logger.warning(f"Structured output {outcome} at {call_site}")
+
+
+def parse_structured(text: str, response_type=None, call_site: str = "unknown") -> Any:
+    """
+    Parses and validates a JSON model response.
+
+    Args:
+        text: Response text
+        response_type: Response model to validate into (None skips validation)
+        call_site: Label for the parse outcome metric
+
+    Returns:
+        The validated data as plain dicts/lists (keys absent from the response stay
+        absent), the unvalidated JSON when it does not match the model, or None when
+        no JSON could be recovered
+    """
+    outcome = OUTCOME_OK
+    try:
+        data = json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        extraction = extract_json(text)
+        data = extraction.value if extraction is not None else None
+        outcome = OUTCOME_REPAIRED
+        if extraction is not None and extraction.truncated:
+            logger.warning(f"Truncated JSON at {call_site}: cut at offset {extraction.end} "
+                           f"inside {extraction.truncated_path}")
+
+    if data is None:
+        record_parse_outcome(call_site, OUTCOME_FAILED)
+        return None
+    return validate_structured(data, response_type, call_site, outcome)
+
+
+def validate_structured(data: Any, response_type=None, call_site: str = "unknown",
+                        outcome: str = OUTCOME_OK) -> Any:
+    """
+    Validates already parsed response data (e.g. assembled from a stream) and
+    records the parse outcome; see parse_structured for the return value.
+    """
+    if response_type is not None:
+        adapter = _type_adapter(response_type)
+        try:
+            data = adapter.dump_python(adapter.validate_python(data), exclude_unset=True)
+        except ValidationError as e:
+            logger.debug(f"Response at {call_site} does not match {response_type}: {e}")
+            outcome = OUTCOME_INVALID
+
+    record_parse_outcome(call_site, outcome)
+    return data
+
+
+def parse_failure_rates() -> Dict[str, Dict[str, Any]]:
+    """Per call site parse outcome counts and failure rate (no JSON recovered)."""
+    sites: Dict[str, Dict[str, Any]] = {}
+    for series in get_metrics_registry().series(STRUCTURED_OUTPUT_METRIC):
+        labels = series["labels"]
+        site = sites.setdefault(labels["call_site"], {"total": 0})
+        site[labels["outcome"]] = site.get(labels["outcome"], 0) + series["value"]
+        site["total"] += series["value"]
+    for site in sites.values():
+        site["failure_rate"] = round(site.get(OUTCOME_FAILED, 0) / site["total"], 4) if site["total"] else 0.0
+    return sites
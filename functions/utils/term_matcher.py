@@ -0,0 +1,93 @@
+"""
+Term Matcher
+Finds every occurrence of a fixed set of terms in one pass over a text.
+
+The terms are compiled once into a single regular expression: their trie, written
+as nested alternations, inside a lookahead. At each position the engine follows only
+the branch for the next character, so the scan is one pass over the text whatever
+the number of terms, and overlapping occurrences are all seen. The match at a
+position is the longest term starting there; the shorter terms starting there are
+its prefixes, worked out when the matcher is built.
+
+Text and terms are expected in lower case. Matching folds the two characters that
+re.IGNORECASE also equates with ASCII letters (dotless ı, long ſ), so the positions
+are exactly those where re.search(re.escape(term), text, re.IGNORECASE) could
+start. Callers that need exact occurrences check text.startswith(term, position).
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+# Lower-case characters re.IGNORECASE matches with an ASCII letter
+_FOLD = {"ı": "i", "ſ": "s"}
+
+
+def _fold(text: str) -> str:
+    # Replacing each character is much faster than str.translate on non-ASCII text
+    for char, ascii_char in _FOLD.items():
+        if char in text:
+            text = text.replace(char, ascii_char)
+    return text
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """Regular expression matching the longest of terms at a position."""
+    trie: Dict[str, dict] = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = "|".join(branches)
+        if "" in node:
+            return f"(?:{body})?"
+        return branches[0] if len(branches) == 1 else f"(?:{body})"
+
+    return emit(trie)
+
+
+class TermMatcher:
+    """Single-pass matcher for a fixed set of lower-case terms."""
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms: Tuple[str, ...] = tuple(sorted({t for t in terms if t}))
+        # Folded form -> the terms it stands for
+        self._folded: Dict[str, List[str]] = {}
+        for term in self.terms:
+            self._folded.setdefault(_fold(term), []).append(term)
+        folded = sorted(self._folded)
+        self._pattern = re.compile(f"(?=({_trie_pattern(folded)}))") if folded else None
+        # Folded terms that also start wherever a longer one does
+        self._prefixes: Dict[str, Tuple[str, ...]] = {
+            term: tuple(other for other in folded if other != term and term.startswith(other))
+            for term in folded
+        }
+
+    def find(self, text: str) -> Dict[str, List[int]]:
+        """Start positions of every term in text, ascending; terms that do not occur are left out."""
+        positions: Dict[str, List[int]] = {}
+        if self._pattern is None:
+            return positions
+        starts: Dict[str, List[int]] = {}
+        for match in self._pattern.finditer(_fold(text)):
+            longest = match.group(1)
+            start = match.start()
+            starts.setdefault(longest, []).append(start)
+            for prefix in self._prefixes[longest]:
+                starts.setdefault(prefix, []).append(start)
+        for folded, found in starts.items():
+            for term in self._folded[folded]:
+                positions[term] = found
+        return positions
+
+
+@lru_cache(maxsize=64)
+def term_matcher(terms: Tuple[str, ...]) -> TermMatcher:
+    """Matcher for terms, built once per term set."""
+    return TermMatcher(terms)
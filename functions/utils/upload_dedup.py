@@ -0,0 +1,133 @@
+"""
+Upload Content Deduplication
+Maintains a contentHashes index so that a founder re-uploading a byte-identical file
+reuses their completed ingestionResults entry instead of re-running the AI pipeline.
+
+Entries are scoped by founder: the document ID is the SHA-256 of the normalized
+founder email and the content hash, so the same file uploaded by another founder
+is processed into a memo of its own. Uploads without a known founder are never
+deduplicated.
+"""
+
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CONTENT_HASH_COLLECTION = "contentHashes"
+
+# Default reuse window: 30 days. Set UPLOAD_DEDUP_WINDOW_SECONDS=0 to disable reuse.
+DEFAULT_DEDUP_WINDOW_SECONDS = 30 * 24 * 3600
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+# Placeholder the upload handlers use when the form has no founder_email
+UNKNOWN_FOUNDER_EMAIL = "unknown@example.com"
+
+
+def compute_content_hash(data: bytes) -> str:
+    """Return the hex SHA-256 digest of the uploaded bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_dedup_window_seconds() -> int:
+    """Return the configured reuse window in seconds."""
+    try:
+        return int(os.environ.get("UPLOAD_DEDUP_WINDOW_SECONDS", DEFAULT_DEDUP_WINDOW_SECONDS))
+    except ValueError:
+        logger.warning("Invalid UPLOAD_DEDUP_WINDOW_SECONDS, using default")
+        return DEFAULT_DEDUP_WINDOW_SECONDS
+
+
+def is_force_reprocess(value: Any) -> bool:
+    """Interpret a force_reprocess flag coming from form data or JSON."""
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in _TRUTHY
+
+
+def founder_scope(founder_email: Optional[str]) -> Optional[str]:
+    """Normalized founder email that scopes reuse, or None when the founder is unknown."""
+    email = str(founder_email or "").strip().lower()
+    if not email or email == UNKNOWN_FOUNDER_EMAIL:
+        return None
+    return email
+
+
+def content_hash_key(content_hash: str, founder_email: Optional[str]) -> Optional[str]:
+    """contentHashes document ID for a founder's upload, or None when it cannot be scoped."""
+    scope = founder_scope(founder_email)
+    if not content_hash or scope is None:
+        return None
+    return hashlib.sha256(f"{scope}\n{content_hash}".encode("utf-8")).hexdigest()
+
+
+def find_reusable_result(db, content_hash: str, founder_email: Optional[str],
+                         window_seconds: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Look up a completed ingestion result for identical content from the same founder.
+
+    Args:
+        db: Firestore client
+        content_hash: SHA-256 of the uploaded bytes
+        founder_email: Founder of the current upload; unknown founders never reuse results
+        window_seconds: Maximum age of a reusable result (defaults to the configured window)
+
+    Returns:
+        The contentHashes entry (including ingestion_result_id) or None when nothing reusable exists
+    """
+    if window_seconds is None:
+        window_seconds = get_dedup_window_seconds()
+    key = content_hash_key(content_hash, founder_email)
+    if window_seconds <= 0 or key is None:
+        return None
+
+    try:
+        entry_doc = db.collection(CONTENT_HASH_COLLECTION).document(key).get()
+        if not entry_doc.exists:
+            return None
+
+        entry = entry_doc.to_dict() or {}
+        result_id = entry.get("ingestion_result_id")
+        completed_at = entry.get("completed_at") or 0
+        if not result_id or time.time() - completed_at > window_seconds:
+            return None
+        if founder_scope(entry.get("founder_email")) != founder_scope(founder_email):
+            return None
+
+        # Only reuse results that still exist, completed successfully and belong to this founder
+        result_doc = db.collection("ingestionResults").document(result_id).get(
+            field_paths=["status", "memo_1.founder_email"])
+        result = (result_doc.to_dict() or {}) if result_doc.exists else {}
+        if result.get("status") != "SUCCESS":
+            return None
+        result_founder = (result.get("memo_1") or {}).get("founder_email")
+        if result_founder is not None and founder_scope(result_founder) != founder_scope(founder_email):
+            return None
+
+        return entry
+    except Exception as e:
+        logger.warning(f"Content hash lookup failed for {content_hash[:12]}: {e}")
+        return None
+
+
+def record_content_hash(db, content_hash: str, ingestion_result_id: str, founder_email: Optional[str],
+                        upload_id: Optional[str] = None, file_path: Optional[str] = None) -> None:
+    """Point the founder's content hash at a freshly completed ingestion result. Best-effort."""
+    key = content_hash_key(content_hash, founder_email)
+    if key is None or not ingestion_result_id:
+        return
+
+    try:
+        db.collection(CONTENT_HASH_COLLECTION).document(key).set({
+            "ingestion_result_id": ingestion_result_id,
+            "founder_email": founder_scope(founder_email),
+            "upload_id": upload_id,
+            "file_path": file_path,
+            "completed_at": time.time(),
+        })
+    except Exception as e:
+        logger.warning(f"Failed to record content hash {content_hash[:12]}: {e}")
@@ -0,0 +1,304 @@
+"""
+Vertex AI Regions
+Spreads Gemini calls over several Vertex AI regions and fails over between them.
+
+A model is built per region from its full resource name
+(projects/{project}/locations/{region}/publishers/google/models/{model}), so one
+process can call every configured region whatever location vertexai.init was given.
+Each region has its own rate limiter (utils.rate_limiter), whose adaptive rate
+tracks how much of that region's quota is left.
+
+Regions are chosen by smooth weighted round-robin; a region's weight is its
+configured weight scaled by its limiter's current rate relative to its starting
+rate, so traffic moves away from regions that are being throttled. When a call fails with a quota, unavailable or
+model-not-found error the next region serves it, and the failed region is skipped
+for a cooldown that doubles with consecutive failures. A region is retried fewer
+times before failing over than the last region a call can use. Each region has its
+own circuit breaker ("vertex@region"); a region whose breaker is open is skipped.
+
+Configuration:
+    VERTEX_REGIONS       "asia-south1:3,us-central1:1" (region[:weight]); the first
+                         region is the home region. Defaults to the vertexai.init location.
+    VERTEX_REGION_PINS   JSON {"call_site": ["region", ...]}; a call site is pinned
+                         to these regions (data residency) and never fails over
+                         outside them. A pin on "intake" also covers "intake.*".
+                         A pin with no regions is a configuration error.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.circuit_breaker import CircuitOpenError
+from utils.llm_gateway import GatewayModel
+from utils.metrics import get_metrics_registry
+from utils.rate_limiter import (
+    VERTEX_PROVIDER, RetryPolicy, get_rate_limiter, is_rate_limit_error, is_transient_error,
+)
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _REGION_FAILOVER_ERRORS = (google_exceptions.NotFound, google_exceptions.PermissionDenied)
+except ImportError:
+    _REGION_FAILOVER_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+REGION_CALLS_METRIC = "llm_region_calls_total"
+
+DEFAULT_PROJECT = "veritas-472301"
+DEFAULT_LOCATION = "asia-south1"
+
+FAILURE_COOLDOWN_SECONDS = 30
+MAX_COOLDOWN_SECONDS = 600
+
+# Retries within a region before trying the next one
+FAILOVER_RETRY_POLICY = RetryPolicy(max_attempts=2)
+
+
+@dataclass
+class VertexRegion:
+    name: str
+    weight: float = 1.0
+
+
+def parse_regions(value: str) -> List[VertexRegion]:
+    """Regions from "region[:weight],..."."""
+    regions = []
+    for item in value.split(","):
+        name, _, weight = item.strip().partition(":")
+        if not name:
+            continue
+        try:
+            regions.append(VertexRegion(name, float(weight) if weight else 1.0))
+        except ValueError:
+            logger.error(f"Ignoring invalid weight for Vertex AI region {name}: {weight}")
+            regions.append(VertexRegion(name))
+    return regions
+
+
+def parse_pins(value: str) -> Dict[str, List[str]]:
+    if not value.strip():
+        return {}
+    try:
+        pins = json.loads(value)
+    except ValueError as e:
+        logger.error(f"Ignoring invalid VERTEX_REGION_PINS: {e}")
+        return {}
+    if not isinstance(pins, dict):
+        logger.error("Ignoring VERTEX_REGION_PINS: expected a JSON object of call site -> regions")
+        return {}
+    return {call_site: [regions] if isinstance(regions, str) else list(regions or [])
+            for call_site, regions in pins.items()}
+
+
+def validate_pins(pins: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """
+    Pins with blank region names removed.
+
+    Raises:
+        ValueError: a pin names no region; falling back to every region would break its residency
+    """
+    validated = {}
+    for call_site, regions in pins.items():
+        names = [str(region).strip() for region in regions if str(region or "").strip()]
+        if not names:
+            raise ValueError(f"Vertex AI region pin for call site '{call_site}' names no regions")
+        validated[call_site] = names
+    return validated
+
+
+def is_region_failover_error(error: BaseException) -> bool:
+    """True when another region may succeed where this one failed."""
+    if isinstance(error, _REGION_FAILOVER_ERRORS):
+        return True
+    return is_rate_limit_error(error) or is_transient_error(error)
+
+
+def model_resource_name(project: str, region: str, model_name: str) -> str:
+    return f"projects/{project}/locations/{region}/publishers/google/models/{model_name}"
+
+
+def _generative_model(resource_name: str):
+    from vertexai.generative_models import GenerativeModel
+    return GenerativeModel(resource_name)
+
+
+class VertexRegionPool:
+    """Configured regions with their health, weights and per-region models."""
+
+    def __init__(self, project: str, regions: List[VertexRegion], pins: Optional[Dict[str, List[str]]] = None,
+                 model_factory: Optional[Callable[[str], Any]] = None, clock: Callable[[], float] = time.monotonic):
+        if not regions:
+            raise ValueError("At least one Vertex AI region is required")
+        self.project = project
+        self.regions = {region.name: region for region in regions}
+        self.home_region = regions[0].name
+        self.pins = validate_pins(pins or {})
+        self._model_factory = model_factory or _generative_model
+        self._clock = clock
+        self._models: Dict[tuple, GatewayModel] = {}
+        self._failures: Dict[str, int] = {}
+        self._unhealthy_until: Dict[str, float] = {}
+        self._current: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def allowed_regions(self, call_site: Optional[str] = None) -> List[str]:
+        """Regions call_site may use: its pin (most specific prefix wins) or every region."""
+        if call_site:
+            parts = call_site.split(".")
+            for length in range(len(parts), 0, -1):
+                pinned = self.pins.get(".".join(parts[:length]))
+                if pinned is not None:
+                    return list(pinned)
+        return list(self.regions)
+
+    def _weight(self, model_name: str, region: str) -> float:
+        limiter = get_rate_limiter(VERTEX_PROVIDER, f"{model_name}@{region}")
+        # A region at or above its starting rate has full weight; throttled regions lose share
+        headroom = min(1.0, limiter.rate / limiter.config.initial_rps)
+        configured = self.regions[region].weight if region in self.regions else 1.0
+        return configured * max(0.05, headroom)
+
+    def order(self, model_name: str, call_site: Optional[str] = None) -> List[str]:
+        """Regions to try for one call, best first; unhealthy regions come last."""
+        allowed = self.allowed_regions(call_site)
+        now = self._clock()
+        with self._lock:
+            healthy = [region for region in allowed if self._unhealthy_until.get(region, 0) <= now]
+            unhealthy = sorted((region for region in allowed if region not in healthy),
+                               key=lambda region: self._unhealthy_until[region])
+        if not healthy:
+            return unhealthy
+        weights = {region: self._weight(model_name, region) for region in healthy}
+        with self._lock:
+            # Smooth weighted round-robin: spreads picks in proportion to the weights
+            for region, weight in weights.items():
+                self._current[region] = self._current.get(region, 0.0) + weight
+            chosen = max(healthy, key=lambda region: self._current[region])
+            self._current[chosen] -= sum(weights.values())
+        rest = sorted((region for region in healthy if region != chosen), key=lambda region: -weights[region])
+        return [chosen] + rest + unhealthy
+
+    def model(self, model_name: str, region: str, last_resort: bool = False) -> GatewayModel:
+        """Gateway model for model_name in region, rate limited per region."""
+        key = (model_name, region, last_resort)
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = GatewayModel(
+                    self._model_factory(model_resource_name(self.project, region, model_name)),
+                    limiter_key=f"{model_name}@{region}",
+                    retry_policy=None if last_resort else FAILOVER_RETRY_POLICY,
+                    breaker=f"{VERTEX_PROVIDER}@{region}",
+                )
+                self._models[key] = model
+            return model
+
+    def mark_failure(self, region: str, error: BaseException) -> None:
+        with self._lock:
+            failures = self._failures.get(region, 0) + 1
+            self._failures[region] = failures
+            cooldown = min(MAX_COOLDOWN_SECONDS, FAILURE_COOLDOWN_SECONDS * 2 ** (failures - 1))
+            self._unhealthy_until[region] = self._clock() + cooldown
+        logger.warning(f"Vertex AI region {region} failed, skipping it for {cooldown}s: {error}")
+
+    def mark_success(self, region: str) -> None:
+        with self._lock:
+            self._failures.pop(region, None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            return {
+                "home_region": self.home_region,
+                "regions": {name: {
+                    "weight": region.weight,
+                    "consecutive_failures": self._failures.get(name, 0),
+                    "unhealthy_for_seconds": max(0, round(self._unhealthy_until.get(name, 0) - now)),
+                } for name, region in self.regions.items()},
+                "pins": dict(self.pins),
+            }
+
+
+class RegionalModel:
+    """Gemini model whose calls are spread over the pool's regions with failover."""
+
+    def __init__(self, pool: VertexRegionPool, model_name: str, call_site: Optional[str] = None,
+                 coalesce: bool = True):
+        self.pool = pool
+        self.model_name = model_name
+        self.call_site = call_site
+        self.coalesce = coalesce
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything but generate_content (e.g. _model_name, count_tokens) is the home region model's
+        home = self.pool.allowed_regions(self.call_site)[0]
+        return getattr(self.pool.model(self.model_name, home, last_resort=True), name)
+
+    def for_call_site(self, call_site: str) -> "RegionalModel":
+        return RegionalModel(self.pool, self.model_name, call_site, self.coalesce)
+
+    def uncoalesced(self) -> "RegionalModel":
+        """The same model without coalescing, for duplicate calls made on purpose."""
+        return RegionalModel(self.pool, self.model_name, self.call_site, coalesce=False)
+
+    def generate_content(self, contents, *args, **kwargs):
+        registry = get_metrics_registry()
+        regions = self.pool.order(self.model_name, self.call_site)
+        last_error: Optional[BaseException] = None
+        for index, region in enumerate(regions):
+            model = self.pool.model(self.model_name, region, last_resort=index == len(regions) - 1)
+            if not self.coalesce:
+                model = model.uncoalesced()
+            try:
+                response = model.generate_content(contents, *args, **kwargs)
+            except CircuitOpenError as e:
+                # The region's breaker already tracks its health; no extra cooldown
+                registry.increment(REGION_CALLS_METRIC, region=region, outcome="circuit_open")
+                last_error = e
+                continue
+            except Exception as e:
+                if not is_region_failover_error(e):
+                    raise
+                self.pool.mark_failure(region, e)
+                registry.increment(REGION_CALLS_METRIC, region=region, outcome="failed_over")
+                last_error = e
+                continue
+            self.pool.mark_success(region)
+            registry.increment(REGION_CALLS_METRIC, region=region, outcome="ok")
+            return response
+        if last_error is None:
+            raise ValueError(f"No Vertex AI regions available for call site '{self.call_site}'")
+        raise last_error
+
+
+# Global instance
+_vertex_region_pool = None
+
+
+def get_vertex_region_pool() -> VertexRegionPool:
+    """Get or create the global pool from VERTEX_REGIONS and VERTEX_REGION_PINS."""
+    global _vertex_region_pool
+    if _vertex_region_pool is None:
+        project = os.environ.get("GOOGLE_CLOUD_PROJECT") or DEFAULT_PROJECT
+        location = DEFAULT_LOCATION
+        try:
+            from google.cloud.aiplatform import initializer
+            # What vertexai.init was given; the public properties fall back to credential lookups
+            project = initializer.global_config._project or project
+            location = initializer.global_config._location or location
+        except ImportError:
+            pass
+        regions = parse_regions(os.environ.get("VERTEX_REGIONS", "")) or [VertexRegion(location)]
+        _vertex_region_pool = VertexRegionPool(project, regions, parse_pins(os.environ.get("VERTEX_REGION_PINS", "")))
+    return _vertex_region_pool
+
+
+def regional_model(model_name: str, call_site: Optional[str] = None) -> RegionalModel:
+    """Gemini model_name served by the configured regions, pinned as configured for call_site."""
+    return RegionalModel(get_vertex_region_pool(), model_name, call_site)